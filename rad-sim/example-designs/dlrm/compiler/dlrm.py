@@ -1,100 +1,124 @@
 import math
-import random
 import os
 import glob
 import numpy as np
 import sys
-
-# Input parameters
-model_csv = "ab_small.csv"
-read_bytewidth = 64
-element_bytewidth = 2
-hbm_channels = 16
-hbm_channel_words = 1 * 1024 * 1024 * 1024 / read_bytewidth
-ddr_channels = 2
-ddr_channel_words = 8 * 1024 * 1024 * 1024 / read_bytewidth
-num_test_inputs = 256
-
-# MLP parameters
-native_dim = 32  # int(read_bytewidth / element_bytewidth)
-num_layers = 3
-hidden_dims = [1024, 512, 256]
-num_mvms = [4, 2, 2]
-hard_mvms = False
-
-# Model parsing
-table_info = []
-smallest_table_bytewidth = 8
-input_dim = 0
-
-# Memory allocation
-hbm_channels_used_words = np.zeros(hbm_channels, dtype=int)
-hbm_channels_rounds = np.zeros(hbm_channels, dtype=int)
-ddr_channels_used_words = np.zeros(ddr_channels, dtype=int)
-ddr_channels_rounds = np.zeros(ddr_channels, dtype=int)
-tables_per_ddr_channel = {}
-tables_per_hbm_channel = {}
-base_addr_per_ddr_channel = {}
-base_addr_per_hbm_channel = {}
-
-# Testing
-test_input_data = []
-test_input_base_addr = []
-test_input_target_ch = []
-test_feature_interaction_outputs = []
-test_golden_outputs = []
-mem_contents_per_channel = [{} for channel in range(ddr_channels + hbm_channels)]
-
-tobin = lambda x, count=8: "".join(
-    map(lambda y: str((x >> y) & 1), range(count - 1, -1, -1))
-)
-
-
-def get_table_id(table):
-    return table[0]
-
-
-def get_table_vector_length(table):
-    return table[1]
-
-
-def get_table_vector_length_by_id(all_tables, id):
-    for table in all_tables:
-        if get_table_id(table) == id:
-            return get_table_vector_length(table)
-    return -1
-
-
-def get_table_entries(table):
-    return table[2]
-
-
-def get_table_entries_by_id(all_tables, id):
-    for table in all_tables:
-        if get_table_id(table) == id:
-            return get_table_entries(table)
-    return -1
-
-
-def get_table_words(table):
-    return table[3]
-
-
-def get_table_channel_type(table):
-    if len(table) < 5:
-        return -1
-    return table[4]
-
-
-def get_table_channel_id(table):
-    if len(table) < 5:
-        return -1
-    return table[5]
-
-
-def parse_dlrm_description(filename):
-    global smallest_table_bytewidth
-    global input_dim
+from scipy import sparse
+from dataclasses import dataclass, field, InitVar
+
+mem_image_magic = 0x4D454D44  # "DMEM" (little-endian)
+
+
+@dataclass
+class DLRMConfig:
+    # Input parameters
+    model_csv: str = "ab_small.csv"
+    read_bytewidth: int = 64
+    element_bytewidth: int = 2
+    hbm_channels: int = 16
+    hbm_channel_words: float = 1 * 1024 * 1024 * 1024 / read_bytewidth
+    ddr_channels: int = 2
+    ddr_channel_words: float = 8 * 1024 * 1024 * 1024 / read_bytewidth
+    num_test_inputs: int = 256
+    seed: int = None
+    binary_mem_images: bool = False
+
+    # Memory channel timing used by the table placement (from the DRAM configs of the
+    # design): DDR4_8Gb_x16_2400 has a 64-bit bus at tCK = 0.83 ns and HBM2_8Gb_x128 a
+    # 128-bit bus at tCK = 1 ns (both double data rate). Each lookup also costs one
+    # controller clock cycle.
+    ddr_channel_bandwidth: float = 64 / 8 * 2 / 0.83  # Bytes per ns
+    hbm_channel_bandwidth: float = 128 / 8 * 2 / 1.0  # Bytes per ns
+    ddr_lookup_ns: float = 3.32
+    hbm_lookup_ns: float = 2.0
+    allocation_mode: str = "greedy"
+
+    # MLP parameters
+    native_dim: int = 32  # int(read_bytewidth / element_bytewidth)
+    num_layers: int = 3
+    hidden_dims: list = field(default_factory=lambda: [1024, 512, 256])
+    num_mvms: list = field(default_factory=lambda: [4, 2, 2])
+    hard_mvms: bool = False
+
+
+@dataclass
+class EmbeddingTable:
+    id: int
+    vector_length: int
+    entries: int
+    words: int
+    channel_type: int = -1  # 1 = DDR, 0 = HBM (-1 if not allocated)
+    channel_id: int = -1
+
+
+@dataclass
+class DLRMModel:
+    # Embedding tables indexed by table ID (iterated in allocation order once sorted)
+    tables: dict = field(default_factory=dict)
+    input_dim: int = 0
+    smallest_table_bytewidth: int = 8
+
+
+@dataclass
+class TableAllocation:
+    config: InitVar[DLRMConfig]
+    tables_per_ddr_channel: dict = field(default_factory=dict)
+    tables_per_hbm_channel: dict = field(default_factory=dict)
+    base_addr_per_ddr_channel: dict = field(default_factory=dict)
+    base_addr_per_hbm_channel: dict = field(default_factory=dict)
+    ddr_channels_used_words: np.ndarray = field(init=False)
+    ddr_channels_rounds: np.ndarray = field(init=False)
+    hbm_channels_used_words: np.ndarray = field(init=False)
+    hbm_channels_rounds: np.ndarray = field(init=False)
+    # (channel type, channel ID) of the memory channels in the order their tables are
+    # dealt in each round, which is also the lookup order of a round
+    channel_order: list = field(init=False)
+
+    def __post_init__(self, config):
+        self.ddr_channels_used_words = np.zeros(config.ddr_channels, dtype=int)
+        self.ddr_channels_rounds = np.zeros(config.ddr_channels, dtype=int)
+        self.hbm_channels_used_words = np.zeros(config.hbm_channels, dtype=int)
+        self.hbm_channels_rounds = np.zeros(config.hbm_channels, dtype=int)
+        self.channel_order = get_memory_channels(config)
+
+    def add_table(self, table, channel_type, ch):
+        if channel_type == 1:
+            tables_per_channel = self.tables_per_ddr_channel
+            base_addr_per_channel = self.base_addr_per_ddr_channel
+            used_words, rounds = self.ddr_channels_used_words, self.ddr_channels_rounds
+        else:
+            tables_per_channel = self.tables_per_hbm_channel
+            base_addr_per_channel = self.base_addr_per_hbm_channel
+            used_words, rounds = self.hbm_channels_used_words, self.hbm_channels_rounds
+        if ch in tables_per_channel:
+            tables_per_channel[ch].append(table.id)
+            base_addr_per_channel[ch].append(used_words[ch])
+        else:
+            tables_per_channel[ch] = [table.id]
+            base_addr_per_channel[ch] = [used_words[ch]]
+        used_words[ch] += table.words
+        rounds[ch] += 1
+        table.channel_type = channel_type
+        table.channel_id = ch
+
+
+@dataclass
+class TestInputs:
+    # Lookup offsets (bytes) of each input (one row per input, one column per lookup)
+    data: np.ndarray
+    # Target memory channel and table base address (bytes) of each lookup
+    target_ch: np.ndarray
+    base_addr: np.ndarray
+    # Row of each lookup in the embedding rows of its memory channel (same shape as data)
+    row_ids: np.ndarray
+    # Looked up addresses (bytes, sorted) and their embedding rows (int16, zero-padded to
+    # the width of a memory row) of each memory channel
+    mem_addrs_per_channel: list
+    mem_rows_per_channel: list
+
+
+def parse_dlrm_description(config, filename):
+    model = DLRMModel()
     f = open(filename, "r")
     lines = f.readlines()
     id = 0
@@ -103,109 +127,323 @@ def parse_dlrm_description(filename):
             continue
         line_split = line.split(",")
         line_split = [eval(i) for i in line_split]
-        input_dim += line_split[0]
-        if line_split[0] * element_bytewidth < smallest_table_bytewidth:
-            smallest_table_bytewidth = line_split[0] * element_bytewidth
-        words_per_entry = int(math.ceil(1.0 * line_split[0] / read_bytewidth))
-        line_split.append(words_per_entry * line_split[1])
-        line_split.insert(0, id)
+        model.input_dim += line_split[0]
+        if line_split[0] * config.element_bytewidth < model.smallest_table_bytewidth:
+            model.smallest_table_bytewidth = line_split[0] * config.element_bytewidth
+        words_per_entry = int(math.ceil(1.0 * line_split[0] / config.read_bytewidth))
+        model.tables[id] = EmbeddingTable(
+            id, line_split[0], line_split[1], words_per_entry * line_split[1]
+        )
         id = id + 1
-        table_info.append(line_split)
     f.close()
+    return model
 
 
-def sort_tables():
-    table_info.sort(key=lambda x: x[3], reverse=True)
+def sort_tables(model):
+    model.tables = dict(
+        sorted(model.tables.items(), key=lambda x: x[1].words, reverse=True)
+    )
 
 
-def greedy_allocation():
+def greedy_allocation(config, model):
+    allocation = TableAllocation(config)
     round_id = 1
-    for table in table_info:
+    for table in model.tables.values():
         allocated = False
         while not (allocated):
-            for ch in range(ddr_channels):
-                rem_words = ddr_channel_words - ddr_channels_used_words[ch]
-                if (ddr_channels_rounds[ch] < round_id) and (
-                    rem_words >= get_table_words(table)
+            for ch in range(config.ddr_channels):
+                rem_words = (
+                    config.ddr_channel_words - allocation.ddr_channels_used_words[ch]
+                )
+                if (allocation.ddr_channels_rounds[ch] < round_id) and (
+                    rem_words >= table.words
                 ):
-                    if ch in tables_per_ddr_channel:
-                        tables_per_ddr_channel[ch].append(get_table_id(table))
-                        base_addr_per_ddr_channel[ch].append(
-                            ddr_channels_used_words[ch]
-                        )
-                    else:
-                        tables_per_ddr_channel[ch] = [get_table_id(table)]
-                        base_addr_per_ddr_channel[ch] = [ddr_channels_used_words[ch]]
-                    ddr_channels_used_words[ch] += get_table_words(table)
-                    ddr_channels_rounds[ch] += 1
+                    allocation.add_table(table, 1, ch)
                     allocated = True
-                    table.append(1)
-                    table.append(ch)
-
                     break
 
             if not (allocated):
-                for ch in range(hbm_channels):
-                    rem_words = hbm_channel_words - hbm_channels_used_words[ch]
-                    if (hbm_channels_rounds[ch] < round_id) and (
-                        rem_words >= get_table_words(table)
+                for ch in range(config.hbm_channels):
+                    rem_words = (
+                        config.hbm_channel_words - allocation.hbm_channels_used_words[ch]
+                    )
+                    if (allocation.hbm_channels_rounds[ch] < round_id) and (
+                        rem_words >= table.words
                     ):
-                        if ch in tables_per_hbm_channel:
-                            tables_per_hbm_channel[ch].append(get_table_id(table))
-                            base_addr_per_hbm_channel[ch].append(
-                                hbm_channels_used_words[ch]
-                            )
-                        else:
-                            tables_per_hbm_channel[ch] = [get_table_id(table)]
-                            base_addr_per_hbm_channel[ch] = [
-                                hbm_channels_used_words[ch]
-                            ]
-                        hbm_channels_used_words[ch] += get_table_words(table)
-                        hbm_channels_rounds[ch] += 1
+                        allocation.add_table(table, 0, ch)
                         allocated = True
-                        table.append(0)
-                        table.append(ch)
                         break
 
             if not (allocated):
                 round_id += 1
+    return allocation
+
+
+def get_memory_channels(config):
+    # (channel type, channel ID) of all memory channels in lookup order (DDR first),
+    # using the channel type encoding of the tables (1 = DDR, 0 = HBM)
+    return [(1, ch) for ch in range(config.ddr_channels)] + [
+        (0, ch) for ch in range(config.hbm_channels)
+    ]
+
+
+def get_channel_words(config, channel):
+    return config.ddr_channel_words if channel[0] == 1 else config.hbm_channel_words
+
+
+def get_table_lookup_bytes(config, table):
+    return int(table.words / table.entries) * config.read_bytewidth
+
+
+def get_lookup_cost(config, lookup_bytes, channel):
+    # Expected time (ns) spent by a channel on one lookup of lookup_bytes bytes
+    if channel[0] == 1:
+        return config.ddr_lookup_ns + lookup_bytes / config.ddr_channel_bandwidth
+    return config.hbm_lookup_ns + lookup_bytes / config.hbm_channel_bandwidth
+
+
+def get_table_lookup_cost(config, table, channel):
+    return get_lookup_cost(config, get_table_lookup_bytes(config, table), channel)
+
+
+def get_deal_order(config):
+    # Indices (in get_memory_channels order) of the memory channels from the fastest to
+    # the slowest lookup of a memory word (HBM before DDR with the default timing)
+    channels = get_memory_channels(config)
+    return sorted(
+        range(len(channels)),
+        key=lambda c: get_lookup_cost(config, config.read_bytewidth, channels[c]),
+    )
+
+
+def deal_tables(config, model, counts):
+    # Places the tables on the channels given the number of tables of each channel. Tables
+    # are dealt round by round (one table per channel per round, from the fastest channel
+    # to the slowest) from the largest vector length to the smallest, so the heaviest
+    # table of each round goes to the fastest channel. Since the feature interaction
+    # consumes the lookups in the same order, vectors never straddle a feature interaction
+    # word. Each slot takes the first remaining table that fits in the channel (None if
+    # none fits).
+    channels = get_memory_channels(config)
+    remaining = sorted(
+        model.tables.values(),
+        key=lambda t: (t.vector_length, t.words),
+        reverse=True,
+    )
+    placement = [[] for channel in channels]
+    used_words = np.zeros(len(channels), dtype=int)
+    for round_id in range(max(counts)):
+        for c in get_deal_order(config):
+            if counts[c] <= round_id:
+                continue
+            rem_words = get_channel_words(config, channels[c]) - used_words[c]
+            fits = [t for t in remaining if t.words <= rem_words]
+            if len(fits) == 0:
+                return None
+            placement[c].append(fits[0])
+            used_words[c] += fits[0].words
+            remaining.remove(fits[0])
+    return placement
+
+
+def get_channel_loads(config, placement):
+    channels = get_memory_channels(config)
+    return [
+        sum([get_table_lookup_cost(config, t, channels[c]) for t in placement[c]])
+        for c in range(len(channels))
+    ]
+
+
+def get_placement_makespan(config, model, counts):
+    if sum(counts) != len(model.tables) or min(counts) < 0:
+        return math.inf
+    placement = deal_tables(config, model, counts)
+    if placement is None:
+        return math.inf
+    return max(get_channel_loads(config, placement))
+
+
+def lpt_table_counts(config, model):
+    # Longest processing time first: tables (most expensive first) go to the channel that
+    # would finish its lookups the earliest, among the channels with enough free words
+    channels = get_memory_channels(config)
+    loads = np.zeros(len(channels))
+    used_words = np.zeros(len(channels), dtype=int)
+    counts = np.zeros(len(channels), dtype=int)
+    tables = sorted(
+        model.tables.values(),
+        key=lambda t: max([get_table_lookup_cost(config, t, ch) for ch in channels]),
+        reverse=True,
+    )
+    for table in tables:
+        candidates = [
+            c
+            for c in range(len(channels))
+            if used_words[c] + table.words <= get_channel_words(config, channels[c])
+        ]
+        assert len(candidates) > 0, "Embedding tables do not fit in memory"
+        best = min(
+            candidates,
+            key=lambda c: (loads[c] + get_table_lookup_cost(config, table, channels[c]), c),
+        )
+        loads[best] += get_table_lookup_cost(config, table, channels[best])
+        used_words[best] += table.words
+        counts[best] += 1
+    return counts
+
+
+def refine_table_counts(config, model, counts, max_iterations=10000):
+    # Local search: moves one table at a time from a busiest channel to another channel
+    # as long as the makespan of the resulting placement decreases
+    counts = np.array(counts)
+    makespan = get_placement_makespan(config, model, counts)
+    for iteration in range(max_iterations):
+        loads = get_channel_loads(config, deal_tables(config, model, counts))
+        improved = False
+        for src in np.argsort(loads)[::-1]:
+            if counts[src] == 0:
+                continue
+            for dst in range(len(counts)):
+                if dst == src:
+                    continue
+                new_counts = np.array(counts)
+                new_counts[src] -= 1
+                new_counts[dst] += 1
+                new_makespan = get_placement_makespan(config, model, new_counts)
+                if new_makespan < makespan - 1e-9:
+                    counts, makespan, improved = new_counts, new_makespan, True
+                    break
+            if improved or loads[src] < max(loads):
+                break
+        if not (improved):
+            break
+    return counts
+
+
+def balanced_allocation(config, model, refine=False):
+    # Places the tables to minimize the lookup time of an input, which is gated by the busiest
+    # channel (makespan), using the LPT heuristic and optionally a local search refinement.
+    # Produces the same outputs as greedy_allocation.
+    channels = get_memory_channels(config)
+    counts = lpt_table_counts(config, model)
+    if get_placement_makespan(config, model, counts) == math.inf:
+        # Round-robin counts of the greedy allocation as a fallback
+        counts = np.array(
+            [
+                len(model.tables) // len(channels)
+                + int(c < len(model.tables) % len(channels))
+                for c in range(len(channels))
+            ]
+        )
+    if refine:
+        counts = refine_table_counts(config, model, counts)
+    placement = deal_tables(config, model, counts)
+    assert placement is not None, "Embedding tables do not fit in memory"
+    allocation = TableAllocation(config)
+    allocation.channel_order = [channels[c] for c in get_deal_order(config)]
+    for c in range(len(channels)):
+        for table in placement[c]:
+            allocation.add_table(table, channels[c][0], channels[c][1])
+    return allocation
+
+
+def get_lookup_order(config, allocation):
+    # (memory channel, table ID, table base address in words) of the embedding lookups of an
+    # input. Lookups go round by round: the n-th table of every channel in the channel
+    # order of the allocation (memory channels are numbered DDR first).
+    lookups = []
+    num_rounds = max(
+        list(allocation.ddr_channels_rounds) + list(allocation.hbm_channels_rounds)
+    )
+    for round_id in range(num_rounds):
+        for (channel_type, ch) in allocation.channel_order:
+            if channel_type == 1:
+                tables = allocation.tables_per_ddr_channel.get(ch, [])
+                base_addrs = allocation.base_addr_per_ddr_channel.get(ch, [])
+                mem_ch = ch
+            else:
+                tables = allocation.tables_per_hbm_channel.get(ch, [])
+                base_addrs = allocation.base_addr_per_hbm_channel.get(ch, [])
+                mem_ch = config.ddr_channels + ch
+            if round_id < len(tables):
+                lookups.append((mem_ch, tables[round_id], base_addrs[round_id]))
+    return lookups
+
+
+def get_allocation_placement(config, model, allocation):
+    # Tables placed by an allocation on each channel (in get_memory_channels order)
+    placement = []
+    for (channel_type, ch) in get_memory_channels(config):
+        tables_per_channel = (
+            allocation.tables_per_ddr_channel
+            if channel_type == 1
+            else allocation.tables_per_hbm_channel
+        )
+        placement.append([model.tables[id] for id in tables_per_channel.get(ch, [])])
+    return placement
+
+
+def print_channel_loads(config, model, allocation):
+    # Expected lookups, bytes and time (ns) per input of each channel for an allocation
+    channels = get_memory_channels(config)
+    placement = get_allocation_placement(config, model, allocation)
+    loads = get_channel_loads(config, placement)
+    print("Expected Channel Loads (per input):")
+    print("+-----+---------+-------+-----------+")
+    print("| Ch  | Lookups | Bytes | Time (ns) |")
+    print("|-----|---------|-------|-----------|")
+    for c in range(len(channels)):
+        name = ("D" if channels[c][0] == 1 else "H") + str(channels[c][1])
+        lookup_bytes = sum([get_table_lookup_bytes(config, t) for t in placement[c]])
+        print(
+            "| {:>3} | {:>7} | {:>5} | {:>9.2f} |".format(
+                name, len(placement[c]), lookup_bytes, loads[c]
+            )
+        )
+    print("+-----+---------+-------+-----------+")
+    print("Expected lookup time per input = {:.2f} ns".format(max(loads)))
+    return loads
 
 
-def print_dlrm_description():
+def print_dlrm_description(model):
     print("Embedding Tables (sorted):")
     print("+----+----+-----------+")
     print("| #  | V  |  Entries  |")
     print("|----|----|-----------|")
-    for row in table_info:
-        print("| {:>2} | {:>2} | {:>9} |".format(*row))
+    for table in model.tables.values():
+        print(
+            "| {:>2} | {:>2} | {:>9} |".format(
+                table.id, table.vector_length, table.entries
+            )
+        )
     print("+----+----+-----------+")
 
 
-def print_allocation():
+def print_allocation(config, model, allocation):
     ddr_total_mb = 0
     hbm_total_mb = 0
     print("\nDDR Channel Allocations:")
-    ddr_table = [ddr_channels_rounds, ddr_channels_used_words]
+    ddr_table = [allocation.ddr_channels_rounds, allocation.ddr_channels_used_words]
     ddr_table = np.transpose(ddr_table).tolist()
     print("+----+-----------+--------+----------+")
     print("| R  | Mem Words |   %    | Size(MB) |")
     print("|----|-----------|--------|----------|")
     for row in ddr_table:
-        row.append(1.0 * row[1] / ddr_channel_words * 100)
-        size_mb = 1.0 * row[1] * read_bytewidth / 1024 / 1024
+        row.append(1.0 * row[1] / config.ddr_channel_words * 100)
+        size_mb = 1.0 * row[1] * config.read_bytewidth / 1024 / 1024
         ddr_total_mb += size_mb
         row.append(size_mb)
         print("| {:>2} | {:>9} | {:5.2f}% | {:8.2f} |".format(*row))
     print("+----+-----------+--------+----------+")
     print("\nHBM Channel Allocations:")
-    hbm_table = [hbm_channels_rounds, hbm_channels_used_words]
+    hbm_table = [allocation.hbm_channels_rounds, allocation.hbm_channels_used_words]
     hbm_table = np.transpose(hbm_table).tolist()
     print("+----+-----------+--------+----------+")
     print("| R  | Mem Words |   %    | Size(MB) |")
     print("|----|-----------|--------|----------|")
     for row in hbm_table:
-        row.append(1.0 * row[1] / hbm_channel_words * 100)
-        size_mb = 1.0 * row[1] * read_bytewidth / 1024 / 1024
+        row.append(1.0 * row[1] / config.hbm_channel_words * 100)
+        size_mb = 1.0 * row[1] * config.read_bytewidth / 1024 / 1024
         hbm_total_mb += size_mb
         row.append(size_mb)
         print("| {:>2} | {:>9} | {:5.2f}% | {:8.2f} |".format(*row))
@@ -215,19 +453,18 @@ def print_allocation():
     print("Total memory footprint = {:.2f} MB".format(ddr_total_mb + hbm_total_mb))
     print("\n")
     print("DDR Tables per channel:")
-    for ch in tables_per_ddr_channel:
+    for ch in allocation.tables_per_ddr_channel:
         print("{:>2} : ".format(ch), end="")
-        for i in range(len(tables_per_ddr_channel[ch])):
+        for i in range(len(allocation.tables_per_ddr_channel[ch])):
+            table = model.tables[allocation.tables_per_ddr_channel[ch][i]]
             print(
                 "{:>3} ({:>9}) ({:>2})".format(
-                    tables_per_ddr_channel[ch][i],
-                    base_addr_per_ddr_channel[ch][i],
+                    table.id,
+                    allocation.base_addr_per_ddr_channel[ch][i],
                     int(
-                        get_table_vector_length_by_id(
-                            table_info, tables_per_ddr_channel[ch][i]
-                        )
-                        * element_bytewidth
-                        / smallest_table_bytewidth
+                        table.vector_length
+                        * config.element_bytewidth
+                        / model.smallest_table_bytewidth
                     ),
                 ),
                 end="",
@@ -235,19 +472,18 @@ def print_allocation():
         print("")
     print("\n")
     print("HBM Tables per channel:")
-    for ch in tables_per_hbm_channel:
+    for ch in allocation.tables_per_hbm_channel:
         print("{:>2} : ".format(ch), end="")
-        for i in range(len(tables_per_hbm_channel[ch])):
+        for i in range(len(allocation.tables_per_hbm_channel[ch])):
+            table = model.tables[allocation.tables_per_hbm_channel[ch][i]]
             print(
                 "{:>3} ({:>9}) ({:>2})".format(
-                    tables_per_hbm_channel[ch][i],
-                    base_addr_per_hbm_channel[ch][i],
+                    table.id,
+                    allocation.base_addr_per_hbm_channel[ch][i],
                     int(
-                        get_table_vector_length_by_id(
-                            table_info, tables_per_hbm_channel[ch][i]
-                        )
-                        * element_bytewidth
-                        / smallest_table_bytewidth
+                        table.vector_length
+                        * config.element_bytewidth
+                        / model.smallest_table_bytewidth
                     ),
                 ),
                 end="",
@@ -256,98 +492,118 @@ def print_allocation():
     print("\n")
 
 
-def generate_embedding_lookup_inputs(num_inputs):
+def write_rows(f, rows, suffix="", chunk_rows=4096):
+    # Writes a 2D integer array as text, one row per line (each element followed by a space)
+    # and an optional suffix after each row
+    row_fmt = "%d " * rows.shape[1] + "\n" + suffix.replace("%", "%%")
+    for start in range(0, rows.shape[0], chunk_rows):
+        chunk = rows[start : start + chunk_rows]
+        f.write((row_fmt * len(chunk)) % tuple(chunk.ravel().tolist()))
+
+
+def generate_embedding_lookup_inputs(config, model, allocation, num_inputs, rng=None):
+    # Draws the lookup indices of all inputs (one RNG call per table) and random contents
+    # for every looked up embedding table row
+    if rng is None:
+        rng = np.random.default_rng()
+    lookups = get_lookup_order(config, allocation)
+    row_elements = int(config.read_bytewidth / config.element_bytewidth) * max(
+        [int(table.words / table.entries) for table in model.tables.values()]
+    )
+    data = np.zeros((num_inputs, len(lookups)), dtype=np.int64)
+    row_ids = np.zeros((num_inputs, len(lookups)), dtype=np.int64)
+    num_channels = config.ddr_channels + config.hbm_channels
+    mem_addrs_per_channel = [[] for channel in range(num_channels)]
+    mem_rows_per_channel = [[] for channel in range(num_channels)]
+    channel_rows = np.zeros(config.ddr_channels + config.hbm_channels, dtype=np.int64)
+    for (j, (ch, table_id, table_base_addr)) in enumerate(lookups):
+        table = model.tables[table_id]
+        limit = int(table.entries / 2)
+        data[:, j] = (
+            rng.integers(0, limit, size=num_inputs, endpoint=True) * config.read_bytewidth
+        )
+        (addrs, inverse) = np.unique(data[:, j], return_inverse=True)
+        rows = np.zeros((len(addrs), row_elements), dtype=np.int16)
+        rows[:, : table.vector_length] = rng.integers(
+            -2, 2, size=(len(addrs), table.vector_length), endpoint=True
+        )
+        row_ids[:, j] = channel_rows[ch] + inverse.reshape(-1)
+        channel_rows[ch] += len(addrs)
+        mem_addrs_per_channel[ch].append(table_base_addr * config.read_bytewidth + addrs)
+        mem_rows_per_channel[ch].append(rows)
+    for ch in range(config.ddr_channels + config.hbm_channels):
+        mem_addrs_per_channel[ch] = np.concatenate(
+            mem_addrs_per_channel[ch] + [np.zeros(0, dtype=np.int64)]
+        )
+        mem_rows_per_channel[ch] = np.concatenate(
+            mem_rows_per_channel[ch] + [np.zeros((0, row_elements), dtype=np.int16)]
+        )
+    test_inputs = TestInputs(
+        data,
+        np.array([lookup[0] for lookup in lookups], dtype=np.int64),
+        np.array([lookup[2] for lookup in lookups], dtype=np.int64) * config.read_bytewidth,
+        row_ids,
+        mem_addrs_per_channel,
+        mem_rows_per_channel,
+    )
+
     f = open("embedding_indecies.in", "w")
-    f.write(str(len(table_info)) + " " + str(num_inputs) + "\n")
-    for i in range(num_inputs):
-        input_vec = []
-        target_ch = []
-        base_addr = []
-        round_id = 0
-        done = False
-        table_count = 0
-        while not (done):
-            for ch in tables_per_ddr_channel:
-                if round_id < len(tables_per_ddr_channel[ch]):
-                    table_id = tables_per_ddr_channel[ch][round_id]
-                    limit = int(get_table_entries_by_id(table_info, table_id) / 2)
-                    input_vec.append(random.randint(0, limit) * read_bytewidth)
-                    target_ch.append(ch)
-                    base_addr.append(
-                        base_addr_per_ddr_channel[ch][round_id] * read_bytewidth
-                    )
-                    vector_length = get_table_vector_length_by_id(table_info, table_id)
-                    mem_addr = base_addr[-1] + input_vec[-1]
-                    mem_contents_per_channel[ch][mem_addr] = [
-                        random.randint(-2, 2) for i in range(vector_length)
-                    ]
-                    table_count += 1
-            for ch in tables_per_hbm_channel:
-                if round_id < len(tables_per_hbm_channel[ch]):
-                    table_id = tables_per_hbm_channel[ch][round_id]
-                    limit = int(get_table_entries_by_id(table_info, table_id) / 2)
-                    input_vec.append(random.randint(0, limit) * read_bytewidth)
-                    target_ch.append(ddr_channels + ch)
-                    base_addr.append(
-                        base_addr_per_hbm_channel[ch][round_id] * read_bytewidth
-                    )
-                    vector_length = get_table_vector_length_by_id(table_info, table_id)
-                    mem_addr = base_addr[-1] + input_vec[-1]
-                    mem_contents_per_channel[ddr_channels + ch][mem_addr] = [
-                        random.randint(-2, 2) for i in range(vector_length)
-                    ]
-                    table_count += 1
-            round_id += 1
-            done = table_count == len(table_info)
-        test_input_data.append(input_vec)
-        test_input_base_addr.append(base_addr)
-        test_input_target_ch.append(target_ch)
-        for j in input_vec:
-            f.write(str(j) + " ")
-        f.write("\n")
-        for j in target_ch:
-            f.write(str(j) + " ")
-        f.write("\n")
-        for j in base_addr:
-            f.write(str(j) + " ")
-        f.write("\n")
+    f.write(str(len(model.tables)) + " " + str(num_inputs) + "\n")
+    target_ch_line = "".join([str(j) + " " for j in test_inputs.target_ch]) + "\n"
+    base_addr_line = "".join([str(j) + " " for j in test_inputs.base_addr]) + "\n"
+    write_rows(f, data, target_ch_line + base_addr_line)
     f.close()
+    return test_inputs
 
 
-def generate_mem_channel_contents():
+def generate_mem_channel_contents(config, test_inputs, binary=False):
     # Prepare instruction MIFs directory
     if not (os.path.exists("./embedding_tables")):
         os.mkdir("embedding_tables")
     else:
-        files = glob.glob("embedding_tables/*.dat")
+        # Both formats are cleared: the simulator loads a .bin over a .dat of a channel
+        files = glob.glob("embedding_tables/*.dat") + glob.glob("embedding_tables/*.bin")
         for file in files:
             os.remove(file)
 
-    for c in range(ddr_channels + hbm_channels):
+    for c in range(config.ddr_channels + config.hbm_channels):
+        rows = test_inputs.mem_rows_per_channel[c]
+        if binary:
+            # Binary memory image: header (magic, bytes per element, number of rows, elements
+            # per row), address of each row (bytes) and the rows, all little-endian
+            f = open("embedding_tables/channel_" + str(c) + ".bin", "wb")
+            header = [
+                mem_image_magic,
+                config.element_bytewidth,
+                rows.shape[0],
+                rows.shape[1],
+            ]
+            np.array(header, dtype="<u4").tofile(f)
+            test_inputs.mem_addrs_per_channel[c].astype("<u8").tofile(f)
+            rows.astype("<i" + str(config.element_bytewidth)).tofile(f)
+            f.close()
+            continue
+        # Each row is written as a binary string with its first element as least significant bits
+        bits = np.unpackbits(rows[:, ::-1].astype(">i2").view(np.uint8), axis=1)
+        bit_strings = (bits + ord("0")).astype(np.uint8)
         f = open("embedding_tables/channel_" + str(c) + ".dat", "w")
-        for addr in mem_contents_per_channel[c]:
-            content = mem_contents_per_channel[c][addr]
-            string_content = ""
-            byte_count = 0
-            for e in content:
-                string_content = tobin(e, element_bytewidth * 8) + string_content
-                byte_count += element_bytewidth
-            for i in range(read_bytewidth - byte_count):
-                string_content = tobin(0, element_bytewidth * 8) + string_content
-            f.write(str(addr) + " " + string_content + "\n")
+        for (addr, string_content) in zip(
+            test_inputs.mem_addrs_per_channel[c].tolist(), bit_strings
+        ):
+            f.write(str(addr) + " " + string_content.tobytes().decode() + "\n")
         f.close()
 
 
-def pop_one_hot(fifo_ids):
+def pop_one_hot(config, fifo_ids):
     one_hot = ""
-    for i in range(ddr_channels + hbm_channels):
+    for i in range(config.ddr_channels + config.hbm_channels):
         one_hot += "0"
     for id in fifo_ids:
         one_hot = one_hot[:id] + "1" + one_hot[id + 1 :]
     return one_hot
 
 
-def generate_feature_interaction_instructions():
+def generate_feature_interaction_instructions(config, model, allocation):
     if not (os.path.exists("./instructions")):
         os.mkdir("instructions")
     else:
@@ -355,64 +611,30 @@ def generate_feature_interaction_instructions():
         for file in files:
             os.remove(file)
 
-    global smallest_table_bytewidth
+    smallest_table_bytewidth = model.smallest_table_bytewidth
     f = open("instructions/feature_interaction.inst", "w")
-    round_id = 0
-    table_count = 0
     total_flush_count = 0
-    flush_counters = np.zeros(ddr_channels + hbm_channels, dtype=int)
+    flush_counters = np.zeros(config.ddr_channels + config.hbm_channels, dtype=int)
     total_pushed_bytes = 0
-    while table_count < len(table_info):
-        for c in tables_per_ddr_channel:
-            if round_id < len(tables_per_ddr_channel[c]):
-                vector_length = get_table_vector_length_by_id(
-                    table_info, tables_per_ddr_channel[c][round_id]
-                )
-                num_pops = int(
-                    vector_length * element_bytewidth / smallest_table_bytewidth
-                )
-                total_pushed_bytes += vector_length * element_bytewidth
-                for p in range(num_pops):
-                    fifo_ids = [c]
-                    for fc in range(len(flush_counters)):
-                        if flush_counters[fc] != 0:
-                            fifo_ids.append(fc)
-                            flush_counters[fc] -= 1
-                            total_flush_count -= 1
-                    f.write(str(c + 1) + " " + pop_one_hot(fifo_ids) + "\n")
-                num_flushes = (read_bytewidth / smallest_table_bytewidth) - num_pops
-                total_flush_count += num_flushes
-                flush_counters[c] += num_flushes
-                table_count += 1
-
-        for ch in tables_per_hbm_channel:
-            c = ch + ddr_channels
-            if round_id < len(tables_per_hbm_channel[ch]):
-                vector_length = get_table_vector_length_by_id(
-                    table_info, tables_per_hbm_channel[ch][round_id]
-                )
-                num_pops = int(
-                    vector_length * element_bytewidth / smallest_table_bytewidth
-                )
-                total_pushed_bytes += vector_length * element_bytewidth
-                for p in range(num_pops):
-                    fifo_ids = [c]
-                    for fc in range(len(flush_counters)):
-                        if flush_counters[fc] != 0:
-                            fifo_ids.append(fc)
-                            flush_counters[fc] -= 1
-                            total_flush_count -= 1
-                    f.write(str(c + 1) + " " + pop_one_hot(fifo_ids) + "\n")
-                num_flushes = (read_bytewidth / smallest_table_bytewidth) - num_pops
-                total_flush_count += num_flushes
-                flush_counters[c] += num_flushes
-                table_count += 1
-
-        round_id += 1
-
-    padded_input_dim = math.ceil(input_dim / native_dim / num_mvms[0])
-    padded_input_dim = int(padded_input_dim * native_dim * num_mvms[0])
-    total_vector_bytewidth = padded_input_dim * element_bytewidth
+    for (c, table_id, table_base_addr) in get_lookup_order(config, allocation):
+        vector_length = model.tables[table_id].vector_length
+        num_pops = int(vector_length * config.element_bytewidth / smallest_table_bytewidth)
+        total_pushed_bytes += vector_length * config.element_bytewidth
+        for p in range(num_pops):
+            fifo_ids = [c]
+            for fc in range(len(flush_counters)):
+                if flush_counters[fc] != 0:
+                    fifo_ids.append(fc)
+                    flush_counters[fc] -= 1
+                    total_flush_count -= 1
+            f.write(str(c + 1) + " " + pop_one_hot(config, fifo_ids) + "\n")
+        num_flushes = (config.read_bytewidth / smallest_table_bytewidth) - num_pops
+        total_flush_count += num_flushes
+        flush_counters[c] += num_flushes
+
+    padded_input_dim = math.ceil(model.input_dim / config.native_dim / config.num_mvms[0])
+    padded_input_dim = int(padded_input_dim * config.native_dim * config.num_mvms[0])
+    total_vector_bytewidth = padded_input_dim * config.element_bytewidth
     remaining_bytes = total_vector_bytewidth - total_pushed_bytes
     assert remaining_bytes % smallest_table_bytewidth == 0
     padding_words = int(remaining_bytes / smallest_table_bytewidth)
@@ -425,120 +647,86 @@ def generate_feature_interaction_instructions():
                 total_flush_count -= 1
         if padding_words > 0:
             f.write(
-                str(ddr_channels + hbm_channels + 1)
+                str(config.ddr_channels + config.hbm_channels + 1)
                 + " "
-                + pop_one_hot(fifo_ids)
+                + pop_one_hot(config, fifo_ids)
                 + "\n"
             )
             padding_words -= 1
         else:
-            f.write("0 " + pop_one_hot(fifo_ids) + "\n")
+            f.write("0 " + pop_one_hot(config, fifo_ids) + "\n")
 
     while padding_words > 0:
-        f.write(str(ddr_channels + hbm_channels + 1) + " " + pop_one_hot([]) + "\n")
+        f.write(
+            str(config.ddr_channels + config.hbm_channels + 1)
+            + " "
+            + pop_one_hot(config, [])
+            + "\n"
+        )
         padding_words -= 1
 
     f.close()
 
 
-def generate_custom_feature_interaction_instructions():
-    global smallest_table_bytewidth
-    round_id = 0
-    table_count = 0
+def generate_custom_feature_interaction_instructions(config, model, allocation):
     running_byte_count = 0
     total_pushed_bytes = 0
     schedule = []
     schedule_step = []
-    while table_count < len(table_info):
-        for ch in tables_per_ddr_channel:
-            if round_id < len(tables_per_ddr_channel[ch]):
-                vector_length = get_table_vector_length_by_id(table_info, tables_per_ddr_channel[ch][round_id])
-                running_byte_count += vector_length * element_bytewidth
-                if (vector_length > native_dim):
-                    for i in range(int(vector_length/native_dim)):
-                        schedule_step.append(ch + 1)
-                        schedule_step.append(i * native_dim)
-                        schedule_step.append((i+1) * native_dim - 1)
-                        if (i == int(vector_length/native_dim) - 1):
-                            schedule_step.append(1)
-                            schedule.append(schedule_step)
-                            schedule_step = []
-                            running_byte_count = 0
-                        else:
-                            schedule_step.append(0)
-                            schedule.append(schedule_step)
-                            schedule_step = []
-                else:
-                    schedule_step.append(ch + 1)
-                    schedule_step.append(0)
-                    schedule_step.append(vector_length-1)
+    for (ch, table_id, table_base_addr) in get_lookup_order(config, allocation):
+        vector_length = model.tables[table_id].vector_length
+        running_byte_count += vector_length * config.element_bytewidth
+        if (vector_length > config.native_dim):
+            for i in range(int(vector_length/config.native_dim)):
+                schedule_step.append(ch + 1)
+                schedule_step.append(i * config.native_dim)
+                schedule_step.append((i+1) * config.native_dim - 1)
+                if (i == int(vector_length/config.native_dim) - 1):
                     schedule_step.append(1)
-                if (running_byte_count == native_dim * element_bytewidth):
                     schedule.append(schedule_step)
-                    running_byte_count = 0
                     schedule_step = []
-                table_count += 1
-                total_pushed_bytes += (vector_length * element_bytewidth)
-        
-        for c in tables_per_hbm_channel:
-            ch = ddr_channels + c
-            if round_id < len(tables_per_hbm_channel[c]):
-                vector_length = get_table_vector_length_by_id(table_info, tables_per_hbm_channel[c][round_id])
-                running_byte_count += vector_length * element_bytewidth
-                if (vector_length > native_dim):
-                    for i in range(int(vector_length/native_dim)):
-                        schedule_step.append(ch + 1)
-                        schedule_step.append(i * native_dim)
-                        schedule_step.append((i+1) * native_dim - 1)
-                        schedule_step.append(int(i == int(vector_length/native_dim)))
-                        if (i == int(vector_length/native_dim) - 1):
-                            schedule_step.append(1)
-                            schedule.append(schedule_step)
-                            schedule_step = []
-                            running_byte_count = 0
-                        else:
-                            schedule_step.append(0)
-                            schedule.append(schedule_step)
-                            schedule_step = []
+                    running_byte_count = 0
                 else:
-                    schedule_step.append(ch + 1)
                     schedule_step.append(0)
-                    schedule_step.append(vector_length-1)
-                    schedule_step.append(1)
-                if (running_byte_count == native_dim * element_bytewidth):
                     schedule.append(schedule_step)
-                    running_byte_count = 0
                     schedule_step = []
-                table_count += 1
-                total_pushed_bytes += (vector_length * element_bytewidth)
-
-        round_id += 1
-
-    if running_byte_count > 0 and running_byte_count < native_dim * element_bytewidth:
-        remaining_bytes = (native_dim * element_bytewidth) - running_byte_count
+        else:
+            schedule_step.append(ch + 1)
+            schedule_step.append(0)
+            schedule_step.append(vector_length-1)
+            schedule_step.append(1)
+        if (running_byte_count == config.native_dim * config.element_bytewidth):
+            schedule.append(schedule_step)
+            running_byte_count = 0
+            schedule_step = []
+        total_pushed_bytes += (vector_length * config.element_bytewidth)
+
+    vector_bytes = config.native_dim * config.element_bytewidth
+    if running_byte_count > 0 and running_byte_count < vector_bytes:
+        remaining_bytes = vector_bytes - running_byte_count
         schedule_step.append(0)
         schedule_step.append(0)
-        schedule_step.append(int(remaining_bytes / element_bytewidth)-1)
+        schedule_step.append(int(remaining_bytes / config.element_bytewidth)-1)
         schedule_step.append(0)
         running_byte_count = 0
         schedule.append(schedule_step)
         schedule_step = []
         total_pushed_bytes += remaining_bytes
 
-    padded_input_dim = math.ceil(input_dim / native_dim / num_mvms[0])
-    padded_input_dim = int(padded_input_dim * native_dim * num_mvms[0])
-    total_vector_bytewidth = padded_input_dim * element_bytewidth
+    padded_input_dim = math.ceil(model.input_dim / config.native_dim / config.num_mvms[0])
+    padded_input_dim = int(padded_input_dim * config.native_dim * config.num_mvms[0])
+    total_vector_bytewidth = padded_input_dim * config.element_bytewidth
     remaining_bytes = total_vector_bytewidth - total_pushed_bytes
-    assert remaining_bytes % read_bytewidth == 0
-    padding_words = int(remaining_bytes / native_dim / element_bytewidth)
+    assert remaining_bytes % config.read_bytewidth == 0
+    padding_words = int(remaining_bytes / config.native_dim / config.element_bytewidth)
     for i in range(padding_words):
         schedule_step.append(0)
         schedule_step.append(0)
-        schedule_step.append(native_dim-1)
+        schedule_step.append(config.native_dim-1)
         schedule_step.append(0)
         schedule.append(schedule_step)
         schedule_step = []
-    
+
     if not (os.path.exists("./instructions")):
         os.mkdir("instructions")
     else:
@@ -556,72 +744,71 @@ def generate_custom_feature_interaction_instructions():
     #    print(str(idx) + ": " + str(s))
     #    idx += 1
 
-def generate_feature_interaction_outputs():
-    f = open("feature_interaction.out", "w")
-    feature_interaction_vector_length = 0
-    for table in table_info:
-        feature_interaction_vector_length += get_table_vector_length(table)
-    total_num_outputs = len(test_input_data) * int(
-        feature_interaction_vector_length * element_bytewidth / read_bytewidth
+def generate_feature_interaction_outputs(config, model, allocation, test_inputs):
+    # Gathers the looked up vectors of all inputs at once: element k of the output of an
+    # input is element cols[k] of the row read by its lookup lookup_ids[k]
+    lookup_ids = []
+    cols = []
+    lookup_order = get_lookup_order(config, allocation)
+    for (j, (ch, table_id, table_base_addr)) in enumerate(lookup_order):
+        vector_length = model.tables[table_id].vector_length
+        lookup_ids += [j] * vector_length
+        cols += list(range(vector_length))
+    channel_offsets = np.cumsum(
+        [0] + [len(rows) for rows in test_inputs.mem_rows_per_channel]
     )
-    f.write(str(total_num_outputs) + "\n")
-    for input_id in range(len(test_input_data)):
-        output_vec = []
-        for idx_id in range(len(test_input_data[input_id])):
-            idx = test_input_data[input_id][idx_id]
-            base = test_input_base_addr[input_id][idx_id]
-            ch = test_input_target_ch[input_id][idx_id]
-            mem_content = mem_contents_per_channel[ch][base + idx]
-            for e in mem_content:
-                output_vec.append(e)
-        reshaped_output_vec = np.reshape(
-            output_vec,
-            (
-                int(len(output_vec) / int((read_bytewidth / element_bytewidth))),
-                int(read_bytewidth / element_bytewidth),
-            ),
-        )
-        for o in reshaped_output_vec:
-            for e in o:
-                f.write(str(e) + " ")
-            f.write("\n")
-        test_feature_interaction_outputs.append(output_vec)
+    all_rows = np.concatenate(test_inputs.mem_rows_per_channel)
+    row_ids = test_inputs.row_ids + channel_offsets[test_inputs.target_ch]
+    feature_interaction_outputs = all_rows[row_ids[:, lookup_ids], cols]
+
+    f = open("feature_interaction.out", "w")
+    row_elements = int(config.read_bytewidth / config.element_bytewidth)
+    reshaped_outputs = feature_interaction_outputs.reshape(-1, row_elements)
+    f.write(str(reshaped_outputs.shape[0]) + "\n")
+    write_rows(f, reshaped_outputs)
     f.close()
+    return feature_interaction_outputs
 
 
-def generate_mlp_weights():
-    # Generate random padded weight matrices
+def generate_mlp_weights(config, model, rng=None):
+    # Generate random padded weight matrices (CSR): each output row of a layer has weights
+    # for a random 10% of the layer inputs
+    if rng is None:
+        rng = np.random.default_rng()
     padded_weights = []
-    for l in range(num_layers):
-        num_mvms_in = num_mvms[l]
-        if l == num_layers - 1:
-            num_mvms_out = num_mvms[0]
+    for l in range(config.num_layers):
+        num_mvms_in = config.num_mvms[l]
+        if l == config.num_layers - 1:
+            num_mvms_out = config.num_mvms[0]
         else:
-            num_mvms_out = num_mvms[l + 1]
+            num_mvms_out = config.num_mvms[l + 1]
         if l == 0:
-            layer_input_dim = input_dim
+            layer_input_dim = model.input_dim
         else:
-            layer_input_dim = hidden_dims[l - 1]
+            layer_input_dim = config.hidden_dims[l - 1]
         padded_dimx = int(
-            math.ceil(layer_input_dim * 1.0 / native_dim / num_mvms_in)
-            * native_dim
+            math.ceil(layer_input_dim * 1.0 / config.native_dim / num_mvms_in)
+            * config.native_dim
             * num_mvms_in
         )
         padded_dimy = int(
-            math.ceil(hidden_dims[l] * 1.0 / native_dim / num_mvms_out)
-            * native_dim
+            math.ceil(config.hidden_dims[l] * 1.0 / config.native_dim / num_mvms_out)
+            * config.native_dim
             * num_mvms_out
         )
-        padded_weights.append(np.zeros(shape=(padded_dimy, padded_dimx), dtype=int))
-        for i in range(hidden_dims[l]):
-            sample_indecies = random.sample(
-                range(layer_input_dim), int(0.1 * layer_input_dim)
-            )
-            for idx in sample_indecies:
-                padded_weights[l][i, idx] = np.random.randint(-2, 2)
-        # padded_weights[l][: hidden_dims[l], :layer_input_dim] = np.random.randint(
-        #    -2, 2, size=(hidden_dims[l], layer_input_dim)
-        # )
+        # Each row samples row_nnz inputs without replacement (those with the smallest keys)
+        row_nnz = int(0.1 * layer_input_dim)
+        keys = rng.random(size=(config.hidden_dims[l], layer_input_dim))
+        indices = np.sort(np.argpartition(keys, row_nnz, axis=1)[:, :row_nnz], axis=1)
+        values = rng.integers(-2, 2, size=(config.hidden_dims[l], row_nnz))
+        indptr = np.minimum(np.arange(padded_dimy + 1), config.hidden_dims[l]) * row_nnz
+        layer_weights = sparse.csr_matrix(
+            (values.ravel(), indices.ravel(), indptr),
+            shape=(padded_dimy, padded_dimx),
+            dtype=int,
+        )
+        layer_weights.eliminate_zeros()
+        padded_weights.append(layer_weights)
 
     # Prepare weight MIFs directory
     if not (os.path.exists("./mvm_weights")):
@@ -631,72 +818,54 @@ def generate_mlp_weights():
         for file in files:
             os.remove(file)
 
-    # Write weight MIFs
-    for l in range(num_layers):
-        layer_mvms = num_mvms[l]
-        mvm_idx = 0
-        limx = int(padded_weights[l].shape[1] / native_dim)
-        limy = int(padded_weights[l].shape[0] / native_dim)
-        mifs = []
+    # Write weight MIFs: MVMs take turns over the native_dim-wide column blocks, and each dot
+    # product file holds one row of every native_dim x native_dim block of its MVM
+    for l in range(config.num_layers):
+        layer_mvms = config.num_mvms[l]
+        limx = int(padded_weights[l].shape[1] / config.native_dim)
+        limy = int(padded_weights[l].shape[0] / config.native_dim)
+        blocks = (
+            padded_weights[l]
+            .toarray()
+            .reshape(limy, config.native_dim, limx, config.native_dim)
+        )
         for m in range(layer_mvms):
-            mifs.append([])
-            for d in range(native_dim):
-                mifs[m].append(
-                    open(
-                        "mvm_weights/layer"
-                        + str(l)
-                        + "_mvm"
-                        + str(m)
-                        + "_dot"
-                        + str(d)
-                        + ".dat",
-                        "w",
-                    )
+            for d in range(config.native_dim):
+                mif = open(
+                    "mvm_weights/layer"
+                    + str(l)
+                    + "_mvm"
+                    + str(m)
+                    + "_dot"
+                    + str(d)
+                    + ".dat",
+                    "w",
                 )
-
-        for i in range(limx):
-            for j in range(limy):
-                for d in range(native_dim):
-                    for e in range(native_dim):
-                        mifs[mvm_idx][d].write(
-                            str(
-                                padded_weights[l][(j * native_dim) + d][
-                                    (i * native_dim) + e
-                                ]
-                            )
-                            + " "
-                        )
-                    mifs[mvm_idx][d].write("\n")
-            if mvm_idx == layer_mvms - 1:
-                mvm_idx = 0
-            else:
-                mvm_idx = mvm_idx + 1
-
-        for mvm_mifs in mifs:
-            for mif in mvm_mifs:
+                mif_rows = blocks[:, d, m::layer_mvms, :].transpose(1, 0, 2)
+                write_rows(mif, mif_rows.reshape(-1, config.native_dim))
                 mif.close()
     return padded_weights
 
 
-def generate_mvm_instructions(padded_weights):
+def generate_mvm_instructions(config, padded_weights):
     # Generate instruction MIFs
     # en, jump, reduce, accum, accum_en, release, raddr, last, dest_layer, dest_mvm
-    for l in range(num_layers):
-        layer_mvms = num_mvms[l]
-        limx = int(padded_weights[l].shape[1] / native_dim / layer_mvms)
-        limy = int(padded_weights[l].shape[0] / native_dim)
+    for l in range(config.num_layers):
+        layer_mvms = config.num_mvms[l]
+        limx = int(padded_weights[l].shape[1] / config.native_dim / layer_mvms)
+        limy = int(padded_weights[l].shape[0] / config.native_dim)
         for m in range(layer_mvms):
             inst_mif = open(
                 "instructions/layer" + str(l) + "_mvm" + str(m) + ".inst", "w"
             )
             for i in range(limx):
                 for j in range(limy):
-                    if (l == num_layers - 1) and (m == layer_mvms - 1):
+                    if (l == config.num_layers - 1) and (m == layer_mvms - 1):
                         dest_layer = 0
                         dest_mvm = 0
                     elif m == layer_mvms - 1:
                         dest_layer = l + 2
-                        dest_mvm = j % num_mvms[l + 1]
+                        dest_mvm = j % config.num_mvms[l + 1]
                     else:
                         dest_layer = l + 1
                         dest_mvm = m + 1
@@ -725,56 +894,53 @@ def generate_mvm_instructions(padded_weights):
             inst_mif.close()
 
 
-def generate_mlp_outputs(padded_weights):
+def generate_mlp_outputs(config, model, padded_weights, feature_interaction_outputs):
     # Compute test outputs
     padded_input_dim = int(
-        math.ceil(input_dim * 1.0 / native_dim / num_mvms[0]) * native_dim * num_mvms[0]
+        math.ceil(model.input_dim * 1.0 / config.native_dim / config.num_mvms[0])
+        * config.native_dim
+        * config.num_mvms[0]
     )
     padded_test_feature_interaction_outputs = np.zeros(
-        shape=(num_test_inputs, padded_input_dim), dtype=int
+        shape=(len(feature_interaction_outputs), padded_input_dim), dtype=int
     )
     padded_test_feature_interaction_outputs[
-        :, :input_dim
-    ] = test_feature_interaction_outputs
+        :, : model.input_dim
+    ] = feature_interaction_outputs
     test_inputs = np.transpose(padded_test_feature_interaction_outputs)
-    test_outputs = np.dot(padded_weights[0], test_inputs)
+    test_outputs = padded_weights[0] @ test_inputs
     # test_outputs = np.maximum(test_outputs, np.zeros(shape=test_outputs.shape, dtype=int))
-    for l in range(1, num_layers):
-        test_outputs = np.dot(padded_weights[l], test_outputs)
+    for l in range(1, config.num_layers):
+        test_outputs = padded_weights[l] @ test_outputs
         # test_outputs = np.maximum(test_outputs, np.zeros(shape=test_outputs.shape, dtype=int))
     test_outputs = np.transpose(test_outputs)
 
     # Generate test output MIFs
     output_file = open("./mlp.out", "w")
-    output_file.write(
-        str(test_outputs.shape[0] * int(test_outputs.shape[1] / native_dim)) + "\n"
-    )
-    for o in range(test_outputs.shape[0]):
-        for c in range(int(test_outputs.shape[1] / native_dim)):
-            for e in range(native_dim):
-                output_file.write(str(test_outputs[o][(c * native_dim) + e]) + " ")
-            output_file.write("\n")
+    reshaped_outputs = test_outputs.reshape(-1, config.native_dim)
+    output_file.write(str(reshaped_outputs.shape[0]) + "\n")
+    write_rows(output_file, reshaped_outputs)
     output_file.close()
 
 
-def generate_mvms_config():
+def generate_mvms_config(config):
     # Generate layer/MVM configuration
     config_file = open("./mvms.config", "w")
-    config_file.write(str(num_layers) + " ")
-    for mvm_count in num_mvms:
+    config_file.write(str(config.num_layers) + " ")
+    for mvm_count in config.num_mvms:
         config_file.write(str(mvm_count) + " ")
     config_file.close()
 
 
-def generate_dlrm_defines_hpp():
+def generate_dlrm_defines_hpp(config):
     dlrm_defines = open("../modules/dlrm_defines.hpp", "w")
     dlrm_defines.write("#define BITWIDTH 16\n")
-    dlrm_defines.write("#define LANES " + str(native_dim) + "\n")
+    dlrm_defines.write("#define LANES " + str(config.native_dim) + "\n")
     dlrm_defines.write("#define FIFO_SIZE 512\n")
     dlrm_defines.write(
-        "#define COMPUTE_LATENCY " + str(int(math.log2(native_dim)) + 5) + "\n"
+        "#define COMPUTE_LATENCY " + str(int(math.log2(config.native_dim)) + 5) + "\n"
     )
-    if (native_dim == 16):
+    if (config.native_dim == 16):
         dlrm_defines.write("#define RF_MEM_DEPTH 1024\n")
     else:
         dlrm_defines.write("#define RF_MEM_DEPTH 512\n")
@@ -787,7 +953,7 @@ def generate_dlrm_defines_hpp():
     dlrm_defines.close()
 
 
-def generate_radsim_clocks_file():
+def generate_radsim_clocks_file(config):
     dlrm_clks = open("../dlrm.clks", "w")
     dlrm_clks.write("embedding_lookup_inst 0 0\n")
     dlrm_clks.write("feature_interaction_inst 0 0\n")
@@ -795,9 +961,9 @@ def generate_radsim_clocks_file():
     dlrm_clks.write("ext_mem_1 2 2\n")
     dlrm_clks.write("ext_mem_2 1 1\n")
     dlrm_clks.write("ext_mem_3 1 1\n")
-    for l in range(len(num_mvms)):
-        for m in range(num_mvms[l]):
-            if hard_mvms:
+    for l in range(len(config.num_mvms)):
+        for m in range(config.num_mvms[l]):
+            if config.hard_mvms:
                 dlrm_clks.write("layer" + str(l) + "_mvm" + str(m) + " 0 3\n")
             else:
                 dlrm_clks.write("layer" + str(l) + "_mvm" + str(m) + " 0 0\n")
@@ -805,42 +971,73 @@ def generate_radsim_clocks_file():
     dlrm_clks.close()
 
 
-if "-h" in sys.argv or "--help" in sys.argv:
-    print("python dlrm.py -l <mvm_lanes> -n <num_test_inputs> -m <model_csv>")
-    exit(1)
-
-# Parse command line arguments
-if "-n" in sys.argv:
-    if sys.argv.index("-n") + 1 >= len(sys.argv):
-        sys.exit(1)
-    num_test_inputs = int(sys.argv[sys.argv.index("-n") + 1])
-
-if "-l" in sys.argv:
-    if sys.argv.index("-l") + 1 >= len(sys.argv):
-        sys.exit(1)
-    native_dim = int(sys.argv[sys.argv.index("-l") + 1])
-
-if "-m" in sys.argv:
-    if sys.argv.index("-m") + 1 >= len(sys.argv):
-        sys.exit(1)
-    model_csv = sys.argv[sys.argv.index("-m") + 1]
-
-if "-a" in sys.argv:
-    hard_mvms = True
-
-parse_dlrm_description(model_csv)
-sort_tables()
-# print_dlrm_description()
-greedy_allocation()
-#print_allocation()
-generate_embedding_lookup_inputs(num_test_inputs)
-generate_mem_channel_contents()
-#generate_feature_interaction_instructions()
-generate_custom_feature_interaction_instructions()
-generate_feature_interaction_outputs()
-padded_weights = generate_mlp_weights()
-generate_mvm_instructions(padded_weights)
-generate_mlp_outputs(padded_weights)
-generate_mvms_config()
-generate_dlrm_defines_hpp()
-#generate_radsim_clocks_file()
\ No newline at end of file
+if __name__ == "__main__":
+    if "-h" in sys.argv or "--help" in sys.argv:
+        print(
+            "python dlrm.py -l <mvm_lanes> -n <num_test_inputs> -m <model_csv> "
+            + "[-alloc greedy|lpt|search] [-s <seed>] [-bin]"
+        )
+        exit(1)
+
+    # Parse command line arguments
+    config = DLRMConfig()
+    if "-n" in sys.argv:
+        if sys.argv.index("-n") + 1 >= len(sys.argv):
+            sys.exit(1)
+        config.num_test_inputs = int(sys.argv[sys.argv.index("-n") + 1])
+
+    if "-l" in sys.argv:
+        if sys.argv.index("-l") + 1 >= len(sys.argv):
+            sys.exit(1)
+        config.native_dim = int(sys.argv[sys.argv.index("-l") + 1])
+
+    if "-m" in sys.argv:
+        if sys.argv.index("-m") + 1 >= len(sys.argv):
+            sys.exit(1)
+        config.model_csv = sys.argv[sys.argv.index("-m") + 1]
+
+    if "-a" in sys.argv:
+        config.hard_mvms = True
+
+    if "-alloc" in sys.argv:
+        if sys.argv.index("-alloc") + 1 >= len(sys.argv):
+            sys.exit(1)
+        config.allocation_mode = sys.argv[sys.argv.index("-alloc") + 1]
+        if config.allocation_mode not in ["greedy", "lpt", "search"]:
+            sys.exit(1)
+
+    if "-s" in sys.argv:
+        if sys.argv.index("-s") + 1 >= len(sys.argv):
+            sys.exit(1)
+        config.seed = int(sys.argv[sys.argv.index("-s") + 1])
+
+    if "-bin" in sys.argv:
+        config.binary_mem_images = True
+
+    model = parse_dlrm_description(config, config.model_csv)
+    sort_tables(model)
+    # print_dlrm_description(model)
+    if config.allocation_mode == "greedy":
+        allocation = greedy_allocation(config, model)
+    else:
+        allocation = balanced_allocation(
+            config, model, refine=(config.allocation_mode == "search")
+        )
+        print_channel_loads(config, model, allocation)
+    #print_allocation(config, model, allocation)
+    rng = np.random.default_rng(config.seed)
+    test_inputs = generate_embedding_lookup_inputs(
+        config, model, allocation, config.num_test_inputs, rng
+    )
+    generate_mem_channel_contents(config, test_inputs, config.binary_mem_images)
+    #generate_feature_interaction_instructions(config, model, allocation)
+    generate_custom_feature_interaction_instructions(config, model, allocation)
+    feature_interaction_outputs = generate_feature_interaction_outputs(
+        config, model, allocation, test_inputs
+    )
+    padded_weights = generate_mlp_weights(config, model, rng)
+    generate_mvm_instructions(config, padded_weights)
+    generate_mlp_outputs(config, model, padded_weights, feature_interaction_outputs)
+    generate_mvms_config(config)
+    generate_dlrm_defines_hpp(config)
+    #generate_radsim_clocks_file(config)
@@ -6,12 +6,28 @@ import sys
 import copy
 import subprocess
 import os
-import threading
 import time
 import re
+import bisect
+import itertools
+import concurrent.futures
+import json
+import hashlib
+import shutil
+import glob
 
 from fsim import chain
 from fsim import npu_isa_sim
+from fsim import chain_store
+from fsim import chain_enum_fields
+from fsim import vrf_op_types
+from fsim import save_checkpoint
+from fsim import load_checkpoint
+from fsim import read_only
+from inst_sched import optimize_program
+from perf_model import estimate_program
+from perf_model import estimate_tops
+from perf_model import latency_params
 
 '''
 Current Limitations:
@@ -28,6 +44,15 @@ Current Limitations:
 - The Keras front-end supports a limited number of layers: Dense, SimpleRNN, GRU, LSTM
 '''
 
+# Architecture parameters fixed by the NPU RTL (not compiler options): the number of identical cores fed with different
+# inputs, and the lanes and dot products (one per vector of a batch) of the MVU tensor blocks. Each chain therefore
+# processes at most tb_num_dots vectors.
+fixed_arch_params = {
+	'cores'			: 2,
+	'tb_lanes'		: 10,
+	'tb_num_dots'	: 3
+}
+
 '''
 The main class in this code is the npu class. It is used to hold all the architecture parameters, architecture states 
 (e.g. mrfs, vrfs, input buffer, output buffer, etc.), memory allocation book-keeping, tagging info, fsim class, and 
@@ -43,16 +68,18 @@ class npu:
 
 		# Memory spaces of the NPU and instruction tagging
 		self.mem_space = {
-			'mvu_vrf' 	: np.zeros(arch_params['vrf_depth'], dtype=int),
-			'mvu_mrf' 	: np.zeros(arch_params['mrf_depth'], dtype=int),
-			'evrf' 		: np.zeros(arch_params['vrf_depth'], dtype=int),
-			'mfu0_add'  	: np.zeros(arch_params['vrf_depth'], dtype=int),
-			'mfu0_mul' 	: np.zeros(arch_params['vrf_depth'], dtype=int),
-			'mfu1_add' 	: np.zeros(arch_params['vrf_depth'], dtype=int),
-			'mfu1_mul' 	: np.zeros(arch_params['vrf_depth'], dtype=int)
+			'mvu_vrf' 	: mem_allocator(arch_params['vrf_depth']),
+			'mvu_mrf' 	: mem_allocator(arch_params['mrf_depth']),
+			'evrf' 		: mem_allocator(arch_params['vrf_depth']),
+			'mfu0_add'  	: mem_allocator(arch_params['vrf_depth']),
+			'mfu0_mul' 	: mem_allocator(arch_params['vrf_depth']),
+			'mfu1_add' 	: mem_allocator(arch_params['vrf_depth']),
+			'mfu1_mul' 	: mem_allocator(arch_params['vrf_depth'])
 		}
 		self.highest_tag_so_far = 0
 		self.mrf_filled_depth = 0
+		# Dependency index: vector name -> (most recent chain writing it back, wb_so_far of that chain)
+		self.producers = {}
 
 		# Architecture states
 		self.mrfs = np.zeros((self.arch_params['tiles'], self.arch_params['dpes'], self.arch_params['mrf_depth'], self.arch_params['lanes']), dtype=self.in_data_type)
@@ -63,10 +90,11 @@ class npu:
 		self.mfu1_vrf0  = np.zeros((self.arch_params['vrf_depth'], self.arch_params['lanes']),dtype = self.ac_data_type)
 		self.mfu1_vrf1  = np.zeros((self.arch_params['vrf_depth'], self.arch_params['lanes']),dtype = self.ac_data_type)
 
-		# Instruction, input and golden output queues
-		self.inst_q = []
+		# Instruction (columnar chain store), input and golden output queues
+		self.inst_q = chain_store()
 		self.ibuf_q = []
 		self.golden_obuf_q = []
+		self.golden_mvu_q = {}	# Chain index -> golden MVU results (one vector per batch) used for sampled verification
 		self.fsim = None
 
 		# Instruction field width parameters
@@ -91,44 +119,39 @@ class npu:
 		self.operands = []
 		self.unsupported_layers = []
 		self.ops = 0
+		self.dump_depths = None
+		self.batch_plan = None	# Batch size and blocking of the inputs picked by the layers front-end (see plan_batching)
+		self.perf_estimate = None	# Cycles and TOPS of the program estimated by the analytical model (see perf_model)
+
+		# Compilation cache (key of this program and metadata of the cache entry in case of a cache hit)
+		self.cache_key = None
+		self.cache_hit = None
+		self.mif_files = []	# Paths of the MIF files generated for this program (see add_flow_artifact_steps)
 
 	# This function is used to allocate memory of a specific number of words (size) in a specific memory space.
 	# It returns the start address of the allocated memory or -1 if allocation failed.
 	def alloc_space(self, space, size):
-		alloc_addr = -1
-		idx = 0
 		assert space in self.mem_space.keys(), 'No such memory space exists'
-		space_depth = self.mem_space[space].size
-
-		# Start from address 0 in the specified memory space and look for the first empty contiguous location of the required size
-		while (idx < space_depth and alloc_addr == -1):
-			assert self.mem_space[space][idx] != -1, 'Something wrong with allocation'
-			if (self.mem_space[space][idx] == 0):
-				can_allocate = True
-				for i in range(1, size):
-					if(idx+i >= space_depth):
-						can_allocate = False
-						idx = space_depth
-						break
-					if (self.mem_space[space][idx+i] != 0):
-						can_allocate = False
-						idx = idx + i + self.mem_space[space][idx+i]
-						break
-				if (can_allocate):
-					self.mem_space[space][idx] = size
-					for i in range(1, size):
-						self.mem_space[space][idx+i] = -1
-					alloc_addr = idx
-					idx = space_depth
-			else:
-				idx = idx + self.mem_space[space][idx]
+		alloc_addr = self.mem_space[space].alloc(size)
 
-		if(space == 'mvu_mrf'):
-			self.mrf_filled_depth += size
+		# The MRF filled depth is the highest MRF address in use (only these rows are dumped for simulation)
+		if(space == 'mvu_mrf' and alloc_addr != -1):
+			self.mrf_filled_depth = max(self.mrf_filled_depth, alloc_addr + size)
 
 		return alloc_addr
 
-	# This function sets all the parameters for instruction field widths based on those specified by the user
+	# This function is used to free memory previously allocated at a specific address in a specific memory space.
+	def free_space(self, space, addr):
+		assert space in self.mem_space.keys(), 'No such memory space exists'
+		self.mem_space[space].free(addr)
+
+	# This function prints the usage and fragmentation statistics of all memory spaces.
+	def print_mem_stats(self):
+		for space in self.mem_space.keys():
+			stats = self.mem_space[space].stats()
+			print(space + ': ' + str(stats['used']) + '/' + str(stats['depth']) + ' word(s) used, ' + str(stats['free_blocks']) + \
+				' free block(s), largest free block = ' + str(stats['largest_free_block']) + ', fragmentation = ' + str(round(stats['fragmentation'], 3)))
+
 	def set_inst_params(self):
 		self.NTAGW = int(math.ceil(math.log(self.arch_params['max_tag'], 2)))
 		self.NSIZEW = int(math.ceil(math.log(max(self.arch_params['mrf_depth'], self.arch_params['vrf_depth']), 2)) + 1)
@@ -387,6 +410,114 @@ class npu:
 				vrf_id=0x0
 			self.ld_minst+=vrf_id<<shift
 
+	'''
+	This function encodes the records of a chain_store into MICW-bit instructions all at once and returns them as
+	an (instructions x MICW) matrix of bits (most significant bit first), matching set_inst for every chain. The
+	field values are added at their bit offsets into per-bit counters that are carried at the end, so fields that
+	overflow into each other behave exactly like the integer additions of set_inst. Chains with a negative field
+	value are encoded one by one using set_inst.
+	'''
+	def encode_insts(self, records):
+		num_insts = len(records)
+		bit_counts = np.zeros((num_insts, self.MICW + 64), dtype=np.int64)
+		negative = np.zeros(num_insts, dtype=bool)
+		fields = []
+
+		# MVU macro-instruction
+		shift = self.MIW_LD + (2*self.MIW_MFU) + self.MIW_EVRF
+		enable = (records['mvu_op_type'] != 0)
+		values = [1, records['mvu_tag'], records['mvu_words_per_row'], records['mvu_mrf_rd_sz'], records['mvu_mrf_rd_base'],
+			records['mvu_vrf_rd_sz'], records['mvu_vrf_rd_base'][:, 2], records['mvu_vrf_rd_base'][:, 1], records['mvu_vrf_rd_base'][:, 0]]
+		widths = [1, self.NTAGW, self.NSIZEW, self.NSIZEW, self.MRFAW, self.NSIZEW, self.VRFAW, self.VRFAW, self.VRFAW]
+		for value, width in zip(values, widths):
+			fields.append((enable * value, shift))
+			shift += width
+
+		# eVRF macro-instruction
+		shift = self.MIW_LD + (2*self.MIW_MFU)
+		enable = (records['extvrf_op_type'] != 0)
+		is_move = (records['extvrf_op_type'] == chain_enum_fields['extvrf_op_type'].index('move'))
+		values = [records['batch'], 1, records['extvrf_tag'], ~is_move, records['extvrf_rd_sz'],
+			records['extvrf_rd_base'][:, 2], records['extvrf_rd_base'][:, 1], records['extvrf_rd_base'][:, 0]]
+		widths = [2, 1, self.NTAGW, 1, self.NSIZEW, self.VRFAW, self.VRFAW, self.VRFAW]
+		for value, width in zip(values, widths):
+			fields.append((enable * value, shift))
+			shift += width
+
+		# MFU macro-instructions (activation functions are set as pass-through)
+		add_op_bits = {'add': 0x02, 'sub_a_b': 0x04, 'sub_b_a': 0x06, 'max': 0x08}
+		mul_op_bits = {'mul': 0x01}
+		for mfu, shift in [('mfu0', self.MIW_LD + self.MIW_MFU), ('mfu1', self.MIW_LD)]:
+			add_ops = chain_enum_fields[mfu + '_add_op_type']
+			mul_ops = chain_enum_fields[mfu + '_mul_op_type']
+			add_bits = np.array([add_op_bits.get(op, 0) for op in add_ops])[records[mfu + '_add_op_type']]
+			mul_bits = np.array([mul_op_bits.get(op, 0) for op in mul_ops])[records[mfu + '_mul_op_type']]
+			enable = (records[mfu + '_act_op_type'] != 0) & (records[mfu + '_add_op_type'] != 0) & (records[mfu + '_mul_op_type'] != 0)
+			values = [records['batch'], 0x40 + add_bits + mul_bits, records[mfu + '_tag'], records[mfu + '_vrf_rd_size']]
+			widths = [2, 7, self.NTAGW, self.NSIZEW]
+			for base in [mfu + '_vrf1_rd_base', mfu + '_vrf0_rd_base']:
+				values += [records[base][:, 2], records[base][:, 1], records[base][:, 0]]
+				widths += [self.VRFAW, self.VRFAW, self.VRFAW]
+			for value, width in zip(values, widths):
+				fields.append((enable * value, shift))
+				shift += width
+
+		# Loader macro-instruction
+		shift = 0
+		loader_ops = chain_enum_fields['loader_src']
+		enable = (records['loader_src'] != 0)
+		is_wb = (records['loader_src'] == loader_ops.index('wb')) | (records['loader_src'] == loader_ops.index('flush'))
+		values = [records['write_to_obuf'], records['last_flag'], records['batch'], 1, is_wb, records['vrf_id0_wr_size']]
+		widths = [1, 1, 2, 1, 1, self.NSIZEW]
+		for base in ['vrf_id1_wr_base', 'vrf_id0_wr_base']:
+			values += [records[base][:, 2], records[base][:, 1], records[base][:, 0]]
+			widths += [self.VRFAW, self.VRFAW, self.VRFAW]
+		for value, width in zip(values, widths):
+			fields.append((enable * value, shift))
+			shift += width
+		# One-hot (vrf_id0) and two-hot (vrf_id1) destination VRF ids, added at a bit position that depends on the destination
+		vrf_id_pos = {'extvrf': 2*self.NTILE, 'mfu0.vrf0': 2*self.NTILE+2, 'mfu0.vrf1': 2*self.NTILE+4, 'mfu1.vrf0': 2*self.NTILE+6, 'mfu1.vrf1': 2*self.NTILE+8}
+		for vrf_op, vrf_id in [('vrf_id0_op', 0x1), ('vrf_id1_op', 0x3)]:
+			for code in np.unique(records[vrf_op]):
+				if(code >= len(vrf_op_types)):
+					pos = 2 * (int(code) - len(vrf_op_types))
+				elif(vrf_op_types[code] in vrf_id_pos):
+					pos = vrf_id_pos[vrf_op_types[code]]
+				else:
+					continue
+				fields.append((enable * (records[vrf_op] == code) * vrf_id, shift + pos))
+
+		for value, shift in fields:
+			value = np.broadcast_to(np.asarray(value, dtype=np.int64), (num_insts,))
+			negative |= (value < 0)
+			add_bit_field(bit_counts, np.where(value < 0, 0, value), shift)
+		carry_bits(bit_counts)
+		bits = bit_counts[:, :self.MICW][:, ::-1].astype(np.uint8)
+
+		# Fall back to the per-chain encoding for chains with negative fields
+		if(negative.any()):
+			insts = chain_store(records=records)
+			for i in np.nonzero(negative)[0]:
+				self.set_inst(insts[int(i)])
+				inst_str = bin(self.minst_chain & int(pow(2, self.MICW)-1))[2:].zfill(self.MICW)
+				bits[i] = np.frombuffer(inst_str.encode(), dtype=np.uint8) - ord('0')
+		return bits
+
+	'''
+	These functions maintain the dependency index used for tagging. A chain that writes back a vector (results[-1])
+	is recorded as its producer, and the tag of an instruction reading a set of vectors is the wb_so_far of the most
+	recent producer of any of them (wb_so_far never decreases along the instruction queue, so this is the maximum).
+	'''
+	def record_producer(self, inst):
+		self.producers[inst.results[-1]] = (inst, inst.wb_so_far)
+
+	def get_tag(self, names):
+		tag = 0
+		for name in names:
+			if(name in self.producers):
+				tag = max(tag, self.producers[name][1])
+		return tag
+
 	'''
 	This function is used for allocating memory for vectors and matrices depending on the dimensions
 	and the memory space specified by the user. It is optional to specify data values for the vector.
@@ -400,8 +531,7 @@ class npu:
 		dpes  = self.arch_params['dpes']
 		lanes = self.arch_params['lanes']
 		# Make sure the memory space exists
-		warnings.simplefilter(action='ignore', category=FutureWarning)
-		assert self.mem_space.get(space_name, 'invalid') != 'invalid', 'Specified memory space does not exist'
+		assert space_name in self.mem_space, 'Specified memory space does not exist'
 
 		if(dimension_y == None):	
 			allocated_mem = vector(name, dimension_x, space_name, tiles, dpes, lanes, self.in_data_type, self.ac_data_type, values)
@@ -421,6 +551,15 @@ class npu:
 
 		return allocated_mem
 
+	'''
+	This function is used for freeing the memory of a vector or matrix allocated using malloc, so that it can be
+	reused by later allocations in the same memory space.
+	'''
+	def free(self, allocated_mem):
+		assert allocated_mem.alloc_addr != -1, 'Vector/matrix ' + allocated_mem.name + ' is not allocated'
+		self.free_space(allocated_mem.space_name, allocated_mem.alloc_addr)
+		allocated_mem.alloc_addr = -1
+
 	'''
 	This function performs matrix-vector multiplication. Returns a vector data structure.
 	vector_in: input vector that resides in the mvu_vrf memory space.
@@ -449,10 +588,7 @@ class npu:
 			names.append(vectors[i].name)
 
 		#Calculate the tag for this matvec operation based on the most recently committed vector
-		for i in reversed(self.inst_q):
-			if(i.results[-1] in names):
-				tag = i.wb_so_far
-				break
+		tag = self.get_tag(names)
 		if (tag > self.highest_tag_so_far):
 			self.highest_tag_so_far = tag
 
@@ -483,6 +619,7 @@ class npu:
 		for i in range(batch):
 			tmp[i].data = np.dot(matrix.data.astype(self.ac_data_type), vectors[i].data.astype(self.ac_data_type))
 			tmp[i].useful_data = tmp[i].data[:tmp[i].dimension_x]
+		self.golden_mvu_q[len(self.inst_q) - 1] = [tmp[i].data for i in range(batch)]
 		return tmp
 
 	'''
@@ -504,10 +641,7 @@ class npu:
 		for i in range(batch):
 			names.append(vectors[i].name)
 
-		for i in reversed(self.inst_q):
-			if(i.results[-1] in names):
-				tag = i.wb_so_far
-				break
+		tag = self.get_tag(names)
 		if (tag > self.highest_tag_so_far):
 			self.highest_tag_so_far = tag
 		
@@ -673,11 +807,7 @@ class npu:
 		names = []
 		for b in range(batch):
 			names.append(vrf_vectors[b].name)
-		tag = 0
-		for i in reversed(self.inst_q):
-			if(i.results[-1] in names):
-				tag = i.wb_so_far
-				break
+		tag = self.get_tag(names)
 		if (tag > self.highest_tag_so_far):
 			self.highest_tag_so_far = tag
 		prev_inst = self.inst_q[-1]
@@ -778,11 +908,7 @@ class npu:
 		names = []
 		for b in range(batch):
 			names.append(vrf_vectors[b].name)
-		tag = 0
-		for i in reversed(self.inst_q):
-			if(i.results[-1] in names):
-				tag = i.wb_so_far
-				break
+		tag = self.get_tag(names)
 		if (tag > self.highest_tag_so_far):
 			self.highest_tag_so_far = tag
 		prev_inst = self.inst_q[-1]
@@ -887,6 +1013,7 @@ class npu:
 		prev_inst.write_to_obuf = write_to_obuf
 		prev_inst.loader_src = 'wb'
 		prev_inst.results[-1] = dst1[0].name
+		self.record_producer(prev_inst)
 
 		# Do the same for second destination if exists
 		if (dst2 != None):
@@ -940,6 +1067,7 @@ class npu:
 				for i in range(7, -1, -1):
 					inst.flags[i] = True
 				self.inst_q.append(inst)
+				self.record_producer(inst)
 				remaining_entries -= dst[0].word_count
 
 	'''
@@ -992,6 +1120,7 @@ class npu:
 				for i in range(7, -1, -1):
 					inst.flags[i] = True
 				self.inst_q.append(inst)
+				self.record_producer(inst)
 				remaining_entries -= dst1[0].word_count
 
 	'''
@@ -1150,6 +1279,7 @@ class npu:
 				inst.write_to_obuf = write_to_obuf
 				inst.flags[-1] = True
 				self.inst_q.append(inst)
+				self.record_producer(inst)
 		else:
 			inst = chain(batch)
 			inst.results[-1] = vectors[0].name
@@ -1173,6 +1303,7 @@ class npu:
 			inst.write_to_obuf = write_to_obuf
 			inst.flags[-1] = True
 			self.inst_q.append(inst)
+			self.record_producer(inst)
 
 		if(write_to_obuf == 1):
 			temp_data = []
@@ -1191,24 +1322,76 @@ class npu:
 	def end_npu_program(self):
 		self.inst_q[-1].last_flag = 1
 
+	'''
+	This function runs the instruction scheduling pass (see inst_sched.py) on the NPU program. Independent chains are
+	reordered to keep the NPU pipeline blocks busy (e.g. the input matvecs of the next RNN time step are issued while
+	the current recurrent result is being written back). The predicted cycle count of the program before and after the
+	pass is reported.
+	'''
+	def optimize_npu_program(self):
+		stats = optimize_program(self)
+		print(bcolors.OKGREEN + 'NPU program optimized: ' + str(stats['double_buffered']) + ' vector(s) double-buffered, ' + str(stats['moved']) + ' chain group(s) moved, ' + str(stats['chains']) + ' NPU instruction(s)' + bcolors.RESET)
+		print('Predicted cycles: ' + str(stats['cycles_before']) + ' -> ' + str(stats['cycles_after']) + \
+			' ({:.2f}x)'.format(stats['cycles_before'] / max(stats['cycles_after'], 1)))
+		return stats
+
+	'''
+	This function estimates the performance of the compiled NPU program using the analytical performance model of the
+	NPU (perf_model). It takes milliseconds instead of the minutes needed to build and run the performance simulation,
+	and is meant for comparing programs and architectures before committing to a full performance simulation run.
+	'''
+	def estimate_npu_performance(self):
+		estimate = estimate_program(self.inst_q, self.arch_params, self.ops, self.flow_opts['freq'])
+		self.set_perf_estimate(estimate['cycles'])
+		runtime_ms = estimate['cycles'] * 1.0 / (self.flow_opts['freq'] * 1000)
+		print('Estimated performance: ' + str(estimate['cycles']) + ' cycles - ' + str(round(runtime_ms, 5)) + ' ms - ' + \
+			str(self.perf_estimate['tops']) + ' TOPS (MVU utilization {:.1f}%)'.format(estimate['utilization']['mvu'] * 100))
+		return estimate
+
+	# Sets the estimated cycles of the program and the TOPS they amount to at the clock frequency of the flow
+	def set_perf_estimate(self, cycles):
+		tops = estimate_tops(cycles, self.ops, self.arch_params['threads'], self.flow_opts['freq']) if cycles > 0 else 0
+		self.perf_estimate = {'cycles': cycles, 'tops': round(tops, 2)}
+
 	'''
 	This function uses FSim to perform a functional simulation for the NPU program written by the user,
 	and compare its results to the golden results generated by the functional model in each of the 
-	compiler functions.
+	compiler functions. In sampled verification mode (verify_every/verify_random flow options), only a 
+	subset of the matvec chains is replayed by the FSim MVU and checked against the golden MVU results,
+	while the rest of the chains take their MVU results from the functional model. Returns True if the
+	simulation results match the golden results.
 	'''
 	def fsim_npu_program(self, verbose=0):
 		# Initialize FSim
-		inst_stream = copy.deepcopy(self.inst_q)
-		input_buffer = copy.deepcopy(self.ibuf_q)
-		initial_mvu_vrfs = copy.deepcopy(self.mvu_vrfs)
-		initial_ext_vrf = copy.deepcopy(self.ext_vrf)
-		initial_mfu0_vrf0 = copy.deepcopy(self.mfu0_vrf0)
-		initial_mfu0_vrf1 = copy.deepcopy(self.mfu0_vrf1)
-		initial_mfu1_vrf0 = copy.deepcopy(self.mfu1_vrf0)
-		initial_mfu1_vrf1 = copy.deepcopy(self.mfu1_vrf1)
+		# FSim reads the instruction queue with a program counter and copies the inputs to its own FIFO
+		# The initial VRFs are passed as read-only views, FSim only copies the VRFs it writes to (copy-on-write)
+		inst_stream = self.inst_q
+		input_buffer = self.ibuf_q
+		initial_mvu_vrfs = read_only(self.mvu_vrfs)
+		initial_ext_vrf = read_only(self.ext_vrf)
+		initial_mfu0_vrf0 = read_only(self.mfu0_vrf0)
+		initial_mfu0_vrf1 = read_only(self.mfu0_vrf1)
+		initial_mfu1_vrf0 = read_only(self.mfu1_vrf0)
+		initial_mfu1_vrf1 = read_only(self.mfu1_vrf1)
 		inst_count = len(self.inst_q)
-		self.fsim = npu_isa_sim(inst_stream, list(input_buffer), initial_mvu_vrfs, initial_ext_vrf, initial_mfu0_vrf0, initial_mfu0_vrf1, initial_mfu1_vrf0, initial_mfu1_vrf1,\
-			self.arch_params['tiles'], self.arch_params['dpes'], self.arch_params['lanes'], self.arch_params['vrf_depth'])
+
+		# Pick the matvec chains to replay in sampled verification mode
+		golden_mvu = None
+		mvu_replay = None
+		verify_every = self.flow_opts['verify_every']
+		verify_random = self.flow_opts['verify_random']
+		if(verify_every > 0 or verify_random > 0):
+			mvu_chains = sorted(self.golden_mvu_q.keys())
+			if(verify_every > 0):
+				mvu_replay = set(mvu_chains[::verify_every])
+			else:
+				num_samples = int(math.ceil(len(mvu_chains) * verify_random / 100.0))
+				mvu_replay = set(np.random.choice(mvu_chains, num_samples, replace=False).tolist())
+			golden_mvu = self.golden_mvu_q
+			print('Sampled verification: replaying ' + str(len(mvu_replay)) + ' out of ' + str(len(mvu_chains)) + ' matvec chain(s)')
+
+		self.fsim = npu_isa_sim(inst_stream, input_buffer, initial_mvu_vrfs, initial_ext_vrf, initial_mfu0_vrf0, initial_mfu0_vrf1, initial_mfu1_vrf0, initial_mfu1_vrf1,\
+			self.arch_params['tiles'], self.arch_params['dpes'], self.arch_params['lanes'], self.arch_params['vrf_depth'], golden_mvu=golden_mvu, mvu_replay=mvu_replay)
 		self.fsim.mvu_mrfs = self.mrfs
 
 		# Simulate the instructions in instruction queue
@@ -1220,757 +1403,237 @@ class npu:
 				print("-------------- Finished simulation of instruction " + str(i+1) + " --------------")
 
 		# Verify results
-		if (np.array_equal(self.fsim.obuf_q, self.golden_obuf_q)):
+		if (np.array_equal(self.fsim.obuf_q, self.golden_obuf_q) and not self.fsim.mvu_mismatches):
 			print(bcolors.OKGREEN + 'Simulation finished successfully!' + bcolors.RESET)
 		else:
 			print(bcolors.FAIL + 'Simulation FAILED!' + bcolors.RESET)
+			for c in self.fsim.mvu_mismatches:
+				print('MVU results of instruction ' + str(c+1) + ' do not match the golden results')
 			for r in range(len(self.fsim.obuf_q)):
 				print('FSim: ' + str(self.fsim.obuf_q[r]))
 				print('Gold: ' + str(self.golden_obuf_q[r]))
+			return False
+		return True
 
 	'''
-	This function dumps the FSim data structures containing the architecture states (i.e. MRFs, VRFs),
-	as well as the instructions, input and output queues. These checkpoints are later used to generate
-	the low-level binary checkpoints for the NPU.
+	Returns the output queue to be dumped in checkpoints. If the functional simulation was skipped (-fast),
+	the golden outputs computed by the compiler functional model are used instead.
 	'''
-	def generate_fsim_checkpoints(self, checkpoint_name, verbose=0):
-		subprocess.call('mkdir dump', shell=True)
-		count = 0
-		# Instructions checkpoint
-		instfile = open('./dump/' + checkpoint_name + '-inst', 'wb')
-		pickle.dump(self.inst_q, instfile)
-		instfile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-inst checkpoint')
-
-		# Input checkpoint
-		inputfile = open('./dump/' + checkpoint_name + '-input', 'wb')
-		np.save(inputfile, self.ibuf_q)
-		inputfile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-input checkpoint')
+	def get_obuf_q(self):
+		if(self.fsim is None):
+			return self.golden_obuf_q
+		return self.fsim.obuf_q
 
-		# MRFs checkpoint
-		mvumrffile = open('./dump/' + checkpoint_name + '-mvu_mrf', 'wb')
-		np.save(mvumrffile, self.fsim.mvu_mrfs)
-		mvumrffile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-mvu_mrf checkpoint')
-
-		# VRFs checkpoints
-		mvuvrffile = open('./dump/' + checkpoint_name + '-mvu_vrf', 'wb')
-		np.save(mvuvrffile, self.mvu_vrfs)
-		mvuvrffile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-mvu_vrf checkpoint')
-
-		extvrffile = open('./dump/' + checkpoint_name + '-ext_vrf', 'wb')
-		np.save(extvrffile, self.ext_vrf)
-		extvrffile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-ext_vrf checkpoint')
+	'''
+	This function returns the FSim data structures containing the architecture states (i.e. MRFs, VRFs),
+	as well as the instructions, input and output queues, which are dumped as checkpoints by
+	generate_fsim_checkpoints. These checkpoints are later used to generate
+	the low-level binary checkpoints for the NPU. The checkpoint is a directory (./dump/<checkpoint_name>)
+	with one .npy file per state, and the instruction chains encoded as a structured array, so that it can
+	be loaded back as read-only memory maps.
+	'''
+	def get_fsim_states(self):
+		return {
+			'inst'		: self.inst_q.records(),
+			'input'		: self.ibuf_q,
+			'mvu_mrf'	: self.mrfs,
+			'mvu_vrf'	: self.mvu_vrfs,
+			'ext_vrf'	: self.ext_vrf,
+			'mfu_vrf'	: self.mfu0_vrf0,
+			'output'	: self.get_obuf_q()
+		}
 
-		mfuvrffile = open('./dump/' + checkpoint_name + '-mfu_vrf', 'wb')
-		np.save(mfuvrffile, self.mfu0_vrf0)
-		mfuvrffile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-mfu_vrf checkpoint')
+	'''
+	These functions implement a content-addressed cache of compiled NPU programs. The cache key is a hash of the
+	model description (layer configs, digests of the input values and of the random number generator state that the
+	weights are drawn from), the random seed, the architecture parameters and the flow options that affect the
+	generated artifacts. A cache entry (<cache_dir>/<key>) stores the FSim checkpoints (which
+	include the compiled instruction stream) and all generated artifacts (PAC header, MIF files, Verilog header and
+	performance simulation files). On a cache hit, the front-end compilation, functional simulation and artifact
+	generation are skipped and the cached artifacts are restored instead. The entry only keeps the estimated cycles of
+	the program, so the estimated TOPS always follow the clock frequency of the current run.
+	'''
+	def get_cache_key(self, model_desc):
+		flow_opts = {}
+		for opt in self.flow_opts.keys():
+			if(opt not in cache_ignored_flow_opts):
+				flow_opts[opt] = self.flow_opts[opt]
+		desc = {'model': model_desc, 'seed': self.flow_opts['seed'], 'arch_params': self.arch_params, 'flow_opts': flow_opts}
+		return hashlib.sha256(json.dumps(desc, sort_keys=True, default=str).encode()).hexdigest()
+
+	# Returns True (and loads the cache entry metadata) if the program described by model_desc is cached
+	def lookup_cache(self, model_desc):
+		if(not self.flow_opts['cache']):
+			return False
+		self.cache_key = self.get_cache_key(model_desc)
+		meta_path = os.path.join(self.flow_opts['cache_dir'], self.cache_key, 'meta.json')
+		if(not os.path.isfile(meta_path)):
+			return False
+		with open(meta_path, 'r') as meta_file:
+			self.cache_hit = json.load(meta_file)
+		self.ops = self.cache_hit['ops']
+		self.mrf_filled_depth = self.cache_hit['mrf_filled_depth']
+		self.unsupported_layers = self.cache_hit['unsupported_layers']
+		if(self.cache_hit.get('est_cycles') is not None):
+			self.set_perf_estimate(self.cache_hit['est_cycles'])
+		return True
 
-		# Output checkpoint
-		outputfile = open('./dump/' + checkpoint_name + '-output', 'wb')
-		np.save(outputfile, self.fsim.obuf_q)
-		outputfile.close()
-		count += 1
-		if (verbose):
-			print('Dumped ' + checkpoint_name + '-output checkpoint')
-
-		return count
-
-	def write_verilog_header_file(self, num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, max_tag, mrf_filled_depth):
-		dump_path = '../rtl/npu.vh'
-		with open(dump_path, 'w') as header_file:
-			header_file.write("`ifndef _NPU_VH_\n")
-			header_file.write("`define _NPU_VH_\n\n")
-			header_file.write("`define max(a,b) ((a > b) ? a : b)\n")
-			header_file.write("`define roundup_power2(a) ((2) ** ($clog2(a)))\n\n")
-			header_file.write("/***********************************/\n")
-			header_file.write("/*    USER-SPECIFIED PARAMETERS    */\n")
-			header_file.write("/***********************************/\n")
-			header_file.write("`define NTILE     			"+str(num_tiles)+"			// Number of MVU tiles\n")
-			header_file.write("`define NDPE      			"+str(num_dpes)+"  		// Number of dot product engines (DPEs) per tile\n")
-			header_file.write("`define DOTW      			"+str(num_lanes)+"			// Number of lanes per DPE\n")
-			header_file.write("`define VRFD					"+str(vrf_depth)+"			// Vector register file depth\n")
-			header_file.write("`define MRFD      			"+str(mrf_depth)+"		// Matrix register file depth\n")
-			header_file.write("`define EW        			8   		// Input bitwidth {8 or 4}\n")
-			header_file.write("`define ACCW      			32  		// Accumulation/Output bitwidth\n")
-			header_file.write("`define QDEPTH    			512			// FIFO depth\n")
-			if(self.flow_opts['rtl_sim'] == 1):
-				header_file.write("`define INPUT_BUFFER_SIZE	2048\n")
-				header_file.write("`define OUTPUT_BUFFER_SIZE	2048\n")
-			else:
-				header_file.write("`define INPUT_BUFFER_SIZE	512\n")
-				header_file.write("`define OUTPUT_BUFFER_SIZE	512\n")
-			header_file.write("`define INST_DEPTH			512			// Instruction memory depth\n")
-			rtl_dir = os.getcwd()
-			idx = rtl_dir.rfind('/')
-			rtl_dir = rtl_dir[:idx] + '/rtl/'
-			header_file.write("`define RTL_DIR				\"" + rtl_dir + "\"	// Directory for RTL source code\n")
-			header_file.write("`define TILES_THRESHOLD 	8			// Number of tiles implemented using hard DSP blocks\n")
-			header_file.write("`define DPES_THRESHOLD  	0			// Number of DPEs/tile implemented using hard DSPs\n")
-			header_file.write("`define TARGET_FPGA			\"S10-Prime\"		// Target FPGA {\"Arria 10\" or \"Stratix 10\" or \"S10-Prime\"}\n\n")
-			header_file.write("/***********************************/\n")
-			header_file.write("/*    IMPLEMENTATION PARAMETERS    */\n")
-			header_file.write("/***********************************/\n")
-			header_file.write("//DO NOT change these parameters unless you really know what you are doing\n")
-			header_file.write("`define PRIME_DOTW			10\n")
-			header_file.write("`define DOT_PER_DSP			3\n")
-			header_file.write("`define NUM_DSP				DOTW / PRIME_DOTW\n")
-			header_file.write("`define MULT_LATENCY       2 + (NUM_DSP-1)*2\n")
-			header_file.write("`define DPE_PIPELINE    	MULT_LATENCY\n")
-			header_file.write("`define VRFIDW					$clog2(NUM_DSP)\n")
-			header_file.write("`define NUM_ACCUM				DOT_PER_DSP * NUM_DSP\n")
-			header_file.write("`define ACCIDW					$clog2(2*NUM_ACCUM)\n")
-			header_file.write("`define VRFAW     			$clog2(VRFD)\n")     
-			header_file.write("`define MRFAW     			$clog2(MRFD)\n")     
-			header_file.write("`define NMFU      			2\n")                
-			header_file.write("`define NVRF      			NTILE+1+(2*NMFU)\n") 
-			header_file.write("`define NMRF      			NTILE*NDPE\n")       
-			header_file.write("`define NSIZE     			`max(VRFD, MRFD)\n")
-			header_file.write("`define NSIZEW    			$clog2(NSIZE)+1\n")
-			header_file.write("`define NTAG      			"+str(max_tag)+"\n")
-			header_file.write("`define NTAGW     			$clog2(NTAG)\n")
-			header_file.write("`define MIW_MVU				3*VRFAW+2*NSIZEW+MRFAW+NSIZEW+NTAGW+1\n")
-			header_file.write("`define UIW_MVU   			8+NTAGW+MRFAW+1+VRFIDW+VRFAW\n")
-			header_file.write("`define MIW_EVRF  			3*VRFAW+NSIZEW+1+NTAGW+3\n")
-			header_file.write("`define UIW_EVRF  			VRFAW+2+NTAGW\n")
-			header_file.write("`define MIW_MFU   			6*VRFAW+NSIZEW+NTAGW+9\n")
-			header_file.write("`define UIW_MFU   			VRFAW+VRFAW+NTAGW+6\n")
-			header_file.write("`define MIW_LD    			(2*NVRF)+6*VRFAW+NSIZEW+6\n")
-			header_file.write("`define UIW_LD    			(2*NVRF)+VRFAW+VRFAW+4\n")
-			header_file.write("`define MICW     				MIW_MVU+MIW_EVRF+(2*MIW_MFU)+MIW_LD\n")
-			header_file.write("`define WB_LMT    			QDEPTH/2\n")        
-			header_file.write("`define WB_LMTW   			$clog2(WB_LMT)+1\n") 
-			if(self.flow_opts['rtl_sim'] == 1):
-				header_file.write("`define SIM_FLAG				1\n")
+	# Paths of the artifacts generated in step 3 of the flow (checkpoint directory and generated files)
+	def get_flow_artifacts(self):
+		checkpoint_name = self.flow_opts['checkpoint_name']
+		artifacts = ['./dump/' + checkpoint_name]
+		if(self.flow_opts['pac']):
+			artifacts.append('./pac_dump/' + checkpoint_name + '.h')
+		if(self.flow_opts['mif_gen']):
+			artifacts += self.mif_files
+			artifacts.append('../rtl/npu.vh')
+		if(self.flow_opts['perf_gen']):
+			artifacts += sorted(glob.glob('../register_files/*.txt') + glob.glob('../register_files/*.bin'))
+			artifacts.append('../gen_done')
+			if(self.flow_opts['is_first_perf_sim']):
+				artifacts.append('../modules/params.hpp')
+		return artifacts
+
+	def store_cache(self, inst_count):
+		cache_dir = self.flow_opts['cache_dir']
+		entry_path = os.path.join(cache_dir, self.cache_key)
+		if(os.path.isdir(entry_path)):
+			return
+		# The entry is written to a temporary directory first so that concurrent runs never see a partial entry
+		tmp_path = entry_path + '.tmp' + str(os.getpid())
+		os.makedirs(os.path.join(tmp_path, 'artifacts'))
+		artifacts = {}
+		for i, path in enumerate(self.get_flow_artifacts()):
+			if(os.path.isdir(path)):
+				shutil.copytree(path, os.path.join(tmp_path, 'artifacts', str(i)))
+			elif(os.path.isfile(path)):
+				shutil.copy2(path, os.path.join(tmp_path, 'artifacts', str(i)))
 			else:
-				header_file.write("`define SIM_FLAG				0\n")
-			header_file.write("`define PRECISION				EW\n")
-			header_file.write("`define BRAM_RD_LATENCY 	2\n")
-			header_file.write("`define INST_ADDRW			$clog2(INST_DEPTH)\n")
-			header_file.write("`define CACHELINE_SIZE		512\n")
-			header_file.write("`define MDATA_SIZE			16\n")
-			header_file.write("`define ROB_DEPTH				INPUT_BUFFER_SIZE\n")
-			header_file.write("`define ROB_ADDRW				$clog2(ROB_DEPTH)\n")
-			header_file.write("`define FILLED_MRFD			"+str(mrf_filled_depth)+"\n")
-			header_file.write("`define NUM_INPUTS			"+str(len(self.ibuf_q))+"\n")
-			header_file.write("`define NUM_OUTPUTS			"+str(len(self.golden_obuf_q))+"\n")
-			if(self.flow_opts['rtl_sim'] == 1):
-				header_file.write("`define DEPLOY					0\n\n")
+				continue
+			artifacts[str(i)] = path
+		meta = {
+			'key'					: self.cache_key,
+			'inst_count'			: inst_count,
+			'ops'					: self.ops,
+			'mrf_filled_depth'		: self.mrf_filled_depth,
+			'unsupported_layers'	: self.unsupported_layers,
+			'est_cycles'			: self.perf_estimate['cycles'] if self.perf_estimate is not None else None,
+			'artifacts'				: artifacts
+		}
+		with open(os.path.join(tmp_path, 'meta.json'), 'w') as meta_file:
+			json.dump(meta, meta_file, indent=2)
+		try:
+			os.rename(tmp_path, entry_path)
+		except OSError:
+			# Another run stored the same entry in the meantime
+			shutil.rmtree(tmp_path, ignore_errors=True)
+
+	def restore_cache(self):
+		entry_path = os.path.join(self.flow_opts['cache_dir'], self.cache_key)
+		for name, path in self.cache_hit['artifacts'].items():
+			cached_path = os.path.join(entry_path, 'artifacts', name)
+			if(os.path.isdir(cached_path)):
+				if(os.path.isdir(path)):
+					shutil.rmtree(path)
+				shutil.copytree(cached_path, path)
 			else:
-				header_file.write("`define DEPLOY					1\n\n")
-			header_file.write("/***********************************/\n")
-			header_file.write("/* 	      MACRO DEFINITIONS       */\n")
-			header_file.write("/***********************************/\n")
-			if(self.flow_opts['rtl_sim'] == 1):
-				header_file.write("`define DISPLAY_MVU\n")
-				header_file.write("`define DISPLAY_MVU_TILE\n")
-				header_file.write("`define DISPLAY_EVRF\n")
-				header_file.write("`define DISPLAY_MFU\n")
-				header_file.write("`define DISPLAY_LD\n")
-				header_file.write("`define DISPLAY_INST\n\n")
-			header_file.write("// NPU Instruction definition\n")
-			header_file.write("`define mvu_minst(minst_chain)  \\\n")
-			header_file.write("    ``minst_chain``[MIW_LD+(2*MIW_MFU)+MIW_EVRF+:MIW_MVU]\n")
-			header_file.write("`define evrf_minst(minst_chain) \\\n")
-			header_file.write("    ``minst_chain``[MIW_LD+(2*MIW_MFU)+:MIW_EVRF]\n")
-			header_file.write("`define mfu0_minst(minst_chain) \\\n")
-			header_file.write("    ``minst_chain``[MIW_LD+MIW_MFU+:MIW_MFU]\n")
-			header_file.write("`define mfu1_minst(minst_chain) \\\n")
-			header_file.write("    ``minst_chain``[MIW_LD+:MIW_MFU]\n")
-			header_file.write("`define ld_minst(minst_chain)   \\\n")
-			header_file.write("    ``minst_chain``[0+:MIW_LD]\n\n")
-			header_file.write("// MVU macro-instruction definition\n")
-			header_file.write("`define mvu_minst_vrf_base0(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW+2*VRFAW +:VRFAW]\n")
-			header_file.write("`define mvu_minst_vrf_base1(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW+VRFAW +:VRFAW]\n")
-			header_file.write("`define mvu_minst_vrf_base2(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW +:VRFAW]\n")
-			header_file.write("`define mvu_minst_vrf_size(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+:NSIZEW]\n")
-			header_file.write("`define mvu_minst_mrf_base(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+:MRFAW]\n")
-			header_file.write("`define mvu_minst_mrf_size(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+NSIZEW+:NSIZEW]\n")
-			header_file.write("`define mvu_minst_words_per_row(minst) \\\n")
-			header_file.write("    ``minst``[1+NTAGW+:NSIZEW]\n")
-			header_file.write("`define mvu_minst_tag(minst) \\\n")
-			header_file.write("    ``minst``[1+:NTAGW]\n")
-			header_file.write("`define mvu_minst_op(minst) \\\n")
-			header_file.write("    ``minst``[0+:1]\n\n")
-			header_file.write("// MVU micro-instruction definition\n")
-			header_file.write("`define mvu_uinst_vrf_addr(uinst) \\\n")
-			header_file.write("	``uinst``[8+NTAGW+MRFAW+1+VRFIDW +:VRFAW]\n")
-			header_file.write("`define mvu_uinst_vrf_rd_id(uinst) \\\n")
-			header_file.write("	``uinst``[8+NTAGW+MRFAW+1 +:VRFIDW]\n")
-			header_file.write("`define mvu_uinst_reg_sel(uinst) \\\n")
-			header_file.write("	``uinst``[8+NTAGW+MRFAW +:1]\n")
-			header_file.write("`define mvu_uinst_mrf_addr(uinst) \\\n")
-			header_file.write("	``uinst``[8+NTAGW +:MRFAW]\n")
-			header_file.write("`define mvu_uinst_tag(uinst) \\\n")
-			header_file.write("	``uinst``[8+:NTAGW]\n")
-			header_file.write("`define mvu_uinst_acc_op(uinst)   \\\n")
-			header_file.write("	``uinst``[6+:2]\n")
-			header_file.write("`define mvu_uinst_acc_size(uinst) \\\n")
-			header_file.write("    ``uinst``[1+:5]\n")
-			header_file.write("`define mvu_uinst_vrf_en(uinst) \\\n")
-			header_file.write("    ``uinst``[0+:1]\n\n")
-			header_file.write("// eVRF macro-instruction definition\n")
-			header_file.write("`define evrf_minst_vrf_base0(minst) \\\n")
-			header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+2*VRFAW+:VRFAW]\n")
-			header_file.write("`define evrf_minst_vrf_base1(minst) \\\n")
-			header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+VRFAW+:VRFAW]\n")
-			header_file.write("`define evrf_minst_vrf_base2(minst) \\\n")
-			header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+:VRFAW]\n")
-			header_file.write("`define evrf_minst_vrf_size(minst) \\\n")
-			header_file.write("    ``minst``[3+NTAGW+1+:NSIZEW]\n")
-			header_file.write("`define evrf_minst_src_sel(minst) \\\n")
-			header_file.write("    ``minst``[3+NTAGW+:1]\n")
-			header_file.write("`define evrf_minst_tag(minst) \\\n")
-			header_file.write("    ``minst``[3+:NTAGW]\n")
-			header_file.write("`define evrf_minst_op(minst) \\\n")
-			header_file.write("    ``minst``[2+:1]\n")
-			header_file.write("`define evrf_minst_batch(minst) \\\n")
-			header_file.write("    ``minst``[0+:2]\n\n")
-			header_file.write("// eVRF micro-instruction definition\n")
-			header_file.write("`define evrf_uinst_vrf_addr(uinst) \\\n")
-			header_file.write("    ``uinst``[NTAGW+2+:VRFAW]\n")
-			header_file.write("`define evrf_uinst_src_sel(uinst)   \\\n")
-			header_file.write("    ``uinst``[NTAGW+:2]\n")
-			header_file.write("`define evrf_uinst_tag(uinst)   \\\n")
-			header_file.write("    ``uinst``[0+:NTAGW]\n\n")
-			header_file.write("//  MFU macro-instruction definition\n")
-			header_file.write("`define mfu_minst_vrf0_base0(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+5*VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_vrf0_base1(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+4*VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_vrf0_base2(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+3*VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_vrf1_base0(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+2*VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_vrf1_base1(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_vrf1_base2(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+NSIZEW+:VRFAW]\n")
-			header_file.write("`define mfu_minst_size(minst) \\\n")
-			header_file.write("    ``minst``[9+NTAGW+:NSIZEW]\n")
-			header_file.write("`define mfu_minst_tag(minst) \\\n")
-			header_file.write("    ``minst``[9+:NTAGW]\n")
-			header_file.write("`define mfu_minst_op(minst) \\\n")
-			header_file.write("    ``minst``[2+:7]\n")
-			header_file.write("`define mfu_minst_batch(minst) \\\n")
-			header_file.write("    ``minst``[0+:2]\n\n")
-			header_file.write("// MFU micro-instruction definition\n")
-			header_file.write("`define mfu_uinst_vrf0_addr(uinst) \\\n")
-			header_file.write("    ``uinst``[6+NTAGW+VRFAW+:VRFAW]\n")
-			header_file.write("`define mfu_uinst_vrf1_addr(uinst) \\\n")
-			header_file.write("    ``uinst``[6+NTAGW+:VRFAW]\n")
-			header_file.write("`define mfu_uinst_tag(uinst) \\\n")
-			header_file.write("    ``uinst``[6+:NTAGW]\n")
-			header_file.write("`define mfu_uinst_func_op(uinst) \\\n")
-			header_file.write("    ``uinst``[0+:6]\n")
-			header_file.write("`define mfu_uinst_act_op(uinst) \\\n")
-			header_file.write("    ``uinst``[4+:2]\n")
-			header_file.write("`define mfu_uinst_add_op(uinst) \\\n")
-			header_file.write("    ``uinst``[1+:3]\n")
-			header_file.write("`define mfu_uinst_mul_op(uinst) \\\n")
-			header_file.write("    ``uinst``[0+:1]\n\n")
-			header_file.write("// LD macro-instruction definition\n")
-			header_file.write("`define ld_minst_vrf_id(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+6*VRFAW+:2*NVRF]\n")
-			header_file.write("`define ld_minst_vrf0_base0(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+5*VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_minst_vrf0_base1(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+4*VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_minst_vrf0_base2(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+3*VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_minst_vrf1_base0(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+2*VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_minst_vrf1_base1(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_minst_vrf1_base2(minst) \\\n")
-			header_file.write("    ``minst``[6+NSIZEW+:VRFAW]\n")
-			header_file.write("`define ld_minst_size(minst) \\\n")
-			header_file.write("    ``minst``[6+:NSIZEW]\n")
-			header_file.write("`define ld_minst_src_sel(minst) \\\n")
-			header_file.write("    ``minst``[5+:1]\n")
-			header_file.write("`define ld_minst_op(minst) \\\n")
-			header_file.write("    ``minst``[4+:1]\n")
-			header_file.write("`define ld_minst_batch(minst) \\\n")
-			header_file.write("    ``minst``[2+:2]\n")
-			header_file.write("`define ld_minst_interrupt(minst) \\\n")
-			header_file.write("    ``minst``[1+:1]\n")
-			header_file.write("`define ld_minst_report_to_host(minst) \\\n")
-			header_file.write("	``minst``[0+:1]\n\n")
-			header_file.write("// LD micro-instruction definition\n")
-			header_file.write("`define ld_uinst_vrf_id(uinst) \\\n")
-			header_file.write("    ``uinst``[4+VRFAW+VRFAW+:2*NVRF]\n")
-			header_file.write("`define ld_uinst_vrf0_addr(uinst) \\\n")
-			header_file.write("    ``uinst``[4+VRFAW+:VRFAW]\n")
-			header_file.write("`define ld_uinst_vrf1_addr(uinst) \\\n")
-			header_file.write("    ``uinst``[4+:VRFAW]\n")
-			header_file.write("`define ld_uinst_src_sel(uinst) \\\n")
-			header_file.write("    ``uinst``[3+:1]\n")
-			header_file.write("`define ld_uinst_last(uinst) \\\n")
-			header_file.write("    ``uinst``[2+:1]\n")
-			header_file.write("`define ld_uinst_interrupt(uinst) \\\n")
-			header_file.write("    ``uinst``[1+:1]\n")
-			header_file.write("`define ld_uinst_report_to_host(uinst) \\\n")
-			header_file.write("    ``uinst``[0+:1]\n\n")
-			header_file.write("`endif\n")
+				if(os.path.dirname(path) and not os.path.isdir(os.path.dirname(path))):
+					os.makedirs(os.path.dirname(path))
+				shutil.copy2(cached_path, path)
 
 	'''
-	This function is used to launch the RTL simulation in case specified by the user. This requires 
-	Synopsys VCS to be set up properly
+	This function adds the steps that generate the flow artifacts (FSim checkpoints, PAC header file, MIF files, Verilog
+	header file and performance simulation files) to the flow pipeline. The steps are module-level functions that read
+	the program from the FSim checkpoints (or get it as arguments), so the npu object itself is never sent to the worker
+	processes. It returns the steps that the RTL ('rtl') and performance ('perf') simulations depend on.
 	'''
-	def launch_rtl_sim(self, checkpoint_name, num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, max_tag, mrf_filled_depth):
-		#self.write_verilog_header_file(num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, max_tag, mrf_filled_depth)
-		subprocess.call('cd ../rtl; sed -i -e \'s/\r$//\' run_sim.sh; ./run_sim.sh; cd ../compiler', shell=True)
+	def add_flow_artifact_steps(self, pipeline):
+		num_tiles = self.arch_params['tiles']
+		num_sectors = self.arch_params['sectors']
+		num_dpes = self.arch_params['dpes']
+		num_lanes = self.arch_params['lanes']
+		num_threads = self.arch_params['threads']
+		vrf_depth = self.arch_params['vrf_depth']
+		mrf_depth = self.arch_params['mrf_depth']
+		max_tag = self.arch_params['max_tag']
+		checkpoint_name = self.flow_opts['checkpoint_name']
+		pac_gen = self.flow_opts['pac']
+		mif_gen = self.flow_opts['mif_gen']
+		generate_perf_sim_files = self.flow_opts['perf_gen']
+		is_first_perf_sim = self.flow_opts['is_first_perf_sim']
+		verbose = self.flow_opts['verbose']
+		bin_dump = self.flow_opts['bin_dump']
+		perf_bin = self.flow_opts['perf_bin']
+		ckpt_dir = './dump/' + checkpoint_name
+		sim_deps = {'rtl': [], 'perf': []}
+
+		pipeline.add_step('checkpoints', generate_fsim_checkpoints, (ckpt_dir, self.get_fsim_states(), verbose), msg='Generating FSim checkpoints')
+		if(pac_gen or mif_gen):
+			# The instructions are encoded once (vectorized) and shared by the PAC and MIF dumps
+			self.set_inst_params()
+			inst_bits = self.encode_insts(self.inst_q.records())
+			dump_files = ['mvu-mrf' + format(i, '03d') for i in range(num_tiles * num_dpes)] + ['input', 'top_sched', 'output']
+		# PAC and MIF generation both use the ./pac_dump directory, so they are chained one after the other
+		pac_dump_dep = ['checkpoints']
+		if(pac_gen):
+			# Use the checkpoints generated by FSim (python data structures) to generate binary low-level NPU checkpoints,
+			# then transform them into the PAC header file format
+			pipeline.add_step('pac_dump', dump_binary_files, (ckpt_dir, num_tiles, num_dpes, num_lanes, inst_bits, bin_dump), \
+				deps=pac_dump_dep, msg='Dumping PAC checkpoints')
+			mif_steps = add_mif_conversion_steps(pipeline, 'pac_dump', dump_files, num_lanes)
+			pipeline.add_step('pac_header', generate_pac_header_file, (checkpoint_name,), deps=mif_steps, msg='Generating C header file')
+			pac_dump_dep = ['pac_header']
+		if(mif_gen):
+			pipeline.add_step('mif_dump', dump_binary_files, (ckpt_dir, num_tiles, num_dpes, num_lanes, inst_bits, bin_dump), \
+				deps=pac_dump_dep, msg='Dumping MIF checkpoints')
+			mif_steps = add_mif_conversion_steps(pipeline, 'mif_dump', dump_files, num_lanes)
+			mif_names = get_mif_file_names(dump_files, num_lanes)
+			self.mif_files = ['../rtl/mif_files/' + name for name in mif_names]
+			pipeline.add_step('mif_files', generate_mif_files, (mif_names,), deps=mif_steps, msg='Converting checkpoints to MIFs')
+			pipeline.add_step('verilog_header', write_verilog_header_file, (num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, max_tag, \
+				self.mrf_filled_depth, self.flow_opts['rtl_sim'], len(self.ibuf_q), len(self.golden_obuf_q)), msg='Generating Verilog header file')
+			sim_deps['rtl'] = ['mif_files', 'verilog_header']
+		if(generate_perf_sim_files == 1):
+			# The register files of a previous run are removed before any of the new ones is written
+			pipeline.add_step('perf_clear', clear_register_files)
+			perf_steps = ['perf_vectors', 'perf_insts']
+			if(is_first_perf_sim):
+				pipeline.add_step('perf_params', write_perf_sim_params, (self.arch_params['cores'], num_tiles, num_sectors, num_dpes, \
+					num_lanes, num_threads, vrf_depth, mrf_depth, max_tag, self.arch_params['tb_lanes'], self.arch_params['tb_num_dots']))
+				perf_steps.append('perf_params')
+			for tile_id in range(num_tiles):
+				pipeline.add_step('perf_mrf_tile' + str(tile_id), dump_mrf_tile, (tile_id, ckpt_dir, self.mrf_filled_depth, perf_bin), \
+					deps=['checkpoints', 'perf_clear'])
+				perf_steps.append('perf_mrf_tile' + str(tile_id))
+			pipeline.add_step('perf_vectors', write_perf_sim_vectors, (ckpt_dir, num_lanes, perf_bin), deps=['checkpoints', 'perf_clear'])
+			pipeline.add_step('perf_insts', write_perf_sim_instructions, (ckpt_dir, num_tiles), deps=['checkpoints', 'perf_clear'])
+			pipeline.add_step('perf_sim_files', write_gen_done, (), deps=perf_steps, msg='Generating performance simulation files')
+			sim_deps['perf'] = ['perf_sim_files']
+		return sim_deps
 
 	'''
-	This function uses the FSim checkpoints to generate low-level binary NPU checkpoints. These
-	checkpoints will later be used to generate the PAC C header file. Make sure to set the precision_in
-	and precision_out to correct number of bits in case the RTL is changed (parameters EW & ACCW in RTL).
+	This function writes a machine-readable record of a performance simulation run to a JSON file. The record 
+	contains the workload name, architecture parameters, simulated cycles and TOPS as well as the wall time of
+	the simulation and the simulation speed (seconds per simulated cycle).
 	'''
-	def dump_binary_files(self, checkpoint_name, num_tiles, num_dpes, num_lanes):
-		precision_in = 8
-		precision_out = 32
-		mask = int(np.power(2, precision_in)) - 1
-
-		# Dump MRF data
-		path = './dump/' + checkpoint_name + '-mvu_mrf'
-		with open (path,'rb') as mrffile:
-			mrfs = np.load(mrffile)
-			for i in range(num_tiles):
-				for j in range(num_dpes):
-					dump_path = './pac_dump/mvu-mrf' + format(i * num_dpes + j, '03d')
-					with open (dump_path,'wb') as dump_file:
-						for k in range(len(mrfs[i][j])):
-							val = 0
-							for l in range(num_lanes):
-								temp = mrfs[i][j][k][l].item()
-								temp &= mask
-								val += (temp << (precision_in * l))
-							val_str = bin(val)[2:].zfill(num_lanes * precision_in)
-							dump_file.write(val_str.encode())
-							dump_file.write('\n'.encode())
-
-		# Dump input vectors
-		path = './dump/' + checkpoint_name + '-input'
-		with open(path,'rb') as inputfile:
-			inputs = np.load(inputfile)
-			dump_path = './pac_dump/input'
-			with open (dump_path,'wb') as dump_file:
-				for i in range(len(inputs)):
-					val = 0
-					for j in range(num_lanes):
-						temp = inputs[i][j].item() 
-						if((((temp >> (precision_in-1)) & 0x1) == 0x1)):
-							temp -= int(np.power(2, precision_in))
-						temp &= mask 
-						val +=  (temp << (precision_in * j))
-					val_str = hex(val)[2:].zfill(int(num_lanes * precision_in / 4))
-					dump_file.write(val_str.encode())
-					dump_file.write('\n'.encode())
-
-		# Dump instructions
-		self.set_inst_params()
-		path = './dump/' + checkpoint_name + '-inst'
-		with open(path,'rb') as instfile:
-			insts = np.load(instfile, allow_pickle=True, fix_imports=True, encoding='latin1')
-			dump_path = './pac_dump/top_sched'
-			with open (dump_path,'wb') as dump_file:
-				for i, inst in enumerate(insts):
-					self.set_inst(inst)
-					inst_str = bin(self.minst_chain & int(pow(2, self.MICW)-1))[2:].zfill(self.MICW)
-					dump_file.write(inst_str.encode())
-					dump_file.write('\n'.encode())
-				inst_str = '1'*self.MICW
-				dump_file.write(inst_str.encode())
-				dump_file.write('\n'.encode())
-
-		# Dump output vectors
-		mask = int(np.power(2, precision_out)) - 1
-		path = './dump/' + checkpoint_name + '-output'
-		with open(path,'rb') as outputfile:
-			outputs = np.load(outputfile)
-			dump_path = './pac_dump/output'
-			with open (dump_path,'wb') as dump_file:
-				for i in range(len(outputs)):
-					val = 0	            
-					for j in range(num_lanes):
-						temp = outputs[i][j].item()
-						temp &= mask
-						val += (temp << (precision_out * j))
-					val_str = hex(val)[2:].zfill(int(num_lanes * precision_out / 4))
-					dump_file.write(val_str.encode())
-					dump_file.write('\n'.encode())
-
-	def launch_perf_sim(self, num_tiles, num_sectors, num_dpes, num_lanes, num_threads, vrf_depth, mrf_depth, perf_simulation, is_first, verbose = False):
-		'''num_tiles = len(self.fsim.mvu_mrfs)
-		num_dpes = len(self.fsim.mvu_mrfs[0])
-		mrf_depth = len(self.fsim.mvu_mrfs[0][0])
-		num_lanes = len(self.fsim.mvu_mrfs[0][0][0])
-		vrf_depth = self.arch_params['vrf_depth']'''
-		max_tag = self.arch_params['max_tag']
-
-		if (is_first):
-			dump_path = '../modules/params.hpp'
-			with open(dump_path, 'w') as defines:
-				defines.write('#pragma once\n\n')
-				defines.write('// Key NPU Architecture Parameters\n')
-				defines.write('#define CORES 2\n')
-				defines.write('#define TILES ' + str(num_tiles) + '\n')
-				defines.write('#define SECTORS ' + str(num_sectors) + '\n')
-				defines.write('#define DPES_PER_SECTOR ' + str(int(num_dpes/num_sectors)) + '\n')
-				defines.write('#define LANES ' + str(num_lanes) + '\n')
-				defines.write('#define THREADS ' + str(num_threads) + '\n')
-				defines.write('#define VRF_DEPTH ' + str(vrf_depth) + '\n')
-				defines.write('#define MRF_DEPTH ' + str(mrf_depth) + '\n')
-				defines.write('#define DATA_FIFO_DEPTH 512\n')
-				defines.write('#define INST_MEMORY_DEPTH 512\n')
-				defines.write('#define MOP_FIFO_DEPTH 512\n')
-				defines.write('#define MOP_FIFO_ALMOST_FULL_DEPTH (MOP_FIFO_DEPTH - 10)\n')
-				defines.write('#define UOP_FIFO_DEPTH 512\n')
-				defines.write('#define UOP_FIFO_ALMOST_FULL_DEPTH (UOP_FIFO_DEPTH - 10)\n')
-				defines.write('#define NPU_CLOCK_PERIOD FABRIC_PERIOD\n')
-				defines.write('#define MAX_TAG ' + str(max_tag) + '\n')
-				defines.write('#define TB_LANES 10\n')
-				defines.write('#define TB_NUM_DOTS 3\n\n')
-				defines.write('// Precisions Definition\n')
-				defines.write('#define LOW_PRECISION 8\n')
-				defines.write('#define HIGH_PRECISION 32\n')
-				defines.write('typedef sc_int<LOW_PRECISION> tb_input_precision;\n')
-				defines.write('typedef sc_int<HIGH_PRECISION> tb_output_precision;\n\n')
-				defines.write('// Latency Parameters\n')
-				defines.write('#define RF_RD_LATENCY 2\n')
-				defines.write('#define RF_WR_LATENCY 1\n')
-				defines.write('#define TB_LATENCY 3\n')
-				defines.write('#define SECTOR_DISTRIBUTION_PIPELINE 2\n')
-				defines.write('#define SECTOR_REDUCTION_PIPELINE 3\n')
-				defines.write('#define SECTOR_REDUCTION_TO_ACCUM_PIPELINE 2\n')
-				defines.write('#define SECTOR_ACCUM_TO_OFIFO_PIPELINE 2\n')
-				defines.write('#define EVRF_INST_TO_VRF 4\n')
-				defines.write('#define EVRF_RF_TO_OFIFO_PIPELINE 2\n')
-				defines.write('#define MFU_INST_TO_VRFS_PIPLINE 2\n')
-				defines.write('#define MFU_VRFS_TO_COMPUTE_PIPELINE 9\n')
-				defines.write('#define MFU_ACT_LATENCY 3\n')
-				defines.write('#define MFU_ADD_LATENCY 1\n')
-				defines.write('#define MFU_MUL_LATENCY 6\n')
-				defines.write('#define MFU_COMPUTE_TO_OFIFO_PIPELINE 2\n')
-				defines.write('#define LD_PIPELINE 8\n\n')
-				defines.write('// Signal Width Parameters\n')
-				defines.write('#define VRF_ADDRW ' + str(int(math.ceil(math.log2(vrf_depth)))) + '\n')
-				defines.write('#define MRF_ADDRW ' + str(int(math.ceil(math.log2(mrf_depth)))) + '\n')
-				defines.write('#define NSIZEW 11\n')
-				defines.write('#define VRFIDW 2\n')
-				defines.write('#define MRFIDW ' + str(int(math.ceil(math.log2(num_tiles * num_dpes)))) + '\n')
-				defines.write('#define ACCUMIDW 5\n')
-				defines.write('#define TAGW ' + str(int(math.ceil(math.log2(max_tag))) + 1) + '\n')
-				defines.write('#define BATCH_COUNTW 2\n')
-				defines.write('#define BLOCK_COUNTW 4\n')
-				defines.write('#define ACCUM_OPW 2\n')
-				defines.write('#define BLOCK_WB_SELW 8\n')
-				defines.write('#define VRF_WB_SELW ' + str(int(math.ceil(math.log2(num_tiles))) + 1) + '\n\n')
-				defines.write('// Derived Parameters (do not change unless you really know why)\n')
-				defines.write('#define DPE_NUM_TBS ((int)ceil(LANES * 1.0 / TB_LANES) + 1)\n')
-				defines.write('#define DPE_USE_SEL_PIPELINE ((TB_LATENCY - 1) * (DPE_NUM_TBS - 2))\n')
-				defines.write('#define DPE_VALID_A_PIPELINE (TB_LATENCY + (DPE_NUM_TBS - 2) * (TB_LATENCY - 1))\n')
-				defines.write('#define DPE_VALID_B_PIPELINE (DPE_NUM_TBS * TB_NUM_DOTS)\n')
-				defines.write('#define DPE_SHIFT_SEL_PIPELINE (DPE_NUM_TBS * TB_NUM_DOTS)\n')
-				defines.write('#define DPE_VECTOR_A_PIPELINE ((DPE_NUM_TBS - 2) * (TB_LATENCY - 1))\n')
-				defines.write('#define MRF_ADDR_PIPELINE (2 * (DPE_NUM_TBS - 1))\n')
-				defines.write('#define SECTOR_MRF_ADDR_PIPELINE (SECTOR_DISTRIBUTION_PIPELINE + (DPE_NUM_TBS * TB_NUM_DOTS) - 1)\n')
-				defines.write('#define SECTOR_MRF_DATA_PIPELINE RF_RD_LATENCY\n')
-				defines.write('#define SECTOR_VRF_DATA_PIPELINE SECTOR_DISTRIBUTION_PIPELINE\n')
-				defines.write('#define SECTOR_INST_TO_DPES_PIPELINE (SECTOR_MRF_ADDR_PIPELINE + SECTOR_MRF_DATA_PIPELINE)\n')
-				defines.write('#define SECTOR_DPES_PIPELINE DPE_VALID_A_PIPELINE\n')
-				defines.write('#define SECTOR_INST_TO_ACCUM_PIPELINE (SECTOR_INST_TO_DPES_PIPELINE + SECTOR_DPES_PIPELINE + SECTOR_REDUCTION_PIPELINE + SECTOR_REDUCTION_TO_ACCUM_PIPELINE)\n')
-				defines.write('#define ACCUM_PIPELINE (RF_RD_LATENCY + 1)\n')
-				defines.write('#define SECTOR_INST_PIPELINE (SECTOR_INST_TO_DPES_PIPELINE + SECTOR_DPES_PIPELINE + SECTOR_REDUCTION_PIPELINE + SECTOR_REDUCTION_TO_ACCUM_PIPELINE + ACCUM_PIPELINE + SECTOR_ACCUM_TO_OFIFO_PIPELINE)\n')
-				defines.write('#define EVRF_INST_PIPELINE (EVRF_INST_TO_VRF + RF_RD_LATENCY + EVRF_RF_TO_OFIFO_PIPELINE)\n')
-				defines.write('#define EVRF_PIPELINE (EVRF_INST_TO_VRF + RF_RD_LATENCY + EVRF_RF_TO_OFIFO_PIPELINE)\n')
-				defines.write('#define MFU_COMPUTE_PIPELINE (MFU_ACT_LATENCY + MFU_ADD_LATENCY + MFU_MUL_LATENCY)\n')
-				defines.write('#define MFU_INST_PIPELINE (MFU_INST_TO_VRFS_PIPLINE + RF_RD_LATENCY + MFU_VRFS_TO_COMPUTE_PIPELINE)\n')
-				defines.write('#define MFU_INPUT_TO_COMPUTE_PIPELINE (MFU_INST_TO_VRFS_PIPLINE + RF_RD_LATENCY + MFU_VRFS_TO_COMPUTE_PIPELINE)\n')
-				defines.write('#define MFU_PIPELINE (MFU_INPUT_TO_COMPUTE_PIPELINE + MFU_COMPUTE_PIPELINE + MFU_COMPUTE_TO_OFIFO_PIPELINE)\n')
-				defines.write('#define NUM_PIPELINE_BLOCKS 5\n')
-				defines.write('#define NUM_VRFS (TILES + 5)\n')
-				defines.write('#define NUM_ACCUM ((DPE_NUM_TBS - 1) * TB_NUM_DOTS)\n')
-				defines.write('#define NAME_LENGTH 35\n\n')
-				defines.write('// AXI-S Parameters\n')
-				defines.write('#define FEEDFORWARD_DATA_WIDTH (CORES * DPES_PER_SECTOR * HIGH_PRECISION)\n')
-				defines.write('#define WIDE_WRITEBACK_WIDTH (CORES * LANES * LOW_PRECISION)\n')
-				defines.write('#define WIDE_WRITEBACK_BV_WIDTH ((CORES * LANES * LOW_PRECISION) + VRF_WB_SELW + VRF_ADDRW + 1)\n')
-				defines.write('#define NARROW_WRITEBACK_WIDTH (CORES * DPES_PER_SECTOR * HIGH_PRECISION)\n')
-				defines.write('#define NARROW_WRITEBACK_BV_WIDTH ((CORES * DPES_PER_SECTOR * HIGH_PRECISION) + VRF_WB_SELW + BLOCK_WB_SELW + VRF_ADDRW + 1)\n')
-				defines.write('#define AXIS_ADAPTER_BUFFER_CAPACITY 2\n')
-				defines.write('#define TDATA(bv) (bv.range(AXIS_MAX_DATAW - 1, 0))\n')
-				defines.write('#define TSTRB(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW - 1, AXIS_MAX_DATAW))\n')
-				defines.write('#define TKEEP(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW - 1, AXIS_MAX_DATAW + AXIS_STRBW))\n')
-				defines.write('#define TUSER(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW))\n')
-				defines.write('#define TUSER_FLAG(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW))\n')
-				defines.write('#define TUSER_ADDR(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + VRF_ADDRW, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + 1))\n')
-				defines.write('#define TUSER_VRFID(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + VRF_ADDRW + 1))\n')
-				defines.write('#define TDEST(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW))\n')
-				defines.write('#define TID(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW + AXIS_IDW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW))\n')
-				defines.write('#define TLAST(bv) (bv.range(AXIS_TRANSACTION_WIDTH - 1, AXIS_TRANSACTION_WIDTH - 1))\n\n')
-				defines.write('// Trace Probe IDs\n')
-				defines.write('#define UOP_ISSUE_TRACE 0\n')
-				defines.write('#define UOP_RETIRE_TRACE 1\n')
-				defines.write('#define FIRST_UOP_ISSUE_TRACE 2\n')
-				defines.write('#define LAST_UOP_RETIRE_TRACE 3\n')
-				defines.write('#define TAG_UPDATE_TRACE 4\n\n')
-
-		for t in range(num_tiles):
-			for d in range(num_dpes):
-				dump_path = '../register_files/mrf_tile_'+str(t)+'_dpe_'+str(d)+'.txt'
-				with open(dump_path, 'w') as dump_file:
-					for m in range(self.mrf_filled_depth):
-						for l in range(num_lanes):
-							dump_file.write(str(self.fsim.mvu_mrfs[t][d][m][l]) + ' ')
-						dump_file.write('\n')
-
-		dump_path = '../register_files/inputs.txt'
-		num_inputs = len(self.ibuf_q)
-		with open(dump_path, 'w') as dump_file:
-			for i in range(num_inputs):
-				for l in range(num_lanes):
-					dump_file.write(str(self.ibuf_q[i][l]) + ' ')
-				dump_file.write('\n')
-
-		dump_path = '../register_files/outputs.txt'
-		num_outputs = len(self.fsim.obuf_q)
-		#mask = int(np.power(2, precision_out)) - 1
-		with open(dump_path, 'w') as dump_file:
-			for i in range(num_outputs):
-				for l in range(num_lanes):
-					dump_file.write(str(self.fsim.obuf_q[i][l]) + ' ')
-				dump_file.write('\n')
-	            
-		dump_path = '../register_files/instructions.txt'
-		num_inst = len(self.inst_q)
-		with open(dump_path, 'w') as dump_file:
-			for i in range(num_inst):
-				inst = self.inst_q[i]
-				
-				# MVU macro-op
-				if(inst.mvu_op_type == 'matvec'):
-					dump_file.write('1 ')
-				else:
-					dump_file.write('0 ')
-				dump_file.write(str(inst.mvu_vrf_rd_base[0]) + ' ')
-				dump_file.write(str(inst.mvu_vrf_rd_base[1]) + ' ')
-				dump_file.write(str(inst.mvu_vrf_rd_base[2]) + ' ')
-				dump_file.write(str(inst.mvu_vrf_rd_sz) + ' ')
-				dump_file.write(str(inst.mvu_mrf_rd_base) + ' ')
-				dump_file.write(str(inst.mvu_mrf_rd_sz) + ' ')
-				dump_file.write(str(inst.mvu_words_per_row) + ' ')
-				dump_file.write(str(inst.mvu_tag) + '\n')
-				
-				# eVRF macro-op
-				if(inst.extvrf_op_type == 'move'):
-					dump_file.write('1 0 ')
-				elif(inst.extvrf_op_type == 'extvrf'):
-					dump_file.write('1 1 ')
-				else:
-					dump_file.write('0 0 ')
-
-				for i in range(inst.batch):
-					dump_file.write(str(inst.extvrf_rd_base[i]) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-
-				dump_file.write(str(inst.extvrf_rd_sz) + ' ')
-				dump_file.write(str(inst.batch) + ' ')
-				dump_file.write(str(inst.extvrf_tag) + '\n')
-				
-				# MFU0 macro-op
-				if((inst.mfu0_act_op_type == 'nop') and (inst.mfu0_act_op_type == 'nop') \
-				    and (inst.mfu0_act_op_type == 'nop')):
-					dump_file.write('0 ')
-				else:
-					dump_file.write('1 ')
-				dump_file.write(str(inst.mfu0_vrf_rd_size) + ' ')
-				if(inst.mfu0_act_op_type == 'tanh'):
-					dump_file.write('1 ')
-				elif(inst.mfu0_act_op_type == 'sig'):
-					dump_file.write('2 ')
-				elif(inst.mfu0_act_op_type == 'relu'):
-					dump_file.write('3 ')
-				else:
-					dump_file.write('0 ')
-				if(inst.mfu0_add_op_type == 'add'):
-					dump_file.write('1 ')
-				elif(inst.mfu0_add_op_type == 'sub_a_b'):
-					dump_file.write('2 ')
-				elif(inst.mfu0_add_op_type == 'sub_b_a'):
-					dump_file.write('3 ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.mfu0_vrf0_rd_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-				#dump_file.write(str(inst.mfu0_vrf0_rd_base) + ' ')
-
-				if(inst.mfu0_mul_op_type == 'mul'):
-					dump_file.write('1 ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.mfu0_vrf1_rd_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-				#dump_file.write(str(inst.mfu0_vrf1_rd_base) + ' ')
-
-				dump_file.write(str(inst.batch) + ' ')
-				dump_file.write(str(inst.mfu0_tag) + '\n')
-				
-				# MFU1 macro-op
-				if((inst.mfu1_act_op_type == 'nop') and (inst.mfu1_act_op_type == 'nop') \
-				    and (inst.mfu1_act_op_type == 'nop')):
-					dump_file.write('0 ')
-				else:
-					dump_file.write('1 ')
-				dump_file.write(str(inst.mfu1_vrf_rd_size) + ' ')
-				if(inst.mfu1_act_op_type == 'tanh'):
-					dump_file.write('1 ')
-				elif(inst.mfu1_act_op_type == 'sig'):
-					dump_file.write('2 ')
-				elif(inst.mfu1_act_op_type == 'relu'):
-					dump_file.write('3 ')
-				else:
-					dump_file.write('0 ')
-				if(inst.mfu1_add_op_type == 'add'):
-					dump_file.write('1 ')
-				elif(inst.mfu1_add_op_type == 'sub_a_b'):
-					dump_file.write('2 ')
-				elif(inst.mfu1_add_op_type == 'sub_b_a'):
-					dump_file.write('3 ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.mfu1_vrf0_rd_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-				#dump_file.write(str(inst.mfu1_vrf0_rd_base) + ' ')
-
-				if(inst.mfu1_mul_op_type == 'mul'):
-					dump_file.write('1 ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.mfu1_vrf1_rd_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-				#dump_file.write(str(inst.mfu1_vrf1_rd_base) + ' ')
-
-				dump_file.write(str(inst.batch) + ' ')
-				dump_file.write(str(inst.mfu1_tag) + '\n')
-				
-				# LD macro-op
-				if(inst.loader_src == 'wb'):
-					dump_file.write('1 1 ')
-				elif(inst.loader_src == 'in'):
-					dump_file.write('1 0 ')
-				elif(inst.loader_src == 'flush'):
-					dump_file.write('1 1 ')
-				else:
-					dump_file.write('0 0 ')
-				dump_file.write(str(inst.vrf_id0_wr_size) + ' ')
-				## DST0
-				if((inst.vrf_id0_wr_size == 0) or (inst.loader_src == 'flush')):
-					dump_file.write('0 ')
-				else:
-					dump_file.write('1 ')
-				if(inst.loader_src == 'flush'):
-					dump_file.write('0 ')
-				elif(inst.vrf_id0_op.startswith('mvu')):
-					vrf_id = re.search('mvu(.*)vrf', inst.vrf_id0_op)
-					dump_file.write(vrf_id.group(1)[:-1] + ' ')
-				elif(inst.vrf_id0_op == 'extvrf'):
-					dump_file.write(str(num_tiles) + ' ')
-				elif(inst.vrf_id0_op == 'mfu0.vrf0'):
-					dump_file.write(str(num_tiles+1) + ' ')
-				elif(inst.vrf_id0_op == 'mfu0.vrf1'):
-					dump_file.write(str(num_tiles+2) + ' ')
-				elif(inst.vrf_id0_op == 'mfu1.vrf0'):
-					dump_file.write(str(num_tiles+3) + ' ')
-				elif(inst.vrf_id0_op == 'mfu1.vrf1'):
-					dump_file.write(str(num_tiles+4) + ' ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.vrf_id0_wr_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-
-				## DST1
-				if((inst.vrf_id1_wr_size == 0) or (inst.loader_src == 'flush')):
-					dump_file.write('0 ')
-				else:
-					dump_file.write('1 ')
-				if(inst.loader_src == 'flush'):
-					dump_file.write('0 ')
-				elif(inst.vrf_id1_op.startswith('mvu')):
-					vrf_id = re.search('mvu(.*)vrf', inst.vrf_id1_op)
-					dump_file.write(vrf_id.group(1)[:-1] + ' ')
-				elif(inst.vrf_id1_op == 'extvrf'):
-					dump_file.write(str(num_tiles) + ' ')
-				elif(inst.vrf_id1_op == 'mfu0.vrf0'):
-					dump_file.write(str(num_tiles+1) + ' ')
-				elif(inst.vrf_id1_op == 'mfu0.vrf1'):
-					dump_file.write(str(num_tiles+2) + ' ')
-				elif(inst.vrf_id1_op == 'mfu1.vrf0'):
-					dump_file.write(str(num_tiles+3) + ' ')
-				elif(inst.vrf_id1_op == 'mfu1.vrf1'):
-					dump_file.write(str(num_tiles+4) + ' ')
-				else:
-					dump_file.write('0 ')
-
-				for addr in inst.vrf_id1_wr_base:
-					dump_file.write(str(addr) + ' ')
-				for i in range(3-inst.batch):
-					dump_file.write('0 ')
-
-				dump_file.write(str(inst.batch) + ' ')
-				if(inst.write_to_obuf == True):
-					dump_file.write('1 \n')
-				else:
-					dump_file.write('0 \n')
-	           
-		dump_path = '../gen_done'
-		with open(dump_path, 'w') as dump_file:
-			dump_file.write('1')
-		
-		if (perf_simulation):
-			subprocess.call('./perf_sim.sh ' + str(is_first), shell=True)	
-
+	def write_perf_record(self, record_path, results):
+		record = {
+			'workload'		: os.path.splitext(os.path.basename(sys.argv[0]))[0],
+			'checkpoint'	: self.flow_opts['checkpoint_name'],
+			'timestamp'		: time.strftime('%Y-%m-%dT%H:%M:%S'),
+			'arch_params'	: self.arch_params,
+			'freq'			: self.flow_opts['freq'],
+			'opt'			: self.flow_opts['opt']
+		}
+		record.update(results)
+		with open(record_path, 'w') as record_file:
+			json.dump(record, record_file, indent=2)
 
 	def run_flow(self):
-		self.end_npu_program()
+		# In case of a compilation cache hit, the instruction queue is not built (the cached artifacts are used instead)
+		cached = (self.cache_hit is not None)
+		if(not cached):
+			self.end_npu_program()
 
 		print('\n')
 		if self.unsupported_layers:
@@ -1996,6 +1659,7 @@ class npu:
 		verbose = self.flow_opts['verbose']
 		freq = self.flow_opts['freq']
 		mif_gen = self.flow_opts['mif_gen']
+		fast = self.flow_opts['fast']
 
 		# Parameter checks
 		if (num_tiles <= 0 or num_dpes <= 0 or num_lanes <= 0):
@@ -2022,226 +1686,126 @@ class npu:
 
 		# Step 1: Compile NPU program written by the user in npu_program() function
 		print(bcolors.HEADER + '=== Compiling NPU Program ===' + bcolors.RESET)
-		print(bcolors.OKGREEN + 'NPU program compiled successfully! It contains ' + str(len(self.inst_q)) + ' NPU instruction(s)' + bcolors.RESET)
+		if(cached):
+			inst_count = self.cache_hit['inst_count']
+			print(bcolors.OKGREEN + 'NPU program restored from cache (' + self.cache_key[:12] + ')! It contains ' + str(inst_count) + ' NPU instruction(s)' + bcolors.RESET)
+		else:
+			inst_count = len(self.inst_q)
+			print(bcolors.OKGREEN + 'NPU program compiled successfully! It contains ' + str(inst_count) + ' NPU instruction(s)' + bcolors.RESET)
+			if(self.flow_opts['opt']):
+				self.optimize_npu_program()
+				inst_count = len(self.inst_q)
+			self.estimate_npu_performance()
+			if(verbose):
+				self.print_mem_stats()
+		if(self.batch_plan is not None):
+			self.batch_plan.report(self.arch_params, self.flow_opts['freq'], self.perf_estimate)
+
+		# In estimation mode, the flow stops after compilation (no functional simulation or artifact generation)
+		if(self.flow_opts['estimate_only']):
+			if(self.flow_opts['perf_record'] is not None and self.perf_estimate is not None):
+				self.write_perf_record(self.flow_opts['perf_record'], {
+					'ops'			: self.ops * num_threads,
+					'est_cycles'	: self.perf_estimate['cycles'],
+					'est_tops'		: self.perf_estimate['tops']
+				})
+			return True
 
 		# -------------------------------------------------------------------------
 
-		# Step 2: Perform functional simulation using FSim
+		# Step 2: Perform functional simulation using FSim (skipped in fast mode, checkpoints are generated from the compiler state)
 		print(bcolors.HEADER + '=== Performing Functional Simulation ===' + bcolors.RESET)
-		self.fsim_npu_program(verbose)
-		sys.stdout.write('Generating FSim checkpoints ... ')
-		sys.stdout.flush()
+		fsim_passed = True
+		if(cached):
+			print(bcolors.WARNING + 'Skipping functional simulation (cached program)' + bcolors.RESET)
+		elif(fast):
+			print(bcolors.WARNING + 'Skipping functional simulation (-fast)' + bcolors.RESET)
+		else:
+			fsim_passed = self.fsim_npu_program(verbose)
 		if os.path.isdir('./dump'):
 			subprocess.call('rm -r ./dump', shell=True)
-		checkpoints_count = self.generate_fsim_checkpoints(checkpoint_name, verbose)
-		print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-		# -------------------------------------------------------------------------
-
-		# Step 3: Generate PAC C header file
-
-		# Use the checkpoints generated by FSim (python data structures) to generate binary low-level NPU checkpoints
-		if(pac_gen):
-			print(bcolors.HEADER + '=== Generating PAC Header File ===' + bcolors.RESET)
-			thread1 = threading.Thread(target = self.dump_binary_files, args = (checkpoint_name, num_tiles, num_dpes, num_lanes))
-			thread1.start()
-
-			sys.stdout.write('Dumping MRF data ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/mvu-mrf' + str(num_tiles * num_dpes - 1)):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Dumping input vectors ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/input'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Dumping instructions ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/input'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Dumping output vectors ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/input'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			thread1.join()
-
-			# Transform the binary low-level NPU checkpoints into the PAC header file format
-			sys.stdout.write('Generating C header file ... ')
-			sys.stdout.flush()
-			transform_list_to_mif(num_lanes)
-			generate_header_file(checkpoint_name)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			# After generating C header file, clean all the checkpoints created along the way
-			subprocess.call('rm ./pac_dump/mvu-mrf* ./pac_dump/input ./pac_dump/output ./pac_dump/top_sched.mif', shell=True)
+		if os.path.isfile('../gen_done'):
+			subprocess.call('rm ../gen_done', shell=True)
+		if os.path.isfile('../sim_done'):
+			subprocess.call('rm ../sim_done', shell=True)
 
 		# -------------------------------------------------------------------------
-		# Generate MIF files
-		if(mif_gen):
-			print(bcolors.HEADER + '=== Generating MIF Files ===' + bcolors.RESET)
-			thread1 = threading.Thread(target = self.dump_binary_files, args = (checkpoint_name, num_tiles, num_dpes, num_lanes))
-			thread1.start()
-
-			sys.stdout.write('Dumping MRF data ... ')
-			sys.stdout.flush()
-			if(num_tiles * num_dpes - 1 < 10):
-				mrf_mif_name = './pac_dump/mvu-mrf00'
-			elif(num_tiles * num_dpes - 1 < 100):
-				mrf_mif_name = './pac_dump/mvu-mrf0'
-			else:
-				mrf_mif_name = './pac_dump/mvu-mrf'
-			while not os.path.isfile(mrf_mif_name + str(num_tiles * num_dpes - 1)):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Dumping input vectors ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/input'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Dumping instructions ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/top_sched'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
 
-			sys.stdout.write('Dumping output vectors ... ')
+		# Step 3: Generate the flow artifacts (FSim checkpoints, PAC header file, MIF files, Verilog header file and
+		# performance simulation files). Independent steps run concurrently in a process pool. The RTL and performance
+		# simulations (steps 4 and 5) are steps of the same pipeline that start as soon as the files they use are generated.
+		print(bcolors.HEADER + '=== Generating Flow Artifacts ===' + bcolors.RESET)
+		pipeline = flow_pipeline()
+		sim_deps = {'rtl': [], 'perf': []}
+		if(cached):
+			sys.stdout.write('Restoring cached artifacts ... ')
 			sys.stdout.flush()
-			while not os.path.isfile('./pac_dump/output'):
-				time.sleep(0.2)
+			self.restore_cache()
 			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			thread1.join()
-
-			# Transform the binary low-level NPU checkpoints into MIF files
-			sys.stdout.write('Converting checkpoints to MIFs ... ')
-			sys.stdout.flush()
-			transform_list_to_mif(num_lanes)
-			subprocess.call('rm ./pac_dump/input ./pac_dump/output', shell=True)
-			if(os.path.isdir('../rtl/mif_files') == False):
-				subprocess.call('mkdir ../rtl/mif_files', shell=True)
-			subprocess.call('mv ./pac_dump/*.mif ../rtl/mif_files/', shell=True)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			self.write_verilog_header_file(num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, self.arch_params['max_tag'], self.mrf_filled_depth)
+		else:
+			sim_deps = self.add_flow_artifact_steps(pipeline)
+		if(rtl_simulation == 1):
+			subprocess.call('rm -f ../rtl/init_done ../rtl/mrf_done ../rtl/input_done ../rtl/sim_done', shell=True)
+			pipeline.add_step('rtl_sim', run_rtl_sim, (), deps=sim_deps['rtl'], msg='Running RTL simulation')
+		if(generate_perf_sim_files == 1 and perf_simulation == 1):
+			pipeline.add_step('perf_sim', run_perf_sim, (is_first_perf_sim,), deps=sim_deps['perf'], msg='Running SystemC performance simulation')
+		results = pipeline.run()
+		if(verbose):
+			print('Flow step wall times (sec): ' + str({name: round(t, 3) for name, t in pipeline.step_times.items()}))
+		if(not cached and self.flow_opts['cache'] and self.cache_key is not None and fsim_passed):
+			self.store_cache(inst_count)
 
 		# -------------------------------------------------------------------------
-		# Step 4: Perform RTL simulation
+		# Step 4: Report the RTL simulation results
 		if(rtl_simulation == 1):
-			if os.path.isfile('../rtl/init_done'):
-				subprocess.call('rm ../rtl/init_done', shell=True)
-			if os.path.isfile('../rtl/mrf_done'):
-				subprocess.call('rm ../rtl/mrf_done', shell=True)
-			if os.path.isfile('../rtl/input_done'):
-				subprocess.call('rm ../rtl/input_done', shell=True)
-			if os.path.isfile('../rtl/sim_done'):
-				subprocess.call('rm ../rtl/sim_done', shell=True)
-
 			print(bcolors.HEADER + '=== Launching RTL Simulation ===' + bcolors.RESET)
-
-			start_time = time.time()
-
-			thread1 = threading.Thread(target = self.launch_rtl_sim, args = (checkpoint_name, num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, self.arch_params['max_tag'], self.mrf_filled_depth))
-			thread1.start()
-
-			sys.stdout.write('Setting up simulation ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('../rtl/init_done'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Loading MRFs ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('../rtl/mrf_done'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
-			sys.stdout.write('Loading inputs ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('../rtl/input_done'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
 			sys.stdout.write('Running simulation ... ')
 			sys.stdout.flush()
-			while not os.path.isfile('../rtl/sim_done'):
-				time.sleep(0.2)
-
-			end_time = time.time()
-			time.sleep(2)
-			
-			file = open('../rtl/sim_done', 'r')
-			lines = file.readlines()
-			if (lines[0] == 'PASS\n'):
+			lines = results['rtl_sim']
+			if (lines is not None and lines[0] == 'PASS\n'):
 				runtime_ms = int(lines[1]) * 1.0 / (freq*1000)
 				print(bcolors.OKGREEN + 'PASSED (' + lines[1] + ' cycles - ' + str(round(runtime_ms, 5)) + ' ms - ' + str(round(self.ops/(runtime_ms/1000)/1000000000000, 2)) + ' TOPS)' + bcolors.RESET)
-				print(bcolors.OKBLUE + 'RTL simulation took ' + str(round(end_time-start_time, 3)) + ' sec' + bcolors.RESET)
+				print(bcolors.OKBLUE + 'RTL simulation took ' + str(round(pipeline.step_times['rtl_sim'], 3)) + ' sec' + bcolors.RESET)
 			else:
 				print(bcolors.FAIL + 'FAILED' + bcolors.RESET)
 
-			thread1.join()
-
 		# -------------------------------------------------------------------------
 
-		# Step 5: Perform Performance simulation
+		# Step 5: Report the performance simulation results (simulation files are generated in Step 3)
 		if(generate_perf_sim_files == 1):
-			if os.path.isfile('../gen_done'):
-				subprocess.call('rm ../gen_done', shell=True)
-			if os.path.isfile('../sim_done'):
-				subprocess.call('rm ../sim_done', shell=True)
-
 			print(bcolors.HEADER + '=== Launching SystemC Performance Simulation ===' + bcolors.RESET)
 
-			thread1 = threading.Thread(target = self.launch_perf_sim, args = (num_tiles, num_sectors, num_dpes, num_lanes, num_threads, vrf_depth, mrf_depth, perf_simulation, is_first_perf_sim))
-			thread1.start()
-
-			sys.stdout.write('Generating simulation files ... ')
-			sys.stdout.flush()
-			while not os.path.isfile('../gen_done'):
-				time.sleep(0.2)
-			print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)
-
 			if (perf_simulation == 1):
-				'''if (is_first_perf_sim == 1):
-					sys.stdout.write('Building simulator ... ')
-					sys.stdout.flush()
-					while not os.path.isfile('../build/npu'):
-						time.sleep(0.2)
-					print(bcolors.OKGREEN + 'DONE' + bcolors.RESET)'''
-
 				sys.stdout.write('Running simulation ... ')
 				sys.stdout.flush()
-				while not os.path.isfile('../sim_done'):
-					time.sleep(0.2)
-				time.sleep(2)
-
-				file = open('../sim_done', 'r')
-				lines = file.readlines()
-				if (lines[0] == 'PASS\n'):
-					runtime_ms = int(lines[1]) * 1.0 / (freq*1000)
-					print(bcolors.OKGREEN + 'PASSED (' + str(int(lines[1])) + ' cycles - ' + str(round(runtime_ms, 5)) + \
-						' ms - ' + str(round(self.ops * num_threads/(runtime_ms/1000)/1000000000000, 2)) + ' TOPS)' + bcolors.RESET)
+				lines, runtime = results['perf_sim']
+				if (lines is None):
+					print(bcolors.FAIL + 'FAILED (no simulation results)' + bcolors.RESET)
 				else:
-					print(bcolors.FAIL + 'FAILED' + bcolors.RESET)        
-				file.close()
-
-				time.sleep(2)
-				file = open('../sim.log', 'r')
-				lines = file.readlines()
-				runtime = lines[-3]
-				runtime = runtime.split()[1]
-				print(bcolors.OKBLUE + 'Simulation took ' + runtime + bcolors.RESET)
-				file.close()
-
-			thread1.join()
+					sim_passed = (lines[0] == 'PASS\n')
+					cycles = int(lines[1])
+					runtime_ms = cycles * 1.0 / (freq*1000)
+					tops = 0
+					if (sim_passed):
+						tops = round(self.ops * num_threads/(runtime_ms/1000)/1000000000000, 2)
+						print(bcolors.OKGREEN + 'PASSED (' + str(cycles) + ' cycles - ' + str(round(runtime_ms, 5)) + \
+							' ms - ' + str(tops) + ' TOPS)' + bcolors.RESET)
+					else:
+						print(bcolors.FAIL + 'FAILED' + bcolors.RESET)        
+					print(bcolors.OKBLUE + 'Simulation took ' + runtime + bcolors.RESET)
+
+					if (self.flow_opts['perf_record'] is not None):
+						sim_time = parse_time_output(runtime)
+						self.write_perf_record(self.flow_opts['perf_record'], {
+							'passed'		: sim_passed,
+							'cycles'		: cycles,
+							'runtime_ms'	: runtime_ms,
+							'ops'			: self.ops * num_threads,
+							'tops'			: tops,
+							'sim_time'		: sim_time,
+							'sec_per_cycle'	: sim_time / cycles if cycles > 0 else None,
+							'est_cycles'	: self.perf_estimate['cycles'] if self.perf_estimate is not None else None
+						})
 
 		# -------------------------------------------------------------------------
 
@@ -2254,7 +1818,7 @@ class npu:
 				subprocess.call('rm ../../../build/cmake.log', shell=True)
 				subprocess.call('rm ../../../build/make.log', shell=True)
 				subprocess.call('rm ../../../build/sim.log', shell=True)
-			subprocess.call('rm ../register_files/*.txt', shell=True)
+			subprocess.call('rm -f ../register_files/*.txt ../register_files/*.bin', shell=True)
 		if(generate_perf_sim_files == 1):
 			subprocess.call('rm ../gen_done', shell=True)
 		if(rtl_simulation == 1):
@@ -2333,6 +1897,227 @@ class matrix:
 	def info(self):
 		print('Matrix ' + self.name + ' , Size: ' + str(self.dimension_x) + 'x' + str(self.dimension_y) + ' element(s), Mem Space: ' +  self.space_name + ', Base Address: ' + str(self.alloc_addr) + ', Word Count: ' + str(self.word_count))
 
+'''
+The mem_allocator class manages the words of one NPU memory space (e.g. mvu_mrf) using an interval free list:
+- free blocks are indexed by start and end address, so coalescing a freed block with its neighbours is O(1)
+- a max segment tree over addresses (leaf = size of the free block starting at that address) gives the lowest-address
+  free block that fits a request (first-fit) in O(log depth)
+- policy: 'first_fit' (default, same placement as a linear scan from address 0) or 'best_fit'. Best-fit also keeps
+  the free blocks in a list sorted by (size, address): lookups are O(log n) but inserting/removing a block shifts the
+  list, which is O(n) in the number of free blocks
+- zero-size allocations return the lowest free address (or -1 if the space is full) without consuming any words, as
+  the original linear-scan allocator did
+'''
+class mem_allocator:
+	def __init__(self, depth, policy='first_fit'):
+		assert policy in ['first_fit', 'best_fit'], 'Unsupported allocation policy ' + policy
+		self.depth = depth
+		self.policy = policy
+		self.allocated = {}			# start address -> size
+		self.empty_allocs = {}		# start address -> number of outstanding zero-size allocations
+		self.free_blocks = {}		# start address -> size
+		self.free_ends = {}			# end address (exclusive) -> start address
+		self.free_by_size = []		# sorted (size, start address) of free blocks (best-fit only)
+		self.tree_leaves = 1
+		while (self.tree_leaves < depth):
+			self.tree_leaves *= 2
+		self.tree = [0] * (2 * self.tree_leaves)
+		if (depth > 0):
+			self.add_free_block(0, depth)
+
+	def update_tree(self, addr, size):
+		idx = addr + self.tree_leaves
+		self.tree[idx] = size
+		idx = idx // 2
+		while (idx >= 1):
+			self.tree[idx] = max(self.tree[2*idx], self.tree[2*idx+1])
+			idx = idx // 2
+
+	def add_free_block(self, start, size):
+		self.free_blocks[start] = size
+		self.free_ends[start + size] = start
+		if (self.policy == 'best_fit'):
+			bisect.insort(self.free_by_size, (size, start))
+		self.update_tree(start, size)
+
+	def remove_free_block(self, start):
+		size = self.free_blocks.pop(start)
+		del self.free_ends[start + size]
+		if (self.policy == 'best_fit'):
+			del self.free_by_size[bisect.bisect_left(self.free_by_size, (size, start))]
+		self.update_tree(start, 0)
+		return size
+
+	# Lowest-address free block of at least size words, or -1
+	def first_fit(self, size):
+		if (self.tree[1] < size):
+			return -1
+		idx = 1
+		while (idx < self.tree_leaves):
+			if (self.tree[2*idx] >= size):
+				idx = 2 * idx
+			else:
+				idx = 2 * idx + 1
+		return idx - self.tree_leaves
+
+	# Smallest free block of at least size words (lowest address on ties), or -1
+	def best_fit(self, size):
+		idx = bisect.bisect_left(self.free_by_size, (size, -1))
+		if (idx == len(self.free_by_size)):
+			return -1
+		return self.free_by_size[idx][1]
+
+	# Returns the start address of the allocated block or -1 if allocation failed
+	def alloc(self, size):
+		if (size == 0):
+			start = self.first_fit(1)
+			if (start != -1):
+				self.empty_allocs[start] = self.empty_allocs.get(start, 0) + 1
+			return start
+		if (self.policy == 'first_fit'):
+			start = self.first_fit(size)
+		else:
+			start = self.best_fit(size)
+		if (start == -1):
+			return -1
+		block_size = self.remove_free_block(start)
+		if (block_size > size):
+			self.add_free_block(start + size, block_size - size)
+		self.allocated[start] = size
+		return start
+
+	# Frees the block allocated at start address and merges it with adjacent free blocks
+	def free(self, start):
+		if (start in self.empty_allocs):
+			self.empty_allocs[start] -= 1
+			if (self.empty_allocs[start] == 0):
+				del self.empty_allocs[start]
+			return
+		assert start in self.allocated, 'No allocated block at address ' + str(start)
+		size = self.allocated.pop(start)
+		if ((start + size) in self.free_blocks):
+			size += self.remove_free_block(start + size)
+		if (start in self.free_ends):
+			prev_start = self.free_ends[start]
+			size += self.remove_free_block(prev_start)
+			start = prev_start
+		self.add_free_block(start, size)
+
+	# Usage and fragmentation statistics (fragmentation = 1 - largest free block / total free words)
+	def stats(self):
+		free_words = sum(self.free_blocks.values())
+		largest_free_block = self.tree[1]
+		if (free_words == 0):
+			fragmentation = 0.0
+		else:
+			fragmentation = 1.0 - (1.0 * largest_free_block / free_words)
+		return {
+			'depth'					: self.depth,
+			'used'					: self.depth - free_words,
+			'free'					: free_words,
+			'free_blocks'			: len(self.free_blocks),
+			'largest_free_block'	: largest_free_block,
+			'fragmentation'			: fragmentation
+		}
+
+'''
+The flow_pipeline class runs the artifact generation steps of the NPU flow (e.g. checkpoints, PAC/MIF dumps,
+Verilog header, performance simulation files, RTL and performance simulations) as a DAG on a process pool. Each
+step is submitted as soon as all the steps it depends on are done, so independent steps run concurrently. The step
+functions have to be module-level functions (they are sent to the worker processes along with their arguments).
+Completion is reported through future callbacks, and the wall time of each step (measured in the worker process) is
+recorded in step_times.
+- add_step(name, func, args, deps, msg): args is either a tuple or a function that takes the dictionary of
+  results of the completed steps and returns the tuple of arguments (evaluated when the step is submitted). The
+  completion of a step is only reported if it has a message (msg)
+- run(): runs all steps and returns the dictionary of step results
+'''
+class flow_pipeline:
+	def __init__(self, num_workers=None):
+		self.num_workers = num_workers
+		self.steps = {}
+		self.order = []
+		self.results = {}
+		self.step_times = {}
+
+	def add_step(self, name, func, args=(), deps=(), msg=None):
+		assert name not in self.steps, 'Flow step ' + name + ' is already defined'
+		for dep in deps:
+			assert dep in self.steps, 'Flow step ' + name + ' depends on undefined step ' + dep
+		self.steps[name] = {'func': func, 'args': args, 'deps': list(deps), 'msg': msg}
+		self.order.append(name)
+
+	def step_done(self, name, future):
+		msg = self.steps[name]['msg']
+		if (future.cancelled() or future.exception() is not None):
+			print(bcolors.FAIL + (name if msg is None else msg) + ' ... FAILED' + bcolors.RESET)
+			return
+		self.results[name], self.step_times[name] = future.result()
+		if (msg is None):
+			return
+		print(msg + ' ... ' + bcolors.OKGREEN + 'DONE' + bcolors.RESET + \
+			' (' + str(round(self.step_times[name], 3)) + ' sec)')
+		sys.stdout.flush()
+
+	def run(self):
+		pending = list(self.order)
+		running = {}
+		with concurrent.futures.ProcessPoolExecutor(max_workers=self.num_workers) as pool:
+			while (pending or running):
+				# Submit all steps whose dependencies are done (in the order they were added)
+				for name in list(pending):
+					step = self.steps[name]
+					if all([(dep in self.results) for dep in step['deps']]):
+						args = step['args'](self.results) if callable(step['args']) else step['args']
+						future = pool.submit(run_flow_step, step['func'], args)
+						future.add_done_callback(lambda f, name=name: self.step_done(name, f))
+						running[future] = name
+						pending.remove(name)
+				done, _ = concurrent.futures.wait(list(running.keys()), return_when=concurrent.futures.FIRST_COMPLETED)
+				for future in done:
+					name = running.pop(future)
+					# Re-raise the exception of a failed step (remaining steps are not submitted)
+					result, elapsed = future.result()
+					self.results[name], self.step_times[name] = result, elapsed
+		return self.results
+
+# Runs a single flow step in a worker process and returns its result along with its wall time
+def run_flow_step(func, args):
+	start_time = time.time()
+	result = func(*args)
+	return result, time.time() - start_time
+
+# Flow options that do not affect the generated artifacts (not part of the compilation cache key)
+cache_ignored_flow_opts = ['verbose', 'perf_sim', 'freq', 'cache', 'cache_dir', 'perf_record', 'estimate_only']
+
+'''
+Writes the rows of a register file (or the inputs/outputs of the NPU) for the performance simulator. The text format
+has one line per row with space-separated values. The binary format (path.bin) starts with a header of four
+little-endian 32-bit words: the magic number REGISTER_FILE_MAGIC, the number of bytes per value, the number of rows
+and the number of values per row, followed by the values as little-endian signed integers of the given dtype.
+'''
+REGISTER_FILE_MAGIC = 0x4e505246
+int8_strings = np.array([str(v) + ' ' for v in range(-128, 128)], dtype=object)
+
+def write_register_file(path, rows, dtype, binary=False):
+	if(binary):
+		header = np.array([REGISTER_FILE_MAGIC, np.dtype(dtype).itemsize, rows.shape[0], rows.shape[1]], dtype='<u4')
+		with open(path + '.bin', 'wb') as dump_file:
+			dump_file.write(header.tobytes())
+			dump_file.write(rows.astype(np.dtype(dtype).newbyteorder('<')).tobytes())
+	elif(rows.dtype == np.int8):
+		# 8-bit values are converted to text using a lookup table of their strings (with the trailing space)
+		with open(path + '.txt', 'w') as dump_file:
+			dump_file.write(''.join([''.join(row) + '\n' for row in int8_strings[rows.astype(np.int16) + 128].tolist()]))
+	else:
+		with open(path + '.txt', 'w') as dump_file:
+			dump_file.write(''.join([' '.join(map(str, row)) + ' \n' for row in rows.tolist()]))
+
+# Converts the output of the bash time command (e.g. 2m13.520s) to seconds
+def parse_time_output(time_str):
+	minutes, seconds = time_str.split('m')
+	return int(minutes) * 60.0 + float(seconds.rstrip('s'))
+
 # Used for colored printing to the terminal.
 class bcolors:
 	HEADER = '\033[95m'
@@ -2345,133 +2130,829 @@ class bcolors:
 	UNDERLINE = '\033[4m'
 	RESET = "\033[0;0m"
 
-def transform_list_to_mif(num_lanes):
-	dump_dir = './pac_dump/'
-	num_dsps = int(num_lanes / 10)
+'''
+Packs a (depth, lanes) block of integers into a (depth, lanes * precision / 8) byte array holding each row as a single
+big-endian word, where lane 0 occupies the least significant bits. Each lane is truncated to its precision (two's complement).
+'''
+def pack_lanes(block, precision):
+	assert precision in [8, 16, 32], 'Unsupported lane precision'
+	block = np.asarray(block, dtype=np.int64).reshape(len(block), -1)
+	mask = (1 << precision) - 1
+	lanes_msb_first = (block[:, ::-1] & mask).astype('>u' + str(precision // 8))
+	return np.ascontiguousarray(lanes_msb_first).view(np.uint8).reshape(len(block), -1)
+
+'''
+Formats the words produced by pack_lanes as text lines (most significant digit first) in 'bin' or 'hex' radix.
+'''
+def words_to_text(words, radix):
+	if (radix == 'bin'):
+		digits = np.unpackbits(words, axis=1) + ord('0')
+	else:
+		hex_digits = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+		digits = np.empty((words.shape[0], 2 * words.shape[1]), dtype=np.uint8)
+		digits[:, 0::2] = hex_digits[words >> 4]
+		digits[:, 1::2] = hex_digits[words & 0xF]
+	lines = np.empty((digits.shape[0], digits.shape[1] + 1), dtype=np.uint8)
+	lines[:, :-1] = digits
+	lines[:, -1] = ord('\n')
+	return lines.tobytes()
+
+'''
+Adds a column of non-negative integers at a bit offset to a matrix of per-bit counters (one row per value, least
+significant bit first). Call carry_bits once all the values are added to get the bits of the sums.
+'''
+def add_bit_field(bit_counts, values, shift):
+	if (shift >= bit_counts.shape[1] or not values.any()):
+		return
+	num_bits = min(int(values.max()).bit_length(), bit_counts.shape[1] - shift)
+	bit_counts[:, shift:shift+num_bits] += (values[:, None] >> np.arange(num_bits)) & 1
+
+def carry_bits(bit_counts):
+	for col in range(bit_counts.shape[1] - 1):
+		bit_counts[:, col+1] += bit_counts[:, col] >> 1
+		bit_counts[:, col] &= 1
+	bit_counts[:, -1] &= 1
+
+'''
+Converts one pac_dump checkpoint file into MIF file(s) in a single pass. The MIF header is written using the known depth
+of the checkpoint (if given) so that the data lines can be streamed straight from the dump file to the MIF file(s).
+'''
+def convert_dump_to_mif(dump_dir, filename, num_dsps, depth=None):
+	with open(dump_dir+filename, 'r') as dump_file:
+		if (depth is None):
+			lines = dump_file.read().splitlines()
+			depth = len(lines)
+		else:
+			lines = dump_file
+		lines = (line.strip() for line in lines)
+		first_line = next(lines, '')
+		width = len(first_line)
+		all_lines = itertools.chain([first_line], lines) if depth > 0 else iter([])
 
-	for filename in os.listdir(dump_dir):
 		if((filename == 'top_sched') or (filename == 'input')):
-			dump_file = open(dump_dir+filename, 'r')
-			mif_file = open(dump_dir+filename+'.mif', 'w')
-			
-			depth = 0
-			for line in dump_file:
-				depth = depth + 1
-			width = int(len(line.strip()))
-			dump_file.close()
-
-			mif_file.write('DEPTH = ' + str(depth) + ';\n')
-			if((filename == 'input') or (filename == 'output')):
-				mif_file.write('WIDTH = ' + str(width*4) + ';\n')
+			if(filename == 'input'):
+				mif_header = generate_mif_header(depth, width*4, 'HEX')
 			else:
-				mif_file.write('WIDTH = ' + str(width) + ';\n')
-			mif_file.write('ADDRESS_RADIX = DEC;\n')
-			if((filename == 'input') or (filename == 'output')):
-				mif_file.write('DATA_RADIX = HEX;\n')
-			else:
-				mif_file.write('DATA_RADIX = BIN;\n')
-			mif_file.write('CONTENT\n')
-			mif_file.write('BEGIN\n')
-			
-			line_num = 0
-			dump_file = open(dump_dir+filename, 'r')
-			for line in dump_file:
-				mif_file.write(str(line_num) + ': ' + line.strip() + ';\n')
-				line_num = line_num + 1
-			mif_file.write('END;\n')
-			dump_file.close()
-			mif_file.close()
-
-			if((filename != 'input') and (filename != 'output')):
-				subprocess.call(['rm', dump_dir+filename], shell=False)
+				mif_header = generate_mif_header(depth, width, 'BIN')
+			with open(dump_dir+filename+'.mif', 'w') as mif_file:
+				mif_file.write(mif_header)
+				mif_file.writelines(str(line_num) + ': ' + line_str + ';\n' for line_num, line_str in enumerate(all_lines))
+				mif_file.write('END;\n')
 
 		elif(filename == 'output'):
-			dump_file = open(dump_dir+filename, 'r')
 			mif_file_lower = open(dump_dir+filename+'_lower.mif', 'w')
 			mif_file_upper = open(dump_dir+filename+'_upper.mif', 'w')
 			mif_file = open(dump_dir+filename+'.mif', 'w')
-			
-			depth = 0
-			for line in dump_file:
-				depth = depth + 1
-			width = int(len(line.strip()))
-			dump_file.close()
-
-			mif_file_lower.write('DEPTH = ' + str(depth) + ';\n')
-			mif_file_lower.write('WIDTH = ' + str(width*2) + ';\n')
-			mif_file_lower.write('ADDRESS_RADIX = DEC;\n')
-			mif_file_lower.write('DATA_RADIX = HEX;\n')
-			mif_file_lower.write('CONTENT\n')
-			mif_file_lower.write('BEGIN\n')
-			mif_file_upper.write('DEPTH = ' + str(depth) + ';\n')
-			mif_file_upper.write('WIDTH = ' + str(width*2) + ';\n')
-			mif_file_upper.write('ADDRESS_RADIX = DEC;\n')
-			mif_file_upper.write('DATA_RADIX = HEX;\n')
-			mif_file_upper.write('CONTENT\n')
-			mif_file_upper.write('BEGIN\n')
-
-			mif_file.write('DEPTH = ' + str(depth) + ';\n')
-			mif_file.write('WIDTH = ' + str(width*4) + ';\n')
-			mif_file.write('ADDRESS_RADIX = DEC;\n')
-			mif_file.write('DATA_RADIX = HEX;\n')
-			mif_file.write('CONTENT\n')
-			mif_file.write('BEGIN\n')
-			
-			line_num = 0
-			dump_file = open(dump_dir+filename, 'r')
-			for line in dump_file:
-				line_str = line.strip()
-				mif_file_lower.write(str(line_num) + ': ' + line_str[int(width/2): width] + ';\n')
-				mif_file_upper.write(str(line_num) + ': ' + line_str[0: int(width/2)] + ';\n')
-				mif_file.write(str(line_num) + ': ' + line_str + ';\n')
-				line_num = line_num + 1
-			mif_file_lower.write('END;\n')
-			mif_file_upper.write('END;\n')
-			mif_file.write('END;\n')
-			dump_file.close()
-			mif_file_lower.close()
-			mif_file_upper.close()
-			mif_file.close()
-
-		elif(filename.find('mrf') != -1):
-			dump_file = open(dump_dir+filename, 'r')
+			mif_file_lower.write(generate_mif_header(depth, width*2, 'HEX'))
+			mif_file_upper.write(generate_mif_header(depth, width*2, 'HEX'))
+			mif_file.write(generate_mif_header(depth, width*4, 'HEX'))
+			half_width = int(width/2)
+			for line_num, line_str in enumerate(all_lines):
+				line_prefix = str(line_num) + ': '
+				mif_file_lower.write(line_prefix + line_str[half_width: width] + ';\n')
+				mif_file_upper.write(line_prefix + line_str[0: half_width] + ';\n')
+				mif_file.write(line_prefix + line_str + ';\n')
+			for f in [mif_file_lower, mif_file_upper, mif_file]:
+				f.write('END;\n')
+				f.close()
+
+		else:
+			# MRF dumps are split column-wise across the DSP blocks of a DPE
 			mif_files = []
 			for i in range(num_dsps):
 				mif_files.append(open(dump_dir+filename+'_'+str(i)+'.mif', 'w'))
-			
-			depth = 0
-			for line in dump_file:
-				depth = depth + 1
-			width = len(line.strip())
-			dump_file.close()
-
-			for i in range(num_dsps):
-				mif_files[i].write('DEPTH = ' + str(depth) + ';\n')
-				mif_files[i].write('WIDTH = ' + str(int(width/4)) + ';\n')
-				mif_files[i].write('ADDRESS_RADIX = DEC;\n')
-				mif_files[i].write('DATA_RADIX = BIN;\n')
-				mif_files[i].write('CONTENT\n')
-				mif_files[i].write('BEGIN\n')
-			
-			line_num = 0
-			dump_file = open(dump_dir+filename, 'r')
-			flag_first = 1
-			for line in dump_file:
-				line_str = line.strip()
-				line_size = len(line_str)
-				line_stepsize = int(len(line_str)/num_dsps)
+				mif_files[i].write(generate_mif_header(depth, int(width/4), 'BIN'))
+			line_stepsize = int(width/num_dsps)
+			for line_num, line_str in enumerate(all_lines):
+				line_prefix = str(line_num) + ': '
 				for i in range(num_dsps):
-					mif_files[i].write(str(line_num) + ': ' + line_str[(line_stepsize*i) : (line_stepsize*(i+1))] + ';\n')
-				line_num = line_num + 1
-				flag_first = 0
-
+					mif_files[i].write(line_prefix + line_str[(line_stepsize*i) : (line_stepsize*(i+1))] + ';\n')
 			for i in range(num_dsps):
 				mif_files[i].write('END;\n')
 				mif_files[i].close()
-			dump_file.close()
+
+	if((filename != 'input') and (filename != 'output')):
+		os.remove(dump_dir+filename)
+
+def generate_mif_header(depth, width, data_radix):
+	return 'DEPTH = ' + str(depth) + ';\n' + 'WIDTH = ' + str(width) + ';\n' + 'ADDRESS_RADIX = DEC;\n' + \
+		'DATA_RADIX = ' + data_radix + ';\n' + 'CONTENT\n' + 'BEGIN\n'
+
+'''
+Adds one flow pipeline step per pac_dump checkpoint file (dump_files) that converts the file to MIF file(s) once the
+dump_step is done, so that the files are converted in parallel. The dump_step returns the number of lines of each
+file. Returns the names of the added steps.
+'''
+def add_mif_conversion_steps(pipeline, dump_step, dump_files, num_lanes):
+	num_dsps = int(num_lanes / 10)
+	steps = []
+	for filename in dump_files:
+		pipeline.add_step(dump_step + '_' + filename, convert_dump_to_mif, \
+			lambda results, filename=filename: ('./pac_dump/', filename, num_dsps, results[dump_step][filename]), deps=[dump_step])
+		steps.append(dump_step + '_' + filename)
+	return steps
+
+'''
+Transforms the MIF files converted from the binary low-level NPU checkpoints in ./pac_dump into the PAC C header file,
+then cleans all the checkpoints created along the way.
+'''
+def generate_pac_header_file(checkpoint_name):
+	generate_header_file(checkpoint_name)
+	subprocess.call('rm ./pac_dump/mvu-mrf* ./pac_dump/input ./pac_dump/output ./pac_dump/top_sched.mif', shell=True)
+
+'''
+Returns the names of the MIF files that convert_dump_to_mif writes for the pac_dump checkpoint files (dump_files).
+'''
+def get_mif_file_names(dump_files, num_lanes):
+	num_dsps = int(num_lanes / 10)
+	names = []
+	for filename in dump_files:
+		if((filename == 'top_sched') or (filename == 'input')):
+			names.append(filename + '.mif')
+		elif(filename == 'output'):
+			names += [filename + '_lower.mif', filename + '_upper.mif', filename + '.mif']
+		else:
+			names += [filename + '_' + str(i) + '.mif' for i in range(num_dsps)]
+	return names
+
+'''
+Moves the MIF files (mif_names) converted from the binary low-level NPU checkpoints in ./pac_dump to the RTL directory.
+'''
+def generate_mif_files(mif_names):
+	subprocess.call('rm ./pac_dump/input ./pac_dump/output', shell=True)
+	if(os.path.isdir('../rtl/mif_files') == False):
+		subprocess.call('mkdir ../rtl/mif_files', shell=True)
+	for name in mif_names:
+		shutil.move('./pac_dump/' + name, '../rtl/mif_files/' + name)
+
+'''
+Saves the FSim states (name -> array, see npu.get_fsim_states) as checkpoints in ckpt_dir and returns their number.
+'''
+def generate_fsim_checkpoints(ckpt_dir, states, verbose=0):
+	if not os.path.isdir(ckpt_dir):
+		os.makedirs(ckpt_dir)
+	count = 0
+	for name, data in states.items():
+		save_checkpoint(ckpt_dir, name, data)
+		count += 1
+		if (verbose):
+			print('Dumped ' + os.path.basename(ckpt_dir) + '-' + name + ' checkpoint')
+	return count
+
+'''
+This function writes the Verilog header file of the NPU (../rtl/npu.vh). The input/output buffer sizes are only defined
+for RTL simulation (rtl_sim), num_inputs and num_outputs are the number of input and golden output vectors.
+'''
+def write_verilog_header_file(num_tiles, num_dpes, num_lanes, vrf_depth, mrf_depth, max_tag, mrf_filled_depth, rtl_sim, num_inputs, num_outputs):
+	dump_path = '../rtl/npu.vh'
+	with open(dump_path, 'w') as header_file:
+		header_file.write("`ifndef _NPU_VH_\n")
+		header_file.write("`define _NPU_VH_\n\n")
+		header_file.write("`define max(a,b) ((a > b) ? a : b)\n")
+		header_file.write("`define roundup_power2(a) ((2) ** ($clog2(a)))\n\n")
+		header_file.write("/***********************************/\n")
+		header_file.write("/*    USER-SPECIFIED PARAMETERS    */\n")
+		header_file.write("/***********************************/\n")
+		header_file.write("`define NTILE     			"+str(num_tiles)+"			// Number of MVU tiles\n")
+		header_file.write("`define NDPE      			"+str(num_dpes)+"  		// Number of dot product engines (DPEs) per tile\n")
+		header_file.write("`define DOTW      			"+str(num_lanes)+"			// Number of lanes per DPE\n")
+		header_file.write("`define VRFD					"+str(vrf_depth)+"			// Vector register file depth\n")
+		header_file.write("`define MRFD      			"+str(mrf_depth)+"		// Matrix register file depth\n")
+		header_file.write("`define EW        			8   		// Input bitwidth {8 or 4}\n")
+		header_file.write("`define ACCW      			32  		// Accumulation/Output bitwidth\n")
+		header_file.write("`define QDEPTH    			512			// FIFO depth\n")
+		if(rtl_sim == 1):
+			header_file.write("`define INPUT_BUFFER_SIZE	2048\n")
+			header_file.write("`define OUTPUT_BUFFER_SIZE	2048\n")
+		else:
+			header_file.write("`define INPUT_BUFFER_SIZE	512\n")
+			header_file.write("`define OUTPUT_BUFFER_SIZE	512\n")
+		header_file.write("`define INST_DEPTH			512			// Instruction memory depth\n")
+		rtl_dir = os.getcwd()
+		idx = rtl_dir.rfind('/')
+		rtl_dir = rtl_dir[:idx] + '/rtl/'
+		header_file.write("`define RTL_DIR				\"" + rtl_dir + "\"	// Directory for RTL source code\n")
+		header_file.write("`define TILES_THRESHOLD 	8			// Number of tiles implemented using hard DSP blocks\n")
+		header_file.write("`define DPES_THRESHOLD  	0			// Number of DPEs/tile implemented using hard DSPs\n")
+		header_file.write("`define TARGET_FPGA			\"S10-Prime\"		// Target FPGA {\"Arria 10\" or \"Stratix 10\" or \"S10-Prime\"}\n\n")
+		header_file.write("/***********************************/\n")
+		header_file.write("/*    IMPLEMENTATION PARAMETERS    */\n")
+		header_file.write("/***********************************/\n")
+		header_file.write("//DO NOT change these parameters unless you really know what you are doing\n")
+		header_file.write("`define PRIME_DOTW			10\n")
+		header_file.write("`define DOT_PER_DSP			3\n")
+		header_file.write("`define NUM_DSP				DOTW / PRIME_DOTW\n")
+		header_file.write("`define MULT_LATENCY       2 + (NUM_DSP-1)*2\n")
+		header_file.write("`define DPE_PIPELINE    	MULT_LATENCY\n")
+		header_file.write("`define VRFIDW					$clog2(NUM_DSP)\n")
+		header_file.write("`define NUM_ACCUM				DOT_PER_DSP * NUM_DSP\n")
+		header_file.write("`define ACCIDW					$clog2(2*NUM_ACCUM)\n")
+		header_file.write("`define VRFAW     			$clog2(VRFD)\n")     
+		header_file.write("`define MRFAW     			$clog2(MRFD)\n")     
+		header_file.write("`define NMFU      			2\n")                
+		header_file.write("`define NVRF      			NTILE+1+(2*NMFU)\n") 
+		header_file.write("`define NMRF      			NTILE*NDPE\n")       
+		header_file.write("`define NSIZE     			`max(VRFD, MRFD)\n")
+		header_file.write("`define NSIZEW    			$clog2(NSIZE)+1\n")
+		header_file.write("`define NTAG      			"+str(max_tag)+"\n")
+		header_file.write("`define NTAGW     			$clog2(NTAG)\n")
+		header_file.write("`define MIW_MVU				3*VRFAW+2*NSIZEW+MRFAW+NSIZEW+NTAGW+1\n")
+		header_file.write("`define UIW_MVU   			8+NTAGW+MRFAW+1+VRFIDW+VRFAW\n")
+		header_file.write("`define MIW_EVRF  			3*VRFAW+NSIZEW+1+NTAGW+3\n")
+		header_file.write("`define UIW_EVRF  			VRFAW+2+NTAGW\n")
+		header_file.write("`define MIW_MFU   			6*VRFAW+NSIZEW+NTAGW+9\n")
+		header_file.write("`define UIW_MFU   			VRFAW+VRFAW+NTAGW+6\n")
+		header_file.write("`define MIW_LD    			(2*NVRF)+6*VRFAW+NSIZEW+6\n")
+		header_file.write("`define UIW_LD    			(2*NVRF)+VRFAW+VRFAW+4\n")
+		header_file.write("`define MICW     				MIW_MVU+MIW_EVRF+(2*MIW_MFU)+MIW_LD\n")
+		header_file.write("`define WB_LMT    			QDEPTH/2\n")        
+		header_file.write("`define WB_LMTW   			$clog2(WB_LMT)+1\n") 
+		if(rtl_sim == 1):
+			header_file.write("`define SIM_FLAG				1\n")
+		else:
+			header_file.write("`define SIM_FLAG				0\n")
+		header_file.write("`define PRECISION				EW\n")
+		header_file.write("`define BRAM_RD_LATENCY 	2\n")
+		header_file.write("`define INST_ADDRW			$clog2(INST_DEPTH)\n")
+		header_file.write("`define CACHELINE_SIZE		512\n")
+		header_file.write("`define MDATA_SIZE			16\n")
+		header_file.write("`define ROB_DEPTH				INPUT_BUFFER_SIZE\n")
+		header_file.write("`define ROB_ADDRW				$clog2(ROB_DEPTH)\n")
+		header_file.write("`define FILLED_MRFD			"+str(mrf_filled_depth)+"\n")
+		header_file.write("`define NUM_INPUTS			"+str(num_inputs)+"\n")
+		header_file.write("`define NUM_OUTPUTS			"+str(num_outputs)+"\n")
+		if(rtl_sim == 1):
+			header_file.write("`define DEPLOY					0\n\n")
+		else:
+			header_file.write("`define DEPLOY					1\n\n")
+		header_file.write("/***********************************/\n")
+		header_file.write("/* 	      MACRO DEFINITIONS       */\n")
+		header_file.write("/***********************************/\n")
+		if(rtl_sim == 1):
+			header_file.write("`define DISPLAY_MVU\n")
+			header_file.write("`define DISPLAY_MVU_TILE\n")
+			header_file.write("`define DISPLAY_EVRF\n")
+			header_file.write("`define DISPLAY_MFU\n")
+			header_file.write("`define DISPLAY_LD\n")
+			header_file.write("`define DISPLAY_INST\n\n")
+		header_file.write("// NPU Instruction definition\n")
+		header_file.write("`define mvu_minst(minst_chain)  \\\n")
+		header_file.write("    ``minst_chain``[MIW_LD+(2*MIW_MFU)+MIW_EVRF+:MIW_MVU]\n")
+		header_file.write("`define evrf_minst(minst_chain) \\\n")
+		header_file.write("    ``minst_chain``[MIW_LD+(2*MIW_MFU)+:MIW_EVRF]\n")
+		header_file.write("`define mfu0_minst(minst_chain) \\\n")
+		header_file.write("    ``minst_chain``[MIW_LD+MIW_MFU+:MIW_MFU]\n")
+		header_file.write("`define mfu1_minst(minst_chain) \\\n")
+		header_file.write("    ``minst_chain``[MIW_LD+:MIW_MFU]\n")
+		header_file.write("`define ld_minst(minst_chain)   \\\n")
+		header_file.write("    ``minst_chain``[0+:MIW_LD]\n\n")
+		header_file.write("// MVU macro-instruction definition\n")
+		header_file.write("`define mvu_minst_vrf_base0(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW+2*VRFAW +:VRFAW]\n")
+		header_file.write("`define mvu_minst_vrf_base1(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW+VRFAW +:VRFAW]\n")
+		header_file.write("`define mvu_minst_vrf_base2(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+NSIZEW +:VRFAW]\n")
+		header_file.write("`define mvu_minst_vrf_size(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+MRFAW+:NSIZEW]\n")
+		header_file.write("`define mvu_minst_mrf_base(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+2*NSIZEW+:MRFAW]\n")
+		header_file.write("`define mvu_minst_mrf_size(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+NSIZEW+:NSIZEW]\n")
+		header_file.write("`define mvu_minst_words_per_row(minst) \\\n")
+		header_file.write("    ``minst``[1+NTAGW+:NSIZEW]\n")
+		header_file.write("`define mvu_minst_tag(minst) \\\n")
+		header_file.write("    ``minst``[1+:NTAGW]\n")
+		header_file.write("`define mvu_minst_op(minst) \\\n")
+		header_file.write("    ``minst``[0+:1]\n\n")
+		header_file.write("// MVU micro-instruction definition\n")
+		header_file.write("`define mvu_uinst_vrf_addr(uinst) \\\n")
+		header_file.write("	``uinst``[8+NTAGW+MRFAW+1+VRFIDW +:VRFAW]\n")
+		header_file.write("`define mvu_uinst_vrf_rd_id(uinst) \\\n")
+		header_file.write("	``uinst``[8+NTAGW+MRFAW+1 +:VRFIDW]\n")
+		header_file.write("`define mvu_uinst_reg_sel(uinst) \\\n")
+		header_file.write("	``uinst``[8+NTAGW+MRFAW +:1]\n")
+		header_file.write("`define mvu_uinst_mrf_addr(uinst) \\\n")
+		header_file.write("	``uinst``[8+NTAGW +:MRFAW]\n")
+		header_file.write("`define mvu_uinst_tag(uinst) \\\n")
+		header_file.write("	``uinst``[8+:NTAGW]\n")
+		header_file.write("`define mvu_uinst_acc_op(uinst)   \\\n")
+		header_file.write("	``uinst``[6+:2]\n")
+		header_file.write("`define mvu_uinst_acc_size(uinst) \\\n")
+		header_file.write("    ``uinst``[1+:5]\n")
+		header_file.write("`define mvu_uinst_vrf_en(uinst) \\\n")
+		header_file.write("    ``uinst``[0+:1]\n\n")
+		header_file.write("// eVRF macro-instruction definition\n")
+		header_file.write("`define evrf_minst_vrf_base0(minst) \\\n")
+		header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+2*VRFAW+:VRFAW]\n")
+		header_file.write("`define evrf_minst_vrf_base1(minst) \\\n")
+		header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+VRFAW+:VRFAW]\n")
+		header_file.write("`define evrf_minst_vrf_base2(minst) \\\n")
+		header_file.write("    ``minst``[3+NTAGW+1+NSIZEW+:VRFAW]\n")
+		header_file.write("`define evrf_minst_vrf_size(minst) \\\n")
+		header_file.write("    ``minst``[3+NTAGW+1+:NSIZEW]\n")
+		header_file.write("`define evrf_minst_src_sel(minst) \\\n")
+		header_file.write("    ``minst``[3+NTAGW+:1]\n")
+		header_file.write("`define evrf_minst_tag(minst) \\\n")
+		header_file.write("    ``minst``[3+:NTAGW]\n")
+		header_file.write("`define evrf_minst_op(minst) \\\n")
+		header_file.write("    ``minst``[2+:1]\n")
+		header_file.write("`define evrf_minst_batch(minst) \\\n")
+		header_file.write("    ``minst``[0+:2]\n\n")
+		header_file.write("// eVRF micro-instruction definition\n")
+		header_file.write("`define evrf_uinst_vrf_addr(uinst) \\\n")
+		header_file.write("    ``uinst``[NTAGW+2+:VRFAW]\n")
+		header_file.write("`define evrf_uinst_src_sel(uinst)   \\\n")
+		header_file.write("    ``uinst``[NTAGW+:2]\n")
+		header_file.write("`define evrf_uinst_tag(uinst)   \\\n")
+		header_file.write("    ``uinst``[0+:NTAGW]\n\n")
+		header_file.write("//  MFU macro-instruction definition\n")
+		header_file.write("`define mfu_minst_vrf0_base0(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+5*VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_vrf0_base1(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+4*VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_vrf0_base2(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+3*VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_vrf1_base0(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+2*VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_vrf1_base1(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_vrf1_base2(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+NSIZEW+:VRFAW]\n")
+		header_file.write("`define mfu_minst_size(minst) \\\n")
+		header_file.write("    ``minst``[9+NTAGW+:NSIZEW]\n")
+		header_file.write("`define mfu_minst_tag(minst) \\\n")
+		header_file.write("    ``minst``[9+:NTAGW]\n")
+		header_file.write("`define mfu_minst_op(minst) \\\n")
+		header_file.write("    ``minst``[2+:7]\n")
+		header_file.write("`define mfu_minst_batch(minst) \\\n")
+		header_file.write("    ``minst``[0+:2]\n\n")
+		header_file.write("// MFU micro-instruction definition\n")
+		header_file.write("`define mfu_uinst_vrf0_addr(uinst) \\\n")
+		header_file.write("    ``uinst``[6+NTAGW+VRFAW+:VRFAW]\n")
+		header_file.write("`define mfu_uinst_vrf1_addr(uinst) \\\n")
+		header_file.write("    ``uinst``[6+NTAGW+:VRFAW]\n")
+		header_file.write("`define mfu_uinst_tag(uinst) \\\n")
+		header_file.write("    ``uinst``[6+:NTAGW]\n")
+		header_file.write("`define mfu_uinst_func_op(uinst) \\\n")
+		header_file.write("    ``uinst``[0+:6]\n")
+		header_file.write("`define mfu_uinst_act_op(uinst) \\\n")
+		header_file.write("    ``uinst``[4+:2]\n")
+		header_file.write("`define mfu_uinst_add_op(uinst) \\\n")
+		header_file.write("    ``uinst``[1+:3]\n")
+		header_file.write("`define mfu_uinst_mul_op(uinst) \\\n")
+		header_file.write("    ``uinst``[0+:1]\n\n")
+		header_file.write("// LD macro-instruction definition\n")
+		header_file.write("`define ld_minst_vrf_id(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+6*VRFAW+:2*NVRF]\n")
+		header_file.write("`define ld_minst_vrf0_base0(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+5*VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_minst_vrf0_base1(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+4*VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_minst_vrf0_base2(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+3*VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_minst_vrf1_base0(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+2*VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_minst_vrf1_base1(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_minst_vrf1_base2(minst) \\\n")
+		header_file.write("    ``minst``[6+NSIZEW+:VRFAW]\n")
+		header_file.write("`define ld_minst_size(minst) \\\n")
+		header_file.write("    ``minst``[6+:NSIZEW]\n")
+		header_file.write("`define ld_minst_src_sel(minst) \\\n")
+		header_file.write("    ``minst``[5+:1]\n")
+		header_file.write("`define ld_minst_op(minst) \\\n")
+		header_file.write("    ``minst``[4+:1]\n")
+		header_file.write("`define ld_minst_batch(minst) \\\n")
+		header_file.write("    ``minst``[2+:2]\n")
+		header_file.write("`define ld_minst_interrupt(minst) \\\n")
+		header_file.write("    ``minst``[1+:1]\n")
+		header_file.write("`define ld_minst_report_to_host(minst) \\\n")
+		header_file.write("	``minst``[0+:1]\n\n")
+		header_file.write("// LD micro-instruction definition\n")
+		header_file.write("`define ld_uinst_vrf_id(uinst) \\\n")
+		header_file.write("    ``uinst``[4+VRFAW+VRFAW+:2*NVRF]\n")
+		header_file.write("`define ld_uinst_vrf0_addr(uinst) \\\n")
+		header_file.write("    ``uinst``[4+VRFAW+:VRFAW]\n")
+		header_file.write("`define ld_uinst_vrf1_addr(uinst) \\\n")
+		header_file.write("    ``uinst``[4+:VRFAW]\n")
+		header_file.write("`define ld_uinst_src_sel(uinst) \\\n")
+		header_file.write("    ``uinst``[3+:1]\n")
+		header_file.write("`define ld_uinst_last(uinst) \\\n")
+		header_file.write("    ``uinst``[2+:1]\n")
+		header_file.write("`define ld_uinst_interrupt(uinst) \\\n")
+		header_file.write("    ``uinst``[1+:1]\n")
+		header_file.write("`define ld_uinst_report_to_host(uinst) \\\n")
+		header_file.write("    ``uinst``[0+:1]\n\n")
+		header_file.write("`endif\n")
+
+'''
+This function uses the FSim checkpoints to generate low-level binary NPU checkpoints. These
+checkpoints will later be used to generate the PAC C header file. Make sure to set the precision_in
+and precision_out to correct number of bits in case the RTL is changed (parameters EW & ACCW in RTL).
+inst_bits is the (instructions x MICW) bit matrix of the program, as returned by npu.encode_insts.
+'''
+def dump_binary_files(ckpt_dir, num_tiles, num_dpes, num_lanes, inst_bits, bin_dump=0):
+	precision_in = 8
+	precision_out = 32
+	# Raw binary copies (little-endian words, one file per text dump) that can be memory-mapped by the RTL/PAC flows
+	if(bin_dump and not os.path.isdir('./pac_dump/bin')):
+		os.makedirs('./pac_dump/bin')
+	# Number of lines of each dump file (used to write the MIF headers without re-reading the dumps)
+	dump_depths = {}
+
+	# The checkpoint files are memory-mapped (read-only), only the data being dumped is paged in
+
+	# Dump MRF data
+	mrfs = load_checkpoint(ckpt_dir, 'mvu_mrf')
+	for i in range(num_tiles):
+		for j in range(num_dpes):
+			dump_path = './pac_dump/mvu-mrf' + format(i * num_dpes + j, '03d')
+			words = pack_lanes(mrfs[i][j], precision_in)
+			dump_depths['mvu-mrf' + format(i * num_dpes + j, '03d')] = len(words)
+			with open (dump_path,'wb') as dump_file:
+				dump_file.write(words_to_text(words, 'bin'))
+			if(bin_dump):
+				words[:, ::-1].tofile('./pac_dump/bin/mvu-mrf' + format(i * num_dpes + j, '03d') + '.bin')
+
+	# Dump input vectors
+	inputs = load_checkpoint(ckpt_dir, 'input')
+	dump_path = './pac_dump/input'
+	words = pack_lanes(inputs, precision_in)
+	dump_depths['input'] = len(words)
+	with open (dump_path,'wb') as dump_file:
+		dump_file.write(words_to_text(words, 'hex'))
+	if(bin_dump):
+		words[:, ::-1].tofile('./pac_dump/bin/input.bin')
+
+	# Dump instructions (encoded by npu.encode_insts, followed by an all-ones instruction)
+	dump_path = './pac_dump/top_sched'
+	bits = np.ones((len(inst_bits) + 1, inst_bits.shape[1]), dtype=np.uint8)
+	bits[:len(inst_bits)] = inst_bits
+	dump_depths['top_sched'] = len(bits)
+	lines = np.empty((len(bits), bits.shape[1] + 1), dtype=np.uint8)
+	lines[:, :-1] = bits + ord('0')
+	lines[:, -1] = ord('\n')
+	with open (dump_path,'wb') as dump_file:
+		dump_file.write(lines.tobytes())
+	if(bin_dump):
+		# LSB-first bits packed into little-endian bytes (MICW rounded up to a multiple of 8 bits)
+		np.packbits(bits[:, ::-1], axis=1, bitorder='little').tofile('./pac_dump/bin/top_sched.bin')
+
+	# Dump output vectors
+	outputs = load_checkpoint(ckpt_dir, 'output')
+	dump_path = './pac_dump/output'
+	words = pack_lanes(outputs, precision_out)
+	dump_depths['output'] = len(words)
+	with open (dump_path,'wb') as dump_file:
+		dump_file.write(words_to_text(words, 'hex'))
+	if(bin_dump):
+		words.reshape(len(words), num_lanes, 4)[:, ::-1, ::-1].tofile('./pac_dump/bin/output.bin')
+
+	return dump_depths
+
+'''
+These functions write the SystemC performance simulator files. They run as independent steps of the flow pipeline
+and read the program from the FSim checkpoints in ckpt_dir:
+- write_perf_sim_params: architecture parameters (../modules/params.hpp), only needed when the simulator is rebuilt
+- clear_register_files: removes the register files of a previous run, since the simulator reads the binary version of
+  a register file if it exists (-perf_bin) and the text version otherwise
+- dump_mrf_tile: MRF contents of all the DPEs of a tile (one file per DPE, only the filled MRF depth)
+- write_perf_sim_vectors: input and golden output vectors
+- write_perf_sim_instructions: instructions (one line per macro-op)
+- write_gen_done: signals the completion of all the files through the ../gen_done file
+'''
+def write_perf_sim_params(num_cores, num_tiles, num_sectors, num_dpes, num_lanes, num_threads, vrf_depth, mrf_depth, max_tag, \
+	tb_lanes, tb_num_dots):
+	dump_path = '../modules/params.hpp'
+	with open(dump_path, 'w') as defines:
+		defines.write('#pragma once\n\n')
+		defines.write('// Key NPU Architecture Parameters\n')
+		defines.write('#define CORES ' + str(num_cores) + '\n')
+		defines.write('#define TILES ' + str(num_tiles) + '\n')
+		defines.write('#define SECTORS ' + str(num_sectors) + '\n')
+		defines.write('#define DPES_PER_SECTOR ' + str(int(num_dpes/num_sectors)) + '\n')
+		defines.write('#define LANES ' + str(num_lanes) + '\n')
+		defines.write('#define THREADS ' + str(num_threads) + '\n')
+		defines.write('#define VRF_DEPTH ' + str(vrf_depth) + '\n')
+		defines.write('#define MRF_DEPTH ' + str(mrf_depth) + '\n')
+		defines.write('#define DATA_FIFO_DEPTH 512\n')
+		defines.write('#define INST_MEMORY_DEPTH 512\n')
+		defines.write('#define MOP_FIFO_DEPTH 512\n')
+		defines.write('#define MOP_FIFO_ALMOST_FULL_DEPTH (MOP_FIFO_DEPTH - 10)\n')
+		defines.write('#define UOP_FIFO_DEPTH 512\n')
+		defines.write('#define UOP_FIFO_ALMOST_FULL_DEPTH (UOP_FIFO_DEPTH - 10)\n')
+		defines.write('#define NPU_CLOCK_PERIOD FABRIC_PERIOD\n')
+		defines.write('#define MAX_TAG ' + str(max_tag) + '\n')
+		defines.write('#define TB_LANES ' + str(tb_lanes) + '\n')
+		defines.write('#define TB_NUM_DOTS ' + str(tb_num_dots) + '\n\n')
+		defines.write('// Precisions Definition\n')
+		defines.write('#define LOW_PRECISION 8\n')
+		defines.write('#define HIGH_PRECISION 32\n')
+		defines.write('typedef sc_int<LOW_PRECISION> tb_input_precision;\n')
+		defines.write('typedef sc_int<HIGH_PRECISION> tb_output_precision;\n\n')
+		defines.write('// Latency Parameters\n')
+		for (param, latency) in latency_params:
+			defines.write('#define ' + param + ' ' + str(latency) + '\n')
+		defines.write('\n')
+		defines.write('// Signal Width Parameters\n')
+		defines.write('#define VRF_ADDRW ' + str(int(math.ceil(math.log2(vrf_depth)))) + '\n')
+		defines.write('#define MRF_ADDRW ' + str(int(math.ceil(math.log2(mrf_depth)))) + '\n')
+		defines.write('#define NSIZEW 11\n')
+		defines.write('#define VRFIDW 2\n')
+		defines.write('#define MRFIDW ' + str(int(math.ceil(math.log2(num_tiles * num_dpes)))) + '\n')
+		defines.write('#define ACCUMIDW 5\n')
+		defines.write('#define TAGW ' + str(int(math.ceil(math.log2(max_tag))) + 1) + '\n')
+		defines.write('#define BATCH_COUNTW 2\n')
+		defines.write('#define BLOCK_COUNTW 4\n')
+		defines.write('#define ACCUM_OPW 2\n')
+		defines.write('#define BLOCK_WB_SELW 8\n')
+		defines.write('#define VRF_WB_SELW ' + str(int(math.ceil(math.log2(num_tiles))) + 1) + '\n\n')
+		defines.write('// Derived Parameters (do not change unless you really know why)\n')
+		defines.write('#define DPE_NUM_TBS ((int)ceil(LANES * 1.0 / TB_LANES) + 1)\n')
+		defines.write('#define DPE_USE_SEL_PIPELINE ((TB_LATENCY - 1) * (DPE_NUM_TBS - 2))\n')
+		defines.write('#define DPE_VALID_A_PIPELINE (TB_LATENCY + (DPE_NUM_TBS - 2) * (TB_LATENCY - 1))\n')
+		defines.write('#define DPE_VALID_B_PIPELINE (DPE_NUM_TBS * TB_NUM_DOTS)\n')
+		defines.write('#define DPE_SHIFT_SEL_PIPELINE (DPE_NUM_TBS * TB_NUM_DOTS)\n')
+		defines.write('#define DPE_VECTOR_A_PIPELINE ((DPE_NUM_TBS - 2) * (TB_LATENCY - 1))\n')
+		defines.write('#define MRF_ADDR_PIPELINE (2 * (DPE_NUM_TBS - 1))\n')
+		defines.write('#define SECTOR_MRF_ADDR_PIPELINE (SECTOR_DISTRIBUTION_PIPELINE + (DPE_NUM_TBS * TB_NUM_DOTS) - 1)\n')
+		defines.write('#define SECTOR_MRF_DATA_PIPELINE RF_RD_LATENCY\n')
+		defines.write('#define SECTOR_VRF_DATA_PIPELINE SECTOR_DISTRIBUTION_PIPELINE\n')
+		defines.write('#define SECTOR_INST_TO_DPES_PIPELINE (SECTOR_MRF_ADDR_PIPELINE + SECTOR_MRF_DATA_PIPELINE)\n')
+		defines.write('#define SECTOR_DPES_PIPELINE DPE_VALID_A_PIPELINE\n')
+		defines.write('#define SECTOR_INST_TO_ACCUM_PIPELINE (SECTOR_INST_TO_DPES_PIPELINE + SECTOR_DPES_PIPELINE + SECTOR_REDUCTION_PIPELINE + SECTOR_REDUCTION_TO_ACCUM_PIPELINE)\n')
+		defines.write('#define ACCUM_PIPELINE (RF_RD_LATENCY + 1)\n')
+		defines.write('#define SECTOR_INST_PIPELINE (SECTOR_INST_TO_DPES_PIPELINE + SECTOR_DPES_PIPELINE + SECTOR_REDUCTION_PIPELINE + SECTOR_REDUCTION_TO_ACCUM_PIPELINE + ACCUM_PIPELINE + SECTOR_ACCUM_TO_OFIFO_PIPELINE)\n')
+		defines.write('#define EVRF_INST_PIPELINE (EVRF_INST_TO_VRF + RF_RD_LATENCY + EVRF_RF_TO_OFIFO_PIPELINE)\n')
+		defines.write('#define EVRF_PIPELINE (EVRF_INST_TO_VRF + RF_RD_LATENCY + EVRF_RF_TO_OFIFO_PIPELINE)\n')
+		defines.write('#define MFU_COMPUTE_PIPELINE (MFU_ACT_LATENCY + MFU_ADD_LATENCY + MFU_MUL_LATENCY)\n')
+		defines.write('#define MFU_INST_PIPELINE (MFU_INST_TO_VRFS_PIPLINE + RF_RD_LATENCY + MFU_VRFS_TO_COMPUTE_PIPELINE)\n')
+		defines.write('#define MFU_INPUT_TO_COMPUTE_PIPELINE (MFU_INST_TO_VRFS_PIPLINE + RF_RD_LATENCY + MFU_VRFS_TO_COMPUTE_PIPELINE)\n')
+		defines.write('#define MFU_PIPELINE (MFU_INPUT_TO_COMPUTE_PIPELINE + MFU_COMPUTE_PIPELINE + MFU_COMPUTE_TO_OFIFO_PIPELINE)\n')
+		defines.write('#define NUM_PIPELINE_BLOCKS 5\n')
+		defines.write('#define NUM_VRFS (TILES + 5)\n')
+		defines.write('#define NUM_ACCUM ((DPE_NUM_TBS - 1) * TB_NUM_DOTS)\n')
+		defines.write('#define NAME_LENGTH 35\n\n')
+		defines.write('// AXI-S Parameters\n')
+		defines.write('#define FEEDFORWARD_DATA_WIDTH (CORES * DPES_PER_SECTOR * HIGH_PRECISION)\n')
+		defines.write('#define WIDE_WRITEBACK_WIDTH (CORES * LANES * LOW_PRECISION)\n')
+		defines.write('#define WIDE_WRITEBACK_BV_WIDTH ((CORES * LANES * LOW_PRECISION) + VRF_WB_SELW + VRF_ADDRW + 1)\n')
+		defines.write('#define NARROW_WRITEBACK_WIDTH (CORES * DPES_PER_SECTOR * HIGH_PRECISION)\n')
+		defines.write('#define NARROW_WRITEBACK_BV_WIDTH ((CORES * DPES_PER_SECTOR * HIGH_PRECISION) + VRF_WB_SELW + BLOCK_WB_SELW + VRF_ADDRW + 1)\n')
+		defines.write('#define AXIS_ADAPTER_BUFFER_CAPACITY 2\n')
+		defines.write('#define TDATA(bv) (bv.range(AXIS_MAX_DATAW - 1, 0))\n')
+		defines.write('#define TSTRB(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW - 1, AXIS_MAX_DATAW))\n')
+		defines.write('#define TKEEP(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW - 1, AXIS_MAX_DATAW + AXIS_STRBW))\n')
+		defines.write('#define TUSER(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW))\n')
+		defines.write('#define TUSER_FLAG(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW))\n')
+		defines.write('#define TUSER_ADDR(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + VRF_ADDRW, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + 1))\n')
+		defines.write('#define TUSER_VRFID(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + VRF_ADDRW + 1))\n')
+		defines.write('#define TDEST(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW))\n')
+		defines.write('#define TID(bv) (bv.range(AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW + AXIS_IDW - 1, AXIS_MAX_DATAW + AXIS_STRBW + AXIS_KEEPW + AXIS_USERW + AXIS_DESTW))\n')
+		defines.write('#define TLAST(bv) (bv.range(AXIS_TRANSACTION_WIDTH - 1, AXIS_TRANSACTION_WIDTH - 1))\n\n')
+		defines.write('// Trace Probe IDs\n')
+		defines.write('#define UOP_ISSUE_TRACE 0\n')
+		defines.write('#define UOP_RETIRE_TRACE 1\n')
+		defines.write('#define FIRST_UOP_ISSUE_TRACE 2\n')
+		defines.write('#define LAST_UOP_RETIRE_TRACE 3\n')
+		defines.write('#define TAG_UPDATE_TRACE 4\n\n')
+
+def clear_register_files():
+	for path in glob.glob('../register_files/*.txt') + glob.glob('../register_files/*.bin'):
+		os.remove(path)
+
+def dump_mrf_tile(tile_id, ckpt_dir, filled_depth, binary=False):
+	mrfs = load_checkpoint(ckpt_dir, 'mvu_mrf')[tile_id, :, :filled_depth]
+	for d in range(mrfs.shape[0]):
+		write_register_file('../register_files/mrf_tile_' + str(tile_id) + '_dpe_' + str(d), mrfs[d], np.int8, binary)
+
+def write_perf_sim_vectors(ckpt_dir, num_lanes, binary=False):
+	write_register_file('../register_files/inputs', np.array(load_checkpoint(ckpt_dir, 'input')).reshape(-1, num_lanes), np.int8, binary)
+	write_register_file('../register_files/outputs', np.array(load_checkpoint(ckpt_dir, 'output')).reshape(-1, num_lanes), np.int32, binary)
+
+def write_perf_sim_instructions(ckpt_dir, num_tiles):
+	dump_path = '../register_files/instructions.txt'
+	insts = chain_store(records=load_checkpoint(ckpt_dir, 'inst'))
+	with open(dump_path, 'w') as dump_file:
+		for inst in insts:
+			# MVU macro-op
+			if(inst.mvu_op_type == 'matvec'):
+				dump_file.write('1 ')
+			else:
+				dump_file.write('0 ')
+			dump_file.write(str(inst.mvu_vrf_rd_base[0]) + ' ')
+			dump_file.write(str(inst.mvu_vrf_rd_base[1]) + ' ')
+			dump_file.write(str(inst.mvu_vrf_rd_base[2]) + ' ')
+			dump_file.write(str(inst.mvu_vrf_rd_sz) + ' ')
+			dump_file.write(str(inst.mvu_mrf_rd_base) + ' ')
+			dump_file.write(str(inst.mvu_mrf_rd_sz) + ' ')
+			dump_file.write(str(inst.mvu_words_per_row) + ' ')
+			dump_file.write(str(inst.mvu_tag) + '\n')
+			
+			# eVRF macro-op
+			if(inst.extvrf_op_type == 'move'):
+				dump_file.write('1 0 ')
+			elif(inst.extvrf_op_type == 'extvrf'):
+				dump_file.write('1 1 ')
+			else:
+				dump_file.write('0 0 ')
+
+			for i in range(inst.batch):
+				dump_file.write(str(inst.extvrf_rd_base[i]) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+
+			dump_file.write(str(inst.extvrf_rd_sz) + ' ')
+			dump_file.write(str(inst.batch) + ' ')
+			dump_file.write(str(inst.extvrf_tag) + '\n')
+			
+			# MFU0 macro-op
+			if((inst.mfu0_act_op_type == 'nop') and (inst.mfu0_act_op_type == 'nop') \
+			    and (inst.mfu0_act_op_type == 'nop')):
+				dump_file.write('0 ')
+			else:
+				dump_file.write('1 ')
+			dump_file.write(str(inst.mfu0_vrf_rd_size) + ' ')
+			if(inst.mfu0_act_op_type == 'tanh'):
+				dump_file.write('1 ')
+			elif(inst.mfu0_act_op_type == 'sig'):
+				dump_file.write('2 ')
+			elif(inst.mfu0_act_op_type == 'relu'):
+				dump_file.write('3 ')
+			else:
+				dump_file.write('0 ')
+			if(inst.mfu0_add_op_type == 'add'):
+				dump_file.write('1 ')
+			elif(inst.mfu0_add_op_type == 'sub_a_b'):
+				dump_file.write('2 ')
+			elif(inst.mfu0_add_op_type == 'sub_b_a'):
+				dump_file.write('3 ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.mfu0_vrf0_rd_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+			#dump_file.write(str(inst.mfu0_vrf0_rd_base) + ' ')
+
+			if(inst.mfu0_mul_op_type == 'mul'):
+				dump_file.write('1 ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.mfu0_vrf1_rd_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+			#dump_file.write(str(inst.mfu0_vrf1_rd_base) + ' ')
+
+			dump_file.write(str(inst.batch) + ' ')
+			dump_file.write(str(inst.mfu0_tag) + '\n')
+			
+			# MFU1 macro-op
+			if((inst.mfu1_act_op_type == 'nop') and (inst.mfu1_act_op_type == 'nop') \
+			    and (inst.mfu1_act_op_type == 'nop')):
+				dump_file.write('0 ')
+			else:
+				dump_file.write('1 ')
+			dump_file.write(str(inst.mfu1_vrf_rd_size) + ' ')
+			if(inst.mfu1_act_op_type == 'tanh'):
+				dump_file.write('1 ')
+			elif(inst.mfu1_act_op_type == 'sig'):
+				dump_file.write('2 ')
+			elif(inst.mfu1_act_op_type == 'relu'):
+				dump_file.write('3 ')
+			else:
+				dump_file.write('0 ')
+			if(inst.mfu1_add_op_type == 'add'):
+				dump_file.write('1 ')
+			elif(inst.mfu1_add_op_type == 'sub_a_b'):
+				dump_file.write('2 ')
+			elif(inst.mfu1_add_op_type == 'sub_b_a'):
+				dump_file.write('3 ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.mfu1_vrf0_rd_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+			#dump_file.write(str(inst.mfu1_vrf0_rd_base) + ' ')
+
+			if(inst.mfu1_mul_op_type == 'mul'):
+				dump_file.write('1 ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.mfu1_vrf1_rd_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+			#dump_file.write(str(inst.mfu1_vrf1_rd_base) + ' ')
+
+			dump_file.write(str(inst.batch) + ' ')
+			dump_file.write(str(inst.mfu1_tag) + '\n')
 			
-			if((filename != 'input') and (filename != 'output')):
-				subprocess.call(['rm', dump_dir+filename], shell=False)
+			# LD macro-op
+			if(inst.loader_src == 'wb'):
+				dump_file.write('1 1 ')
+			elif(inst.loader_src == 'in'):
+				dump_file.write('1 0 ')
+			elif(inst.loader_src == 'flush'):
+				dump_file.write('1 1 ')
+			else:
+				dump_file.write('0 0 ')
+			dump_file.write(str(inst.vrf_id0_wr_size) + ' ')
+			## DST0
+			if((inst.vrf_id0_wr_size == 0) or (inst.loader_src == 'flush')):
+				dump_file.write('0 ')
+			else:
+				dump_file.write('1 ')
+			if(inst.loader_src == 'flush'):
+				dump_file.write('0 ')
+			elif(inst.vrf_id0_op.startswith('mvu')):
+				vrf_id = re.search('mvu(.*)vrf', inst.vrf_id0_op)
+				dump_file.write(vrf_id.group(1)[:-1] + ' ')
+			elif(inst.vrf_id0_op == 'extvrf'):
+				dump_file.write(str(num_tiles) + ' ')
+			elif(inst.vrf_id0_op == 'mfu0.vrf0'):
+				dump_file.write(str(num_tiles+1) + ' ')
+			elif(inst.vrf_id0_op == 'mfu0.vrf1'):
+				dump_file.write(str(num_tiles+2) + ' ')
+			elif(inst.vrf_id0_op == 'mfu1.vrf0'):
+				dump_file.write(str(num_tiles+3) + ' ')
+			elif(inst.vrf_id0_op == 'mfu1.vrf1'):
+				dump_file.write(str(num_tiles+4) + ' ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.vrf_id0_wr_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+
+			## DST1
+			if((inst.vrf_id1_wr_size == 0) or (inst.loader_src == 'flush')):
+				dump_file.write('0 ')
+			else:
+				dump_file.write('1 ')
+			if(inst.loader_src == 'flush'):
+				dump_file.write('0 ')
+			elif(inst.vrf_id1_op.startswith('mvu')):
+				vrf_id = re.search('mvu(.*)vrf', inst.vrf_id1_op)
+				dump_file.write(vrf_id.group(1)[:-1] + ' ')
+			elif(inst.vrf_id1_op == 'extvrf'):
+				dump_file.write(str(num_tiles) + ' ')
+			elif(inst.vrf_id1_op == 'mfu0.vrf0'):
+				dump_file.write(str(num_tiles+1) + ' ')
+			elif(inst.vrf_id1_op == 'mfu0.vrf1'):
+				dump_file.write(str(num_tiles+2) + ' ')
+			elif(inst.vrf_id1_op == 'mfu1.vrf0'):
+				dump_file.write(str(num_tiles+3) + ' ')
+			elif(inst.vrf_id1_op == 'mfu1.vrf1'):
+				dump_file.write(str(num_tiles+4) + ' ')
+			else:
+				dump_file.write('0 ')
+
+			for addr in inst.vrf_id1_wr_base:
+				dump_file.write(str(addr) + ' ')
+			for i in range(3-inst.batch):
+				dump_file.write('0 ')
+
+			dump_file.write(str(inst.batch) + ' ')
+			if(inst.write_to_obuf == True):
+				dump_file.write('1 \n')
+			else:
+				dump_file.write('0 \n')
+
+def write_gen_done():
+	with open('../gen_done', 'w') as dump_file:
+		dump_file.write('1')
+
+'''
+These functions launch the RTL simulation (requires Synopsys VCS to be set up properly) and the SystemC performance
+simulation. They return once the simulation process exits, with the lines of its sim_done file (PASS/FAIL and the
+number of cycles, or None if the simulation did not produce it). run_perf_sim also returns the simulation wall time
+reported by the time command in sim.log.
+'''
+def run_rtl_sim():
+	subprocess.call('cd ../rtl; sed -i -e \'s/\r$//\' run_sim.sh; ./run_sim.sh; cd ../compiler', shell=True)
+	if not os.path.isfile('../rtl/sim_done'):
+		return None
+	with open('../rtl/sim_done', 'r') as sim_file:
+		return sim_file.readlines()
+
+def run_perf_sim(is_first):
+	subprocess.call('./perf_sim.sh ' + str(is_first), shell=True)
+	if not os.path.isfile('../sim_done'):
+		return None, None
+	with open('../sim_done', 'r') as sim_file:
+		lines = sim_file.readlines()
+	with open('../sim.log', 'r') as log_file:
+		runtime = log_file.readlines()[-3].split()[1]
+	return lines, runtime
 
 def numericalSort(value):
 	numbers = re.compile(r'(\d+)')
@@ -2692,6 +3173,17 @@ def initialize_npu(argv):
 	is_first_perf_sim = 0
 	mif_gen = 0
 	freq = 300
+	fast = 0
+	verify_every = 0
+	verify_random = 0
+	bin_dump = 0
+	perf_bin = 0
+	cache = 0
+	cache_dir = './npu_cache'
+	seed = 0
+	perf_record = None
+	opt = 0
+	estimate_only = 0
 
 	# Capture parameters from command line
 	if('-n' in sys.argv):
@@ -2816,6 +3308,72 @@ def initialize_npu(argv):
 		print(bcolors.FAIL + "\nSpecified frequency must be a positive integer" + bcolors.RESET)
 		sys.exit(1)
 
+	if('-fast' in sys.argv):
+		fast = 1
+
+	if('-bin' in sys.argv):
+		bin_dump = 1
+
+	# Binary register files for the performance simulator (faster to write and parse than the text files)
+	if('-perf_bin' in sys.argv):
+		perf_bin = 1
+
+	if('-verify_every' in sys.argv):
+		try:
+			verify_every = int(sys.argv[sys.argv.index('-verify_every') + 1])
+		except (ValueError, IndexError):
+			print(bcolors.FAIL + "\nInvalid -verify_every argument!" + bcolors.RESET)
+			sys.exit(1)
+		if(verify_every <= 0):
+			print(bcolors.FAIL + "\nInvalid -verify_every argument!" + bcolors.RESET)
+			sys.exit(1)
+
+	if('-verify_random' in sys.argv):
+		try:
+			verify_random = float(sys.argv[sys.argv.index('-verify_random') + 1])
+		except (ValueError, IndexError):
+			print(bcolors.FAIL + "\nInvalid -verify_random argument!" + bcolors.RESET)
+			sys.exit(1)
+		if(verify_random <= 0 or verify_random > 100):
+			print(bcolors.FAIL + "\nSpecified -verify_random percentage must be in (0, 100]" + bcolors.RESET)
+			sys.exit(1)
+
+	if('-cache' in sys.argv):
+		cache = 1
+
+	if('-cache_dir' in sys.argv):
+		try:
+			cache_dir = sys.argv[sys.argv.index('-cache_dir') + 1]
+		except IndexError:
+			print(bcolors.FAIL + "\nInvalid -cache_dir argument!" + bcolors.RESET)
+			sys.exit(1)
+		cache = 1
+
+	if('-seed' in sys.argv):
+		try:
+			seed = int(sys.argv[sys.argv.index('-seed') + 1])
+		except (ValueError, IndexError):
+			print(bcolors.FAIL + "\nInvalid -seed argument!" + bcolors.RESET)
+			sys.exit(1)
+
+	if('-opt' in sys.argv):
+		opt = 1
+
+	if('-estimate' in sys.argv):
+		estimate_only = 1
+
+	if('-perf_record' in sys.argv):
+		try:
+			perf_record = sys.argv[sys.argv.index('-perf_record') + 1]
+		except IndexError:
+			print(bcolors.FAIL + "\nInvalid -perf_record argument!" + bcolors.RESET)
+			sys.exit(1)
+
+	# Random weights and inputs are part of the compiled program, so they have to be reproducible for caching (workload
+	# scripts initialize the NPU before generating their test inputs, so that these are drawn after seeding too)
+	if(cache or ('-seed' in sys.argv)):
+		np.random.seed(seed)
+
 
 	# Assign program name as well as verbose and RTL simulation options
 	checkpoint_name = name + '_' + str(num_tiles) + '_' + str(num_dpes) + '_' + str(num_lanes)
@@ -2831,6 +3389,7 @@ def initialize_npu(argv):
 		'mrf_depth' : mrf_depth, 
 		'max_tag'	: 512
 	}
+	arch_params.update(fixed_arch_params)
 
 	# Define compiler options
 	flow_opts = {
@@ -2842,7 +3401,18 @@ def initialize_npu(argv):
     'is_first_perf_sim' : is_first_perf_sim,
 		'verbose' 			: verbose,
 		'mif_gen'			: mif_gen,
-		'freq'				: freq
+		'freq'				: freq,
+		'fast'				: fast,
+		'verify_every'		: verify_every,
+		'verify_random'		: verify_random,
+		'bin_dump'			: bin_dump,
+		'perf_bin'			: perf_bin,
+		'cache'				: cache,
+		'cache_dir'			: cache_dir,
+		'seed'				: seed,
+		'perf_record'		: perf_record,
+		'opt'				: opt,
+		'estimate_only'		: estimate_only
 	}
 
 	return npu(arch_params, flow_opts)
@@ -28,14 +28,153 @@ def myTanh(x):
     # return output *
     return x 
 
-### Class to represent the input chains
+### MFU op decoding (None means bypass)
+mfu_act_ops = {'nop': None, 'move': None, 'relu': myReLU, 'tanh': myTanh, 'sig': mySigmoid}
+# (ufunc, swap): swap means the VRF operand comes first (i.e. b - a for sub_b_a)
+mfu_add_ops = {'nop': None, 'move': None, 'add': (np.add, True), 'sub_a_b': (np.subtract, False), 'sub_b_a': (np.subtract, True), 'max': (np.maximum, True)}
+mfu_mul_ops = {'nop': None, 'move': None, 'mul': np.multiply}
+
+### Columnar instruction store: each chain is one row of a NumPy structured array
+# Op strings are stored as enum codes and per-batch base addresses as fixed-size arrays of chain_max_batch entries
+# (only the first batch entries are valid). The result vector names of each chain are kept in a side list.
+chain_max_batch = 3
+chain_int_fields = ['batch', 'mvu_mrf_rd_base', 'mvu_mrf_rd_sz', 'mvu_vrf_rd_sz', 'mvu_words_per_row', 'mvu_tag',
+                    'extvrf_rd_sz', 'extvrf_tag', 'mfu0_vrf_rd_size', 'mfu0_tag', 'mfu1_vrf_rd_size', 'mfu1_tag',
+                    'vrf_id0_wr_size', 'vrf_id1_wr_size', 'last_flag', 'write_to_obuf', 'wb_so_far']
+chain_base_fields = ['mvu_vrf_rd_base', 'extvrf_rd_base', 'mfu0_vrf0_rd_base', 'mfu0_vrf1_rd_base', 'mfu1_vrf0_rd_base',
+                     'mfu1_vrf1_rd_base', 'vrf_id0_wr_base', 'vrf_id1_wr_base']
+mfu_act_op_types = ['nop', 'move', 'relu', 'tanh', 'sig']
+mfu_add_op_types = ['nop', 'move', 'add', 'sub_a_b', 'sub_b_a', 'max']
+mfu_mul_op_types = ['nop', 'move', 'mul']
+chain_enum_fields = {
+  'mvu_op_type'      : ['nop', 'matvec'],
+  'extvrf_op_type'   : ['nop', 'move', 'extvrf'],
+  'mfu0_act_op_type' : mfu_act_op_types,
+  'mfu0_add_op_type' : mfu_add_op_types,
+  'mfu0_mul_op_type' : mfu_mul_op_types,
+  'mfu1_act_op_type' : mfu_act_op_types,
+  'mfu1_add_op_type' : mfu_add_op_types,
+  'mfu1_mul_op_type' : mfu_mul_op_types,
+  'loader_src'       : ['nop', 'in', 'wb', 'flush']
+}
+# Loader destinations: '--', extvrf, MFU VRFs, then mvu<i>.vrf for MVU tile i
+vrf_op_types = ['--', 'extvrf', 'mfu0.vrf0', 'mfu0.vrf1', 'mfu1.vrf0', 'mfu1.vrf1']
+chain_vrf_op_fields = ['vrf_id0_op', 'vrf_id1_op']
+chain_dtype = np.dtype([(f, np.int32) for f in chain_int_fields] + [(f, np.int32, (chain_max_batch,)) for f in chain_base_fields] +
+                       [(f, np.uint8) for f in chain_enum_fields] + [(f, np.uint8) for f in chain_vrf_op_fields] + [('flags', np.bool_, (8,))])
+
+def vrf_op_code(vrf_op):
+  if(vrf_op in vrf_op_types):
+    return vrf_op_types.index(vrf_op)
+  m = re.match(r'mvu(\d+)\.vrf$', vrf_op)
+  assert m, 'Unsupported VRF destination ' + vrf_op
+  return len(vrf_op_types) + int(m.group(1))
+
+def vrf_op_name(code):
+  if(code < len(vrf_op_types)):
+    return vrf_op_types[code]
+  return 'mvu' + str(code - len(vrf_op_types)) + '.vrf'
+
+class chain_store (object):
+  def __init__(self, capacity=64, records=None):
+    if(records is None):
+      self.data = np.zeros(capacity, dtype=chain_dtype)
+      self.size = 0
+      self.results = []
+    else:
+      # Wrap existing records (e.g. a memory-mapped instruction checkpoint) without copying them
+      self.data = records
+      self.size = len(records)
+      self.results = [['', '', '', '', '', '', '', ''] for i in range(self.size)]
+
+  def __len__(self):
+    return self.size
+
+  def __getitem__(self, idx):
+    if(idx < 0):
+      idx += self.size
+    if(idx < 0 or idx >= self.size):
+      raise IndexError('chain index out of range')
+    return chain(store=self, row=idx)
+
+  def __iter__(self):
+    for row in range(self.size):
+      yield chain(store=self, row=row)
+
+  # Records of all chains in the store (a view, not a copy)
+  def records(self):
+    return self.data[:self.size]
+
+  # Adds an empty row (doubling the capacity when full) and returns its index
+  def new_row(self):
+    if(self.size == len(self.data)):
+      data = np.zeros(max(2 * len(self.data), 1), dtype=chain_dtype)
+      data[:self.size] = self.data[:self.size]
+      self.data = data
+    self.results.append(['', '', '', '', '', '', '', ''])
+    self.size += 1
+    return self.size - 1
+
+  # Copies a chain into the store and rebinds the chain handle to its new row
+  def append(self, inst):
+    row = self.new_row()
+    self.data[row] = inst.store.data[inst.row]
+    self.results[row] = inst.store.results[inst.row]
+    inst.store = self
+    inst.row = row
+
+### Accessors mapping chain attributes to the fields of its row in the store
+def chain_int_field(name):
+  def get(self):
+    return int(self.store.data[name][self.row])
+  def set(self, value):
+    self.store.data[name][self.row] = value
+  return property(get, set)
+
+# Per-batch fields are returned as views of the row (writes to elements update the store)
+def chain_base_field(name):
+  def get(self):
+    return self.store.data[name][self.row][:self.batch]
+  def set(self, value):
+    bases = self.store.data[name][self.row]
+    bases[:] = 0
+    bases[:len(value)] = value
+  return property(get, set)
+
+def chain_enum_field(name, op_types):
+  codes = {op: code for code, op in enumerate(op_types)}
+  def get(self):
+    return op_types[self.store.data[name][self.row]]
+  def set(self, value):
+    assert value in codes, 'Unsupported ' + name + ' ' + str(value)
+    self.store.data[name][self.row] = codes[value]
+  return property(get, set)
+
+def chain_vrf_op_field(name):
+  def get(self):
+    return vrf_op_name(int(self.store.data[name][self.row]))
+  def set(self, value):
+    self.store.data[name][self.row] = vrf_op_code(value)
+  return property(get, set)
+
+### Class to represent the input chains (a handle to one row of a chain_store)
+# A chain created on its own gets a private single-row store until it is appended to the instruction queue store
 class chain (object):
+   __slots__ = ['store', 'row']
+
    def __init__(self, batch=3, mvu_mrf_rd_base=0, mvu_mrf_rd_sz=0, mvu_vrf_rd_base=0, mvu_vrf_rd_sz=0, mvu_words_per_row=0, mvu_op_type='nop', mvu_tag=0, 
    	           extvrf_rd_base=0, extvrf_rd_sz=0, extvrf_op_type='nop', extvrf_tag=0,
    	           mfu0_vrf0_rd_base=0, mfu0_vrf1_rd_base=0, mfu0_vrf_rd_size=0, mfu0_act_op_type='nop', mfu0_add_op_type='nop', mfu0_mul_op_type='nop', mfu0_tag=0,
    	           mfu1_vrf0_rd_base=0, mfu1_vrf1_rd_base=0, mfu1_vrf_rd_size=0, mfu1_act_op_type='nop', mfu1_add_op_type='nop', mfu1_mul_op_type='nop', mfu1_tag=0,
    	           vrf_id0_op='--', vrf_id0_wr_base=0, vrf_id0_wr_size=0, vrf_id1_op='--', vrf_id1_wr_base=0, vrf_id1_wr_size=0, loader_src='nop',
-               last_flag=0, write_to_obuf=1):
+               last_flag=0, write_to_obuf=1, store=None, row=None):
+      if(store is not None):
+        self.store = store
+        self.row   = row
+        return
+      assert batch <= chain_max_batch, 'Chain batch cannot exceed ' + str(chain_max_batch)
+      self.store = chain_store(1)
+      self.row   = self.store.new_row()
 
       self.batch             = batch
 
@@ -79,16 +218,22 @@ class chain (object):
       self.last_flag         = last_flag          	#boolean {0,1}
       self.write_to_obuf     = write_to_obuf      	#boolean {0,1}
 
-      self.results = ['', '', '', '', '', '', '', '']
       self.wb_so_far = 0
-      self.flags = [False, False, False, False, False, False, False, False]
+
+   @property
+   def results(self):
+      return self.store.results[self.row]
+
+   @property
+   def flags(self):
+      return self.store.data['flags'][self.row]
 
    def print_chain(self):
-      print('MVU mOP {mrf_base:' + str(self.mvu_mrf_rd_base) + ', mrf_sz:' + str(self.mvu_mrf_rd_sz) + ', vrf_base:' + str(self.mvu_vrf_rd_base) + ', vrf_sz:' + str(self.mvu_vrf_rd_sz) + ', op:' + self.mvu_op_type + ', tag:' + str(self.mvu_tag))
-      print('eVRF mOP {evrf_base:' + str(self.extvrf_rd_base) + ', evrf_sz:' + str(self.extvrf_rd_sz) + ', op:' + self.extvrf_op_type + ', tag:' + str(self.extvrf_tag))
-      print('MFU0 mOP {vrf0_base:' + str(self.mfu0_vrf0_rd_base) + ', vrf1_base:' + str(self.mfu0_vrf1_rd_base) + ', vrf_sz:' + str(self.mfu0_vrf_rd_size) + ', op:' + self.mfu0_act_op_type + ',' + self.mfu0_add_op_type + ',' + self.mfu0_mul_op_type + ', tag:' + str(self.mfu0_tag))
-      print('MFU1 mOP {vrf0_base:' + str(self.mfu1_vrf0_rd_base) + ', vrf1_base:' + str(self.mfu1_vrf1_rd_base) + ', vrf_sz:' + str(self.mfu1_vrf_rd_size) + ', op:' + self.mfu1_act_op_type + ',' + self.mfu1_add_op_type + ',' + self.mfu1_mul_op_type + ', tag:' + str(self.mfu1_tag))
-      print('LD mOP {vrf_id0:' + self.vrf_id0_op + ', vrf_id0_base:' + str(self.vrf_id0_wr_base) + ', vrf_id0_sz:' + str(self.vrf_id0_wr_size) + ', vrf_id1:' + self.vrf_id1_op + ', vrf_id1_base:' + str(self.vrf_id1_wr_base) + ', vrf_id1_sz:' + str(self.vrf_id1_wr_size) + ', src:' + self.loader_src)
+      print('MVU mOP {mrf_base:' + str(self.mvu_mrf_rd_base) + ', mrf_sz:' + str(self.mvu_mrf_rd_sz) + ', vrf_base:' + str(list(self.mvu_vrf_rd_base)) + ', vrf_sz:' + str(self.mvu_vrf_rd_sz) + ', op:' + self.mvu_op_type + ', tag:' + str(self.mvu_tag))
+      print('eVRF mOP {evrf_base:' + str(list(self.extvrf_rd_base)) + ', evrf_sz:' + str(self.extvrf_rd_sz) + ', op:' + self.extvrf_op_type + ', tag:' + str(self.extvrf_tag))
+      print('MFU0 mOP {vrf0_base:' + str(list(self.mfu0_vrf0_rd_base)) + ', vrf1_base:' + str(list(self.mfu0_vrf1_rd_base)) + ', vrf_sz:' + str(self.mfu0_vrf_rd_size) + ', op:' + self.mfu0_act_op_type + ',' + self.mfu0_add_op_type + ',' + self.mfu0_mul_op_type + ', tag:' + str(self.mfu0_tag))
+      print('MFU1 mOP {vrf0_base:' + str(list(self.mfu1_vrf0_rd_base)) + ', vrf1_base:' + str(list(self.mfu1_vrf1_rd_base)) + ', vrf_sz:' + str(self.mfu1_vrf_rd_size) + ', op:' + self.mfu1_act_op_type + ',' + self.mfu1_add_op_type + ',' + self.mfu1_mul_op_type + ', tag:' + str(self.mfu1_tag))
+      print('LD mOP {vrf_id0:' + self.vrf_id0_op + ', vrf_id0_base:' + str(list(self.vrf_id0_wr_base)) + ', vrf_id0_sz:' + str(self.vrf_id0_wr_size) + ', vrf_id1:' + self.vrf_id1_op + ', vrf_id1_base:' + str(list(self.vrf_id1_wr_base)) + ', vrf_id1_sz:' + str(self.vrf_id1_wr_size) + ', src:' + self.loader_src)
       print('-----------------------------------------')
 
    def adjust_bypassed(self):
@@ -118,11 +263,96 @@ class chain (object):
         self.mfu1_vrf1_rd_base = [0] * self.batch
         self.mfu1_tag = self.mfu0_tag
 
+for name in chain_int_fields:
+  setattr(chain, name, chain_int_field(name))
+for name in chain_base_fields:
+  setattr(chain, name, chain_base_field(name))
+for name, op_types in chain_enum_fields.items():
+  setattr(chain, name, chain_enum_field(name, op_types))
+for name in chain_vrf_op_fields:
+  setattr(chain, name, chain_vrf_op_field(name))
+
+### Checkpoints: one directory with a .npy file per state (MRFs, VRFs, IO queues) and the encoded instruction chains
+checkpoint_files = ['inst', 'input', 'mvu_mrf', 'mvu_vrf', 'ext_vrf', 'mfu_vrf', 'output']
+
+def save_checkpoint(ckpt_dir, name, data):
+  np.save(ckpt_dir + '/' + name + '.npy', np.asarray(data))
+
+# Loads a checkpoint file as a read-only memory map (no copy of the data is made)
+def load_checkpoint(ckpt_dir, name):
+  return np.load(ckpt_dir + '/' + name + '.npy', mmap_mode='r')
+
+# Read-only view of an array (shares the data, writes raise an error)
+def read_only(data):
+  view = np.asarray(data).view()
+  view.setflags(write=False)
+  return view
+
+### Class to represent a hardware FIFO of nlane-wide words (NumPy ring buffer)
+class fifo (object):
+  def __init__(self, width, dtype=acc_d_type, depth=1024):
+    self.width = width
+    self.buf   = np.zeros((depth, width), dtype=dtype)
+    self.head  = 0   # index of the oldest word
+    self.count = 0   # number of words in the FIFO
+
+  def __len__(self):
+    return self.count
+
+  def __repr__(self):
+    return str(self.words())
+
+  # Contents of the FIFO (oldest word first) without popping them
+  def words(self):
+    idx = (self.head + np.arange(self.count)) % len(self.buf)
+    return self.buf[idx]
+
+  # Double the capacity (at least) when a push does not fit
+  def grow(self, num_words):
+    depth = max(2 * len(self.buf), self.count + num_words)
+    buf = np.zeros((depth, self.width), dtype=self.buf.dtype)
+    buf[:self.count] = self.words()
+    self.buf  = buf
+    self.head = 0
+
+  # Push one word or a block of words (any shape with a multiple of width elements)
+  def push(self, data):
+    data = np.asarray(data).reshape(-1, self.width)
+    num_words = data.shape[0]
+    if(self.count + num_words > len(self.buf)):
+      self.grow(num_words)
+    depth = len(self.buf)
+    tail = (self.head + self.count) % depth
+    first = min(num_words, depth - tail)
+    self.buf[tail:tail+first] = data[:first]
+    self.buf[:num_words-first] = data[first:]
+    self.count += num_words
+
+  # Pop a block of words, returned as a (num_words, width) array
+  def pop(self, num_words=1):
+    assert num_words <= self.count, 'FIFO underflow'
+    depth = len(self.buf)
+    first = min(num_words, depth - self.head)
+    if(first == num_words):
+      data = self.buf[self.head:self.head+num_words].copy()
+    else:
+      data = np.concatenate((self.buf[self.head:], self.buf[:num_words-first]))
+    self.head = (self.head + num_words) % depth
+    self.count -= num_words
+    return data
+
 ### Class for ISA simulator
 class npu_isa_sim (object):
-  def __init__(self,inst_q, ibuf_q, mvu_vrfs, ext_vrf, mfu0_vrf0, mfu0_vrf1, mfu1_vrf0, mfu1_vrf1, ntile, ndpe, nlane, vrf_init_sz):
+  def __init__(self,inst_q, ibuf_q, mvu_vrfs, ext_vrf, mfu0_vrf0, mfu0_vrf1, mfu1_vrf0, mfu1_vrf1, ntile, ndpe, nlane, vrf_init_sz,
+               mvu_engine='batched', mvu_bit_exact=True, golden_mvu=None, mvu_replay=None):
+    # Instructions are read with a program counter, the queue itself is not modified
     self.inst_q = inst_q
-    self.ibuf_q = ibuf_q
+    self.pc     = 0
+    if(isinstance(ibuf_q, fifo)):
+      self.ibuf_q = ibuf_q
+    else:
+      self.ibuf_q = fifo(nlane)
+      self.ibuf_q.push(np.asarray(ibuf_q))
     self.obuf_q = []
 
     # HW 
@@ -132,11 +362,20 @@ class npu_isa_sim (object):
     self.vrf_init_sz = vrf_init_sz
 
     # MVU states
-    self.mvu_ofifo = []
+    # mvu_engine: 'batched' (one tensor contraction per chain) or 'loop' (reference per-row implementation)
+    # mvu_bit_exact: accumulate in int32 like the HW (otherwise use float64 BLAS, exact as long as no overflow)
+    self.mvu_engine = mvu_engine
+    self.mvu_bit_exact = mvu_bit_exact
+    self.mvu_ofifo = fifo(nlane)
+    # Sampled verification: chains not in mvu_replay take their MVU results from golden_mvu (chain index -> vector per batch),
+    # replayed chains are checked against golden_mvu and mismatching chain indices are recorded in mvu_mismatches
+    self.golden_mvu = golden_mvu
+    self.mvu_replay = mvu_replay
+    self.mvu_mismatches = []
     self.mvu_mrfs  = []   
     self.mvu_accs  = [0] * self.ndpe
 
-    # Read the input fifo data and put in the vrf
+    # VRFs can be read-only views (e.g. memory-mapped checkpoints), they are copied on the first write (see get_vrf)
     self.mvu_vrfs   = mvu_vrfs
     self.mvu_all    = [0]*self.ntile
 
@@ -148,25 +387,52 @@ class npu_isa_sim (object):
     # MFU0 states
     self.mfu0_vrf0  = mfu0_vrf0
     self.mfu0_vrf1  = mfu0_vrf1
-    self.mfu0_ififo = []
+    self.mfu0_ififo = fifo(nlane)
     self.mfu0_ofifo = []
 
     # MFU1 states
     self.mfu1_vrf0  = mfu1_vrf0
     self.mfu1_vrf1  = mfu1_vrf1
-    self.mfu1_ofifo = []
-    self.mfu1_ififo = []
+    self.mfu1_ofifo = fifo(nlane)
+    self.mfu1_ififo = fifo(nlane)
    
   #### MVU macro functionality ####
-  # MVU matvec
+  # MVU matvec (batched): one contraction over tiles, VRF words and lanes for all steps, DPEs and batches
   def exe_mvu_m_inst_matvec(self, cur_chain, verbose):
     num_steps = int(math.ceil(cur_chain.mvu_mrf_rd_sz / cur_chain.mvu_vrf_rd_sz))
     batch = cur_chain.batch
+    vrf_sz = cur_chain.mvu_vrf_rd_sz
+    mrf_base = cur_chain.mvu_mrf_rd_base
+
+    # MRF block: (tile, dpe, step, word, lane) -- each step reads vrf_sz consecutive MRF rows
+    mrf_block = np.asarray(self.mvu_mrfs)[:, :, mrf_base:mrf_base+(num_steps*vrf_sz), :]
+    mrf_block = mrf_block.reshape(self.ntile, self.ndpe, num_steps, vrf_sz, self.nlane)
+    # VRF block: (tile, batch, word, lane) -- every step re-reads the same VRF words
+    vrf_idx = np.asarray(cur_chain.mvu_vrf_rd_base[:batch])[:, None] + np.arange(vrf_sz)
+    vrf_block = np.asarray(self.mvu_vrfs)[:, vrf_idx, :]
+
+    if(self.mvu_bit_exact):
+      mvu_result = np.tensordot(mrf_block.astype(acc_d_type), vrf_block.astype(acc_d_type), axes=([0, 3, 4], [0, 2, 3]))
+    else:
+      mvu_result = np.tensordot(mrf_block.astype(np.float64), vrf_block.astype(np.float64), axes=([0, 3, 4], [0, 2, 3]))
+      mvu_result = mvu_result.astype(np.int64).astype(acc_d_type)
+
+    # (dpe, step, batch) -> (step, chunk, batch, lane) to keep the output FIFO ordering of the HW
+    mvu_result = mvu_result.reshape(self.ndpe // self.nlane, self.nlane, num_steps, batch).transpose(2, 0, 3, 1)
+    self.mvu_ofifo.push(mvu_result)
+
+    if(verbose):
+      print("MVU Output FIFO: ", self.mvu_ofifo)
+
+  # MVU matvec (reference): row by row dot products
+  def exe_mvu_m_inst_matvec_loop(self, cur_chain, verbose):
+    num_steps = int(math.ceil(cur_chain.mvu_mrf_rd_sz / cur_chain.mvu_vrf_rd_sz))
+    batch = cur_chain.batch
 
     mvu_result = [[([0] * batch) for d in range(self.ndpe)] for t in range(num_steps)]
     mrf_addr = cur_chain.mvu_mrf_rd_base
     for t in range(num_steps):
-      vrf_addr = cur_chain.mvu_vrf_rd_base[:]
+      vrf_addr = list(cur_chain.mvu_vrf_rd_base)
       while(vrf_addr[0] < cur_chain.mvu_vrf_rd_base[0] + cur_chain.mvu_vrf_rd_sz):
         for tile in range(self.ntile):
           for dpe in range(self.ndpe):
@@ -178,21 +444,47 @@ class npu_isa_sim (object):
         for b in range(batch):
           vrf_addr[b] += 1
 
+    mvu_out = []
     for t in range(num_steps):
       for chunk in range(int(self.ndpe/self.nlane)):
         for b in range(batch):
           for lane in range(self.nlane):
-            self.mvu_ofifo.append(mvu_result[t][(chunk*self.nlane)+lane][b])
+            mvu_out.append(mvu_result[t][(chunk*self.nlane)+lane][b])
+    self.mvu_ofifo.push(np.array(mvu_out, dtype=np.int64).astype(acc_d_type))
 
     if(verbose):
       print("MVU Output FIFO: ", self.mvu_ofifo)
   
+  # MVU results taken from the compiler functional model (sampled verification)
+  def exe_mvu_m_inst_golden(self, cur_chain, golden, verbose):
+    self.mvu_ofifo.push(self.golden_mvu_words(golden))
+    if(verbose):
+      print("MVU Output FIFO: ", self.mvu_ofifo)
+
+  # Golden matvec results (one vector per batch) in the MVU output FIFO order: (word, batch, lane)
+  def golden_mvu_words(self, golden):
+    return np.stack([np.asarray(g).reshape(-1, self.nlane) for g in golden], axis=1).reshape(-1, self.nlane).astype(acc_d_type)
+
   # Complete MVU
   def exe_mvu_m_inst (self, cur_chain, verbose):
     if cur_chain.mvu_op_type=='matvec':
       if(verbose):
         print('MVU performing matvec')    	
-      self.exe_mvu_m_inst_matvec(cur_chain, verbose)
+      chain_idx = self.pc - 1
+      if(self.golden_mvu is not None and chain_idx not in self.mvu_replay):
+        self.exe_mvu_m_inst_golden(cur_chain, self.golden_mvu[chain_idx], verbose)
+        return
+      num_words = len(self.mvu_ofifo)
+      if(self.mvu_engine == 'batched'):
+        self.exe_mvu_m_inst_matvec(cur_chain, verbose)
+      elif(self.mvu_engine == 'loop'):
+        self.exe_mvu_m_inst_matvec_loop(cur_chain, verbose)
+      else:
+        raise AssertionError()
+      if(self.golden_mvu is not None):
+        mvu_words = self.mvu_ofifo.words()[num_words:]
+        if(not np.array_equal(mvu_words, self.golden_mvu_words(self.golden_mvu[chain_idx]))):
+          self.mvu_mismatches.append(chain_idx)
     elif cur_chain.mvu_op_type=='nop':
       if(verbose):	
         print('MVU performing nop')
@@ -203,10 +495,7 @@ class npu_isa_sim (object):
   # Extvrf move 
   def exe_extvrf_inst_move(self, cur_chain, verbose):
     batch = cur_chain.batch
-    for i in range(cur_chain.extvrf_rd_sz):
-      for b in range(batch):
-        for j in range(self.nlane):
-          self.mfu0_ififo.append((self.mvu_ofifo.pop(0)).astype(acc_d_type))
+    self.mfu0_ififo.push(self.mvu_ofifo.pop(cur_chain.extvrf_rd_sz * batch).astype(acc_d_type))
 
     if(verbose):
       print("eVRF Output FIFO: ", self.mfu0_ififo)
@@ -214,12 +503,9 @@ class npu_isa_sim (object):
   # Extvrf active: reading from external vrf 
   def exe_extvrf_inst_extvrf(self, cur_chain, verbose):
     batch = cur_chain.batch
-    extvrf_rd_addr_tmp = cur_chain.extvrf_rd_base[:]
-    for i in range(cur_chain.extvrf_rd_sz):
-      for b in range(batch):
-        for j in range(self.nlane):
-          self.mfu0_ififo.append(self.ext_vrf[extvrf_rd_addr_tmp[b]][j])
-        extvrf_rd_addr_tmp[b] += 1  
+    # (word, batch) read addresses in FIFO order
+    extvrf_rd_addr = np.arange(cur_chain.extvrf_rd_sz)[:, None] + np.asarray(cur_chain.extvrf_rd_base[:batch])
+    self.mfu0_ififo.push(self.ext_vrf[extvrf_rd_addr])
 
     if(verbose):
       print("eVRF Output FIFO: ", self.mfu0_ififo)
@@ -240,166 +526,114 @@ class npu_isa_sim (object):
     else:
       raise AssertionError()
 
-  #### MFU0 macro functionality ####
+  #### MFU macro functionality ####
+  # Applies activation -> add/sub/max -> multiply to a (rd_size, batch, nlane) block read from the input FIFO
+  def exe_mfu_block(self, ififo, ofifo, vrf0, vrf1, vrf0_rd_base, vrf1_rd_base, rd_size, batch, act_op_type, add_op_type, mul_op_type):
+    assert act_op_type in mfu_act_ops and add_op_type in mfu_add_ops and mul_op_type in mfu_mul_ops
+
+    temp = ififo.pop(rd_size * batch).reshape(rd_size, batch, self.nlane).astype(acc_d_type)
+    act_func = mfu_act_ops[act_op_type]
+    if(act_func is not None):
+      temp = act_func(temp)
+
+    add_op = mfu_add_ops[add_op_type]
+    if(add_op is not None):
+      vrf0_idx = np.arange(rd_size)[:, None] + np.asarray(vrf0_rd_base[:batch])
+      add_func, swap = add_op
+      if(swap):
+        temp = add_func(vrf0[vrf0_idx], temp).astype(acc_d_type)
+      else:
+        temp = add_func(temp, vrf0[vrf0_idx]).astype(acc_d_type)
+
+    mul_func = mfu_mul_ops[mul_op_type]
+    if(mul_func is not None):
+      vrf1_idx = np.arange(rd_size)[:, None] + np.asarray(vrf1_rd_base[:batch])
+      temp = mul_func(vrf1[vrf1_idx], temp).astype(acc_d_type)
+
+    ofifo.push(temp)
+
+  # MFU0
   def exe_mfu0_m_inst(self, cur_chain, verbose): 
-    batch = cur_chain.batch
-    mfu0_vrf0_idx = cur_chain.mfu0_vrf0_rd_base[:]
-    mfu0_vrf1_idx = cur_chain.mfu0_vrf1_rd_base[:]
-
     if(cur_chain.mfu0_act_op_type=='nop' and cur_chain.mfu0_add_op_type=='nop' and cur_chain.mfu0_mul_op_type=='nop'):
       if(verbose):
         print('MFU0 performing nop')
     else:
       if(verbose):
         print('MFU0 performing ' + cur_chain.mfu0_act_op_type + ', ' + cur_chain.mfu0_add_op_type + ', ' + cur_chain.mfu0_mul_op_type)
-      for i in range (cur_chain.mfu0_vrf_rd_size):
-        for b in range(batch):
-          for j in range (self.nlane):
-            if(cur_chain.mfu0_act_op_type=='nop' or cur_chain.mfu0_act_op_type=='move'):
-              temp = (self.mfu0_ififo.pop(0)).astype(acc_d_type)
-            elif(cur_chain.mfu0_act_op_type=='relu'):
-              temp = myReLU((self.mfu0_ififo.pop(0)).astype(acc_d_type))
-            elif(cur_chain.mfu0_act_op_type=='tanh'):
-              temp = myTanh((self.mfu0_ififo.pop(0)).astype(acc_d_type))
-            elif(cur_chain.mfu0_act_op_type=='sig'):
-              temp = mySigmoid((self.mfu0_ififo.pop(0)).astype(acc_d_type))
-            else:
-              raise AssertionError()
-
-            if(cur_chain.mfu0_add_op_type=='nop' or cur_chain.mfu0_add_op_type=='move'):
-              temp = temp
-            elif(cur_chain.mfu0_add_op_type=='add'):
-              temp = (self.mfu0_vrf0[mfu0_vrf0_idx[b]][j] + temp).astype(acc_d_type)
-            elif(cur_chain.mfu0_add_op_type=='sub_a_b'):
-              temp = (temp - self.mfu0_vrf0[mfu0_vrf0_idx[b]][j]).astype(acc_d_type)
-            elif(cur_chain.mfu0_add_op_type=='sub_b_a'):
-              temp = (self.mfu0_vrf0[mfu0_vrf0_idx[b]][j] - temp).astype(acc_d_type)
-            elif(cur_chain.mfu0_add_op_type=='max'):
-              temp = max(self.mfu0_vrf0[mfu0_vrf0_idx[b]][j],temp).astype(acc_d_type)
-            else:
-              raise AssertionError()
-
-            if(cur_chain.mfu0_mul_op_type=='nop' or cur_chain.mfu0_mul_op_type=='move'):
-              temp = temp
-            elif(cur_chain.mfu0_mul_op_type=='mul'):
-              temp = (self.mfu0_vrf1[mfu0_vrf1_idx[b]][j] * temp).astype(acc_d_type)
-              
-            else:
-              raise AssertionError()
-
-            self.mfu1_ififo.append(temp)
-
-          mfu0_vrf0_idx[b] = mfu0_vrf0_idx[b] + 1
-          mfu0_vrf1_idx[b] = mfu0_vrf1_idx[b] + 1
-
+      self.exe_mfu_block(self.mfu0_ififo, self.mfu1_ififo, self.mfu0_vrf0, self.mfu0_vrf1, cur_chain.mfu0_vrf0_rd_base, cur_chain.mfu0_vrf1_rd_base,
+                         cur_chain.mfu0_vrf_rd_size, cur_chain.batch, cur_chain.mfu0_act_op_type, cur_chain.mfu0_add_op_type, cur_chain.mfu0_mul_op_type)
       if(verbose):
         print("MFU0 Output FIFO: ", self.mfu1_ififo)
 
-
-  #### MFU1 macro functionality ####
+  # MFU1
   def exe_mfu1_m_inst(self, cur_chain, verbose): 
-    batch = cur_chain.batch
-    mfu1_vrf0_idx = cur_chain.mfu1_vrf0_rd_base[:]
-    mfu1_vrf1_idx = cur_chain.mfu1_vrf1_rd_base[:]
-
     if(cur_chain.mfu1_act_op_type=='nop' and cur_chain.mfu1_add_op_type=='nop' and cur_chain.mfu1_mul_op_type=='nop'):
       if(verbose):
         print('MFU1 performing nop')
     else:
       if(verbose):
         print('MFU1 performing ' + cur_chain.mfu1_act_op_type + ', ' + cur_chain.mfu1_add_op_type + ', ' + cur_chain.mfu1_mul_op_type)
-      for i in range (cur_chain.mfu1_vrf_rd_size):
-        for b in range(batch):
-          for j in range (self.nlane):
-            if(cur_chain.mfu1_act_op_type=='nop' or cur_chain.mfu1_act_op_type=='move'):
-              temp = (self.mfu1_ififo.pop(0)).astype(acc_d_type)
-            elif(cur_chain.mfu1_act_op_type=='relu'):
-              temp = myReLU((self.mfu1_ififo.pop(0)).astype(acc_d_type))
-            elif(cur_chain.mfu1_act_op_type=='tanh'):
-              temp = myTanh((self.mfu1_ififo.pop(0)).astype(acc_d_type))
-            elif(cur_chain.mfu1_act_op_type=='sig'):
-              temp = mySigmoid((self.mfu1_ififo.pop(0)).astype(acc_d_type))
-            else:
-              raise AssertionError()
-
-            if(cur_chain.mfu1_add_op_type=='nop' or cur_chain.mfu1_add_op_type=='move'):
-              temp = temp
-            elif(cur_chain.mfu1_add_op_type=='add'):
-              temp = (self.mfu1_vrf0[mfu1_vrf0_idx[b]][j] + temp).astype(acc_d_type)
-            elif(cur_chain.mfu1_add_op_type=='sub_a_b'):
-              temp = (temp - self.mfu1_vrf0[mfu1_vrf0_idx[b]][j]).astype(acc_d_type)
-            elif(cur_chain.mfu1_add_op_type=='sub_b_a'):
-              temp = (self.mfu1_vrf0[mfu1_vrf0_idx[b]][j] - temp).astype(acc_d_type)
-            elif(cur_chain.mfu1_add_op_type=='max'):
-              temp = max(self.mfu1_vrf0[mfu1_vrf0_idx[b]][j],temp).astype(acc_d_type)
-            else:
-              raise AssertionError()
-
-            if(cur_chain.mfu1_mul_op_type=='nop' or cur_chain.mfu1_mul_op_type=='move'):
-              temp = temp
-            elif(cur_chain.mfu1_mul_op_type=='mul'):
-              temp = (self.mfu1_vrf1[mfu1_vrf1_idx[b]][j] * temp).astype(acc_d_type)
-          
-            else:
-              raise AssertionError()
-
-            self.mfu1_ofifo.append(temp)
-
-          mfu1_vrf0_idx[b] = mfu1_vrf0_idx[b] + 1
-          mfu1_vrf1_idx[b] = mfu1_vrf1_idx[b] + 1 
-
+      self.exe_mfu_block(self.mfu1_ififo, self.mfu1_ofifo, self.mfu1_vrf0, self.mfu1_vrf1, cur_chain.mfu1_vrf0_rd_base, cur_chain.mfu1_vrf1_rd_base,
+                         cur_chain.mfu1_vrf_rd_size, cur_chain.batch, cur_chain.mfu1_act_op_type, cur_chain.mfu1_add_op_type, cur_chain.mfu1_mul_op_type)
       if(verbose):
-        print("MFU1 Output FIFO: ", self.mfu1_ififo) 
+        print("MFU1 Output FIFO: ", self.mfu1_ofifo) 
 
   #### Loader macro functionality ####
+  # Returns the VRF state with the given attribute name, copying it first if it is read-only (copy-on-write)
+  def writable_vrf(self, name):
+    vrf = getattr(self, name)
+    if(isinstance(vrf, np.ndarray) and not vrf.flags.writeable):
+      vrf = np.array(vrf)
+      setattr(self, name, vrf)
+    return vrf
+
+  # Returns the VRF targeted by a loader destination string (e.g. mvu0.vrf, extvrf, mfu0.vrf0) or None
+  def get_vrf(self, vrf_op):
+    seprator = ''
+    if(seprator.join(vrf_op[0:3]) == 'mvu'):
+      m = re.search('mvu(\d+)',vrf_op,re.IGNORECASE)
+      return self.writable_vrf('mvu_vrfs')[int(m.group(1))]
+    elif(vrf_op == 'extvrf'):
+      return self.writable_vrf('ext_vrf')
+    elif(vrf_op == 'mfu0.vrf0'):
+      return self.writable_vrf('mfu0_vrf0')
+    elif(vrf_op == 'mfu0.vrf1'):
+      return self.writable_vrf('mfu0_vrf1')
+    elif(vrf_op == 'mfu1.vrf0'):
+      return self.writable_vrf('mfu1_vrf0')
+    elif(vrf_op == 'mfu1.vrf1'):
+      return self.writable_vrf('mfu1_vrf1')
+    return None
+
   # Loader for the input   
   def exe_ld_inst_in(self, cur_chain):
-    curr_obuf_q = []
+    seprator = ''
+    id_str_0 = cur_chain.vrf_id0_op
+    id_str_1 = cur_chain.vrf_id1_op
+    dest_vrfs = []
+    # Loading to MVU VRFs (the second destination also uses the first destination's MVU id)
+    if(seprator.join(id_str_0[0:3]) == 'mvu'):
+      dest_vrfs.append(self.get_vrf(id_str_0))
+    if(seprator.join(id_str_1[0:3]) == 'mvu'):
+      dest_vrfs.append(self.get_vrf(id_str_0))
+    # Loading to eVRF or one of the MFU VRFs
+    for vrf_op in ['extvrf', 'mfu0.vrf0', 'mfu0.vrf1', 'mfu1.vrf0', 'mfu1.vrf1']:
+      if((id_str_0 == vrf_op) or (id_str_1 == vrf_op)):
+        dest_vrfs.append(self.get_vrf(vrf_op))
+        break
+
+    wb_data = self.ibuf_q.pop(cur_chain.vrf_id0_wr_size * cur_chain.batch).reshape(cur_chain.vrf_id0_wr_size, cur_chain.batch, self.nlane)
     for i in range (cur_chain.vrf_id0_wr_size):
       for b in range(cur_chain.batch):
         vrf_addr = cur_chain.vrf_id0_wr_base[b] + i
-        wb_data = self.ibuf_q.pop(0)
-
-        # Loading to MVU VRFs
-        seprator = ''
-        id_str_0 = cur_chain.vrf_id0_op
-        src_0 = seprator.join(id_str_0[0:3])
-        id_str_1 = cur_chain.vrf_id1_op
-        src_1 = seprator.join(id_str_1[0:3])
-        if(src_0 == 'mvu'):
-          m = re.search('mvu(\d+)',id_str_0,re.IGNORECASE)
-          vrf_id = int(m.group(1))
-          self.mvu_vrfs[vrf_id][vrf_addr][:]= wb_data
-        if(src_1 == 'mvu'):
-          m = re.search('mvu(\d+)',id_str_0,re.IGNORECASE)
-          vrf_id = int(m.group(1))
-          self.mvu_vrfs[vrf_id][vrf_addr][:]= wb_data
-
-        # Loading to eVRF
-        if((cur_chain.vrf_id0_op=='extvrf') or (cur_chain.vrf_id1_op=='extvrf')):
-          self.ext_vrf[vrf_addr][:]= wb_data
-        # Loading to MFU0 VRF0
-        elif((cur_chain.vrf_id0_op=='mfu0.vrf0') or (cur_chain.vrf_id1_op=='mfu0.vrf0')):
-          self.mfu0_vrf0[vrf_addr][:]= wb_data
-        # Loading to MFU0 VRF1
-        elif((cur_chain.vrf_id0_op=='mfu0.vrf1') or (cur_chain.vrf_id1_op=='mfu0.vrf1')):
-          self.mfu0_vrf1[vrf_addr][:]= wb_data
-        # Loading to MFU1 VRF0
-        elif((cur_chain.vrf_id0_op=='mfu1.vrf0') or (cur_chain.vrf_id1_op=='mfu1.vrf0')):
-          self.mfu1_vrf0[vrf_addr][:]= wb_data
-        # Loading to MFU1 VRF1
-        elif((cur_chain.vrf_id0_op=='mfu1.vrf1') or (cur_chain.vrf_id1_op=='mfu1.vrf1')):
-          self.mfu1_vrf1[vrf_addr][:]= wb_data
-
+        for vrf in dest_vrfs:
+          vrf[vrf_addr][:] = wb_data[i][b]
         if(cur_chain.write_to_obuf == 1):
-          self.obuf_q.append(wb_data)
+          self.obuf_q.append(wb_data[i][b])
 
   # flush is used to make the fifo empty if loader wb instruction don't read all the data in fifo
   def exe_ld_inst_flush(self, cur_chain, verbose):
-    for i in range(cur_chain.vrf_id0_wr_size):
-      for b in range(cur_chain.batch):
-        for j in range (self.nlane):
-          temp_nul = self.mfu1_ofifo.pop(0)
+    self.mfu1_ofifo.pop(cur_chain.vrf_id0_wr_size * cur_chain.batch)
     if(verbose):
       print("Loader Output FIFO: ", self.mfu1_ofifo)
      
@@ -407,54 +641,18 @@ class npu_isa_sim (object):
   def exe_ld_inst_wb(self, cur_chain, verbose):
     if(verbose):
       print("Loader Output FIFO: ", self.mfu1_ofifo)
-    seprator = ''
-    id_str_0 = cur_chain.vrf_id0_op
-    id_str_1 = cur_chain.vrf_id1_op
-    curr_obuf_q = []
+    # wb0: write back to the first destination, wb1: write back to the second destination
+    dest_vrf0 = self.get_vrf(cur_chain.vrf_id0_op)
+    dest_vrf1 = self.get_vrf(cur_chain.vrf_id1_op)
+    wb_data = self.mfu1_ofifo.pop(cur_chain.vrf_id0_wr_size * cur_chain.batch).reshape(cur_chain.vrf_id0_wr_size, cur_chain.batch, self.nlane)
     for i in range(cur_chain.vrf_id0_wr_size):
       for b in range(cur_chain.batch):
-        curr_obuf_val = []
-        tmp_addr0 = cur_chain.vrf_id0_wr_base[b] + i
-        tmp_addr1 = cur_chain.vrf_id1_wr_base[b] + i
-        for j in range (self.nlane):
-          wb_data = self.mfu1_ofifo.pop(0)
-          curr_obuf_val.append(wb_data)
-          # wb0:write back to the first destination
-          if (seprator.join(id_str_0[0:3]) == 'mvu'):
-            m = re.search('mvu(\d+)',id_str_0,re.IGNORECASE)
-            id_int_0 = int(m.group(1))
-            self.mvu_vrfs[id_int_0][tmp_addr0][j]= wb_data
-            #if (self.mvu_vrfs[id_int_0][tmp_addr0][j] == -128):
-            #  self.mvu_vrfs[id_int_0][tmp_addr0][j] = 0
-          if(cur_chain.vrf_id0_op=='mfu0.vrf0'):
-            self.mfu0_vrf0[tmp_addr0][j]= wb_data
-          if(cur_chain.vrf_id0_op=='mfu0.vrf1'):
-            self.mfu0_vrf1[tmp_addr0][j] = wb_data 
-          if(cur_chain.vrf_id0_op=='mfu1.vrf0'):
-            self.mfu1_vrf0[tmp_addr0][j] = wb_data
-          if(cur_chain.vrf_id0_op=='mfu1.vrf1'):
-            self.mfu1_vrf1[tmp_addr0][j] = wb_data 
-          if(cur_chain.vrf_id0_op=='extvrf'):
-            self.ext_vrf[tmp_addr0][j] = wb_data 
-          # wb1:write back to the second destination 
-          if (seprator.join(id_str_1[0:3]) == 'mvu'):
-            m = re.search('mvu(\d+)',id_str_1,re.IGNORECASE)
-            id_int_1 = int(m.group(1))
-            self.mvu_vrfs[id_int_1][tmp_addr1][j]= wb_data
-            #if (self.mvu_vrfs[id_int_1][tmp_addr1][j] == -128):
-            #  self.mvu_vrfs[id_int_1][tmp_addr1][j] = 0
-          if(cur_chain.vrf_id1_op=='mfu0.vrf0'):
-            self.mfu0_vrf0[tmp_addr1][j] = wb_data
-          if(cur_chain.vrf_id1_op=='mfu0.vrf1'):
-            self.mfu0_vrf1[tmp_addr1][j] = wb_data 
-          if(cur_chain.vrf_id1_op=='mfu1.vrf0'):
-            self.mfu1_vrf0[tmp_addr1][j] = wb_data
-          if(cur_chain.vrf_id1_op=='mfu1.vrf1'):
-            self.mfu1_vrf1[tmp_addr1][j] = wb_data 
-          if(cur_chain.vrf_id1_op=='extvrf'):
-            self.ext_vrf[tmp_addr1][j] = wb_data 
+        if(dest_vrf0 is not None):
+          dest_vrf0[cur_chain.vrf_id0_wr_base[b] + i][:] = wb_data[i][b]
+        if(dest_vrf1 is not None):
+          dest_vrf1[cur_chain.vrf_id1_wr_base[b] + i][:] = wb_data[i][b]
         if(cur_chain.write_to_obuf == 1):
-          self.obuf_q.append(curr_obuf_val)
+          self.obuf_q.append(wb_data[i][b])
 
   # Complete loader 
   def exe_ld_m_inst (self, cur_chain, verbose):
@@ -478,7 +676,8 @@ class npu_isa_sim (object):
   
   # execute all macro insts in the chain
   def step(self, verbose=0):
-    cur_chain = self.inst_q.pop(0)
+    cur_chain = self.inst_q[self.pc]
+    self.pc += 1
     if(verbose):
       cur_chain.print_chain()
     self.exe_mvu_m_inst(cur_chain, verbose)
@@ -0,0 +1,404 @@
+from fsim import chain_store
+from perf_model import pipeline_stages
+from perf_model import pipeline_model
+from perf_model import npu_perf_model
+from perf_model import estimate_program
+from perf_model import mfu_active
+
+'''
+This module implements an optimization pass over the instruction chains of a compiled NPU program (npu.inst_q).
+The front-end emits chains in the order of the layer code, while the NPU executes the mOPs of each pipeline block
+(MVU, eVRF, MFU0, MFU1, loader) in that order and stalls a block until the write-back count reaches the tag of its
+mOP. For example, the input matvecs of the next RNN time step are emitted after the recurrent matvec of the current
+step, so the MVU sits idle while the recurrent result is written back. The pass:
+1) double-buffers vectors that are written more than once, so that writing the next value of a vector does not have
+   to wait for all the readers of its current value,
+2) reorders independent chains using a list scheduler driven by the pipeline model of the NPU (perf_model), and
+3) recomputes the write-back counts and tags of the resulting program.
+Chains passing a vector through the eVRF are not fused: the MFU stages of a chain run in a fixed order (MFU0 then MFU1,
+each with activation, add and multiply), and the layers of npu_layers always read the vector back into an earlier
+stage than the last one used by the producing chain, so the fused chain would apply the operations in the wrong order.
+A chain and the loader-only chains following it (write-backs to MVU tiles and flushes) communicate through the FIFOs
+between the pipeline blocks, so they are always moved together as one group. The order of the input buffer reads,
+output buffer writes and program ends (last flags) is kept.
+'''
+
+# Memory space written by each loader destination (MVU tile destinations are 'mvu<i>.vrf')
+vrf_op_spaces = {
+	'extvrf'	: 'evrf',
+	'mfu0.vrf0'	: 'mfu0_add',
+	'mfu0.vrf1'	: 'mfu0_mul',
+	'mfu1.vrf0'	: 'mfu1_add',
+	'mfu1.vrf1'	: 'mfu1_mul'
+}
+
+mfu_add_ops = ['add', 'sub_a_b', 'sub_b_a', 'max']
+
+# Returns the memory space and MVU tile (None for the other spaces) written by a loader destination
+def vrf_op_space(vrf_op):
+	if(vrf_op.startswith('mvu')):
+		return 'mvu_vrf', int(vrf_op[3:vrf_op.index('.')])
+	return vrf_op_spaces[vrf_op], None
+
+def mfu_op(inst, mfu, op):
+	return getattr(inst, mfu + '_' + op + '_op_type')
+
+def mfu_bypassed(inst, mfu):
+	return all(mfu_op(inst, mfu, op) == 'move' for op in ['act', 'add', 'mul'])
+
+# A chain is loader-only if all its blocks except the loader are idle
+def is_loader_only(inst):
+	return inst.mvu_op_type == 'nop' and inst.extvrf_op_type == 'nop' and not mfu_active(inst, 'mfu0') and \
+		not mfu_active(inst, 'mfu1')
+
+'''
+Returns the VRF reads and writes of a chain as lists of (stage, space, base field, batch index, size, tile) tuples.
+The address of an access is getattr(inst, field)[b], which is also how the renaming step updates it.
+'''
+def chain_accesses(inst):
+	reads = []
+	writes = []
+	batch = inst.batch
+	if(inst.mvu_op_type == 'matvec'):
+		reads += [('mvu', 'mvu_vrf', 'mvu_vrf_rd_base', b, inst.mvu_vrf_rd_sz, None) for b in range(batch)]
+	if(inst.extvrf_op_type == 'extvrf'):
+		reads += [('evrf', 'evrf', 'extvrf_rd_base', b, inst.extvrf_rd_sz, None) for b in range(batch)]
+	for mfu in ['mfu0', 'mfu1']:
+		size = getattr(inst, mfu + '_vrf_rd_size')
+		if(mfu_op(inst, mfu, 'add') in mfu_add_ops):
+			reads += [(mfu, mfu + '_add', mfu + '_vrf0_rd_base', b, size, None) for b in range(batch)]
+		if(mfu_op(inst, mfu, 'mul') == 'mul'):
+			reads += [(mfu, mfu + '_mul', mfu + '_vrf1_rd_base', b, size, None) for b in range(batch)]
+	if(inst.loader_src in ['in', 'wb']):
+		# The loader writes vrf_id0_wr_size words to each destination (input loads use the first base for both)
+		dests = [(inst.vrf_id0_op, 'vrf_id0_wr_base'), (inst.vrf_id1_op, 'vrf_id1_wr_base' if inst.loader_src == 'wb' else 'vrf_id0_wr_base')]
+		for vrf_op, field in dests:
+			if(vrf_op == '--'):
+				continue
+			space, tile = vrf_op_space(vrf_op)
+			writes += [('ld', space, field, b, inst.vrf_id0_wr_size, tile) for b in range(batch)]
+	return reads, writes
+
+def access_words(inst, access):
+	_, space, field, b, size, _ = access
+	base = int(getattr(inst, field)[b])
+	return [(space, addr) for addr in range(base, base + size)]
+
+'''
+A group is a chain together with the loader-only chains that write back or flush its results (or the per-tile chains
+of one input load). Groups are the units moved by the scheduler.
+'''
+class chain_group:
+	def __init__(self, idx, chains):
+		self.idx = idx				# Position of the group in the original program
+		self.chains = chains		# chain handles (in order)
+		self.preds = set()			# Groups that have to be issued before this one
+		self.succs = set()
+		self.stage_deps = {}		# (chain position, stage) -> groups producing the vectors read by this stage
+		self.done = 0				# Cycle at which the last write-back of the group completes (pipeline model)
+
+	def is_load(self):
+		return any(inst.loader_src == 'in' for inst in self.chains)
+
+	def writes_obuf(self):
+		return any(inst.write_to_obuf == 1 and inst.loader_src != 'nop' for inst in self.chains)
+
+	def has_last_flag(self):
+		return any(inst.last_flag == 1 for inst in self.chains)
+
+# Splits a list of chains into groups (see chain_group)
+def chain_groups(chains):
+	groups = []
+	for inst in chains:
+		if(groups and is_loader_only(inst)):
+			prev = groups[-1].chains[-1]
+			if(inst.loader_src in ['wb', 'flush'] and not prev.last_flag):
+				groups[-1].chains.append(inst)
+				continue
+			# Per-tile chains of a load to the MVU VRFs
+			if(inst.loader_src == 'in' and prev.loader_src == 'in' and is_loader_only(prev) and not prev.last_flag and \
+				inst.vrf_id0_op.startswith('mvu') and prev.vrf_id0_op.startswith('mvu') and \
+				inst.results[-1] == prev.results[-1] and list(inst.vrf_id0_wr_base) == list(prev.vrf_id0_wr_base)):
+				groups[-1].chains.append(inst)
+				continue
+		groups.append(chain_group(len(groups), [inst]))
+	return groups
+
+'''
+Builds the dependency graph of a list of groups (in program order): read-after-write, write-after-read and
+write-after-write on VRF words (MVU VRF words of all tiles are treated as one, since the MVU reads all tiles), plus
+the order of the input loads and of the output buffer writes. It also records which groups produce the vectors read
+by each stage of each chain, which is what the tags of the chain encode.
+'''
+def build_dependencies(groups):
+	last_writer = {}
+	readers = {}
+	last_load = None
+	last_obuf = None
+	for group in groups:
+		group.preds = set()
+		group.succs = set()
+		group.stage_deps = {}
+		writes = []
+		for pos, inst in enumerate(group.chains):
+			reads, chain_writes = chain_accesses(inst)
+			for access in reads:
+				for word in access_words(inst, access):
+					producer = last_writer.get(word)
+					if(producer is not None and producer is not group):
+						group.preds.add(producer)
+						group.stage_deps.setdefault((pos, access[0]), set()).add(producer)
+					readers.setdefault(word, set()).add(group)
+			writes += [(inst, access) for access in chain_writes]
+		for inst, access in writes:
+			for word in access_words(inst, access):
+				if(word in last_writer):
+					group.preds.add(last_writer[word])
+				group.preds.update(readers.get(word, set()))
+				last_writer[word] = group
+				readers[word] = set()
+		if(group.is_load()):
+			if(last_load is not None):
+				group.preds.add(last_load)
+			last_load = group
+		if(group.writes_obuf()):
+			if(last_obuf is not None):
+				group.preds.add(last_obuf)
+			last_obuf = group
+		group.preds.discard(group)
+		for pred in group.preds:
+			pred.succs.add(group)
+
+# Returns a wait function for the pipeline model that waits for the write-backs of the groups a group depends on
+def wait_for_groups(group):
+	return lambda inst, pos, stage: max([g.done for g in group.stage_deps.get((pos, stage), [])] + [0])
+
+'''
+Double-buffers the vectors written more than once. A vector is an address range of a memory space that is always
+accessed as a whole (every access overlapping it has the same base and size, and MVU VRF writes cover all the tiles).
+The even writes of such a vector (and the reads of the values they produce) are redirected to a shadow copy allocated
+in the same memory space, so that consecutive values of the vector can be live at the same time. Returns the number
+of double-buffered vectors.
+'''
+def double_buffer(npu, groups):
+	num_tiles = npu.arch_params['tiles']
+	# Collect the accesses of each memory space and the tiles written by each group
+	accesses = {}
+	tiles_written = {}
+	writes_per_vector = {}
+	for group in groups:
+		for inst in group.chains:
+			reads, writes = chain_accesses(inst)
+			for access in reads + writes:
+				if(access[4] > 0):
+					accesses.setdefault(access[1], set()).add((int(getattr(inst, access[2])[access[3]]), access[4]))
+			for access in writes:
+				vector = (access[1], int(getattr(inst, access[2])[access[3]]))
+				tiles_written.setdefault((group.idx, vector), set()).add(access[5])
+				writes_per_vector.setdefault(vector, set()).add(group.idx)
+	# Find the vectors (ranges accessed as a whole)
+	vectors = {}
+	for space, ranges in accesses.items():
+		ranges = sorted(ranges)
+		cluster = []
+		cluster_end = -1
+		for base, size in ranges + [(float('inf'), 0)]:
+			if(base >= cluster_end):
+				if(len(cluster) == 1):
+					vectors[(space, cluster[0][0])] = cluster[0][1]
+				cluster = []
+			cluster.append((base, size))
+			cluster_end = max(cluster_end, base + size)
+	for (group_idx, vector), tiles in tiles_written.items():
+		if(vector[0] == 'mvu_vrf' and len(tiles) != num_tiles):
+			vectors.pop(vector, None)
+	# Allocate shadow copies
+	shadows = {}
+	for vector, size in sorted(vectors.items()):
+		if(len(writes_per_vector.get(vector, [])) < 2):
+			continue
+		addr = npu.alloc_space(vector[0], size)
+		if(addr != -1):
+			shadows[vector] = addr
+	# Redirect the accesses to the even values of each vector (value 0 is the initial content, value 1 is the first write)
+	values = dict((vector, 0) for vector in shadows)
+	def redirect(inst, access):
+		vector = (access[1], int(getattr(inst, access[2])[access[3]]))
+		if(vector in shadows and values[vector] >= 2 and values[vector] % 2 == 0):
+			getattr(inst, access[2])[access[3]] = shadows[vector]
+	for group in groups:
+		written = set()
+		writes = []
+		for inst in group.chains:
+			reads, chain_writes = chain_accesses(inst)
+			for access in reads:
+				redirect(inst, access)
+			writes += [(inst, access) for access in chain_writes]
+		# Input loads use the same base field for both destinations, so the field is only redirected once
+		done = set()
+		for inst, access in writes:
+			vector = (access[1], int(getattr(inst, access[2])[access[3]]))
+			if(vector in shadows and vector not in written):
+				values[vector] += 1
+				written.add(vector)
+			if((inst.row, access[2], access[3]) not in done):
+				redirect(inst, access)
+				done.add((inst.row, access[2], access[3]))
+	return len(shadows)
+
+'''
+Returns the critical path length of each group (cycles from the start of the group to the end of the program along
+its successors, each group taking the cycles it needs on an idle pipeline), used as the scheduling priority.
+'''
+def critical_paths(groups, perf):
+	for group in reversed(groups):
+		latency = pipeline_model(perf).issue(group.chains, lambda inst, pos, stage: 0, commit=False)[1]
+		group.critical_path = latency + max([succ.critical_path for succ in group.succs] + [0])
+
+'''
+List scheduler: issues the groups of one program (between two last flags) in an order that respects their
+dependencies. Input loads are issued as soon as they are ready (the inputs are available from the start of the
+program). Among the other ready groups (the oldest ones, up to a window), the 'critical_path' priority issues the group
+with the longest critical path, and the 'earliest_start' priority issues the group that can start the earliest in the
+pipeline model, unless it would delay the start of the group with the longest critical path.
+'''
+def schedule_groups(groups, perf, priority, window=32):
+	model = pipeline_model(perf)
+	order = []
+	num_preds = dict((group, len(group.preds)) for group in groups)
+	ready = [group for group in groups if num_preds[group] == 0]
+	while(ready):
+		ready.sort(key=lambda group: group.idx)
+		candidates = ready[:window]
+		loads = [group for group in candidates if group.is_load() and all(is_loader_only(inst) for inst in group.chains)]
+		critical = max(candidates, key=lambda group: (group.critical_path, -group.idx))
+		if(loads):
+			best = loads[0]
+		elif(priority == 'critical_path'):
+			best = critical
+		else:
+			critical_start = model.issue(critical.chains, wait_for_groups(critical), commit=False)[0]
+			starts = dict((group, model.issue(group.chains, wait_for_groups(group), commit=False)[0]) for group in candidates)
+			best = critical
+			for group in sorted(candidates, key=lambda group: (starts[group], group.idx)):
+				if(group is critical):
+					break
+				trial = model.copy()
+				trial.issue(group.chains, wait_for_groups(group))
+				if(trial.issue(critical.chains, wait_for_groups(critical), commit=False)[0] <= critical_start):
+					best = group
+					break
+		model.issue(best.chains, wait_for_groups(best))
+		best.done = model.wb_done[-1]
+		ready.remove(best)
+		order.append(best)
+		for succ in best.succs:
+			num_preds[succ] -= 1
+			if(num_preds[succ] == 0):
+				ready.append(succ)
+	assert len(order) == len(groups), 'Dependency cycle in the NPU program'
+	return order
+
+# Returns the cycles predicted by the pipeline model for a group order (using the group dependencies)
+def simulate_groups(order, perf):
+	model = pipeline_model(perf)
+	cycles = 0
+	for group in order:
+		cycles = max(cycles, model.issue(group.chains, wait_for_groups(group))[1])
+		group.done = model.wb_done[-1]
+	return cycles
+
+# Schedules the groups of one program with each priority and returns the fastest order (program order if no better)
+def best_schedule(groups, perf):
+	build_dependencies(groups)
+	critical_paths(groups, perf)
+	best = list(groups)
+	best_cycles = simulate_groups(best, perf)
+	for priority in ['critical_path', 'earliest_start']:
+		order = schedule_groups(groups, perf, priority)
+		cycles = simulate_groups(order, perf)
+		if(cycles < best_cycles):
+			best = order
+			best_cycles = cycles
+	return best
+
+'''
+Recomputes the write-back counts and tags of a program: the tag of a block is the write-back count right after the
+last write-back (before the chain) to any of the words it reads. Chains with a bypassed MFU inherit the tag of the
+previous block like in adjust_bypassed(). Returns the highest tag.
+'''
+def retag(inst_q):
+	last_wb = {}
+	wb_count = 0
+	highest_tag = 0
+	for inst in inst_q:
+		reads, writes = chain_accesses(inst)
+		tags = dict((stage, 0) for stage in pipeline_stages)
+		for access in reads:
+			for space, addr in access_words(inst, access):
+				tags[access[0]] = max(tags[access[0]], last_wb.get((space, addr), 0))
+		if(inst.mvu_op_type != 'nop'):
+			inst.mvu_tag = tags['mvu']
+		if(inst.extvrf_op_type == 'move'):
+			inst.extvrf_tag = inst.mvu_tag
+		elif(inst.extvrf_op_type == 'extvrf'):
+			inst.extvrf_tag = tags['evrf']
+		prev_tag = inst.extvrf_tag
+		for mfu in ['mfu0', 'mfu1']:
+			if(mfu_bypassed(inst, mfu)):
+				setattr(inst, mfu + '_tag', prev_tag)
+			elif(mfu_active(inst, mfu)):
+				setattr(inst, mfu + '_tag', tags[mfu])
+			prev_tag = getattr(inst, mfu + '_tag')
+		highest_tag = max(highest_tag, inst.mvu_tag, inst.extvrf_tag, inst.mfu0_tag, inst.mfu1_tag)
+		if(inst.loader_src != 'nop'):
+			wb_count += 1
+		inst.wb_so_far = wb_count
+		for access in writes:
+			for word in access_words(inst, access):
+				last_wb[word] = wb_count
+	return highest_tag
+
+'''
+Runs the optimization pass on the instruction queue of an NPU program and returns a dictionary with the number of
+double-buffered vectors and moved chains, and the predicted cycles of the program before and after.
+'''
+def optimize_program(npu):
+	inst_q = npu.inst_q
+	perf = npu_perf_model(npu.arch_params)
+	stats = {'cycles_before': estimate_program(inst_q, npu.arch_params)['cycles']}
+	chains = list(inst_q)
+	old_idx = dict((inst.row, idx) for idx, inst in enumerate(chains))
+
+	groups = chain_groups(chains)
+	stats['double_buffered'] = double_buffer(npu, groups)
+
+	# Schedule each program (ending with a last flag) separately
+	order = []
+	program = []
+	for group in groups:
+		program.append(group)
+		if(group.has_last_flag() or group is groups[-1]):
+			for inst in program[-1].chains:
+				inst.last_flag = 0
+			scheduled = best_schedule(program, perf)
+			scheduled[-1].chains[-1].last_flag = 1
+			order += scheduled
+			program = []
+	stats['moved'] = sum(1 for pos, group in enumerate(order) if group.idx != pos)
+
+	# Rebuild the instruction queue in the new order
+	new_q = chain_store(len(chains))
+	golden_mvu_q = {}
+	for group in order:
+		for inst in group.chains:
+			idx = old_idx[inst.row]
+			if(idx in npu.golden_mvu_q):
+				golden_mvu_q[len(new_q)] = npu.golden_mvu_q[idx]
+			new_q.append(inst)
+	npu.inst_q = new_q
+	npu.golden_mvu_q = golden_mvu_q
+	npu.highest_tag_so_far = retag(new_q)
+	stats['chains'] = len(new_q)
+	stats['cycles_after'] = estimate_program(new_q, npu.arch_params)['cycles']
+	return stats
@@ -1,16 +1,14 @@
 import math
+import hashlib
 import numpy as np
 import os
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = "2"
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
 
 from compiler import *
+from perf_model import pipeline_latencies
 
-def npu_dense(npu, layer_name, layer_idx, num_inputs, time_steps, input_size, output_size, w_data, dest_memspace, inputs=None, activation=None, style='normal'):
-    SIM_BATCH = 3
-    BATCH = 6
+def npu_dense(npu, layer_name, layer_idx, num_inputs, time_steps, input_size, output_size, w_data, dest_memspace, inputs=None, activation=None, style='normal', batch=3):
+    SIM_BATCH = batch
+    BATCH = npu.arch_params['cores'] * batch
     # Allocate weight matrix
     wdata = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
     W = npu.malloc(layer_name+'W', input_size, output_size, 'mvu_mrf', wdata)
@@ -55,9 +53,9 @@ def npu_dense(npu, layer_name, layer_idx, num_inputs, time_steps, input_size, ou
 
     npu.operands.append(h)
 
-def npu_rnn(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, wx_data, wh_data, dest_memspace, inputs=None, activation='tanh'):
-    SIM_BATCH = 3
-    BATCH = 6
+def npu_rnn(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, wx_data, wh_data, dest_memspace, inputs=None, activation='tanh', batch=3):
+    SIM_BATCH = batch
+    BATCH = npu.arch_params['cores'] * batch
 
     # Allocate Matrices
     Wx = npu.malloc(layer_name+'Wx', input_size, output_size, 'mvu_mrf', wx_data)
@@ -124,9 +122,9 @@ def npu_rnn(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, unit
         npu.operands.append(h2)
 
 def npu_gru(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uz_data, uc_data, ur_data, \
-    wz_data, wc_data, wr_data, dest_memspace, inputs=None, activation='tanh', recurrent_activation='sigmoid'):
-    SIM_BATCH = 3
-    BATCH = 6
+    wz_data, wc_data, wr_data, dest_memspace, inputs=None, activation='tanh', recurrent_activation='sigmoid', batch=3):
+    SIM_BATCH = batch
+    BATCH = npu.arch_params['cores'] * batch
 
     # Allocate Matrices
     Uz = npu.malloc(layer_name+'_Uz', input_size, output_size, 'mvu_mrf', uz_data)
@@ -258,9 +256,9 @@ def npu_gru(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, unit
     npu.operands.append(h)
 
 def npu_lstm(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uf_data, uc_data, ui_data, uo_data, \
-        wf_data, wc_data, wi_data, wo_data, dest_memspace, inputs, activation, recurrent_activation):
-    SIM_BATCH = 3
-    BATCH = 6
+        wf_data, wc_data, wi_data, wo_data, dest_memspace, inputs, activation, recurrent_activation, batch=3):
+    SIM_BATCH = batch
+    BATCH = npu.arch_params['cores'] * batch
 
     # Allocate Matrices
     Uf = npu.malloc(layer_name+'_Uf', input_size, output_size, 'mvu_mrf', uf_data)
@@ -408,9 +406,9 @@ def npu_lstm(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, uni
     
     npu.operands.append(h)
 
-def npu_preprocessing(npu, max_tokens, seq_length, num_inputs):
-    SIM_BATCH = 3
-    BATCH = 6
+def npu_preprocessing(npu, max_tokens, seq_length, num_inputs, batch=3):
+    SIM_BATCH = batch
+    BATCH = npu.arch_params['cores'] * batch
 
     x = [[[None] * SIM_BATCH] * int(num_inputs/BATCH)] * time_steps
     for t in range(time_steps):
@@ -423,144 +421,472 @@ def npu_preprocessing(npu, max_tokens, seq_length, num_inputs):
 
     npu.operands.append(x)
 
-class NPUSequential(keras.Sequential):
+# TensorFlow is only imported when a Keras model is compiled (it takes several seconds to start)
+def import_keras():
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = "2"
+    from tensorflow import keras
+    return keras
+
+'''
+Lightweight NPU layer specifications. These describe the layers of a model (type, dimensions and activations)
+without requiring TensorFlow, and are used to drive npu_dense/npu_rnn/npu_gru/npu_lstm directly. The input
+size of a layer is inferred from the model inputs (first layer) or from the previous layer if not specified.
+Keras layers are converted to these specifications before compilation (see spec_from_keras_layer).
+'''
+class NPULayer:
+    def __init__(self, name=None):
+        self.name = name
+
+    def get_config(self):
+        config = dict(vars(self))
+        # Weights are described by their hash (used in the compilation cache key)
+        if config.get('weights') is not None:
+            config['weights'] = hashlib.sha256(np.ascontiguousarray(config['weights']).tobytes()).hexdigest()
+        return config
+
+class Dense(NPULayer):
+    def __init__(self, units, activation=None, input_size=None, name=None):
+        super(Dense, self).__init__(name)
+        self.units = units
+        self.activation = activation
+        self.input_size = input_size
+
+class Embedding(NPULayer):
+    def __init__(self, input_dim, output_dim, weights=None, name=None):
+        super(Embedding, self).__init__(name)
+        self.input_dim = input_dim
+        self.output_dim = output_dim
+        # Embedding table of shape (input_dim, output_dim), random if not specified
+        self.weights = weights
+
+class SimpleRNN(NPULayer):
+    def __init__(self, units, activation='tanh', input_size=None, name=None):
+        super(SimpleRNN, self).__init__(name)
+        self.units = units
+        self.activation = activation
+        self.input_size = input_size
+
+class GRU(NPULayer):
+    def __init__(self, units, activation='tanh', recurrent_activation='sigmoid', input_size=None, name=None):
+        super(GRU, self).__init__(name)
+        self.units = units
+        self.activation = activation
+        self.recurrent_activation = recurrent_activation
+        self.input_size = input_size
+
+class LSTM(NPULayer):
+    def __init__(self, units, activation='tanh', recurrent_activation='sigmoid', input_size=None, name=None):
+        super(LSTM, self).__init__(name)
+        self.units = units
+        self.activation = activation
+        self.recurrent_activation = recurrent_activation
+        self.input_size = input_size
+
+class TextVectorization(NPULayer):
+    def __init__(self, max_tokens, output_sequence_length, name=None):
+        super(TextVectorization, self).__init__(name)
+        self.max_tokens = max_tokens
+        self.output_sequence_length = output_sequence_length
+
+# Converts a (built) Keras layer to its NPU layer specification
+def spec_from_keras_layer(layer):
+    keras = import_keras()
+    config = layer.get_config()
+    weights = layer.get_weights()
+    if isinstance(layer, keras.layers.Dense):
+        return Dense(int(weights[0].shape[1]), config['activation'], int(weights[0].shape[0]), layer.name)
+    elif isinstance(layer, keras.layers.Embedding):
+        return Embedding(config['input_dim'], config['output_dim'], weights[0], layer.name)
+    elif isinstance(layer, keras.layers.SimpleRNN):
+        return SimpleRNN(config['units'], config['activation'], int(weights[0].shape[0]), layer.name)
+    elif isinstance(layer, keras.layers.GRU):
+        return GRU(config['units'], config['activation'], config['recurrent_activation'], int(weights[0].shape[0]), layer.name)
+    elif isinstance(layer, keras.layers.LSTM):
+        return LSTM(config['units'], config['activation'], config['recurrent_activation'], int(weights[0].shape[0]), layer.name)
+    elif isinstance(layer, keras.layers.experimental.preprocessing.TextVectorization):
+        return TextVectorization(config['max_tokens'], config['output_sequence_length'], layer.name)
+    else:
+        print(layer.name+' type is not supported by NPU')
+        exit(0)
+
+# Returns the output size of a layer specification (used to infer the input size of the next layer)
+def spec_output_size(layer):
+    if isinstance(layer, Embedding):
+        return layer.output_dim
+    elif isinstance(layer, TextVectorization):
+        return layer.max_tokens
+    return layer.units
+
+'''
+Chains executed by each layer type for one block of inputs and one time step, used by the batching planner:
+- x_chains: matvecs on the layer input, h_chains: matvecs on the recurrent state (or intermediate vectors)
+- vec_chains: chains that only perform element-wise operations (read_evrf)
+- depth: number of chains on the dependency path from one time step to the next (0 for feed-forward layers)
+- outputs: output vectors per input (and per time step for feed-forward layers)
+- temps: intermediate vectors per input in each memory space
+'''
+layer_chain_models = {
+    'Dense'     : {'x_chains': 1, 'h_chains': 0, 'vec_chains': 0, 'depth': 0, 'outputs': 1, 'temps': {}},
+    'Embedding' : {'x_chains': 1, 'h_chains': 0, 'vec_chains': 0, 'depth': 0, 'outputs': 1, 'temps': {}},
+    'SimpleRNN' : {'x_chains': 1, 'h_chains': 1, 'vec_chains': 0, 'depth': 1, 'outputs': 2,
+                   'temps': {'mvu_vrf': 1, 'mfu0_add': 1}},
+    'GRU'       : {'x_chains': 3, 'h_chains': 3, 'vec_chains': 2, 'depth': 3, 'outputs': 1,
+                   'temps': {'mvu_vrf': 2, 'mfu0_add': 4, 'mfu0_mul': 1, 'mfu1_add': 1, 'mfu1_mul': 2, 'evrf': 2}},
+    'LSTM'      : {'x_chains': 4, 'h_chains': 4, 'vec_chains': 2, 'depth': 3, 'outputs': 1,
+                   'temps': {'mvu_vrf': 1, 'mfu0_add': 4, 'mfu0_mul': 2, 'mfu1_add': 1, 'mfu1_mul': 1, 'evrf': 2}}
+}
+
+'''
+A batching plan maps the inputs of a model to the NPU: the inputs are padded and split into blocks of
+cores x batch inputs, where batch is the number of vectors processed by each chain. It holds the predicted
+cycles, operations and MVU utilization of each layer as well as the MRF/VRF words used by the model.
+'''
+class batch_plan:
+    def __init__(self, batch, real_inputs, cores):
+        self.batch = batch
+        self.real_inputs = real_inputs
+        self.cores = cores
+        self.block_size = cores * batch
+        self.num_blocks = int(math.ceil(real_inputs / float(self.block_size)))
+        self.num_inputs = self.num_blocks * self.block_size
+        self.layers = []
+        self.mrf_words = 0
+        self.vrf_words = {}
+        self.cycles = 0
+        self.ops = 0
+
+    def fits(self, arch_params):
+        if self.mrf_words > arch_params['mrf_depth']:
+            return False
+        return all(words <= arch_params['vrf_depth'] for words in self.vrf_words.values())
+
+    # The per-layer cycles only rank the candidate batches, the predicted throughput is the estimate of the compiled
+    # program by the pipeline model of the NPU (perf_model.estimate_program, see npu.estimate_npu_performance)
+    def report(self, arch_params, freq, estimate=None):
+        print('Batching plan: ' + str(self.real_inputs) + ' input(s) in ' + str(self.num_blocks) + ' block(s) of ' + \
+            str(self.cores) + ' core(s) x batch-' + str(self.batch) + ' (' + str(self.num_inputs - self.real_inputs) + ' padding input(s))')
+        print('{:<20}    {:<10}    {:<10}    {:<10}'.format('Layer', 'Type', 'Cycles', 'MVU Util.'))
+        for (name, layer_type, cycles, ops, utilization) in self.layers:
+            print('{:<20}    {:<10}    {:<10}    {:<10}'.format(name, layer_type, cycles, '{:.1f}%'.format(utilization * 100)))
+        usage = ', '.join(space + ' ' + str(words) for space, words in sorted(self.vrf_words.items()) if words > 0)
+        print('Memory: ' + str(self.mrf_words) + '/' + str(arch_params['mrf_depth']) + ' MRF word(s), ' + usage + \
+            ' (out of ' + str(arch_params['vrf_depth']) + ') VRF word(s)')
+        if (estimate is not None):
+            print('Predicted throughput: ' + str(estimate['cycles']) + ' cycles, ' + str(estimate['tops']) + ' TOPS at ' + \
+                str(freq) + ' MHz')
+
+# Returns the time steps, number of inputs, input size and output size of each layer (as passed to the npu_* functions)
+def layer_shapes(layer_specs, inputs):
+    shapes = []
+    for i in range(len(layer_specs)):
+        layer = layer_specs[i]
+        input_size = layer.input_size if hasattr(layer, 'input_size') else None
+        if (input_size is None):
+            input_size = int(np.shape(inputs)[-1]) if (i == 0) else spec_output_size(layer_specs[i-1])
+        if isinstance(layer, Embedding):
+            input_size = layer.input_dim
+        if (i == 0):
+            if isinstance(layer, Dense):
+                (time_steps, real_inputs) = (1, int(np.shape(inputs)[0]))
+            elif isinstance(layer, Embedding):
+                (time_steps, real_inputs) = (int(np.shape(inputs)[1]), int(np.shape(inputs)[0]))
+            elif isinstance(layer, TextVectorization):
+                (time_steps, real_inputs) = (1, len(inputs))
+            else:
+                (time_steps, real_inputs) = (int(np.shape(inputs)[0]), int(np.shape(inputs)[1]))
+        else:
+            # Feed-forward layers produce one output per time step, recurrent layers only the last one
+            real_inputs = shapes[-1][1]
+            time_steps = shapes[-1][0] if isinstance(layer_specs[i-1], (Dense, Embedding)) else 1
+            if isinstance(layer, Dense):
+                time_steps = 1
+        shapes.append((time_steps, real_inputs, input_size, spec_output_size(layer)))
+    return shapes
+
+'''
+Predicts the cycles, operations and memory usage of each layer for a given chain batch. The MVU of each core streams
+one MRF word per DPE per cycle, computing its dot products with the (up to tb_num_dots) VRF vectors held in the
+tensor block registers, which take tb_num_dots x lanes/tb_lanes cycles to reload for the next VRF word. The MFUs and
+loader process one word per cycle for each vector of the batch. Time steps of recurrent layers are bound by the
+pipeline latency of the chains on their dependency path.
+'''
+def evaluate_batch_plan(npu, layer_specs, shapes, batch):
+    tiles = npu.arch_params['tiles']
+    dpes  = npu.arch_params['dpes']
+    lanes = npu.arch_params['lanes']
+    cores = npu.arch_params['cores']
+    tb_num_dots = npu.arch_params['tb_num_dots']
+    latency = sum(pipeline_latencies(npu.arch_params).values())
+    reload_cycles = tb_num_dots * int(math.ceil(1.0 * lanes / npu.arch_params['tb_lanes']))
+    plan = batch_plan(batch, shapes[0][1], cores)
+    vrf_words = lambda size, space: vector('', size, space, tiles, dpes, lanes, npu.in_data_type, npu.ac_data_type).word_count
+    for i in range(len(layer_specs)):
+        layer = layer_specs[i]
+        layer_type = type(layer).__name__
+        (time_steps, real_inputs, input_size, output_size) = shapes[i]
+        if layer_type not in layer_chain_models:
+            continue
+        model = layer_chain_models[layer_type]
+        num_vectors = plan.num_blocks * batch
+
+        # Matrices: MRF words and MVU cycles per chain
+        chain_cycles = {}
+        chain_macs = 0
+        for (mat, size, count) in [('x', input_size, model['x_chains']), ('h', output_size, model['h_chains'])]:
+            if count == 0:
+                continue
+            m = matrix('', size, output_size, 'mvu_mrf', tiles, dpes, lanes, npu.in_data_type, np.zeros((1, 1), dtype=np.int8))
+            plan.mrf_words = plan.mrf_words + (m.word_count * count)
+            chain_cycles[mat] = int(m.dimension_x_padded / tiles / lanes) * max(int(m.dimension_y_padded / dpes), reload_cycles)
+            chain_macs = chain_macs + (size * output_size * count)
+        vec_cycles = batch * vrf_words(output_size, 'mfu0_add')
+        x_cycles = max(chain_cycles['x'], vec_cycles)
+        h_cycles = max(chain_cycles.get('h', 0), vec_cycles)
+
+        # Predicted cycles (blocks are executed one after the other)
+        if model['depth'] == 0:
+            cycles = (time_steps * plan.num_blocks * x_cycles) + latency
+        else:
+            step_cycles = (model['x_chains'] * x_cycles) + (model['h_chains'] * h_cycles) + (model['vec_chains'] * vec_cycles)
+            step_cycles = max(step_cycles, model['depth'] * (latency + h_cycles))
+            cycles = (plan.num_blocks * time_steps * step_cycles) + latency
+        ops = real_inputs * time_steps * chain_macs * 2
+        utilization = (ops / 2.0) / (cycles * tiles * dpes * lanes * tb_num_dots * cores)
+        plan.layers.append((layer.name, layer_type, cycles, ops, utilization))
+        plan.cycles = plan.cycles + cycles
+        plan.ops = plan.ops + ops
+
+        # Vectors: inputs of the first layer, outputs and intermediates
+        usage = {}
+        if (i == 0):
+            usage['mvu_vrf'] = time_steps * num_vectors * vrf_words(input_size, 'mvu_vrf')
+        outputs = model['outputs'] * (time_steps if model['depth'] == 0 else 1)
+        usage['mvu_vrf'] = usage.get('mvu_vrf', 0) + (outputs * num_vectors * vrf_words(output_size, 'mvu_vrf'))
+        for (space, count) in model['temps'].items():
+            usage[space] = usage.get(space, 0) + (count * batch * vrf_words(output_size, space))
+        for (space, words) in usage.items():
+            plan.vrf_words[space] = plan.vrf_words.get(space, 0) + words
+    return plan
+
+'''
+Picks the chain batch (and the resulting blocking of the inputs) with the lowest predicted cycles among the ones
+that fit in the MRF/VRF capacity of the NPU. Ties are broken in favour of less padding, then larger batches.
+'''
+def plan_batching(npu, layer_specs, inputs):
+    shapes = layer_shapes(layer_specs, inputs)
+    plans = [evaluate_batch_plan(npu, layer_specs, shapes, batch) for batch in range(1, npu.arch_params['tb_num_dots']+1)]
+    plans = [plan for plan in plans if plan.fits(npu.arch_params)]
+    assert plans, 'The model does not fit in the NPU memories for any batch size'
+    return min(plans, key=lambda plan: (plan.cycles, plan.num_inputs, -plan.batch))
+
+# Returns a description of the model and its data that is used as the NPU compilation cache key: the layer configs
+# (including the hash of user-provided weights), a digest of the input values and a digest of the state of the NumPy
+# random number generator. The random weights and input vectors of the layers are drawn from this state during
+# compilation, so it determines their values.
+def describe_layers_for_npu(layer_specs, inputs):
+    input_data = np.ascontiguousarray(np.asarray(inputs))
+    rng_state = np.random.get_state()
+    rng_hash = hashlib.sha256(np.asarray(rng_state[1]).tobytes() + repr(rng_state[2:]).encode())
+    return {
+        'layers': [[type(layer).__name__, layer.get_config()] for layer in layer_specs],
+        'input_shape': list(input_data.shape),
+        'input_dtype': str(input_data.dtype),
+        'input_hash': hashlib.sha256(input_data.tobytes()).hexdigest(),
+        'rng_hash': rng_hash.hexdigest()
+    }
+
+def compile_layers_for_npu(npu, layer_specs, inputs):
+    # Pick the batch size and blocking of the inputs
+    plan = plan_batching(npu, layer_specs, inputs)
+    npu.batch_plan = plan
+
+    # Skip compilation if the same program was already compiled and cached
+    if npu.lookup_cache(describe_layers_for_npu(layer_specs, inputs)):
+        return
+
+    unsupported_layers = []
+    ops = 0
+    for i in range(len(layer_specs)):
+        layer = layer_specs[i]
+        layer_name = layer.name
+        layer_idx = i
+        input_size = layer.input_size if hasattr(layer, 'input_size') else None
+        if (input_size is None):
+            input_size = int(np.shape(inputs)[-1]) if (i == 0) else spec_output_size(layer_specs[i-1])
+
+        if isinstance(layer, Dense):
+            output_size = layer.units
+            w_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            num_inputs = plan.num_inputs
+            input_data = np.random.randint(-128, 127, size=(num_inputs, input_size), dtype=np.int8)
+            dest_memspace = 'mvu_vrf'
+            activation = layer.activation
+            style = 'normal'
+            npu_dense(npu, layer_name, layer_idx, num_inputs, 1, input_size, output_size, w_data, dest_memspace, input_data, activation, style, plan.batch)
+            ops = ops + (num_inputs * input_size * output_size * 2)
+        
+        elif isinstance(layer, Embedding):
+            input_size = layer.input_dim
+            output_size = layer.output_dim
+            if (layer.weights is None):
+                w_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            else:
+                w_data = np.transpose(layer.weights)
+            dest_memspace = 'mvu_vrf'
+            num_inputs = plan.num_inputs
+            if(i == 0):
+                time_steps = np.shape(inputs)[1]
+            else:
+                time_steps = len(npu.operands[i-1])
+            activation = None
+            style = 'embedding'
+            npu_dense(npu, layer_name, layer_idx, num_inputs, time_steps, input_size, output_size, w_data, dest_memspace, inputs, activation, style, plan.batch)
+            ops = ops + (num_inputs * time_steps * input_size * output_size * 2)
+
+        elif isinstance(layer, SimpleRNN):
+            units = layer.units
+            output_size = layer.units
+            wx_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            wh_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            num_inputs = plan.num_inputs
+            if(i == 0):
+                time_steps = np.shape(inputs)[0]
+                assert input_size == int(np.shape(inputs)[2]), 'Incompatible input dimensions for ('+layer_name+')'
+            else:
+                time_steps = len(npu.operands[i-1])
+            input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8)
+            dest_memspace = 'mvu_vrf'
+            activation = layer.activation
+            assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
+            npu_rnn(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, wx_data, wh_data, dest_memspace, input_data, activation, plan.batch)
+            ops = ops + (time_steps * num_inputs * input_size * output_size * 2 * 2)
+
+        elif isinstance(layer, GRU):
+            # Dimensions 
+            output_size = layer.units
+            units = layer.units
+            num_inputs = plan.num_inputs
+            if(i == 0):
+                time_steps = int(np.shape(inputs)[0])
+                assert input_size == int(np.shape(inputs)[2]), 'Incompatible input dimensions for ('+layer_name+')'
+            else:
+                time_steps = len(npu.operands[i-1])
+            # Weight Matrices
+            uz_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            uc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            ur_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            wz_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            wc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            wr_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8)
+            # Other params
+            dest_memspace = 'mvu_vrf'
+            activation = layer.activation
+            assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
+            recurrent_activation = layer.recurrent_activation
+            assert recurrent_activation in ['relu', 'sigmoid', 'tanh'], 'Specified recurrent activation function for ('+layer_name+') is not supported by NPU'
+            npu_gru(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uz_data, uc_data, ur_data, \
+                wz_data, wc_data, wr_data, dest_memspace, input_data, activation, recurrent_activation, plan.batch)
+            ops = ops + (time_steps * num_inputs * input_size * output_size * 6 * 2)
+
+        elif isinstance(layer, LSTM):
+            # Dimensions 
+            output_size = layer.units
+            units = layer.units
+            num_inputs = plan.num_inputs
+            if(i == 0):
+                time_steps = int(np.shape(inputs)[0])
+                assert input_size == int(np.shape(inputs)[2]), 'Incompatible input dimensions for ('+layer_name+')'
+            else:
+                time_steps = len(npu.operands[i-1])
+            # Weight Matrices
+            uf_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            uc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            ui_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            uo_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            wf_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            wc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            wi_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
+            wo_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
+            input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8) 
+            # Other params
+            dest_memspace = 'mvu_vrf'
+            activation = layer.activation
+            assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
+            recurrent_activation = layer.recurrent_activation
+            assert recurrent_activation in ['relu', 'sigmoid', 'tanh'], 'Specified recurrent activation function for ('+layer_name+') is not supported by NPU'
+            npu_lstm(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uf_data, uc_data, ui_data, uo_data, \
+                wf_data, wc_data, wi_data, wo_data, dest_memspace, input_data, activation, recurrent_activation, plan.batch)
+            ops = ops + (time_steps * num_inputs * input_size * output_size * 8 * 2)
+
+        elif isinstance(layer, TextVectorization):
+            max_tokens = layer.max_tokens
+            seq_length = layer.output_sequence_length
+            num_inputs = plan.num_inputs
+            npu_preprocessing(npu, max_tokens, seq_length, num_inputs, plan.batch)
+
+        else:
+            print(layer_name+' type is not supported by NPU')
+            exit(0)
+
+    npu.unsupported_layers = unsupported_layers
+    npu.ops = ops
+
+'''
+A sequential model built from NPU layer specifications (does not require TensorFlow).
+'''
+class NPUModel:
     def __init__(self, layers=None, name=None):
-        super(NPUSequential, self).__init__(layers, name)
-
-    def compile_for_npu(self, npu, inputs):
-        unsupported_layers = []
-        ops = 0
+        self.layers = list(layers) if layers is not None else []
+        self.name = name if name is not None else 'npu_model'
         for i in range(len(self.layers)):
-            config = self.layers[i].get_config()
-            layer_name = self.layers[i].name
-            layer_idx = i
-            weights = self.layers[i].get_weights()
-
-            if isinstance(self.layers[i], keras.layers.Dense):
-                w_data = np.transpose(weights[0])
-                input_size = int(w_data.shape[1])
-                output_size = int(w_data.shape[0])
-                w_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                if (i == 0):
-                    num_inputs = int(math.ceil(int(inputs.shape[0]) / 6.0)) * 6
-                else:
-                    num_inputs = len(npu.operands[i-1][0]) * 6
-                input_data = np.random.randint(-128, 127, size=(num_inputs, input_size), dtype=np.int8)
-                dest_memspace = 'mvu_vrf'
-                activation = config['activation']
-                style = 'normal'
-                npu_dense(npu, layer_name, layer_idx, num_inputs, 1, input_size, output_size, w_data, dest_memspace, input_data, activation, style)
-                ops = ops + (num_inputs * input_size * output_size * 2)
-            
-            elif isinstance(self.layers[i], keras.layers.Embedding):
-                w_data = np.transpose(weights[0])
-                input_size = config['input_dim']
-                output_size = config['output_dim']
-                dest_memspace = 'mvu_vrf'
-                if(i == 0):
-                    num_inputs = int(math.ceil(int(inputs.shape[0]) / 6.0)) * 6
-                    time_steps = inputs.shape[1]
-                else:
-                    num_inputs = len(npu.operands[i-1][0]) * 6
-                    time_steps = len(npu.operands[i-1])
-                activation = None
-                style = 'embedding'
-                npu_dense(npu, layer_name, layer_idx, num_inputs, time_steps, input_size, output_size, w_data, dest_memspace, inputs, activation, style)
-                ops = ops + (num_inputs * time_steps * input_size * output_size * 2)
-
-            elif isinstance(self.layers[i], keras.layers.SimpleRNN):
-                wx_data = weights[0]
-                wh_data = weights[1]
-                input_size = int(wx_data.shape[0])
-                units = config['units']
-                output_size = int(wx_data.shape[1])
-                wx_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                wh_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                if(i == 0):
-                    time_steps = inputs.shape[0]
-                    num_inputs = int(math.ceil(int(inputs.shape[1]) / 6.0)) * 6
-                    assert input_size == int(inputs.shape[2]), 'Incompatible input dimensions for ('+layer_name+')'
-                else:
-                    time_steps = len(npu.operands[i-1])
-                    num_inputs = len(npu.operands[i-1][0]) * 6
-                input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8)
-                dest_memspace = 'mvu_vrf'
-                activation = config['activation']
-                assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
-                npu_rnn(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, wx_data, wh_data, dest_memspace, input_data, activation)
-                ops = ops + (time_steps * num_inputs * input_size * output_size * 2 * 2)
-
-            elif isinstance(self.layers[i], keras.layers.GRU):
-                # Dimensions 
-                input_size = int(weights[0].shape[0])
-                output_size = int(int(weights[0].shape[1]) / 3)
-                units = config['units']
-                if(i == 0):
-                    time_steps = int(inputs.shape[0])
-                    num_inputs = int(math.ceil(int(inputs.shape[1]) / 6.0)) * 6
-                    assert input_size == int(inputs.shape[2]), 'Incompatible input dimensions for ('+layer_name+')'
-                else:
-                    time_steps = len(npu.operands[i-1])
-                    num_inputs = len(npu.operands[i-1][0]) * 6
-                # Weight Matrices
-                uz_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                uc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                ur_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                wz_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                wc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                wr_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8)
-                # Other params
-                dest_memspace = 'mvu_vrf'
-                activation = config['activation']
-                assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
-                recurrent_activation = config['recurrent_activation']
-                assert recurrent_activation in ['relu', 'sigmoid', 'tanh'], 'Specified recurrent activation function for ('+layer_name+') is not supported by NPU'
-                npu_gru(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uz_data, uc_data, ur_data, \
-                    wz_data, wc_data, wr_data, dest_memspace, input_data, activation, recurrent_activation)
-                ops = ops + (time_steps * num_inputs * input_size * output_size * 6 * 2)
-
-            elif isinstance(self.layers[i], keras.layers.LSTM):
-                # Dimensions 
-                input_size = int(weights[0].shape[0])
-                output_size = int(int(weights[0].shape[1]) / 4)
-                units = config['units']
-                if(i == 0):
-                    time_steps = int(inputs.shape[0])
-                    num_inputs = int(math.ceil(int(inputs.shape[1]) / 6.0)) * 6
-                    assert input_size == int(inputs.shape[2]), 'Incompatible input dimensions for ('+layer_name+')'
-                else:
-                    time_steps = len(npu.operands[i-1])
-                    num_inputs = len(npu.operands[i-1][0]) * 6
-                # Weight Matrices
-                uf_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                uc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                ui_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                uo_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                wf_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                wc_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                wi_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8) 
-                wo_data = np.random.randint(0, 127, size=(output_size, input_size), dtype=np.int8)
-                input_data = np.random.randint(-128, 127, size=(time_steps, num_inputs, input_size), dtype=np.int8) 
-                # Other params
-                dest_memspace = 'mvu_vrf'
-                activation = config['activation']
-                assert activation in ['relu', 'sigmoid', 'tanh'], 'Specified activation function for ('+layer_name+') is not supported by NPU'
-                recurrent_activation = config['recurrent_activation']
-                assert recurrent_activation in ['relu', 'sigmoid', 'tanh'], 'Specified recurrent activation function for ('+layer_name+') is not supported by NPU'
-                npu_lstm(npu, layer_name, layer_idx, time_steps, num_inputs, input_size, units, output_size, uf_data, uc_data, ui_data, uo_data, \
-                    wf_data, wc_data, wi_data, wo_data, dest_memspace, input_data, activation, recurrent_activation)
-                ops = ops + (time_steps * num_inputs * input_size * output_size * 8 * 2)
-
-            elif isinstance(self.layers[i], keras.layers.experimental.preprocessing.TextVectorization):
-                max_tokens = config['max_tokens']
-                seq_length = config['output_sequence_length']
-                num_inputs = int(math.ceil(len(inputs) / 6.0)) * 6
-                npu_preprocessing(npu, max_tokens, seq_length, num_inputs)
+            if self.layers[i].name is None:
+                self.layers[i].name = 'layer' + str(i+1)
 
-            else:
-                print(layer_name+' type is not supported by NPU')
-                exit(0)
+    def add(self, layer):
+        if layer.name is None:
+            layer.name = 'layer' + str(len(self.layers)+1)
+        self.layers.append(layer)
+
+    def summary(self):
+        print('Model: "' + self.name + '"')
+        print('{:<20}    {:<20}    {:<10}'.format('Layer', 'Type', 'Units'))
+        for layer in self.layers:
+            print('{:<20}    {:<20}    {:<10}'.format(layer.name, type(layer).__name__, spec_output_size(layer)))
 
-        npu.unsupported_layers = unsupported_layers
-        npu.ops = ops
+    def describe_for_npu(self, inputs):
+        return describe_layers_for_npu(self.layers, inputs)
+
+    def compile_for_npu(self, npu, inputs):
+        compile_layers_for_npu(npu, self.layers, inputs)
+
+keras_npu_sequential = None
+
+# Returns the Keras Sequential model class with NPU compilation support (imports TensorFlow)
+def get_keras_npu_sequential():
+    global keras_npu_sequential
+    if keras_npu_sequential is None:
+        keras = import_keras()
+
+        class KerasNPUSequential(keras.Sequential):
+            def __init__(self, layers=None, name=None):
+                super(KerasNPUSequential, self).__init__(layers, name)
+
+            def describe_for_npu(self, inputs):
+                return describe_layers_for_npu([spec_from_keras_layer(layer) for layer in self.layers], inputs)
+
+            def compile_for_npu(self, npu, inputs):
+                compile_layers_for_npu(npu, [spec_from_keras_layer(layer) for layer in self.layers], inputs)
+
+        keras_npu_sequential = KerasNPUSequential
+    return keras_npu_sequential
+
+'''
+Creates a sequential model that can be compiled for the NPU. If all layers are NPU layer specifications, a
+TensorFlow-free NPUModel is returned. Otherwise, the layers are Keras layers and a Keras Sequential model is
+returned (TensorFlow is only imported in this case).
+'''
+def NPUSequential(layers=None, name=None):
+    if layers is not None and all(isinstance(layer, NPULayer) for layer in layers):
+        return NPUModel(layers, name)
+    return get_keras_npu_sequential()(layers, name)
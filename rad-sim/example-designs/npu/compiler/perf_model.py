@@ -0,0 +1,217 @@
+import math
+
+'''
+This module implements an analytical performance model of the NPU, used to estimate the cycles of a compiled NPU
+program (npu.inst_q) in milliseconds instead of running the SystemC performance simulation. It models each pipeline
+block (MVU, eVRF, MFU0, MFU1, loader) as executing the mOPs of the chains in order:
+- the decoder of a block takes MOP_DECODE_CYCLES cycles to read a mOP, then issues its uOPs (one MRF word for the
+  MVU, one vector word of one batch for the other blocks, plus the tag update uOPs of the loader), each taking the
+  calibrated uOP cycles of the block (see calibration_params),
+- a mOP waits for the tags it depends on (the write-back count reaches its tag), and
+- the outputs of a block reach the next block of the same chain after the pipeline latency of the block, which is
+  derived from the same latency parameters used to generate the params.hpp file of the performance simulator.
+The model ignores back-pressure from full FIFOs, and only accounts for the NoC traffic between blocks through the
+calibrated cycles of each uOP, so it is meant for comparing programs and architectures (e.g. design-space exploration)
+rather than replacing the performance simulation.
+'''
+
+# Latency parameters of the NPU blocks in cycles (written to params.hpp by generate_perf_sim_files)
+latency_params = [
+	('RF_RD_LATENCY', 2),
+	('RF_WR_LATENCY', 1),
+	('TB_LATENCY', 3),
+	('SECTOR_DISTRIBUTION_PIPELINE', 2),
+	('SECTOR_REDUCTION_PIPELINE', 3),
+	('SECTOR_REDUCTION_TO_ACCUM_PIPELINE', 2),
+	('SECTOR_ACCUM_TO_OFIFO_PIPELINE', 2),
+	('EVRF_INST_TO_VRF', 4),
+	('EVRF_RF_TO_OFIFO_PIPELINE', 2),
+	('MFU_INST_TO_VRFS_PIPLINE', 2),
+	('MFU_VRFS_TO_COMPUTE_PIPELINE', 9),
+	('MFU_ACT_LATENCY', 3),
+	('MFU_ADD_LATENCY', 1),
+	('MFU_MUL_LATENCY', 6),
+	('MFU_COMPUTE_TO_OFIFO_PIPELINE', 2),
+	('LD_PIPELINE', 8)
+]
+
+# Cycles taken by a block decoder to read and initialize a mOP (also the cost of a nop mOP)
+MOP_DECODE_CYCLES = 2
+
+# Calibration of the model against the performance simulation, fitted to the perf_baseline cycles of the standard
+# workloads (7 tiles, 40 DPEs, 40 lanes, 4 threads): latency added by the NoC to every transfer between blocks
+# (including write-backs), and cycles taken by each uOP of the MVU and of the vector blocks (eVRF, MFUs, loader) whose
+# outputs are sent as NoC packets. The fixed NoC latency is hidden by the uOP throughput of the blocks (the fit does
+# not improve with a non-zero value), so the NoC traffic is modeled by the uOP cycles only.
+calibration_params = [
+	('NOC_HOP_LATENCY', 0),
+	('MVU_UOP_CYCLES', 1.5),
+	('VECTOR_UOP_CYCLES', 4.0)
+]
+
+# Largest relative error of the estimated cycles on the perf_baseline workloads with the calibration above (the
+# estimates range from 0.81x to 1.21x of the simulated cycles)
+CALIBRATION_ERROR = 0.21
+
+# Number of blocks the loader sends a tag update uOP to after each write-back
+NUM_PIPELINE_BLOCKS = 5
+
+# Pipeline blocks of the NPU (in chain order) and the tag field of their mOP
+pipeline_stages = ['mvu', 'evrf', 'mfu0', 'mfu1', 'ld']
+stage_tags = {'mvu': 'mvu_tag', 'evrf': 'extvrf_tag', 'mfu0': 'mfu0_tag', 'mfu1': 'mfu1_tag', 'ld': None}
+
+def mfu_active(inst, mfu):
+	return any(getattr(inst, mfu + '_' + op + '_op_type') != 'nop' for op in ['act', 'add', 'mul'])
+
+'''
+Returns the latency (in cycles) from the first uOP of a block to its first output reaching the next block, computed
+like the derived parameters of params.hpp (SECTOR_INST_PIPELINE, EVRF_PIPELINE, MFU_PIPELINE and LD_PIPELINE).
+'''
+def pipeline_latencies(arch_params, params=latency_params):
+	p = dict(params)
+	dpe_num_tbs = int(math.ceil(arch_params['lanes'] * 1.0 / arch_params['tb_lanes'])) + 1
+	sector_inst_to_dpes = p['SECTOR_DISTRIBUTION_PIPELINE'] + (dpe_num_tbs * arch_params['tb_num_dots']) - 1 + p['RF_RD_LATENCY']
+	dpe_valid_a = p['TB_LATENCY'] + (dpe_num_tbs - 2) * (p['TB_LATENCY'] - 1)
+	accum = p['RF_RD_LATENCY'] + 1
+	mvu = sector_inst_to_dpes + dpe_valid_a + p['SECTOR_REDUCTION_PIPELINE'] + p['SECTOR_REDUCTION_TO_ACCUM_PIPELINE'] + \
+		accum + p['SECTOR_ACCUM_TO_OFIFO_PIPELINE']
+	evrf = p['EVRF_INST_TO_VRF'] + p['RF_RD_LATENCY'] + p['EVRF_RF_TO_OFIFO_PIPELINE']
+	mfu = p['MFU_INST_TO_VRFS_PIPLINE'] + p['RF_RD_LATENCY'] + p['MFU_VRFS_TO_COMPUTE_PIPELINE'] + p['MFU_ACT_LATENCY'] + \
+		p['MFU_ADD_LATENCY'] + p['MFU_MUL_LATENCY'] + p['MFU_COMPUTE_TO_OFIFO_PIPELINE']
+	return {'mvu': mvu, 'evrf': evrf, 'mfu0': mfu, 'mfu1': mfu, 'ld': p['LD_PIPELINE']}
+
+'''
+Per-architecture timing of the NPU blocks: the number of uOPs of each mOP and the pipeline latencies.
+'''
+class npu_perf_model:
+	def __init__(self, arch_params, calibration=calibration_params):
+		self.arch_params = arch_params
+		self.calibration = dict(calibration)
+		self.latency = dict((stage, latency + self.calibration['NOC_HOP_LATENCY']) \
+			for stage, latency in pipeline_latencies(arch_params).items())
+		# Number of MRF rows accumulated by the MVU before its first results are sent out
+		self.num_accum = (int(math.ceil(arch_params['lanes'] * 1.0 / arch_params['tb_lanes']))) * arch_params['tb_num_dots']
+
+	# Returns the cycles taken by a block to issue the uOPs of a chain (None if the block is idle for this chain)
+	def mop_cycles(self, inst, stage):
+		uops = self.mop_uops(inst, stage)
+		if(uops is None):
+			return None
+		return uops * self.calibration['MVU_UOP_CYCLES' if stage == 'mvu' else 'VECTOR_UOP_CYCLES']
+
+	# Returns the number of uOPs issued by a block for a chain (None if the block is idle for this chain)
+	def mop_uops(self, inst, stage):
+		if(stage == 'mvu'):
+			return inst.mvu_mrf_rd_sz if inst.mvu_op_type == 'matvec' else None
+		elif(stage == 'evrf'):
+			if(inst.extvrf_op_type == 'move'):
+				# Results from the MVU are passed through for all the dot products of the tensor blocks
+				return inst.extvrf_rd_sz * self.arch_params['tb_num_dots']
+			return inst.extvrf_rd_sz * inst.batch if inst.extvrf_op_type != 'nop' else None
+		elif(stage in ['mfu0', 'mfu1']):
+			return getattr(inst, stage + '_vrf_rd_size') * inst.batch if mfu_active(inst, stage) else None
+		else:
+			return inst.vrf_id0_wr_size * inst.batch + (NUM_PIPELINE_BLOCKS - 1) if inst.loader_src != 'nop' else None
+
+	# Returns the cycles from the start of a mOP to its first output reaching the next block
+	def first_output(self, inst, stage):
+		if(stage == 'mvu'):
+			return min(inst.mvu_mrf_rd_sz, self.num_accum * inst.mvu_vrf_rd_sz) * self.calibration['MVU_UOP_CYCLES'] + \
+				self.latency['mvu']
+		return self.latency[stage]
+
+'''
+Pipeline state of the NPU used to estimate when the mOPs of a sequence of chains start and end. A mOP starts once
+(1) the previous mOP in the same block is done, (2) the first outputs of the previous block of the same chain arrive,
+and (3) the vectors it reads are written back. The write-back condition is given by a wait function, either the tags
+of the chains (wait_for_tags) or any other dependency information (e.g. the groups of the scheduling pass).
+'''
+class pipeline_model:
+	def __init__(self, perf):
+		self.perf = perf
+		self.free = dict((stage, 0) for stage in pipeline_stages)
+		self.busy = dict((stage, 0) for stage in pipeline_stages)
+		self.wb_done = [0]		# Cycle at which the n-th write-back completes
+		self.fifo_start = 0		# Cycle at which the MFU outputs of the last chain using the MFUs start to arrive
+		self.fifo_end = 0		# Cycle at which the last of these outputs arrives
+
+	def copy(self):
+		model = pipeline_model(self.perf)
+		model.free = dict(self.free)
+		model.busy = dict(self.busy)
+		model.wb_done = list(self.wb_done)
+		model.fifo_start = self.fifo_start
+		model.fifo_end = self.fifo_end
+		return model
+
+	def wait_for_tags(self, inst, pos, stage):
+		tag = getattr(inst, stage_tags[stage]) if stage_tags[stage] else 0
+		return self.wb_done[min(tag, len(self.wb_done) - 1)]
+
+	'''
+	Issues a list of chains to the model and returns the cycles at which the first mOP starts and the last mOP ends.
+	With commit=False the state of the model is not changed (used to evaluate scheduling candidates).
+	'''
+	def issue(self, chains, wait, commit=True):
+		perf = self.perf
+		free = dict(self.free)
+		busy = dict(self.busy)
+		fifo = (self.fifo_start, self.fifo_end)
+		wb_done = []
+		first_start = None
+		last_end = 0
+		for pos, inst in enumerate(chains):
+			prev = None
+			for stage in pipeline_stages:
+				issue_cycles = perf.mop_cycles(inst, stage)
+				if(issue_cycles is None):
+					free[stage] += MOP_DECODE_CYCLES
+					continue
+				start = max(free[stage] + MOP_DECODE_CYCLES, wait(inst, pos, stage))
+				if(prev is not None):
+					arrival = (prev[0] + perf.first_output(inst, prev[2]), prev[1] + perf.latency[prev[2]])
+				elif(stage == 'ld' and inst.loader_src in ['wb', 'flush']):
+					arrival = fifo
+				else:
+					arrival = (0, 0)
+				start = max(start, arrival[0])
+				end = max(start + issue_cycles, arrival[1])
+				free[stage] = end
+				busy[stage] += issue_cycles
+				if(stage == 'mfu1'):
+					fifo = (start + perf.first_output(inst, stage), end + perf.latency[stage])
+				if(stage == 'ld'):
+					wb_done.append(end + perf.latency['ld'])
+				if(first_start is None):
+					first_start = start
+				last_end = max(last_end, end + perf.latency[stage])
+				prev = (start, end, stage)
+		if(commit):
+			self.free = free
+			self.busy = busy
+			(self.fifo_start, self.fifo_end) = fifo
+			self.wb_done += wb_done
+		return (first_start if first_start is not None else 0), last_end
+
+'''
+Estimates the performance of an NPU program from the tags of its chains. Returns a dictionary with the estimated
+cycles, the utilization of each block (fraction of the cycles it issues uOPs) and, if the number of operations of the
+program and the clock frequency (in MHz) are given, the estimated TOPS of all NPU threads.
+'''
+def estimate_program(inst_q, arch_params, ops=None, freq=None, calibration=calibration_params):
+	model = pipeline_model(npu_perf_model(arch_params, calibration))
+	cycles = 0
+	for inst in inst_q:
+		cycles = max(cycles, model.issue([inst], model.wait_for_tags)[1])
+	cycles = int(math.ceil(cycles))
+	estimate = {
+		'cycles'		: cycles,
+		'utilization'	: dict((stage, model.busy[stage] * 1.0 / cycles if cycles else 0) for stage in pipeline_stages)
+	}
+	if(ops is not None and freq is not None and cycles > 0):
+		estimate['tops'] = estimate_tops(cycles, ops, arch_params['threads'], freq)
+	return estimate
+
+# Returns the TOPS of num_threads NPU threads that each perform ops operations in the given cycles at freq (in MHz)
+def estimate_tops(cycles, ops, num_threads, freq):
+	return ops * num_threads / (cycles * 1.0 / (freq * 1000000)) / 1000000000000
@@ -179,9 +179,9 @@ mvu_sector::mvu_sector(const sc_module_name& name, unsigned int id, RADSimDesign
     for (unsigned int tile_id = 0; tile_id < TILES; tile_id++) {
       mrf_name_str = "mrf_" + std::to_string(tile_id) + "_" + std::to_string((sector_id * DPES_PER_SECTOR) + dpe_id);
       std::strcpy(mrf_name, mrf_name_str.c_str());
-      mrf_filename = "/register_files/mrf_tile_" + std::to_string(tile_id) + "_dpe_" +
-                     std::to_string((sector_id * DPES_PER_SECTOR) + dpe_id) + ".txt";
-      mrf_path = npu_dir + mrf_filename;
+      mrf_filename = "mrf_tile_" + std::to_string(tile_id) + "_dpe_" +
+                     std::to_string((sector_id * DPES_PER_SECTOR) + dpe_id);
+      mrf_path = GetRegisterFilePath(npu_dir, mrf_filename);
       mrfs[dpe_id][tile_id] = new register_file<tb_input_precision>(
           mrf_name, (tile_id * DPES_PER_SECTOR * SECTORS) + (DPES_PER_SECTOR * sector_id) + dpe_id, MRF_DEPTH, LANES,
           mrf_path);
@@ -44,6 +44,15 @@ template <class dtype>
 bool parse_register_file_contents_from_file( std::vector< std::vector<dtype>>& mem,
                                              std::string& init_file, unsigned int width, unsigned int depth ) {
 
+    if( IsBinaryRegisterFile(init_file) ) {
+        std::vector<std::vector<dtype>> rf_words;
+        if( !ParseBinaryRegisterFile(init_file, rf_words, width) )
+            return false;
+        for( uint32_t addr = 0; (addr < rf_words.size()) && (addr < depth); addr++ )
+            mem[addr] = rf_words[addr];
+        return true;
+    }
+
     std::ifstream rf_content(init_file);
 
     if( !rf_content )
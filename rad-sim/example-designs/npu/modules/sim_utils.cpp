@@ -325,7 +325,21 @@ bool ParseNPUInst(std::string& inst_filename, std::vector<vliw_inst>& npu_progra
   return true;
 }
 
+// Returns the path of a register file generated by the NPU compiler, preferring the binary version (-perf_bin) if any
+std::string GetRegisterFilePath(const std::string& npu_dir, const std::string& name) {
+  std::string bin_path = npu_dir + "/register_files/" + name + ".bin";
+  std::ifstream bin_file(bin_path);
+  if (bin_file) return bin_path;
+  return npu_dir + "/register_files/" + name + ".txt";
+}
+
+bool IsBinaryRegisterFile(const std::string& filename) {
+  return (filename.size() >= 4) && (filename.compare(filename.size() - 4, 4, ".bin") == 0);
+}
+
 bool ParseNPUInputs(std::string& input_filename, std::vector<std::vector<tb_input_precision>>& npu_inputs) {
+  if (IsBinaryRegisterFile(input_filename)) return ParseBinaryRegisterFile(input_filename, npu_inputs, LANES);
+
   std::ifstream inputs_file(input_filename);
   if (!inputs_file) return false;
 
@@ -346,6 +360,8 @@ bool ParseNPUInputs(std::string& input_filename, std::vector<std::vector<tb_inpu
 }
 
 bool ParseNPUOutputs(std::string& outputs_filename, std::vector<std::vector<tb_output_precision>>& npu_outputs) {
+  if (IsBinaryRegisterFile(outputs_filename)) return ParseBinaryRegisterFile(outputs_filename, npu_outputs, LANES);
+
   std::ifstream outputs_file(outputs_filename);
   if (!outputs_file) return false;
 
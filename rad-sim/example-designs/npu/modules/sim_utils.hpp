@@ -11,6 +11,49 @@
 bool ParseNPUInst(std::string& inst_filename, std::vector<vliw_inst>& npu_program);
 bool ParseNPUInputs(std::string& input_filename, std::vector<std::vector<tb_input_precision>>& npu_inputs);
 bool ParseNPUOutputs(std::string& output_filename, std::vector<std::vector<tb_output_precision>>& npu_outputs);
+std::string GetRegisterFilePath(const std::string& npu_dir, const std::string& name);
+bool IsBinaryRegisterFile(const std::string& filename);
+
+// Magic number of the binary register files generated by the NPU compiler (-perf_bin)
+#define REGISTER_FILE_MAGIC 0x4e505246
+
+// Decodes a little-endian signed integer of num_bytes bytes
+inline int64_t DecodeLittleEndian(const unsigned char* bytes, unsigned int num_bytes) {
+  uint64_t raw = 0;
+  for (unsigned int i = 0; i < num_bytes; i++) raw |= ((uint64_t)bytes[i]) << (8 * i);
+  uint64_t sign = ((uint64_t)1) << (8 * num_bytes - 1);
+  return (int64_t)((raw ^ sign) - sign);
+}
+
+// Parses a binary register file generated by the NPU compiler and appends its rows (of width values each) to rows.
+// The file starts with four little-endian 32-bit words (REGISTER_FILE_MAGIC, bytes per value, number of rows and
+// values per row), followed by the values as little-endian signed integers.
+template <class dtype>
+bool ParseBinaryRegisterFile(const std::string& filename, std::vector<std::vector<dtype>>& rows, unsigned int width) {
+  std::ifstream rf_file(filename, std::ios::binary);
+  if (!rf_file) return false;
+
+  unsigned char header[16];
+  rf_file.read(reinterpret_cast<char*>(header), sizeof(header));
+  if (!rf_file) return false;
+  uint32_t magic = (uint32_t)DecodeLittleEndian(header, 4);
+  uint32_t value_bytes = (uint32_t)DecodeLittleEndian(header + 4, 4);
+  uint32_t num_rows = (uint32_t)DecodeLittleEndian(header + 8, 4);
+  uint32_t num_cols = (uint32_t)DecodeLittleEndian(header + 12, 4);
+  if (magic != REGISTER_FILE_MAGIC || value_bytes == 0 || value_bytes > 8) return false;
+
+  std::vector<unsigned char> data((size_t)num_rows * num_cols * value_bytes);
+  rf_file.read(reinterpret_cast<char*>(data.data()), data.size());
+  if (!rf_file) return false;
+
+  for (uint32_t row_id = 0; row_id < num_rows; row_id++) {
+    std::vector<dtype> row(width, 0);
+    for (uint32_t col_id = 0; (col_id < num_cols) && (col_id < width); col_id++)
+      row[col_id] = DecodeLittleEndian(&data[((size_t)row_id * num_cols + col_id) * value_bytes], value_bytes);
+    rows.push_back(row);
+  }
+  return true;
+}
 
 template <class dtype>
 class data_vector;
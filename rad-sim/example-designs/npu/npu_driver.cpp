@@ -55,8 +55,7 @@ void npu_driver::source() {
   }
 
   // Parse inputs
-  std::string inputs_filename = "/register_files/inputs.txt";
-  std::string inputs_path = npu_dir + inputs_filename;
+  std::string inputs_path = GetRegisterFilePath(npu_dir, "inputs");
   parse_flag = ParseNPUInputs(inputs_path, npu_inputs);
   if (!parse_flag) {
     std::cerr << "Cannot parse inputs file!" << std::endl;
@@ -64,8 +63,7 @@ void npu_driver::source() {
   }
 
   // Parse golden results
-  std::string outputs_filename = "/register_files/outputs.txt";
-  std::string outputs_path = npu_dir + outputs_filename;
+  std::string outputs_path = GetRegisterFilePath(npu_dir, "outputs");
   parse_flag = ParseNPUOutputs(outputs_path, npu_outputs);
   if (!parse_flag) {
     std::cerr << "Cannot parse outputs file!" << std::endl;
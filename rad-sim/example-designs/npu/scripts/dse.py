@@ -0,0 +1,296 @@
+import os
+import sys
+import csv
+import math
+import shutil
+import itertools
+import subprocess
+from os import listdir
+from os.path import isfile, join
+from concurrent.futures import ProcessPoolExecutor
+from perf_db import *
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '../compiler'))
+from compiler import fixed_arch_params
+from perf_model import CALIBRATION_ERROR
+
+'''
+Design-space exploration driver for the NPU. It sweeps ranges of architecture parameters, compiles the selected
+workloads for every valid design point and estimates their performance using the analytical model of the compiler
+(compiler.py -estimate). The points that are clearly dominated by a cheaper and faster point are pruned, and the
+remaining ones are evaluated using the performance simulation. Each simulated design point gets its own copy of
+the RAD-Sim tree (with its own params.hpp, register files and build directory) under scripts/dse/, so several
+points can be built and simulated in parallel. The results are reported as a Pareto front of throughput (geometric
+mean of the TOPS of the workloads) against resources (multipliers or MRF memory).
+
+Usage: python dse.py [-t R] [-s R] [-d R] [-l R] [-th R] [-vd R] [-md R] [--run_test KEYWORD] [-j N]
+                     [-constraint EXPR]... [-prune_tol PCT] [-keep N] [-resource macs|mrf_kb] [-estimate_only] [-opt]
+Ranges (R) are either a comma-separated list of values (e.g. 20,40,80) or an inclusive range lo:hi[:step]. Constraints
+are Python expressions of the architecture parameters and resources (e.g. -constraint "macs <= 100000").
+'''
+
+scripts_dir = os.path.dirname(os.path.abspath(__file__))
+npu_dir = os.path.abspath(os.path.join(scripts_dir, '..'))
+radsim_root = os.path.abspath(os.path.join(npu_dir, '../..'))
+compiler_dir = os.path.join(npu_dir, 'compiler')
+workloads_dir = os.path.join(scripts_dir, 'workloads')
+reports_dir = os.path.join(scripts_dir, 'reports')
+dse_dir = os.path.join(scripts_dir, 'dse')
+
+# Architecture parameters swept by the driver (command line flag -> name of the parameter) and their default values
+arch_flags = [('-t', 'tiles'), ('-s', 'sectors'), ('-d', 'dpes'), ('-l', 'lanes'), ('-th', 'threads'), \
+	('-vd', 'vrf_depth'), ('-md', 'mrf_depth')]
+default_ranges = {'tiles': [7], 'sectors': [10], 'dpes': [40], 'lanes': [40], 'threads': [4], 'vrf_depth': [512], \
+	'mrf_depth': [1024]}
+
+# Parses a range of parameter values (a,b,c or lo:hi[:step]), returns None if the range is invalid
+def parse_range(text):
+	try:
+		if(':' in text):
+			bounds = [int(v) for v in text.split(':')]
+			if(len(bounds) not in [2, 3] or (len(bounds) == 3 and bounds[2] <= 0)):
+				return None
+			return list(range(bounds[0], bounds[1] + 1, bounds[2] if len(bounds) == 3 else 1))
+		return [int(v) for v in text.split(',')]
+	except ValueError:
+		return None
+
+'''
+Returns the resources used by a design point: the number of multipliers of the MVU tiles of all cores and threads
+(macs) and the size of the matrix register files of all threads in KB (mrf_kb, 8-bit weights shared by the cores).
+'''
+def arch_resources(arch):
+	return {
+		'macs'		: fixed_arch_params['cores'] * arch['threads'] * arch['tiles'] * arch['dpes'] * arch['lanes'],
+		'mrf_kb'	: arch['threads'] * arch['tiles'] * arch['dpes'] * arch['mrf_depth'] * arch['lanes'] / 1024.0
+	}
+
+# Checks the architecture constraints of the compiler (see run_flow) and the user constraints of a design point
+def valid_point(arch, constraints):
+	if(min(arch.values()) <= 0):
+		return False
+	if(arch['dpes'] % arch['lanes'] != 0 or arch['dpes'] % arch['sectors'] != 0):
+		return False
+	names = dict(arch)
+	names.update(arch_resources(arch))
+	return all(eval(constraint, {'__builtins__': {}}, names) for constraint in constraints)
+
+def point_name(arch):
+	return 't{}_s{}_d{}_l{}_th{}_vd{}_md{}'.format(*[arch[p] for (_, p) in arch_flags])
+
+def point_arguments(arch):
+	args = []
+	for (flag, param) in arch_flags:
+		args += [flag, str(arch[param])]
+	return args
+
+# Geometric mean of a metric over the records of the workloads of a design point (None if any workload is missing)
+def geomean(records, metric):
+	values = [r.get(metric) if r is not None else None for r in records]
+	if(not values or any(v is None or v <= 0 for v in values)):
+		return None
+	return math.exp(sum(math.log(v) for v in values) / len(values))
+
+# Runs a workload in the given compiler directory and returns its performance record (None if the flow failed)
+def run_workload(work_dir, workload, args, report_dir):
+	shutil.copy(os.path.join(workloads_dir, workload + '.py'), work_dir)
+	record_path = os.path.join(report_dir, workload + '_perf.json')
+	if os.path.isfile(record_path):
+		os.remove(record_path)
+	with open(os.path.join(report_dir, workload + '.rpt'), 'w') as outfile:
+		subprocess.call(['python', workload + '.py'] + args + ['-perf_record', record_path], stdout=outfile, \
+			stderr=outfile, cwd=work_dir, shell=False)
+	os.remove(os.path.join(work_dir, workload + '.py'))
+	return load_record(record_path)
+
+# Compiles the workloads for a design point and returns their estimated performance records
+def estimate_point(arch, workloads, extra_args):
+	point_dir = os.path.join(dse_dir, point_name(arch))
+	work_dir = os.path.join(point_dir, 'estimate', 'compiler')
+	if os.path.isdir(work_dir):
+		shutil.rmtree(work_dir)
+	os.makedirs(os.path.join(work_dir, 'pac_dump'))
+	for f in listdir(compiler_dir):
+		if f.endswith('.py'):
+			shutil.copy(os.path.join(compiler_dir, f), work_dir)
+	records = [run_workload(work_dir, workload, point_arguments(arch) + ['-estimate'] + extra_args, point_dir) \
+		for workload in workloads]
+	shutil.rmtree(os.path.join(point_dir, 'estimate'))
+	return records
+
+'''
+Builds and simulates the workloads on a design point in its own copy of the RAD-Sim tree and returns their performance
+records. The first workload generates params.hpp and builds the simulator (-is_first) and the others reuse the build.
+'''
+def simulate_point(arch, workloads, extra_args, keep_build):
+	point_dir = os.path.join(dse_dir, point_name(arch))
+	radsim_dir = os.path.join(point_dir, 'rad-sim')
+	work_dir = make_radsim_copy(radsim_root, npu_dir, radsim_dir, os.path.join(point_dir, 'config.log'))
+	records = []
+	for i, workload in enumerate(workloads):
+		args = point_arguments(arch) + ['-perfsim'] + extra_args + (['-is_first'] if i == 0 else [])
+		records.append(run_workload(work_dir, workload, args, point_dir))
+	if(not keep_build):
+		shutil.rmtree(radsim_dir)
+	return records
+
+'''
+Returns the design points on the Pareto front of the given metric (maximized) against the given resource (minimized).
+A point is on the front if no other point has a higher or equal metric for fewer or equal resources (and is strictly
+better in one of them).
+'''
+def pareto_front(points, metric, resource):
+	front = []
+	for p in points:
+		dominated = False
+		for q in points:
+			if(q[metric] >= p[metric] and q[resource] <= p[resource] and (q[metric] > p[metric] or q[resource] < p[resource])):
+				dominated = True
+				break
+		if not dominated:
+			front.append(p)
+	return sorted(front, key=lambda p: p[resource])
+
+'''
+Returns the default pruning tolerance (percent) derived from the error of the analytical model: the estimates of a
+workload are within CALIBRATION_ERROR of the simulated cycles, so a point estimated to be faster than another one by
+more than (1 + error) / (1 - error) is also faster in the performance simulation.
+'''
+def default_prune_tol():
+	return ((1 + CALIBRATION_ERROR) / (1 - CALIBRATION_ERROR) - 1) * 100
+
+'''
+Prunes the design points using their estimated TOPS. Since the error of the analytical model differs between
+workloads, the estimates are compared workload by workload (est_tops_per_workload) rather than through their geometric
+mean: a point is only pruned if another point uses fewer or equal resources and is estimated to be faster by more than
+prune_tol percent on every workload. At most keep points are kept, starting with the estimated Pareto front.
+'''
+def prune_points(points, resource, prune_tol, keep):
+	def dominates(q, p):
+		return all(q['est_tops_per_workload'][w] > tops * (1 + prune_tol / 100.0) \
+			for w, tops in p['est_tops_per_workload'].items())
+	survivors = []
+	for p in points:
+		if not any(q is not p and q[resource] <= p[resource] and dominates(q, p) for q in points):
+			survivors.append(p)
+	front = pareto_front(points, 'est_tops', resource)
+	survivors.sort(key=lambda p: (not any(p is f for f in front), -p['est_tops']))
+	return survivors[:keep]
+
+def print_points(points, front):
+	print(colors.BOLD + '{:<40}    {:<10}    {:<10}    {:<9}    {:<9}    {:<5}'.format('DESIGN POINT', 'MACs', 'MRF(KB)', \
+		'Est. TOPS', 'TOPS', 'FRONT') + colors.RESET)
+	for p in sorted(points, key=lambda p: p['macs']):
+		print('{:<40}    {:<10}    {:<10.0f}    {:<9}    {:<9}    {:<5}'.format(p['name'], p['macs'], p['mrf_kb'], \
+			'{:.2f}'.format(p['est_tops']) if p.get('est_tops') is not None else 'N/A', \
+			'{:.2f}'.format(p['tops']) if p.get('tops') is not None else 'N/A', \
+			'*' if any(p is f for f in front) else ''))
+
+# Columns of the CSV results file
+dse_fields = ['name'] + arch_fields + ['macs', 'mrf_kb', 'est_tops', 'tops', 'pareto']
+
+if __name__ == '__main__':
+	# Parse command line arguments
+	ranges = dict(default_ranges)
+	for (flag, param) in arch_flags:
+		if(flag in sys.argv):
+			values = parse_range(sys.argv[sys.argv.index(flag) + 1]) if sys.argv.index(flag) + 1 < len(sys.argv) else None
+			if(not values):
+				print(colors.FAIL + "\nInvalid " + flag + " argument!" + colors.RESET)
+				sys.exit(1)
+			ranges[param] = values
+
+	constraints = [sys.argv[i + 1] for i in range(len(sys.argv) - 1) if sys.argv[i] == '-constraint']
+
+	num_jobs = 1
+	prune_tol = default_prune_tol()
+	keep = 8
+	resource = 'macs'
+	for (flag, cast) in [('-j', int), ('-prune_tol', float), ('-keep', int), ('-resource', str)]:
+		if(flag in sys.argv):
+			try:
+				value = cast(sys.argv[sys.argv.index(flag) + 1])
+			except (ValueError, IndexError):
+				print(colors.FAIL + "\nInvalid " + flag + " argument!" + colors.RESET)
+				sys.exit(1)
+			if(flag == '-j'):
+				num_jobs = value
+			elif(flag == '-prune_tol'):
+				prune_tol = value
+			elif(flag == '-keep'):
+				keep = value
+			else:
+				resource = value
+	if(num_jobs <= 0 or keep <= 0 or resource not in ['macs', 'mrf_kb']):
+		print(colors.FAIL + "\nInvalid -j, -keep or -resource argument!" + colors.RESET)
+		sys.exit(1)
+
+	estimate_only = ('-estimate_only' in sys.argv)
+	keep_build = ('-keep_build' in sys.argv)
+	extra_args = ['-opt'] if ('-opt' in sys.argv) else []
+
+	keyword = ''
+	if ('--run_test' in sys.argv):
+		keyword = sys.argv[sys.argv.index('--run_test')+1]
+	workloads = sorted([f.split('.')[0] for f in listdir(workloads_dir) if isfile(join(workloads_dir, f)) and keyword in f])
+	if(not workloads):
+		print(colors.FAIL + "\nNo workloads matching '" + keyword + "'!" + colors.RESET)
+		sys.exit(1)
+
+	# Enumerate the valid design points
+	points = []
+	for values in itertools.product(*[ranges[param] for (_, param) in arch_flags]):
+		arch = dict(zip([param for (_, param) in arch_flags], values))
+		if valid_point(arch, constraints):
+			point = dict(arch)
+			point.update(arch_resources(arch))
+			point['name'] = point_name(arch)
+			points.append(point)
+	print(colors.BOLD + 'Exploring ' + str(len(points)) + ' design point(s) with ' + str(len(workloads)) + ' workload(s)' + colors.RESET)
+	if(not points):
+		sys.exit(1)
+	if not os.path.isdir(dse_dir):
+		os.makedirs(dse_dir)
+
+	# Step 1: Estimate the performance of all design points (points on which a workload does not compile are dropped)
+	with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+		futures = [executor.submit(estimate_point, dict((p, point[p]) for (_, p) in arch_flags), workloads, extra_args) \
+			for point in points]
+		for point, future in zip(points, futures):
+			records = future.result()
+			point['est_tops'] = geomean(records, 'est_tops')
+			if(point['est_tops'] is not None):
+				point['est_tops_per_workload'] = dict((w, r['est_tops']) for w, r in zip(workloads, records))
+	feasible = [p for p in points if p['est_tops'] is not None]
+	print(str(len(points) - len(feasible)) + ' design point(s) cannot run all workloads')
+	if(not feasible):
+		sys.exit(1)
+
+	# Step 2: Prune the design points using the estimates and simulate the remaining ones in parallel
+	if(estimate_only):
+		evaluated = feasible
+		front = pareto_front(feasible, 'est_tops', resource)
+	else:
+		evaluated = prune_points(feasible, resource, prune_tol, keep)
+		print('Simulating ' + str(len(evaluated)) + ' design point(s) out of ' + str(len(feasible)))
+		with ProcessPoolExecutor(max_workers=num_jobs) as executor:
+			futures = [executor.submit(simulate_point, dict((p, point[p]) for (_, p) in arch_flags), workloads, extra_args, \
+				keep_build) for point in evaluated]
+			for point, future in zip(evaluated, futures):
+				records = future.result()
+				passed = all(r is not None and r.get('passed') for r in records)
+				point['tops'] = geomean(records, 'tops') if passed else None
+		front = pareto_front([p for p in evaluated if p['tops'] is not None], 'tops', resource)
+
+	# Report the results and the Pareto front
+	for point in evaluated:
+		point['pareto'] = any(point is f for f in front)
+	print_points(evaluated, front)
+	if not os.path.isdir(reports_dir):
+		os.makedirs(reports_dir)
+	write_json(evaluated, os.path.join(reports_dir, 'dse_results.json'))
+	with open(os.path.join(reports_dir, 'dse_results.csv'), 'w', newline='') as out_file:
+		writer = csv.DictWriter(out_file, fieldnames=dse_fields, extrasaction='ignore')
+		writer.writeheader()
+		for point in evaluated:
+			writer.writerow(point)
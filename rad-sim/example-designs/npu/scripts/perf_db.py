@@ -0,0 +1,261 @@
+import os
+import sys
+import csv
+import json
+import time
+import shutil
+import statistics
+import subprocess
+
+'''
+This module keeps track of the NPU performance results across runs. Each performance simulation run produces
+a JSON record (compiler.py -perf_record) with the workload name, architecture parameters, simulated cycles,
+TOPS, simulation wall time and simulation speed (seconds per simulated cycle). The records of every run of
+perf_tests.py are appended to a history file (one JSON record per line), which is used to compute regressions
+against a baseline and to chart trends over time.
+
+Usage: python perf_db.py trend [-history FILE] [-w KEYWORD] [-m METRIC] [-o FILE.html]
+       python perf_db.py check [-history FILE] [-runs N]
+'''
+
+# Tracked metrics and their default regression tolerances (in percent). Metrics without a tolerance are
+# reported but never flagged as regressions.
+default_tolerances = {
+	'tops'			: 10.00,
+	'sim_time'		: 100.00,
+	'sec_per_cycle'	: None
+}
+
+# Architecture parameters that identify comparable runs
+arch_fields = ['tiles', 'sectors', 'dpes', 'lanes', 'threads', 'vrf_depth', 'mrf_depth']
+
+# Columns of the CSV results file
+csv_fields = ['run_id', 'git_rev', 'timestamp', 'workload', 'passed', 'cycles', 'est_cycles', 'tops', 'sim_time', 'sec_per_cycle'] + \
+	arch_fields + ['freq', 'opt']
+
+# Define colors for printing
+class colors:
+	PASS = '\x1b[42m'
+	FAIL = '\x1b[41m'
+	BOLD = '\033[1m'
+	RESET = '\033[0;0m'
+
+# Loads a performance record written by the compiler, returns None if the run did not produce one
+def load_record(path):
+	if not os.path.isfile(path):
+		return None
+	with open(path, 'r') as record_file:
+		try:
+			return json.load(record_file)
+		except ValueError:
+			return None
+
+# Returns the key used to match runs of the same workload on the same architecture (and compiler optimization level)
+def record_key(record):
+	arch = record.get('arch_params', {})
+	return (record['workload'],) + tuple(arch.get(f) for f in arch_fields) + (record.get('freq'), record.get('opt', 0))
+
+# Returns the current git revision (or None if not available)
+def git_revision():
+	try:
+		rev = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL)
+		return rev.decode().strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# Tags the records of one perf_tests.py run with a run ID (time of the run) and the git revision
+def stamp_records(records):
+	run_id = time.strftime('%Y%m%d-%H%M%S')
+	git_rev = git_revision()
+	for record in records:
+		record['run_id'] = run_id
+		record['git_rev'] = git_rev
+	return records
+
+def write_json(records, path):
+	with open(path, 'w') as out_file:
+		json.dump(records, out_file, indent=2)
+
+def write_csv(records, path):
+	with open(path, 'w', newline='') as out_file:
+		writer = csv.DictWriter(out_file, fieldnames=csv_fields, extrasaction='ignore')
+		writer.writeheader()
+		for record in records:
+			row = dict(record)
+			row.update(record.get('arch_params', {}))
+			writer.writerow(row)
+
+# Parses the legacy baseline file (one "{workload} {TOPS} {runtime}" line per workload)
+def load_baseline_file(path):
+	baseline = {}
+	with open(path, 'r') as baseline_file:
+		for line in baseline_file:
+			split_line = line.split()
+			if len(split_line) < 3:
+				continue
+			baseline[split_line[0]] = {'tops': float(split_line[1]), 'sim_time': float(split_line[2])}
+	return baseline
+
+'''
+Compares the metrics of a record to a reference and returns a dictionary of metric -> (change in percent,
+regressed). Only metrics available in both the record and the reference are compared. A metric regresses if
+its absolute change exceeds its tolerance (changes in both directions are flagged, since a large improvement
+of QoR or simulation speed usually means that the simulator is not doing the same work anymore).
+'''
+def compare(record, reference, tolerances=default_tolerances):
+	comparison = {}
+	for metric, tolerance in tolerances.items():
+		value = record.get(metric)
+		ref = reference.get(metric) if reference is not None else None
+		if value is None or not ref:
+			continue
+		change = ((value / ref) - 1) * 100
+		comparison[metric] = (change, tolerance is not None and abs(change) >= tolerance)
+	return comparison
+
+class perf_history:
+	def __init__(self, path):
+		self.path = path
+		self.runs = []
+		if os.path.isfile(path):
+			with open(path, 'r') as history_file:
+				for line in history_file:
+					line = line.strip()
+					if line:
+						self.runs.append(json.loads(line))
+
+	# Appends the records of one perf_tests.py run (see stamp_records) to the history
+	def append(self, records):
+		with open(self.path, 'a') as history_file:
+			for record in records:
+				history_file.write(json.dumps(record, sort_keys=True) + '\n')
+				self.runs.append(record)
+
+	# Returns the history of the runs matching the given record (same workload and architecture), oldest first
+	def matching(self, record):
+		key = record_key(record)
+		return [r for r in self.runs if record_key(r) == key]
+
+	'''
+	Returns a reference for the given record computed as the median of each metric over the last num_runs
+	passing runs of the same workload and architecture, or None if there are no such runs in the history.
+	'''
+	def reference(self, record, num_runs=5):
+		runs = [r for r in self.matching(record) if r.get('passed')][-num_runs:]
+		if not runs:
+			return None
+		reference = {}
+		for metric in default_tolerances.keys():
+			values = [r[metric] for r in runs if r.get(metric) is not None]
+			if values:
+				reference[metric] = statistics.median(values)
+		return reference
+
+	def workloads(self):
+		return sorted(set(r['workload'] for r in self.runs))
+
+# Prints the evolution of a metric over the history of each workload
+def print_trends(history, workloads, metric):
+	for workload in workloads:
+		runs = [r for r in history.runs if r['workload'] == workload]
+		if not runs:
+			continue
+		print(colors.BOLD + workload + colors.RESET)
+		print('{:<18}    {:<10}    {:<6}    {:<12}    {:<10}'.format('RUN', 'REV', 'TEST', metric, 'Change'))
+		prev = None
+		for r in runs:
+			value = r.get(metric)
+			change = ''
+			if value is not None and prev:
+				change = '{:+.2f}%'.format(((value / prev) - 1) * 100)
+			print('{:<18}    {:<10}    {:<6}    {:<12}    {:<10}'.format(str(r.get('run_id')), str(r.get('git_rev')), \
+				'PASS' if r.get('passed') else 'FAIL', '{:.6g}'.format(value) if value is not None else 'N/A', change))
+			if value is not None:
+				prev = value
+
+# Plots the evolution of a metric over the history of each workload to an HTML file (requires plotly)
+def plot_trends(history, workloads, metric, out_path):
+	import plotly.graph_objects as go
+	fig = go.Figure()
+	for workload in workloads:
+		runs = [r for r in history.runs if r['workload'] == workload and r.get(metric) is not None]
+		fig.add_trace(go.Scatter(x=[r['run_id'] for r in runs], y=[r[metric] for r in runs], mode='lines+markers', name=workload, \
+			text=[r.get('git_rev') for r in runs]))
+	fig.update_layout(title='NPU performance history (' + metric + ')', xaxis_title='Run', yaxis_title=metric)
+	fig.write_html(out_path)
+
+# Checks the last run in the history against the runs preceding it and returns True if any metric regressed
+def check_last_run(history, num_runs, tolerances=default_tolerances):
+	if not history.runs:
+		return False
+	last_run_id = history.runs[-1]['run_id']
+	last_run = [r for r in history.runs if r['run_id'] == last_run_id]
+	previous = perf_history(history.path)
+	previous.runs = [r for r in history.runs if r['run_id'] != last_run_id]
+	regressed = False
+	for record in last_run:
+		reference = previous.reference(record, num_runs)
+		comparison = compare(record, reference, tolerances)
+		changes = '    '.join('{} {:+.2f}%'.format(m, c) for m, (c, _) in comparison.items())
+		if any(r for (_, r) in comparison.values()) or not record.get('passed'):
+			print('{:<35}    '.format(record['workload']) + colors.FAIL + 'FAIL' + colors.RESET + '    ' + changes)
+			regressed = True
+		else:
+			print('{:<35}    '.format(record['workload']) + colors.PASS + 'PASS' + colors.RESET + '    ' + changes)
+	return regressed
+
+# Files of the RAD-Sim tree that are not needed to build and simulate the NPU
+def ignore_files(path, names):
+	ignored = [n for n in names if n in ['build', '__pycache__', 'scratch', 'dse', 'reports']]
+	if(os.path.basename(path) == 'register_files'):
+		ignored += [n for n in names if n.endswith('.txt') or n.endswith('.bin')]
+	return ignored
+
+'''
+Creates a private copy of the RAD-Sim tree (simulator sources and NPU design) in radsim_dir and configures it for
+the NPU. The copy has its own params.hpp, register files and build directory, so workloads compiled and simulated
+in it do not interfere with the ones of other copies. Returns the path of the compiler directory of the copy.
+'''
+def make_radsim_copy(radsim_root, npu_dir, radsim_dir, log_path):
+	if os.path.isdir(radsim_dir):
+		shutil.rmtree(radsim_dir)
+	os.makedirs(os.path.join(radsim_dir, 'example-designs'))
+	shutil.copytree(os.path.join(radsim_root, 'sim'), os.path.join(radsim_dir, 'sim'), ignore=ignore_files)
+	for f in ['CMakeLists.txt', 'config.py', 'example-designs/CMakeLists.txt']:
+		shutil.copy(os.path.join(radsim_root, f), os.path.join(radsim_dir, f))
+	shutil.copytree(npu_dir, os.path.join(radsim_dir, 'example-designs', 'npu'), ignore=ignore_files)
+	work_dir = os.path.join(radsim_dir, 'example-designs', 'npu', 'compiler')
+	if not os.path.isdir(os.path.join(work_dir, 'pac_dump')):
+		os.makedirs(os.path.join(work_dir, 'pac_dump'))
+	subprocess.call(['chmod', '777', 'perf_sim.sh'], cwd=work_dir, shell=False)
+	with open(log_path, 'w') as outfile:
+		subprocess.call(['python', 'config.py', 'npu'], stdout=outfile, stderr=outfile, cwd=radsim_dir, shell=False)
+	return work_dir
+
+if __name__ == '__main__':
+	history_path = './perf_history.jsonl'
+	if('-history' in sys.argv):
+		history_path = sys.argv[sys.argv.index('-history') + 1]
+	history = perf_history(history_path)
+
+	if('trend' in sys.argv):
+		metric = 'sec_per_cycle'
+		if('-m' in sys.argv):
+			metric = sys.argv[sys.argv.index('-m') + 1]
+		keyword = ''
+		if('-w' in sys.argv):
+			keyword = sys.argv[sys.argv.index('-w') + 1]
+		workloads = [w for w in history.workloads() if keyword in w]
+		if('-o' in sys.argv):
+			plot_trends(history, workloads, metric, sys.argv[sys.argv.index('-o') + 1])
+		else:
+			print_trends(history, workloads, metric)
+	elif('check' in sys.argv):
+		num_runs = 5
+		if('-runs' in sys.argv):
+			num_runs = int(sys.argv[sys.argv.index('-runs') + 1])
+		exit(check_last_run(history, num_runs))
+	else:
+		print('Usage: python perf_db.py trend [-history FILE] [-w KEYWORD] [-m METRIC] [-o FILE.html]')
+		print('       python perf_db.py check [-history FILE] [-runs N]')
+		exit(1)
@@ -2,14 +2,11 @@ import os
 from os import listdir, chdir
 from os.path import isfile, join
 import sys
+import shutil
 import subprocess
-
-# Define colors for printing
-class colors:
-	PASS = '\x1b[42m'
-	FAIL = '\x1b[41m'
-	BOLD = '\033[1m'
-	RESET = '\033[0;0m'
+from glob import glob
+from concurrent.futures import ProcessPoolExecutor
+from perf_db import *
 
 # Set default values
 num_tiles = 7
@@ -20,8 +17,10 @@ num_lanes = 40
 vrf_depth = 512
 mrf_depth = 1024
 instances = 1
-qor_tolerance = 10.00 # 10 percent
-runtime_tolerance = 100.00 # 100 percent
+tolerances = dict(default_tolerances) # QoR (TOPS) 10 percent, runtime 100 percent
+num_jobs = 1
+history_path = '../scripts/perf_history.jsonl'
+baseline_runs = 0 # compare to the perf_baseline file by default
 
 # Parse command line arguments
 if('-t' in sys.argv):
@@ -104,9 +103,59 @@ if('-i' in sys.argv):
 		print(bcolors.FAIL + "\nInvalid -i argument!" + bcolors.RESET)
 		sys.exit(1)
 
+if('-j' in sys.argv):
+	if(sys.argv.index('-j') + 1 >= len(sys.argv)):
+		print(colors.FAIL + "\nInvalid -j argument!" + colors.RESET)
+		sys.exit(1)
+	try:
+		num_jobs = int(sys.argv[sys.argv.index('-j') + 1])
+	except ValueError:
+		print(colors.FAIL + "\nInvalid -j argument!" + colors.RESET)
+		sys.exit(1)
+	if(num_jobs <= 0):
+		print(colors.FAIL + "\nInvalid -j argument!" + colors.RESET)
+		sys.exit(1)
+
+# Regression tolerances (in percent) for QoR, simulation runtime and simulation speed (seconds per cycle)
+for (flag, metric) in [('-qor_tol', 'tops'), ('-runtime_tol', 'sim_time'), ('-speed_tol', 'sec_per_cycle')]:
+	if(flag in sys.argv):
+		try:
+			tolerances[metric] = float(sys.argv[sys.argv.index(flag) + 1])
+		except (ValueError, IndexError):
+			print(colors.FAIL + "\nInvalid " + flag + " argument!" + colors.RESET)
+			sys.exit(1)
+
+if('-history' in sys.argv):
+	if(sys.argv.index('-history') + 1 >= len(sys.argv)):
+		print(colors.FAIL + "\nInvalid -history argument!" + colors.RESET)
+		sys.exit(1)
+	history_path = sys.argv[sys.argv.index('-history') + 1]
+
+if('-no_history' in sys.argv):
+	history_path = None
+
+# Compare to the median of the last N runs in the history instead of the perf_baseline file
+if('-baseline_runs' in sys.argv):
+	try:
+		baseline_runs = int(sys.argv[sys.argv.index('-baseline_runs') + 1])
+	except (ValueError, IndexError):
+		print(colors.FAIL + "\nInvalid -baseline_runs argument!" + colors.RESET)
+		sys.exit(1)
+	if(history_path is None):
+		print(colors.FAIL + "\n-baseline_runs cannot be used with -no_history!" + colors.RESET)
+		sys.exit(1)
+
 sim_arguments = ['python', '-t', str(num_tiles), '-s', str(num_sectors), '-d', str(num_dpes), '-l', str(num_lanes), \
 	'-vd', str(vrf_depth), '-md', str(mrf_depth), '-th', str(num_threads), '-perfsim']
 
+# Run the instruction scheduling pass of the compiler on the workloads
+if('-opt' in sys.argv):
+	sim_arguments.append('-opt')
+
+# Use binary register files for the performance simulation
+if('-perf_bin' in sys.argv):
+	sim_arguments.append('-perf_bin')
+
 keyword = ''
 if ('--run_test' in sys.argv):
 	keyword = sys.argv[sys.argv.index('--run_test')+1]
@@ -119,90 +168,127 @@ workloads.sort()
 for i in range(len(workloads)):
 	workloads[i] = workloads[i].split('.')[0]
 
-# Parse baseline results
-baseline_results = {}
-baseline = open('../scripts/perf_baseline', 'r')
-for line in baseline:
-	split_line = line.split(' ')
-	baseline_results[split_line[0]] = (float(split_line[1]), float(split_line[2]))
+# Load baseline results (perf_baseline file) and history of previous runs
+baseline_results = load_baseline_file('../scripts/perf_baseline')
+history = perf_history(history_path) if history_path is not None else None
 
-print(colors.BOLD + '{:<35}    {:<4}    {:<4}    {:<5}    {:<7}    {:<8}    {:<11}    {:<20}'.format('WORKLOAD', 'TEST', 'PERF', 'TOPS', 'QoR', 'Cycles', 'Runtime(s)', 'Speed(s/cyc)') + colors.RESET)
+# Loads the performance record of a workload run (None if the flow did not finish)
+def load_workload_record(workload):
+	record = load_record(os.path.abspath('../scripts/reports/'+workload+'_perf.json'))
+	if (record is not None):
+		record['workload'] = workload
+		record['instances'] = instances
+		record['tops'] = record['tops'] * instances
+	return record
 
-chdir('../compiler')
-subprocess.call(['chmod', '777', 'perf_sim.sh'], shell=False)
-first_flag = True
-cycles = ''
-global_failed = False
-for workload in workloads:
-	subprocess.call(['cp', '../scripts/workloads/'+workload+'.py', './'], shell=False)
-	sys.stdout.write('{:<35}    '.format(workload))
-	sys.stdout.flush()
-	outfile = open('../scripts/reports/'+workload+'_perf.rpt', 'w')
-	if (first_flag):
-		call_args = sim_arguments
-		call_args.insert(1, workload+'.py')
+# Runs a workload in the given compiler directory and returns its parsed report
+def run_workload(workload, is_first, work_dir='.'):
+	shutil.copy('../scripts/workloads/'+workload+'.py', work_dir)
+	record_path = os.path.abspath('../scripts/reports/'+workload+'_perf.json')
+	if os.path.isfile(record_path):
+		os.remove(record_path)
+	call_args = list(sim_arguments)
+	call_args.insert(1, workload+'.py')
+	call_args += ['-perf_record', record_path]
+	if (is_first):
 		call_args.append('-is_first')
-		subprocess.call(call_args, stdout=outfile, stderr=outfile, shell=False)
-		first_flag = False
-	else:
-		call_args = sim_arguments
-		call_args.insert(1, workload+'.py')
-		subprocess.call(call_args, stdout=outfile, stderr=outfile, shell=False)
-	rptfile = open('../scripts/reports/'+workload+'_perf.rpt', 'r')
-	parse_perf_res = False
-
-	# Parse File
-	tops = 0
-	cycles = 0
-	runtime = 0
-	speed = 0
-	correctness = False
-	for line in rptfile:
-		if (parse_perf_res and ('Running simulation ... ' in line)):
-			args = line.split()
-			if('PASSED' in args[3]):
-				result = args[10]
-				tops = float(result) * instances
-				cycles = int(args[4][1:])
-				correctness = True	
-			else:
-				correctness = False
-		elif (parse_perf_res and ('Simulation took' in line)):
-			args = line.split()
-			args = args[2].split('m')
-			runtime = int(args[0]) * 60.0
-			args = args[1].split('s')
-			runtime = runtime + float(args[0])
-			speed = runtime/cycles
-		elif 'SystemC Performance Simulation' in line:
-			parse_perf_res = True
-
-	# Write Results
-	if(not parse_perf_res):
+	outfile = open('../scripts/reports/'+workload+'_perf.rpt', 'w')
+	subprocess.call(call_args, stdout=outfile, stderr=outfile, cwd=work_dir, shell=False)
+	outfile.close()
+	os.remove(os.path.join(work_dir, workload+'.py'))
+	return load_workload_record(workload)
+
+# Compiler directory of the private RAD-Sim tree of a job (worker process of perf_tests.py -j), None until it is built
+job_work_dir = None
+
+'''
+Runs a workload in a job (perf_tests.py -j). The workloads are taken from the shared queue of the process pool, and
+each job compiles and simulates them in a private copy of the RAD-Sim tree under scripts/scratch/ with its own
+params.hpp, register files and build directory. The first workload of a job creates its tree and builds the
+simulator (-is_first), and the next ones reuse the build.
+'''
+def run_job_workload(workload):
+	global job_work_dir
+	is_first = (job_work_dir is None)
+	if (is_first):
+		job_dir = os.path.abspath('../scripts/scratch/job'+str(os.getpid()))
+		job_work_dir = make_radsim_copy(os.path.abspath('../../..'), os.path.abspath('..'), \
+			os.path.join(job_dir, 'rad-sim'), os.path.join(job_dir, 'config.log'))
+	return run_workload(workload, is_first, job_work_dir)
+
+# Prints the results of a workload and returns True if it failed
+def print_results(workload, record):
+	failed = False
+	if(record is None):
 		print(colors.FAIL + 'FAIL' + colors.RESET)
-		global_failed = True
+		failed = True
 	else:
-		if(correctness):
+		tops = record['tops']
+		cycles = record['cycles']
+		runtime = record['sim_time']
+		speed = record['sec_per_cycle']
+		if(record['passed']):
 			print(colors.PASS + 'PASS' + colors.RESET, end='    ') # Correctness PASS
-			if workload in baseline_results:
-				qor_comparison_to_baseline = ((tops/baseline_results[workload][0])-1) * 100
-				runtime_comparison_to_baseline = ((runtime/baseline_results[workload][1])-1) * 100
-				if (abs(qor_comparison_to_baseline) < qor_tolerance and abs(runtime_comparison_to_baseline) < runtime_tolerance):
+			if (baseline_runs > 0):
+				reference = history.reference(record, baseline_runs)
+			else:
+				reference = baseline_results.get(workload)
+			comparison = compare(record, reference, tolerances)
+			if 'tops' in comparison:
+				qor_comparison_to_baseline = comparison['tops'][0]
+				if not any(regressed for (_, regressed) in comparison.values()):
 					print(colors.PASS + 'PASS' + colors.RESET, end='    ') # Performance PASS
 				else:
 					print(colors.FAIL + 'FAIL' + colors.RESET, end='    ') # Performance FAIL
-					global_failed = True
+					failed = True
 				if qor_comparison_to_baseline >= 0:
-					print ('{:<5}    +{:<5.2f}%    {:<8}    {:<11.2f}    {:<20.2f}'.format(tops, qor_comparison_to_baseline, cycles, runtime, speed))
+					print ('{:<5}    +{:<5.2f}%    {:<8}    {:<11.2f}    {:<20.3e}'.format(tops, qor_comparison_to_baseline, cycles, runtime, speed))
 				else:
-					print ('{:<5}     {:<5.2f}%    {:<8}    {:<11.2f}    {:<20.2f}'.format(tops, qor_comparison_to_baseline, cycles, runtime, speed))
+					print ('{:<5}     {:<5.2f}%    {:<8}    {:<11.2f}    {:<20.3e}'.format(tops, qor_comparison_to_baseline, cycles, runtime, speed))
 			else:
 				print ('    ', end='    ') # No Performance Result
-				print ('{:<5}    {:<7}    {:<8}    {:<11.2f}    {:<20.2f}'.format(tops, 'N/A', cycles, runtime, speed))
+				print ('{:<5}    {:<7}    {:<8}    {:<11.2f}    {:<20.3e}'.format(tops, 'N/A', cycles, runtime, speed))
 		else:
 			print(colors.FAIL + 'FAIL' + colors.RESET) # Correctness FAIL
-			global_failed = True
+			failed = True
+	return failed
+
+print(colors.BOLD + '{:<35}    {:<4}    {:<4}    {:<5}    {:<7}    {:<8}    {:<11}    {:<20}'.format('WORKLOAD', 'TEST', 'PERF', 'TOPS', 'QoR', 'Cycles', 'Runtime(s)', 'Speed(s/cyc)') + colors.RESET)
+
+chdir('../compiler')
+subprocess.call(['chmod', '777', 'perf_sim.sh'], shell=False)
+global_failed = False
+records = []
+
+if (num_jobs == 1):
+	# The first workload regenerates params.hpp and rebuilds the simulator (-is_first) in the shared RAD-Sim tree
+	for i, workload in enumerate(workloads):
+		sys.stdout.write('{:<35}    '.format(workload))
+		sys.stdout.flush()
+		record = run_workload(workload, i == 0)
+		records.append(record)
+		global_failed = print_results(workload, record) or global_failed
+else:
+	if os.path.isdir('../scripts/scratch'):
+		shutil.rmtree('../scripts/scratch')
+	os.makedirs('../scripts/scratch')
+	# Each workload is submitted to the pool on its own, so a free job picks up the next one (no job waits for the
+	# share of another one). The shared RAD-Sim tree is not built: each job builds its own tree
+	with ProcessPoolExecutor(max_workers=min(num_jobs, len(workloads))) as executor:
+		futures = [executor.submit(run_job_workload, workload) for workload in workloads]
+		# Results are printed in workload order as they become available
+		for workload, future in zip(workloads, futures):
+			record = future.result()
+			records.append(record)
+			sys.stdout.write('{:<35}    '.format(workload))
+			global_failed = print_results(workload, record) or global_failed
+	shutil.rmtree('../scripts/scratch')
 
-	subprocess.call(['rm', workload+'.py'], shell=False)
+# Write machine-readable results of this run and append them to the history
+records = stamp_records([r for r in records if r is not None])
+write_json(records, '../scripts/reports/perf_results.json')
+write_csv(records, '../scripts/reports/perf_results.csv')
+if (history is not None and records):
+	history.append(records)
 
 exit(global_failed)
@@ -1,39 +1,28 @@
-import os
-os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
-os.environ['TF_CPP_MIN_LOG_LEVEL'] = "2"
-import tensorflow as tf
-from tensorflow import keras
-from tensorflow.keras import layers
-#import sys
-#sys.path.append('../compiler/')
-
 from compiler import *
 from npu_layers import *
 
+# Initialize NPU (before any test data is generated, since it seeds the random number generator with -seed/-cache)
+npu = initialize_npu(sys.argv)
+
 ###### START OF MODEL DEFINITION ######
 
 # Define constants
 INPUT_SIZE = 1152
 L1_SIZE = 1152
 
-# Define model architecture using Keras Sequential Model
+# Define model architecture using NPU layer specifications (TensorFlow is not needed)
 model = NPUSequential([
-	layers.Dense(L1_SIZE, name="layer1"),
+	Dense(L1_SIZE, name="layer1"),
 ])
 
 # Random test inputs for different types of layers
-test_input = tf.random.uniform(shape=[6, INPUT_SIZE], dtype=tf.int32, minval=-128, maxval=127)
-
-# Call model on example input
-y = model(test_input)
+test_input = np.random.randint(-128, 127, size=[6, INPUT_SIZE])
 
 # Print model summary
 model.summary()
 
 ####### END OF MODEL DEFINITION #######
 
-# Initialize NPU
-npu = initialize_npu(sys.argv)
 # Compile model for NPU
 model.compile_for_npu(npu, test_input)
 # Run NPU flow
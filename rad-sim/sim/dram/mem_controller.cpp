@@ -1,5 +1,70 @@
 #include <mem_controller.hpp>
 
+// Reads an unsigned integer stored in little-endian byte order
+static uint64_t ReadLittleEndian(const uint8_t *bytes, unsigned int num_bytes) {
+  uint64_t value = 0;
+  for (unsigned int i = 0; i < num_bytes; i++)
+    value |= static_cast<uint64_t>(bytes[i]) << (8 * i);
+  return value;
+}
+
+// Loads the binary memory image of a channel (memory-mapped). The image starts
+// with a little-endian header of 4 uint32 values (magic, bytes per element,
+// number of rows, elements per row), followed by the byte address of each row
+// (uint64) and the rows (packed little-endian elements, the first element of a
+// row being the least significant bits of the memory word)
+void mem_controller::InitializeChannelFromImage(const std::string &image_filename,
+                                                unsigned int ch_id) {
+  int fd = ::open(image_filename.c_str(), O_RDONLY);
+  if (fd < 0) {
+    sim_log.log(error, "Cannot open memory image file " + image_filename);
+    return;
+  }
+  struct stat file_stat;
+  if ((::fstat(fd, &file_stat) != 0) ||
+      (file_stat.st_size < MEM_IMAGE_HEADER_BYTES)) {
+    ::close(fd);
+    sim_log.log(error, "Invalid memory image file " + image_filename);
+    return;
+  }
+  size_t file_size = file_stat.st_size;
+  void *mapped = ::mmap(nullptr, file_size, PROT_READ, MAP_PRIVATE, fd, 0);
+  ::close(fd);
+  if (mapped == MAP_FAILED) {
+    sim_log.log(error, "Cannot map memory image file " + image_filename);
+    return;
+  }
+
+  const uint8_t *bytes = static_cast<const uint8_t *>(mapped);
+  uint64_t magic = ReadLittleEndian(bytes, 4);
+  uint64_t element_bytes = ReadLittleEndian(bytes + 4, 4);
+  uint64_t num_rows = ReadLittleEndian(bytes + 8, 4);
+  uint64_t row_bytes = element_bytes * ReadLittleEndian(bytes + 12, 4);
+  if ((magic != MEM_IMAGE_MAGIC) ||
+      (file_size != MEM_IMAGE_HEADER_BYTES + num_rows * (8 + row_bytes))) {
+    ::munmap(mapped, file_size);
+    sim_log.log(error, "Invalid memory image file " + image_filename);
+    return;
+  }
+
+  // Rows wider than a memory word are truncated (as with the text format)
+  const uint8_t *addrs = bytes + MEM_IMAGE_HEADER_BYTES;
+  const uint8_t *rows = addrs + 8 * num_rows;
+  uint64_t data_bytes = std::min<uint64_t>(row_bytes, AXI4_MAX_DATAW / 8);
+  _mem_contents[ch_id].reserve(_mem_contents[ch_id].size() + num_rows);
+  for (uint64_t r = 0; r < num_rows; r++) {
+    uint64_t addr = ReadLittleEndian(addrs + 8 * r, 8);
+    const uint8_t *row = rows + r * row_bytes;
+    sc_bv<AXI4_MAX_DATAW> data;
+    for (uint64_t w = 0; 4 * w < data_bytes; w++)
+      data.set_word(
+          w, ReadLittleEndian(row + 4 * w,
+                              std::min<uint64_t>(4, data_bytes - 4 * w)));
+    _mem_contents[ch_id][AddressMapping(addr, ch_id)] = data;
+  }
+  ::munmap(mapped, file_size);
+}
+
 void mem_controller::InitializeMemoryContents(std::string &init_filename) {
   std::string name =
       init_filename.substr(0, init_filename.find_last_of("_") + 1);
@@ -9,10 +74,29 @@ void mem_controller::InitializeMemoryContents(std::string &init_filename) {
 
   for (unsigned int ch_id = 0; ch_id < _num_channels; ch_id++) {
     // std::cout << this->name() << " channel " << ch_id << std::endl;
-    std::string full_name = name + std::to_string(ch_id + base_idx) + ".dat";
+    // Binary memory images (.bin) are used instead of text files (.dat) if any
+    std::string channel_name = name + std::to_string(ch_id + base_idx);
+    std::string full_name = channel_name + ".dat";
+    std::ifstream image_file(channel_name + ".bin");
+    if (image_file) {
+      image_file.close();
+      if (std::ifstream(full_name))
+        sim_log.log(warning,
+                    "Both " + channel_name + ".bin and " + full_name +
+                        " exist, ignoring " + full_name,
+                    this->name());
+      sim_log.log(info, "Loading memory image " + channel_name + ".bin",
+                  this->name());
+      InitializeChannelFromImage(channel_name + ".bin", ch_id);
+      continue;
+    }
+
     std::ifstream io_file(full_name);
     if (!io_file)
       sim_log.log(error, "Cannot find memory content file!");
+    else
+      sim_log.log(info, "Loading memory content file " + full_name,
+                  this->name());
 
     std::string line;
     uint64_t addr;
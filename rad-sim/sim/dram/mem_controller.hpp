@@ -2,19 +2,28 @@
 
 #include <systemc.h>
 
+#include <algorithm>
 #include <aximm_interface.hpp>
 #include <bitset>
 #include <cmath>
 #include <design_context.hpp>
+#include <fcntl.h>
 #include <functional>
 #include <memory_system.h>
 #include <queue>
 #include <radsim_utils.hpp>
 #include <sstream>
+#include <sys/mman.h>
+#include <sys/stat.h>
 #include <tuple>
+#include <unistd.h>
 #include <unordered_map>
 #include <vector>
 
+// Magic number ("DMEM") and header size of the binary memory images
+#define MEM_IMAGE_MAGIC 0x4d454d44
+#define MEM_IMAGE_HEADER_BYTES 16
+
 class mem_controller : public RADSimModule {
 private:
   // The DRAMsim memory system model
@@ -99,6 +108,8 @@ public:
   unsigned int GetMemCapacity();
   unsigned int GetAddressableWordSize();
   void InitializeMemoryContents(std::string &init_filename);
+  void InitializeChannelFromImage(const std::string &image_filename,
+                                  unsigned int ch_id);
 
   void Assign();
   void Tick();
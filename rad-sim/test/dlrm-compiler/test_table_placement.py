@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+import dlrm
+
+class TablePlacementTest(unittest.TestCase):
+    """
+    TablePlacementTest class to test the embedding table placement in dlrm.py
+    """
+
+    def setUp(self):
+        """
+        Builds a model with mixed vector lengths (256, 128, 64 and 64 elements) for one DDR and one HBM channel
+        """
+        self.config = dlrm.DLRMConfig(ddr_channels=1, hbm_channels=1)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            model_csv = os.path.join(tmp_dir, "model.csv")
+            with open(model_csv, "w") as f:
+                f.write("# Vector Elements,Table Entries\n256,100\n128,100\n64,100\n64,100\n")
+            self.model = dlrm.parse_dlrm_description(self.config, model_csv)
+        dlrm.sort_tables(self.model)
+
+    def realized_makespan(self, allocation):
+        """
+        Returns the expected lookup time per input (ns) of the busiest channel of an allocation
+        """
+        placement = dlrm.get_allocation_placement(self.config, self.model, allocation)
+        return max(dlrm.get_channel_loads(self.config, placement))
+
+    def test_balanced_allocation(self):
+        """
+        Tests that the balanced allocations put the heaviest table on the fast HBM channel and reach the optimal
+        makespan, below the one of the greedy allocation
+        """
+        ddr, hbm = (1, 0), (0, 0)
+        tables = self.model.tables
+        cost = lambda id, channel: dlrm.get_table_lookup_cost(self.config, tables[id], channel)
+        # HBM: 256 + 64 elements, DDR: 128 + 64 elements
+        expected = max(cost(0, hbm) + cost(2, hbm), cost(1, ddr) + cost(3, ddr))
+        greedy = self.realized_makespan(dlrm.greedy_allocation(self.config, self.model))
+        for refine in [False, True]:
+            with self.subTest(refine=refine):
+                allocation = dlrm.balanced_allocation(self.config, self.model, refine)
+                self.assertEqual(tables[0].channel_type, 0)
+                self.assertAlmostEqual(self.realized_makespan(allocation), expected)
+                self.assertLess(self.realized_makespan(allocation), greedy)
+
+    def test_lookup_order(self):
+        """
+        Tests that the lookups of a balanced allocation follow the deal order (fastest channel first in each round),
+        so that vector lengths never increase and vectors never straddle a feature interaction word
+        """
+        allocation = dlrm.balanced_allocation(self.config, self.model)
+        lookups = dlrm.get_lookup_order(self.config, allocation)
+        self.assertEqual([ch for (ch, table_id, base_addr) in lookups], [1, 0, 1, 0])
+        vector_lengths = [self.model.tables[table_id].vector_length for (ch, table_id, base_addr) in lookups]
+        self.assertEqual(vector_lengths, sorted(vector_lengths, reverse=True))
+
+if __name__ == "__main__":
+    unittest.main()
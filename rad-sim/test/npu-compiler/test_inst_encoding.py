@@ -0,0 +1,85 @@
+import unittest
+import numpy as np
+import fsim
+from compiler import npu, pack_lanes, words_to_text
+
+arch_params = {
+    'tiles' : 3,
+    'sectors' : 2,
+    'dpes'  : 4,
+    'lanes' : 4,
+    'threads' : 1,
+    'vrf_depth' : 64,
+    'mrf_depth' : 128,
+    'max_tag' : 512,
+    'cores' : 2,
+    'tb_lanes' : 10,
+    'tb_num_dots' : 3
+}
+
+def random_chains(rng, count):
+    """
+    Builds a chain_store of random chains covering all op types, destination VRFs and field values (including
+    zero, overflowing and negative fields)
+    """
+    insts = fsim.chain_store()
+    for _ in range(count):
+        inst = fsim.chain(fsim.chain_max_batch)
+        for field in fsim.chain_int_fields:
+            if (field == 'batch'):
+                continue
+            if (rng.rand() < 0.5):
+                setattr(inst, field, int(rng.choice([0, 1, rng.randint(0, 2**12), rng.randint(-5, 5)])))
+        for field in fsim.chain_base_fields:
+            setattr(inst, field, list(rng.randint(-1 if rng.rand() < 0.02 else 0, 2**rng.randint(1, 13), size=3)))
+        for field, ops in fsim.chain_enum_fields.items():
+            setattr(inst, field, ops[rng.randint(len(ops))])
+        for field in fsim.chain_vrf_op_fields:
+            setattr(inst, field, fsim.vrf_op_name(rng.randint(len(fsim.vrf_op_types) + 2 * arch_params['tiles'])))
+        insts.append(inst)
+    return insts
+
+class InstEncodingTest(unittest.TestCase):
+    """
+    InstEncodingTest class to test the vectorized instruction and data encoding functions in compiler.py
+    """
+
+    def test_encode_insts(self):
+        """
+        Tests that encode_insts matches the per-instruction set_inst encoding
+        """
+        npu_inst = npu(arch_params, {'verbose': 0})
+        npu_inst.set_inst_params()
+        insts = random_chains(np.random.RandomState(1), 1000)
+        bits = npu_inst.encode_insts(insts.records())
+        self.assertEqual(bits.shape, (len(insts), npu_inst.MICW))
+        for i, inst in enumerate(insts):
+            npu_inst.set_inst(inst)
+            inst_str = bin(npu_inst.minst_chain & int(pow(2, npu_inst.MICW)-1))[2:].zfill(npu_inst.MICW)
+            self.assertEqual(''.join(map(str, bits[i])), inst_str, 'Instruction ' + str(i) + ' encoded differently')
+
+    def test_pack_lanes(self):
+        """
+        Tests that pack_lanes and words_to_text match the per-word encoding (lane 0 in the least significant bits)
+        """
+        rng = np.random.RandomState(2)
+        for precision, dtype in [(8, np.int8), (16, np.int16), (32, np.int32)]:
+            info = np.iinfo(dtype)
+            block = rng.randint(info.min, info.max, size=(20, 5), dtype=np.int64).astype(dtype)
+            block[0] = [info.min, -1, 0, 1, info.max]
+            words = pack_lanes(block, precision)
+            self.assertEqual(words.shape, (20, 5 * precision // 8))
+            mask = (1 << precision) - 1
+            bin_lines = []
+            hex_lines = []
+            for row in block:
+                val = 0
+                for lane, temp in enumerate(row):
+                    val += ((int(temp) & mask) << (precision * lane))
+                bin_lines.append(bin(val)[2:].zfill(len(row) * precision) + '\n')
+                hex_lines.append(hex(val)[2:].zfill(len(row) * precision // 4) + '\n')
+            self.assertEqual(words_to_text(words, 'bin').decode(), ''.join(bin_lines))
+            self.assertEqual(words_to_text(words, 'hex').decode(), ''.join(hex_lines))
+
+if __name__ == "__main__":
+    unittest.main()
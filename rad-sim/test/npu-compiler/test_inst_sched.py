@@ -0,0 +1,65 @@
+import unittest
+import numpy as np
+from compiler import npu
+from inst_sched import optimize_program
+from npu_layers import npu_rnn, npu_gru, npu_lstm
+
+arch_params = {
+    'tiles' : 2,
+    'sectors' : 2,
+    'dpes'  : 20,
+    'lanes' : 10,
+    'threads' : 1,
+    'vrf_depth' : 512,
+    'mrf_depth' : 1024,
+    'max_tag' : 512,
+    'cores' : 2,
+    'tb_lanes' : 10,
+    'tb_num_dots' : 3
+}
+
+flow_opts = {'verbose': 0, 'verify_every': 0, 'verify_random': 0}
+
+def layer_program(layer, seed, time_steps=3, num_inputs=6, size=40):
+    """
+    Builds the program of a small recurrent layer (npu_layers) with random weights and inputs
+    """
+    rng = np.random.RandomState(seed)
+    npu_inst = npu(arch_params, flow_opts)
+    num_weights = {'rnn': 2, 'gru': 6, 'lstm': 8}[layer]
+    weights = [rng.randint(0, 127, size=(size, size), dtype=np.int8) for i in range(num_weights)]
+    inputs = rng.randint(-128, 127, size=(time_steps, num_inputs, size), dtype=np.int8)
+    if (layer == 'rnn'):
+        npu_rnn(npu_inst, 'rnn', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh')
+    elif (layer == 'gru'):
+        npu_gru(npu_inst, 'gru', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh', 'sigmoid')
+    else:
+        npu_lstm(npu_inst, 'lstm', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh', 'sigmoid')
+    npu_inst.end_npu_program()
+    return npu_inst
+
+class InstSchedTest(unittest.TestCase):
+    """
+    InstSchedTest class to test the instruction scheduling pass in inst_sched.py
+    """
+
+    def test_optimize_program(self):
+        """
+        Tests that the optimized programs of recurrent layers produce the same outputs as the original ones in the
+        functional simulator
+        """
+        for layer in ['rnn', 'gru', 'lstm']:
+            with self.subTest(layer=layer):
+                reference = layer_program(layer, 0)
+                self.assertTrue(reference.fsim_npu_program())
+                optimized = layer_program(layer, 0)
+                stats = optimize_program(optimized)
+                self.assertGreater(stats['moved'], 0)
+                self.assertLess(stats['cycles_after'], stats['cycles_before'])
+                self.assertTrue(optimized.fsim_npu_program())
+                self.assertEqual(len(optimized.fsim.obuf_q), len(reference.fsim.obuf_q))
+                for i, (output, expected) in enumerate(zip(optimized.fsim.obuf_q, reference.fsim.obuf_q)):
+                    np.testing.assert_array_equal(output, expected, 'Output ' + str(i) + ' differs')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,118 @@
+import random
+import unittest
+from compiler import mem_allocator
+
+class MemAllocatorTest(unittest.TestCase):
+    """
+    MemAllocatorTest class to test the mem_allocator class in compiler.py
+    """
+
+    def check_consistency(self, allocator):
+        """
+        Checks that the allocated and free blocks exactly tile the memory space and that no two free blocks are adjacent
+        """
+        blocks = sorted([(start, size, False) for start, size in allocator.allocated.items()] +
+                        [(start, size, True) for start, size in allocator.free_blocks.items()])
+        addr = 0
+        prev_free = False
+        for start, size, is_free in blocks:
+            self.assertEqual(start, addr)
+            self.assertGreater(size, 0)
+            self.assertFalse(prev_free and is_free)
+            addr = start + size
+            prev_free = is_free
+        self.assertEqual(addr, allocator.depth)
+        self.assertEqual(allocator.tree[1], max(allocator.free_blocks.values(), default=0))
+
+    def test_first_fit(self):
+        """
+        Tests that first-fit places blocks at the lowest address that fits
+        """
+        allocator = mem_allocator(16)
+        self.assertEqual(allocator.alloc(4), 0)
+        self.assertEqual(allocator.alloc(4), 4)
+        self.assertEqual(allocator.alloc(4), 8)
+        allocator.free(0)
+        self.assertEqual(allocator.alloc(6), -1)
+        self.assertEqual(allocator.alloc(3), 0)
+        self.assertEqual(allocator.alloc(4), 12)
+        self.assertEqual(allocator.alloc(2), -1)
+        self.check_consistency(allocator)
+
+    def test_best_fit(self):
+        """
+        Tests that best-fit places blocks in the smallest free block that fits
+        """
+        allocator = mem_allocator(16, policy='best_fit')
+        self.assertEqual(allocator.alloc(4), 0)
+        self.assertEqual(allocator.alloc(2), 4)
+        self.assertEqual(allocator.alloc(4), 6)
+        allocator.free(0)
+        self.assertEqual(allocator.alloc(3), 0)
+        allocator.free(6)
+        self.assertEqual(allocator.alloc(5), 6)
+        self.check_consistency(allocator)
+
+    def test_free_coalescing(self):
+        """
+        Tests that freed blocks are merged with free neighbours on both sides
+        """
+        allocator = mem_allocator(12)
+        for start in [0, 3, 6, 9]:
+            self.assertEqual(allocator.alloc(3), start)
+        allocator.free(3)
+        allocator.free(9)
+        self.assertEqual(allocator.stats()['free_blocks'], 2)
+        allocator.free(6)
+        self.assertEqual(allocator.free_blocks, {3: 9})
+        allocator.free(0)
+        self.assertEqual(allocator.free_blocks, {0: 12})
+        self.assertEqual(allocator.stats()['used'], 0)
+        self.assertEqual(allocator.alloc(12), 0)
+        self.check_consistency(allocator)
+
+    def test_zero_size(self):
+        """
+        Tests that zero-size allocations return the lowest free address without consuming any words
+        """
+        allocator = mem_allocator(4)
+        self.assertEqual(allocator.alloc(2), 0)
+        self.assertEqual(allocator.alloc(0), 2)
+        self.assertEqual(allocator.alloc(2), 2)
+        self.assertEqual(allocator.alloc(0), -1)
+        allocator.free(2)
+        allocator.free(2)
+        self.assertEqual(allocator.free_blocks, {2: 2})
+        self.check_consistency(allocator)
+
+    def test_random_against_linear_scan(self):
+        """
+        Tests random alloc/free sequences against a word-by-word first-fit reference
+        """
+        rng = random.Random(0)
+        depth = 64
+        allocator = mem_allocator(depth)
+        words = [False] * depth
+        live = {}
+        for _ in range(2000):
+            if (live and rng.random() < 0.45):
+                start = rng.choice(sorted(live.keys()))
+                allocator.free(start)
+                for i in range(start, start + live.pop(start)):
+                    words[i] = False
+            else:
+                size = rng.randint(1, 12)
+                expected = -1
+                for start in range(depth - size + 1):
+                    if (not any(words[start:start + size])):
+                        expected = start
+                        break
+                self.assertEqual(allocator.alloc(size), expected)
+                if (expected != -1):
+                    live[expected] = size
+                    for i in range(expected, expected + size):
+                        words[i] = True
+            self.check_consistency(allocator)
+
+if __name__ == "__main__":
+    unittest.main()
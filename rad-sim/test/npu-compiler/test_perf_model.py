@@ -0,0 +1,106 @@
+import os
+import unittest
+import numpy as np
+from compiler import npu
+from compiler import initialize_npu
+from npu_layers import npu_rnn, npu_gru, npu_lstm
+from npu_layers import NPUSequential, Dense, SimpleRNN, GRU, LSTM
+from perf_model import estimate_program, CALIBRATION_ERROR
+
+arch_params = {
+    'tiles' : 2,
+    'sectors' : 2,
+    'dpes'  : 20,
+    'lanes' : 10,
+    'threads' : 1,
+    'vrf_depth' : 512,
+    'mrf_depth' : 1024,
+    'max_tag' : 512,
+    'cores' : 2,
+    'tb_lanes' : 10,
+    'tb_num_dots' : 3
+}
+
+flow_opts = {'verbose': 0, 'verify_every': 0, 'verify_random': 0}
+
+# Architecture and clock frequency (MHz) of the perf_baseline results (defaults of perf_tests.py)
+baseline_args = ['perf_model', '-t', '7', '-s', '10', '-d', '40', '-l', '40', '-vd', '512', '-md', '1024', '-th', '4']
+baseline_freq = 300
+
+# Models and test input shapes of the standard workloads (scripts/workloads) checked against perf_baseline
+baseline_workloads = {
+    '01_std_gemv_512x512': ([Dense(512, name="layer1")], [6, 512]),
+    '06_std_rnn_512_8': ([SimpleRNN(512, name="layer1")], [8, 6, 512]),
+    '11_std_gru_512_8': ([GRU(512, name="layer1")], [8, 6, 512]),
+    '14_std_lstm_512_8': ([LSTM(512, name="layer1")], [8, 6, 512]),
+    '18_std_mlp3_dlrm': ([Dense(512, activation="relu", name="layer1"), Dense(256, activation="relu", name="layer2"),
+                          Dense(256, activation="relu", name="layer3")], [6, 1024])
+}
+
+def layer_program(layer, seed, time_steps=3, num_inputs=6, size=40):
+    """
+    Builds the program of a small recurrent layer (npu_layers) with random weights and inputs
+    """
+    rng = np.random.RandomState(seed)
+    npu_inst = npu(arch_params, flow_opts)
+    num_weights = {'rnn': 2, 'gru': 6, 'lstm': 8}[layer]
+    weights = [rng.randint(0, 127, size=(size, size), dtype=np.int8) for i in range(num_weights)]
+    inputs = rng.randint(-128, 127, size=(time_steps, num_inputs, size), dtype=np.int8)
+    if (layer == 'rnn'):
+        npu_rnn(npu_inst, 'rnn', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh')
+    elif (layer == 'gru'):
+        npu_gru(npu_inst, 'gru', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh', 'sigmoid')
+    else:
+        npu_lstm(npu_inst, 'lstm', 0, time_steps, num_inputs, size, size, size, *weights, 'mvu_vrf', inputs, 'tanh', 'sigmoid')
+    npu_inst.end_npu_program()
+    return npu_inst
+
+def load_baseline_tops(path):
+    """
+    Returns the simulated TOPS of the workloads in the perf_baseline file
+    """
+    baseline = {}
+    with open(path, 'r') as baseline_file:
+        for line in baseline_file:
+            split_line = line.split()
+            if len(split_line) >= 3:
+                baseline[split_line[0]] = float(split_line[1])
+    return baseline
+
+class PerfModelTest(unittest.TestCase):
+    """
+    PerfModelTest class to test the analytical performance model in perf_model.py
+    """
+
+    def test_estimate_cycles(self):
+        """
+        Tests the estimated cycles of the programs of small recurrent layers
+        """
+        expected_cycles = {'rnn': 1099, 'gru': 3484, 'lstm': 3544}
+        for layer in ['rnn', 'gru', 'lstm']:
+            with self.subTest(layer=layer):
+                npu_inst = layer_program(layer, 0)
+                estimate = estimate_program(npu_inst.inst_q, arch_params)
+                self.assertEqual(estimate['cycles'], expected_cycles[layer])
+                for stage, utilization in estimate['utilization'].items():
+                    self.assertGreaterEqual(utilization, 0)
+                    self.assertLessEqual(utilization, 1)
+
+    def test_baseline_error(self):
+        """
+        Tests that the estimated cycles of standard workloads are within CALIBRATION_ERROR of the perf_baseline results
+        """
+        baseline_tops = load_baseline_tops(os.path.join(os.getcwd(), 'example-designs', 'npu', 'scripts', 'perf_baseline'))
+        for workload, (layers, input_shape) in baseline_workloads.items():
+            with self.subTest(workload=workload):
+                npu_inst = initialize_npu(baseline_args)
+                inputs = np.random.RandomState(0).uniform(-128, 127, size=input_shape)
+                NPUSequential(layers).compile_for_npu(npu_inst, inputs)
+                npu_inst.end_npu_program()
+                threads = npu_inst.arch_params['threads']
+                simulated_cycles = npu_inst.ops * threads * baseline_freq * 1e6 / (baseline_tops[workload] * 1e12)
+                estimate = estimate_program(npu_inst.inst_q, npu_inst.arch_params)
+                self.assertLessEqual(abs(estimate['cycles'] / simulated_cycles - 1), CALIBRATION_ERROR)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,14 +2,16 @@
 usage()
 {
    echo ""
-   echo "Usage: $0 -t test"
+   echo "Usage: $0 -t test -j jobs"
    echo -e "\t-t The keyword on which NPU tests to run (default: run all)"
+   echo -e "\t-j The number of parallel test jobs, each with its own RAD-Sim build (default: 1)"
 }
 
-while getopts "t:h" opt
+while getopts "t:j:h" opt
 do
    case "$opt" in
       t) TEST_KEYWORD="$OPTARG" ;;
+      j) JOBS="$OPTARG" ;;
       h) usage
          exit 0
          ;;
@@ -27,8 +29,9 @@ cp -f ../example-designs/npu/config.yml ../config.yml
 (cd ../; python config.py npu)
 
 (cd ../example-designs/npu/compiler; chmod 777 perf_sim.sh)
+JOBS=${JOBS:-1}
 if [ -z ${TEST_KEYWORD+x} ]; then
-    (cd ../example-designs/npu/scripts; python perf_tests.py | tee -a $GITHUB_STEP_SUMMARY; exit ${PIPESTATUS[0]})
+    (cd ../example-designs/npu/scripts; python perf_tests.py -j ${JOBS} | tee -a $GITHUB_STEP_SUMMARY; exit ${PIPESTATUS[0]})
 else
-    (cd ../example-designs/npu/scripts; python perf_tests.py --run_test ${TEST_KEYWORD} | tee -a $GITHUB_STEP_SUMMARY; exit ${PIPESTATUS[0]})
+    (cd ../example-designs/npu/scripts; python perf_tests.py -j ${JOBS} --run_test ${TEST_KEYWORD} | tee -a $GITHUB_STEP_SUMMARY; exit ${PIPESTATUS[0]})
 fi